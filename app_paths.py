@@ -0,0 +1,11 @@
+import os
+import sys
+
+
+def get_app_dir():
+    """程序所在目录（打包后为exe所在目录）
+
+    单文件打包时 __file__ 位于每次启动都会重新解压、退出时删除的临时目录（sys._MEIPASS），
+    需要跨次运行保留的文件（编码历史、日志、计时报告）都放在这里
+    """
+    return os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
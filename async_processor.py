@@ -0,0 +1,386 @@
+import asyncio
+import functools
+import logging
+import os
+import subprocess
+import time
+from collections import namedtuple
+
+from log_sink import get_logger
+from probe_pool import default_workers
+from verifier import build_decode_args, check_output, decode_error, sample_positions
+from video_processor import MAX_SIZE_CAP_RETRIES, MAX_VERIFY_RETRIES, VideoProcessor
+
+# 任务状态；后三者为终止状态
+JOB_STATES = ('queued', 'running', 'verifying', 'done', 'failed', 'cancelled')
+FINAL_STATES = ('done', 'failed', 'cancelled')
+
+# 事件类型：状态变化、编码进度（媒体时间，秒）和日志
+StateEvent = namedtuple('StateEvent', 'job_id state error')
+ProgressEvent = namedtuple('ProgressEvent', 'job_id media_seconds duration percent')
+LogEvent = namedtuple('LogEvent', 'job_id level message')
+
+# 终止FFmpeg后等待其退出的时间，超时则强制结束
+TERMINATE_TIMEOUT = 5
+_CREATIONFLAGS = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+
+
+class _EventStream:
+    """事件分发：每个订阅者一个队列，close() 后订阅者的迭代结束"""
+
+    def __init__(self):
+        self._queues = []
+        self.closed = False
+
+    def publish(self, event):
+        for queue in self._queues:
+            queue.put_nowait(event)
+
+    def close(self):
+        self.closed = True
+        for queue in self._queues:
+            queue.put_nowait(None)
+
+    async def subscribe(self, initial=()):
+        queue = asyncio.Queue()
+        for event in initial:
+            queue.put_nowait(event)
+        if self.closed:
+            queue.put_nowait(None)
+        self._queues.append(queue)
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            self._queues.remove(queue)
+
+
+class AsyncJob:
+    """异步任务句柄
+
+    await job 得到 (是否成功, 错误信息)；async for event in job.events() 逐个得到该任务的
+    StateEvent / ProgressEvent / LogEvent，任务结束后迭代结束；job.cancel() 协作式取消
+    （排队中的任务直接取消，运行中的任务终止其FFmpeg进程）。
+    """
+
+    def __init__(self, job_id, input_file, output_file, rotation, hw_accel, encode_options):
+        self.job_id = job_id
+        self.input_file = input_file
+        self.output_file = output_file
+        self.rotation = rotation
+        self.hw_accel = hw_accel
+        self.encode_options = encode_options or {}
+        self.state = 'queued'
+        self.error = None
+        self.media_seconds = 0.0
+        self.duration = None
+        self.started = None
+        self.finished = None
+        self._result = asyncio.get_running_loop().create_future()
+        self._stream = _EventStream()
+        self._task = None
+        self._process = None
+
+    def __await__(self):
+        return asyncio.shield(self._result).__await__()
+
+    def __repr__(self):
+        return f"<AsyncJob {self.job_id} {os.path.basename(self.input_file)} {self.state}>"
+
+    @property
+    def percent(self):
+        if self.state == 'done':
+            return 100.0
+        return min(self.media_seconds / self.duration * 100, 100.0) if self.duration else 0.0
+
+    def done(self):
+        return self.state in FINAL_STATES
+
+    def result(self):
+        """已结束任务的 (是否成功, 错误信息)，未结束时抛出 asyncio.InvalidStateError"""
+        return self._result.result()
+
+    def events(self):
+        """该任务的事件异步迭代器；订阅时先收到当前状态"""
+        return self._stream.subscribe([StateEvent(self.job_id, self.state, self.error)])
+
+    def cancel(self):
+        """取消任务，已结束时返回False"""
+        if self.done() or self._task is None:
+            return False
+        self._task.cancel()
+        return True
+
+
+class AsyncVideoProcessor:
+    """基于asyncio子进程的视频处理API，供异步服务嵌入
+
+    所有任务在同一个事件循环中运行，不为每个任务创建线程：编码和探测都使用 asyncio 子进程，
+    max_concurrent 限制同时运行的FFmpeg数量，排队中的任务只占用一个协程。
+    命令行构建、编码选项、媒体信息缓存、失败回退和输出校验与 VideoProcessor 共用：编码失败时按
+    get_encode_fallback 回退，输出超出 max_size_growth_percent 上限时降低码率重新编码，
+    encode_options['verify_output'] 为True时编码后校验输出，校验失败重新编码。
+    与 process_files 不同，始终使用FFmpeg子进程编码：忽略 engine（不使用进程内PyAV引擎）和
+    checkpoint_min_seconds（不分段续编，失败或取消后从头编码），也不支持暂存和短视频合并编码。
+
+        processor = AsyncVideoProcessor(max_concurrent=4)
+        job = processor.submit("a.mp4", "a_rotated.mp4", "顺时针90度")
+        async for event in job.events():
+            ...
+        success, error = await job
+    """
+
+    def __init__(self, processor=None, max_concurrent=2, probe_workers=None):
+        self.processor = processor or VideoProcessor()
+        self.max_concurrent = max_concurrent
+        self.jobs = {}  # 任务ID -> AsyncJob
+        self.logger = get_logger("async")
+        self._next_id = 0
+        self._encode_slots = asyncio.Semaphore(max_concurrent)
+        self._probe_slots = asyncio.Semaphore(probe_workers or default_workers())
+        self._stream = _EventStream()
+
+    def submit(self, input_file, output_file=None, rotation="顺时针90度", hw_accel="software",
+               encode_options=None, suffix="_rotated"):
+        """提交任务并立即返回 AsyncJob；未指定输出路径时输出到源文件目录（文件名加 suffix）"""
+        if output_file is None:
+            output_file = self.processor.get_output_path(input_file, suffix, "源文件目录", None, False)
+        job = AsyncJob(self._next_id, input_file, output_file, rotation, hw_accel, encode_options)
+        self._next_id += 1
+        self.jobs[job.job_id] = job
+        job._task = asyncio.get_running_loop().create_task(self._run_job(job))
+        job._task.add_done_callback(lambda task: self._finish_job(job, task))
+        self._publish(job, StateEvent(job.job_id, job.state, None))
+        return job
+
+    async def run(self, files, **options):
+        """提交一批文件并等待全部完成，返回与 files 顺序一致的 [(是否成功, 错误信息)]"""
+        jobs = [self.submit(file_path, **options) for file_path in files]
+        return [await job for job in jobs]
+
+    def events(self):
+        """所有任务的事件异步迭代器（只包含订阅之后的事件），close() 后结束"""
+        return self._stream.subscribe()
+
+    def cancel_all(self):
+        """取消所有未结束的任务，返回取消的数量"""
+        return sum(1 for job in list(self.jobs.values()) if job.cancel())
+
+    def forget(self, job_id):
+        """从 jobs 中移除已结束的任务，长期运行的服务借此释放任务记录"""
+        job = self.jobs.get(job_id)
+        if job is not None and job.done():
+            del self.jobs[job_id]
+
+    async def close(self):
+        """取消未结束的任务、等待其清理完毕，并结束 events() 的迭代"""
+        self.cancel_all()
+        tasks = [job._task for job in self.jobs.values() if job._task is not None]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._stream.close()
+
+    def _publish(self, job, event):
+        job._stream.publish(event)
+        self._stream.publish(event)
+
+    def _set_state(self, job, state, error=None):
+        job.state, job.error = state, error
+        self._publish(job, StateEvent(job.job_id, state, error))
+
+    def _log(self, job, message, level=logging.INFO, stage="async", duration=None):
+        self.logger.log(level, message, extra={'job_id': job.job_id, 'file': job.input_file,
+                                               'stage': stage, 'duration': duration})
+        self._publish(job, LogEvent(job.job_id, level, message))
+
+    async def _run_job(self, job):
+        """任务协程，返回 (是否成功, 错误信息)；结束状态和结果由 _finish_job 统一设置"""
+        async with self._encode_slots:
+            job.started = time.time()
+            self._set_state(job, 'running')
+            try:
+                return await self._process_job(job)
+            finally:
+                job._process = None
+
+    def _finish_job(self, job, task):
+        """任务协程结束（包括开始执行前就被取消）时设置最终状态、结果并结束事件流"""
+        if task.cancelled():
+            success, error = False, "已取消"
+        elif task.exception() is not None:
+            success, error = False, f"处理异常: {task.exception()}"
+        else:
+            success, error = task.result()
+        job.finished = time.time()
+        if success:
+            self._set_state(job, 'done')
+        else:
+            self._set_state(job, 'cancelled' if error == "已取消" else 'failed', error)
+        job._stream.close()
+        job._result.set_result((success, error))
+
+    async def _process_job(self, job):
+        """编码并按 VideoProcessor 的策略处理失败：依次回退（get_encode_fallback），输出超出大小上限时
+        降低码率重新编码（最多 MAX_SIZE_CAP_RETRIES 次），校验失败时删除输出并重新编码（最多 MAX_VERIFY_RETRIES 次）"""
+        input_file, output_file = job.input_file, job.output_file
+        info = await self.probe(input_file)
+        job.duration = info.get('duration') if info else None
+        os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+
+        for attempt in range(MAX_VERIFY_RETRIES + 1):
+            started = time.time()
+            success, error, encode_options = await self._encode_with_fallback(job, job.encode_options)
+            if not success:
+                return success, error
+            for _ in range(MAX_SIZE_CAP_RETRIES):
+                retry = await self._in_executor(self.processor.get_size_cap_retry, input_file, output_file, encode_options)
+                if retry is None:
+                    break
+                reason, encode_options = retry
+                self._log(job, f"⚠️ {reason}: {os.path.basename(input_file)}", logging.WARNING, stage="size_cap")
+                job.media_seconds = 0.0
+                success, error, encode_options = await self._encode_with_fallback(job, encode_options)
+                if not success:
+                    return success, error
+            await self._in_executor(self.processor._record_file_speed, input_file, job.hw_accel,
+                                    time.time() - started, encode_options)
+
+            if not job.encode_options.get('verify_output'):
+                return True, None
+            self._set_state(job, 'verifying')
+            success, error = await self.verify(input_file, output_file, job.rotation)
+            if success:
+                return True, None
+            self._log(job, f"⚠️ 输出校验失败: {os.path.basename(output_file)} - {error}", logging.WARNING, stage="verify")
+            try:
+                os.remove(output_file)
+            except OSError:
+                pass
+            if attempt < MAX_VERIFY_RETRIES:
+                self._log(job, f"🔁 重新编码: {os.path.basename(input_file)}", stage="verify")
+                job.media_seconds = 0.0
+                self._set_state(job, 'running')
+        return False, f"输出校验失败: {error}"
+
+    async def _encode_with_fallback(self, job, encode_options):
+        """编码一次，失败时按 get_encode_fallback 依次回退，返回 (是否成功, 错误信息, 最后使用的编码选项)"""
+        hw_accel = job.hw_accel
+        success, error = await self._encode(job, hw_accel, encode_options)
+        while not success:
+            fallback = self.processor.get_encode_fallback(error, hw_accel, encode_options)
+            if fallback is None:
+                break
+            reason, hw_accel, encode_options = fallback
+            self._log(job, f"⚠️ {reason}: {os.path.basename(job.input_file)}", logging.WARNING, stage="encode")
+            success, error = await self._encode(job, hw_accel, encode_options)
+        return success, error, encode_options
+
+    async def _in_executor(self, func, *args):
+        """在默认线程池中运行可能阻塞的同步调用（构建命令行时的探测、编码历史读写），不阻塞事件循环"""
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+    async def _encode(self, job, hw_accel, encode_options):
+        """运行一次FFmpeg编码，逐行读取 -progress 输出并发布进度事件"""
+        # 匹配源策略和快速启动会在构建命令行时探测输入，放到线程池中运行
+        args = await self._in_executor(functools.partial(
+            self.processor.build_encode_args, job.input_file, job.output_file, job.rotation, hw_accel,
+            output_options=["-progress", "pipe:1", "-nostats"], encode_options=encode_options
+        ))
+        accel_type = "软件编码" if hw_accel in ("software", "无") else f"{hw_accel.upper()}硬件加速"
+        self._log(job, f"开始处理: {os.path.basename(job.input_file)} ({accel_type})", stage="encode")
+        self.logger.debug(f"命令: {' '.join(args)}", extra={'job_id': job.job_id, 'file': job.input_file,
+                                                          'stage': "encode", 'duration': None})
+        started = time.time()
+        process = job._process = await asyncio.create_subprocess_exec(
+            *args, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE, creationflags=_CREATIONFLAGS
+        )
+        stderr_task = asyncio.ensure_future(process.stderr.read())
+        try:
+            async for line in process.stdout:
+                if line.startswith(b"out_time_us="):
+                    try:
+                        job.media_seconds = int(line.split(b"=", 1)[1]) / 1000000
+                    except ValueError:
+                        continue  # 尚无输出时为 N/A
+                    self._publish(job, ProgressEvent(job.job_id, job.media_seconds, job.duration, job.percent))
+            await process.wait()
+            stderr = (await stderr_task).decode('utf-8', errors='replace')
+        except asyncio.CancelledError:
+            stderr_task.cancel()
+            await self._terminate(process)
+            raise
+
+        if process.returncode == 0:
+            self._log(job, f"✅ 完成: {os.path.basename(job.output_file)}", stage="encode", duration=time.time() - started)
+            return True, None
+        error_msg = self.processor.describe_encode_failure(process.returncode, stderr)
+        self._log(job, f"❌ 失败: {os.path.basename(job.input_file)} - {error_msg}", logging.ERROR, stage="encode",
+                  duration=time.time() - started)
+        return False, error_msg
+
+    async def _terminate(self, process):
+        """终止FFmpeg并等待退出，超时后强制结束"""
+        if process.returncode is not None:
+            return
+        try:
+            process.terminate()
+            await asyncio.wait_for(process.wait(), TERMINATE_TIMEOUT)
+        except ProcessLookupError:
+            pass
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+    async def _run(self, args):
+        """运行命令并返回 (返回码, 标准输出, 标准错误)"""
+        process = await asyncio.create_subprocess_exec(
+            *args, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE, creationflags=_CREATIONFLAGS
+        )
+        try:
+            stdout, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            await self._terminate(process)
+            raise
+        return (process.returncode, stdout.decode('utf-8', errors='replace'),
+                stderr.decode('utf-8', errors='replace'))
+
+    async def probe(self, file_path):
+        """异步探测媒体信息，与 VideoProcessor.probe_video 共用缓存，失败返回None"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        cache_key = (file_path, stat.st_size, stat.st_mtime)
+        cache = self.processor.media_info_cache
+        if cache_key in cache:
+            return cache[cache_key]
+        async with self._probe_slots:
+            returncode, stdout, _ = await self._run([
+                self.processor.ffprobe_path, "-v", "error", "-print_format", "json",
+                "-show_format", "-show_streams", file_path
+            ])
+        if returncode != 0:
+            return None
+        try:
+            info = self.processor.parse_probe_output(stdout, stat.st_size)
+        except ValueError:
+            return None
+        cache[cache_key] = info
+        return info
+
+    async def verify(self, input_file, output_file, rotation):
+        """与 OutputVerifier.verify 相同的校验（check_output + 一次抽样解码），返回 (是否通过, 错误信息)"""
+        source_info = await self.probe(input_file)
+        output_info = await self.probe(output_file)
+        problem = check_output(output_file, source_info, output_info, rotation)
+        if problem:
+            return False, problem
+        samples = sample_positions(output_info.get('duration'))
+        returncode, _, stderr = await self._run(build_decode_args(self.processor.ffmpeg_path, output_file, samples))
+        error = decode_error(samples, returncode, stderr)
+        return (False, error) if error else (True, None)
@@ -0,0 +1,133 @@
+try:
+    import av  # PyAV（可选依赖）：在进程内调用libav进行解码、滤镜和编码
+except ImportError:
+    av = None
+
+# 旋转方向 -> libavfilter滤镜链
+ROTATION_FILTERS = {
+    "顺时针90度": [("transpose", "1")],
+    "逆时针90度": [("transpose", "2")],
+    "180度": [("hflip", ""), ("vflip", "")],
+}
+
+# 源视频带旋转元数据时 rotate() 返回的错误，调用方据此改用FFmpeg
+ROTATED_SOURCE_ERROR = "进程内引擎不处理带旋转元数据的视频"
+
+
+def is_available():
+    """PyAV是否已安装"""
+    return av is not None
+
+
+class AVEngine:
+    """进程内旋转引擎：对几秒钟的短视频，省去每个文件启动FFmpeg进程的开销
+
+    与FFmpeg子进程路径输出一致（libx264视频 + 音频直接复制）。FFmpeg解码时会按旋转元数据（显示矩阵或
+    rotate标签，手机拍摄的视频常带）自动旋转，PyAV不会，因此带旋转元数据的视频不在进程内编码：
+    rotate() 发现旋转元数据时返回失败，由调用方改用FFmpeg。引擎本身无状态，
+    由VideoProcessor的线程池并发调用；PyAV在解码和编码时释放GIL，多个工作线程可以真正并行。
+    """
+
+    def probe(self, input_file):
+        """在进程内读取 (时长秒数, 显示旋转角度)，无法读取的项为None"""
+        try:
+            with av.open(input_file) as container:
+                stream = container.streams.video[0]
+                duration = None
+                if container.duration:
+                    duration = container.duration / av.time_base
+                elif stream.duration and stream.time_base:
+                    duration = float(stream.duration * stream.time_base)
+                rotation = self.display_rotation(stream)
+                if not rotation:
+                    # 显示矩阵只能从解码帧上读取，解码第一帧
+                    rotation = self.display_rotation(stream, next(container.decode(stream), None))
+                return duration, rotation
+        except Exception:
+            return None, None
+
+    def display_rotation(self, stream, frame=None):
+        """视频的显示旋转角度：rotate标签，或解码帧上的显示矩阵（较新的PyAV提供 frame.rotation），没有时为0"""
+        rotation = 0
+        try:
+            rotation = int(float(stream.metadata.get('rotate') or 0))
+        except (TypeError, ValueError):
+            pass
+        if not rotation and frame is not None:
+            rotation = int(getattr(frame, 'rotation', 0) or 0)
+        return rotation % 360
+
+    def _build_graph(self, in_stream, rotation):
+        """按输入流参数构建旋转滤镜图"""
+        graph = av.filter.Graph()
+        node = graph.add_buffer(template=in_stream)
+        for name, args in ROTATION_FILTERS.get(rotation, ROTATION_FILTERS["顺时针90度"]):
+            next_node = graph.add(name, args) if args else graph.add(name)
+            node.link_to(next_node)
+            node = next_node
+        node.link_to(graph.add("buffersink"))
+        graph.configure()
+        return graph
+
+    def _drain_graph(self, graph, out_stream, output):
+        """取出滤镜图中所有可用的帧并编码写入"""
+        while True:
+            try:
+                frame = graph.pull()
+            except (BlockingIOError, EOFError):
+                return
+            for packet in out_stream.encode(frame):
+                output.mux(packet)
+
+    def rotate(self, input_file, output_file, rotation, should_continue=None):
+        """旋转并重新编码视频，返回(success, error)；should_continue() 返回False时中止"""
+        if av is None:
+            return False, "未安装PyAV"
+
+        try:
+            with av.open(input_file) as source, av.open(output_file, 'w') as output:
+                in_video = source.streams.video[0]
+                in_video.thread_type = "AUTO"
+                if self.display_rotation(in_video):
+                    return False, ROTATED_SOURCE_ERROR
+                swap = rotation in ("顺时针90度", "逆时针90度")
+
+                out_video = output.add_stream("libx264", rate=in_video.average_rate or 30)
+                out_video.width = in_video.codec_context.height if swap else in_video.codec_context.width
+                out_video.height = in_video.codec_context.width if swap else in_video.codec_context.height
+                out_video.pix_fmt = "yuv420p"
+                out_video.codec_context.time_base = in_video.time_base
+
+                # 音频流原样复制（对应 -c:a copy）
+                audio_streams = {}
+                for in_audio in source.streams.audio:
+                    if hasattr(output, 'add_stream_from_template'):
+                        audio_streams[in_audio.index] = output.add_stream_from_template(in_audio)
+                    else:
+                        audio_streams[in_audio.index] = output.add_stream(template=in_audio)
+
+                # 编码器和滤镜图在文件结束时需要冲刷，冲刷后无法复用，因此每个文件重新创建
+                graph = self._build_graph(in_video, rotation)
+                for packet in source.demux(in_video, *source.streams.audio):
+                    if should_continue is not None and not should_continue():
+                        return False, "已取消"
+                    if packet.stream.index in audio_streams:
+                        # 流结束时的空包只用于冲刷解码器，复制音频时跳过
+                        if packet.dts is None:
+                            continue
+                        packet.stream = audio_streams[packet.stream.index]
+                        output.mux(packet)
+                        continue
+                    for frame in packet.decode():
+                        if self.display_rotation(in_video, frame):
+                            return False, ROTATED_SOURCE_ERROR
+                        graph.push(frame)
+                        self._drain_graph(graph, out_video, output)
+
+                graph.push(None)
+                self._drain_graph(graph, out_video, output)
+                for packet in out_video.encode(None):
+                    output.mux(packet)
+            return True, None
+        except Exception as e:
+            return False, f"进程内编码失败: {e}"
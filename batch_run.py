@@ -0,0 +1,685 @@
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from eta_model import EtaTracker
+from job_store import CANCELLED, DONE, FAILED, PENDING, RUNNING, JobStore
+from probe_pool import ProbePool, default_workers
+from video_processor import MAX_VERIFY_RETRIES
+
+
+class BatchRun:
+    """一次 process_files 调用的调度器
+
+    持有本批的待调度队列、运行中和校验中的任务、剩余时间估算（eta）和吞吐量控制器（controller）。
+    run() 在调用线程中循环：补充队列 → 在CPU并发上限内派发设备空闲的任务 → 收集完成的任务 → 刷新进度，
+    编码在线程池中进行。任务控制（取消、调整优先级）由 VideoProcessor 转发到当前批次，
+    与调度线程共用 processor._job_lock。
+    """
+
+    def __init__(self, processor, files, rotation, suffix, output_option, output_dir, create_subdir, hw_accel,
+                 max_concurrent=1, max_io_per_device=2, staging_options=None, encode_options=None, result_callback=None):
+        self.processor = processor
+        self.files = files
+        self.rotation = rotation
+        self.suffix = suffix
+        self.output_option = output_option
+        self.output_dir = output_dir
+        self.create_subdir = create_subdir
+        self.hw_accel = hw_accel
+        self.max_concurrent = max_concurrent
+        self.max_io_per_device = max_io_per_device  # 每个设备的并发任务数，0表示不限制
+        self.staging_options = staging_options
+        self.encode_options = encode_options
+        self.result_callback = result_callback
+
+        self.total_files = len(files) if hasattr(files, '__len__') else None
+        self.job_store = files if isinstance(files, JobStore) else None  # 任务状态写回其中
+        self.eta = EtaTracker(max_concurrent)
+        self.controller = None  # 设置了截止时间或目标速度时的 ThroughputController
+        self.staging = None
+        self.verifier = None
+        self.probe_pool = None
+
+        # 待调度任务：(任务ID, 文件路径, 输出路径, 涉及的设备, 任务选项)，任务ID即任务在输入中的序号
+        self.pending = deque()
+        self.running_jobs = {}  # 任务ID -> 文件路径
+        self.cancelled_pending = []  # 从队列中取消的文件
+        self.stop_generating = False  # 流式输入时停止继续读取新任务
+        self.running = {}  # future -> (占用的设备, [(任务ID, 输出路径, 任务选项)])，合并编码的一组短视频共用一个future
+        self.verifying = {}  # 校验future -> (任务ID, 文件路径, 输出路径, 任务选项)
+        self.verify_attempts = {}  # 任务ID -> 已因校验失败重新排队的次数
+        self.clip_durations = {}  # 可合并编码的任务ID -> 时长
+        self.job_presets = {}  # 任务ID -> 开始时分配的编码预设
+        self.probe_requested = set()  # 已提交探测、尚未开始的任务ID
+
+        self.successful_files = []
+        self.failed_files = []
+        self.cancelled_files = []
+        self.staged_outputs = []  # 启用暂存时成功任务的 (任务ID, 文件路径, 输出路径)，用于识别移动失败的任务
+
+        # 短视频合并批量编码：不超过 batch_clip_seconds 的视频按总时长分组，一组只启动一个FFmpeg进程
+        options = encode_options or {}
+        self.batch_clip_seconds = 0 if staging_options else options.get('batch_clip_seconds') or 0
+        self.batch_max_seconds = options.get('batch_max_seconds') or 120
+        self.batch_max_files = options.get('batch_max_files') or 16
+
+        # 调度窗口只向前查看有限个任务，避免超大队列下每次调度都全量扫描
+        self.scan_window = max(32, max_concurrent * 8)
+        # 流式输入时队列中最多保留的待调度任务数；列表输入全部入队，便于按任务ID控制
+        self.queue_limit = None if self.total_files is not None else max(self.scan_window * 4, 256)
+        # 任务表只处理开始时已有的任务，处理过程中追加的任务留到下一批，使进度与 total_files 一致
+        self._source = enumerate(itertools.islice(files, self.total_files) if self.job_store is not None else files)
+        self._source_exhausted = False
+        self._source_end = object()
+        # 流式输入由后台线程读取，放入有界队列：读取标准输入或网络清单阻塞时，调度线程照常处理完成、取消和停止
+        self._feed_queue = queue.Queue(maxsize=self.queue_limit) if self.queue_limit is not None else None
+
+    def log(self, message, level=logging.INFO, stage="batch", **kwargs):
+        self.processor.log(message, level=level, stage=stage, **kwargs)
+
+    # ---- 运行 ----
+
+    def run(self):
+        """处理全部任务直到完成或停止，返回 (成功的文件列表, [(失败的文件, 错误信息)])"""
+        self._start()
+        with ThreadPoolExecutor(max_workers=self.max_concurrent) as executor:
+            self.dispatch(executor)
+            self._loop(executor)
+
+        # 停止后线程池退出时所有编码都已结束：停止前已完成的任务照常记录结果，被终止的任务计为已取消
+        for future in list(self.running):
+            self.on_finished(future)
+        self._abandon_verifying()
+        self._cancel_remaining()
+        self.probe_pool.cancel()
+        self._commit_staged_outputs()
+        return self._report()
+
+    def _start(self):
+        """初始化处理器的批次状态，创建暂存、校验、吞吐量控制和探测等组件"""
+        processor = self.processor
+        processor.is_processing = True
+        processor.total_files = self.total_files
+        processor.completed_files = 0
+        processor.start_time = time.time()
+        processor.batch_concurrency = self.max_concurrent
+        processor.eta = self.eta
+
+        if processor.ui_callback:
+            total_text = f"{self.total_files} 个文件" if self.total_files is not None else "清单中的文件"
+            processor.ui_callback('status', f"开始处理 {total_text}...")
+            processor.ui_callback('progress', {'overall': 0, 'current': 0})
+
+        # 可选的本地暂存：预取后续输入，输出先写暂存目录再异步移动
+        if self.staging_options:
+            from staging import StagingManager
+            self.staging = StagingManager(
+                scratch_root=self.staging_options.get('scratch_dir') or None,
+                budget_bytes=int(self.staging_options.get('budget_mb', 10240)) * 1024 * 1024,
+                prefetch_count=self.staging_options.get('prefetch_count', 2),
+                ui_callback=processor.ui_callback
+            ).start()
+
+        # 编码完成后在独立线程池中校验输出，校验期间编码并发立即用于下一个文件
+        options = self.encode_options or {}
+        if options.get('verify_output'):
+            from verifier import OutputVerifier
+            self.verifier = OutputVerifier(processor, max_workers=self.max_concurrent)
+
+        # 吞吐量目标：给定截止时间或目标总速度时，按实测速度为尚未开始的任务选择能按时完成的最慢（质量最好）预设
+        if options.get('deadline') or options.get('target_speed'):
+            from preset_controller import ThroughputController
+            self.controller = ThroughputController(
+                self.hw_accel, self.max_concurrent,
+                deadline=options.get('deadline'), target_speed=options.get('target_speed'),
+                log=lambda message, level=logging.INFO: self.log(message, level=level, stage="preset")
+            )
+        processor.preset_controller = self.controller
+
+        # 后台探测调度窗口内即将开始的任务并预测其耗时，第一个文件完成前即可给出剩余时间；
+        # 探测数少于编码并发，不与正在进行的编码争抢磁盘和CPU，尚未探测的任务按已知预测的平均值估计
+        probe_workers = min(processor.probe_workers or default_workers(), max(1, self.max_concurrent // 2))
+        self.probe_pool = ProbePool(processor, max_workers=probe_workers, on_result=self.on_probed)
+
+        with processor._job_lock:
+            processor._cancelled_jobs.clear()
+            processor._batch = self
+
+        if self._feed_queue is not None:
+            threading.Thread(target=self._feed, name="job-feeder", daemon=True).start()
+
+    def _loop(self, executor):
+        """处理完成的任务；带超时等待，以便及时响应取消、调整优先级和停止"""
+        processor = self.processor
+        last_report = 0.0
+        while (self.running or self.verifying or self.source_open()) and processor.is_processing:
+            if self.running or self.verifying:
+                done, _ = wait(itertools.chain(self.running, self.verifying), timeout=0.2, return_when=FIRST_COMPLETED)
+            else:
+                # 流式输入暂时没有读到新任务
+                done = set()
+                time.sleep(0.1)
+
+            for future in done:
+                if future in self.verifying:
+                    self.on_verified(*self.verifying.pop(future), *future.result())
+                else:
+                    self.on_finished(future)
+
+            if processor.is_processing:
+                self.dispatch(executor)
+
+            # 有任务完成时立即更新，否则每秒按实时进度刷新一次剩余时间
+            if not done and time.time() - last_report < 1.0:
+                continue
+            last_report = time.time()
+            self.report_progress()
+
+    # ---- 任务设置 ----
+
+    def job_settings(self, job_options):
+        """任务自身的旋转方向和编码选项（覆盖批量参数）"""
+        if not job_options:
+            return self.rotation, self.encode_options
+        job_encode_options = self.encode_options
+        if job_options.get('encode_options'):
+            job_encode_options = dict(self.encode_options or {}, **job_options['encode_options'])
+        return job_options.get('rotation', self.rotation), job_encode_options
+
+    def with_preset(self, job_id, job_encode_options):
+        """加上任务开始时分配的编码预设"""
+        preset = self.job_presets.get(job_id)
+        return dict(job_encode_options or {}, encoder_preset=preset) if preset else job_encode_options
+
+    # ---- 工作线程 ----
+
+    def process_single_file(self, job_id, file_path, output_path, job_options):
+        """在工作线程中处理单个文件"""
+        processor = self.processor
+        processor._job_context.job_id = job_id
+        try:
+            job_rotation, job_encode_options = self.job_settings(job_options)
+            job_encode_options = self.with_preset(job_id, job_encode_options)
+            started = time.time()
+            result = processor.process_single(
+                file_path, output_path, job_rotation, self.hw_accel, self.staging, job_encode_options,
+                verifier=self.verifier if self.staging is not None else None
+            )
+            # 每个任务一条汇总记录（只写入日志文件）
+            self.log("任务完成" if result[1] else f"任务失败: {result[2]}",
+                     level=logging.INFO if result[1] else logging.ERROR,
+                     stage="job", file=file_path, duration=time.time() - started, ui=False)
+            return result
+        finally:
+            processor._job_context.job_id = None
+
+    def process_batch_files(self, batch, durations):
+        """用一个FFmpeg进程处理一组短视频；整组失败时逐个重新处理，使错误对应到具体文件"""
+        processor = self.processor
+        # 同一组同时开始，分配的预设相同
+        job_encode_options = self.with_preset(batch[0][0], self.job_settings(batch[0][3])[1])
+        jobs = [(file_path, output_path, self.job_settings(job_options)[0])
+                for _, file_path, output_path, job_options in batch]
+        started = time.time()
+        try:
+            for _, output_path, _ in jobs:
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            success, error = processor.encode_batch(jobs, self.hw_accel, job_encode_options, [item[0] for item in batch])
+        except Exception as e:
+            success, error = False, str(e)
+
+        if success:
+            # 按时长分摊整组耗时，用于速度历史和每个任务的汇总记录
+            elapsed, total = time.time() - started, sum(durations)
+            results = []
+            for (job_id, file_path, _, _), duration in zip(batch, durations):
+                share = elapsed * duration / total if total else elapsed / len(batch)
+                processor._record_file_speed(file_path, self.hw_accel, share, job_encode_options)
+                processor._job_context.job_id = job_id
+                self.log("任务完成", stage="job", file=file_path, duration=share, ui=False)
+                results.append((file_path, True, None))
+            processor._job_context.job_id = None
+            return results
+
+        if processor.is_processing and error != "已取消":
+            self.log(f"⚠️ 批量处理失败，逐个重新处理 {len(batch)} 个文件: {error}", level=logging.WARNING,
+                     stage="batch_encode")
+        results = []
+        for job_id, file_path, output_path, job_options in batch:
+            with processor._job_lock:
+                cancelled = job_id in processor._cancelled_jobs
+            results.append((file_path, False, "已取消") if cancelled else
+                           self.process_single_file(job_id, file_path, output_path, job_options))
+        return results
+
+    # ---- 结果 ----
+
+    def set_job_state(self, job_id, state, error=None):
+        """把任务状态写回任务表（输入为JobStore时）；任务表已被清空（ID不存在）时忽略"""
+        if self.job_store is not None and job_id < len(self.job_store):
+            self.job_store.set_state(job_id, state)
+            self.job_store.set_error(job_id, error)
+
+    def record_result(self, file_path, success, error):
+        if self.result_callback is not None:
+            self.result_callback(file_path, success, error)
+        elif success:
+            self.successful_files.append(file_path)
+        else:
+            self.failed_files.append((file_path, error))
+
+    def on_probed(self, key, file_path, info):
+        """探测完成（在探测线程中调用）：预测耗时，登记到吞吐量控制器，短视频标记为可合并编码
+
+        预测和后端选择在锁外计算，结果在 _job_lock 下写入，与调度线程的派发和取消互斥；
+        任务已结束或已取消时丢弃结果，不在控制器和合并候选中留下残留
+        """
+        job_id, job_options = key
+        job_encode_options = self.job_settings(job_options)[1]
+        duration = info.get('duration') if info else None
+        predicted = self.processor.predict_encode_time(info, self.hw_accel, job_encode_options, self.max_concurrent)
+        # 只合并走FFmpeg后端的短视频；大小上限需要逐个检查和重试，这类任务单独编码
+        batchable = bool(self.batch_clip_seconds and duration and duration <= self.batch_clip_seconds
+                         and (job_encode_options or {}).get('max_size_growth_percent') is None
+                         and self.processor.select_engine(file_path, self.hw_accel, job_encode_options) == 'ffmpeg')
+
+        with self.processor._job_lock:
+            queued = job_id in self.probe_requested
+            if not queued and job_id not in self.running_jobs:
+                return
+            self.eta.set_prediction(job_id, duration, predicted)
+            if self.controller is not None:
+                self.controller.add_job(job_id, duration)
+            if queued and batchable:
+                self.clip_durations[job_id] = duration
+
+    # ---- 输入 ----
+
+    def _feed(self):
+        """后台读取流式输入，放入有界队列；停止或取消全部排队任务时结束"""
+        processor = self.processor
+
+        def put(item):
+            while processor.is_processing and not self.stop_generating:
+                try:
+                    self._feed_queue.put(item, timeout=0.2)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        try:
+            for item in self._source:
+                if not put(item):
+                    return
+        except Exception as e:
+            self.log(f"❌ 读取任务失败: {e}", level=logging.ERROR)
+        put(self._source_end)
+
+    def next_job(self):
+        """下一个任务 (任务ID, 任务)；流式输入暂时没有读到新任务时返回None，输入结束时标记为已读完"""
+        try:
+            item = next(self._source) if self._feed_queue is None else self._feed_queue.get_nowait()
+        except StopIteration:
+            item = self._source_end
+        except queue.Empty:
+            return None
+        except Exception as e:
+            self.log(f"❌ 读取任务失败: {e}", level=logging.ERROR)
+            item = self._source_end
+        if item is self._source_end:
+            self._source_exhausted = True
+            return None
+        return item
+
+    def source_open(self):
+        """流式输入是否还可能有新任务（主循环据此在没有运行中的任务时继续等待）"""
+        return self._feed_queue is not None and not self._source_exhausted and not self.stop_generating
+
+    def refill(self):
+        """从输入中按需取出任务，补充到待调度队列"""
+        if self._source_exhausted:
+            return
+        processor = self.processor
+        new_items = []
+        while processor.is_processing and (self.queue_limit is None or len(self.pending) + len(new_items) < self.queue_limit):
+            item = self.next_job()
+            if item is None:
+                break
+            job_id, job = item
+
+            job_options = None
+            if isinstance(job, dict):
+                file_path = job.get('input')
+                job_options = job
+                if job.get('error'):
+                    processor.completed_files += 1
+                    self.record_result(file_path, False, job['error'])
+                    continue
+            else:
+                file_path = job
+            try:
+                output_path = (job_options or {}).get('output') or processor.get_output_path(
+                    file_path, self.suffix, self.output_option, self.output_dir, self.create_subdir
+                )
+            except Exception as e:
+                processor.completed_files += 1
+                self.record_result(file_path, False, str(e))
+                continue
+            new_items.append((job_id, file_path, output_path,
+                              processor.io_scheduler.devices_for(file_path, output_path), job_options))
+            self.set_job_state(job_id, PENDING)
+            self.eta.add_job(job_id)
+            if self.controller is not None:
+                self.controller.add_job(job_id)
+
+        if new_items:
+            with processor._job_lock:
+                self.pending.extend(new_items)
+
+    def probe_ahead(self):
+        """为调度窗口内尚未探测的任务提交探测（调用方需持有锁），不为整个队列预先探测"""
+        items = [((item[0], item[4]), item[1]) for item in itertools.islice(self.pending, self.scan_window)
+                 if item[0] not in self.probe_requested]
+        if items:
+            self.probe_requested.update(key[0] for key, _ in items)
+            self.probe_pool.submit(items)
+
+    # ---- 调度 ----
+
+    def collect_batch(self, index, first):
+        """从调度窗口中为短视频凑一组：设备和编码选项相同，总时长不超过 batch_max_seconds（调用方需持有锁）"""
+        pending = self.pending
+        batch, durations = [first], [self.clip_durations.pop(first[0], None)]
+        if durations[0] is None:
+            return batch, durations
+        total, options = durations[0], self.job_settings(first[4])[1]
+        end = min(len(pending), self.scan_window)
+        while index < end and len(batch) < self.batch_max_files and total < self.batch_max_seconds:
+            item = pending[index]
+            duration = self.clip_durations.get(item[0])
+            if (duration is not None and item[3] == first[3] and total + duration <= self.batch_max_seconds
+                    and self.job_settings(item[4])[1] == options):
+                del pending[index]
+                end -= 1
+                del self.clip_durations[item[0]]
+                batch.append(item)
+                durations.append(duration)
+                total += duration
+            else:
+                index += 1
+        return batch, durations
+
+    def dispatch(self, executor):
+        """在CPU并发上限内提交设备空闲的任务，被占满设备上的任务留在队列中"""
+        processor = self.processor
+        if not self.stop_generating:
+            self.refill()
+        with processor._job_lock:
+            pending = self.pending
+            index = 0
+            while pending and len(self.running) < self.max_concurrent and index < min(len(pending), self.scan_window):
+                job_id, file_path, output_path, devices, job_options = pending[index]
+                if processor.io_scheduler.try_acquire(devices, self.max_io_per_device):
+                    del pending[index]
+                    batch, durations = self.collect_batch(index, (job_id, file_path, output_path, devices, job_options))
+                    if self.controller is not None:
+                        for item in batch:
+                            self.job_presets[item[0]] = self.controller.start_job(item[0])
+                    if len(batch) > 1:
+                        future = executor.submit(self.process_batch_files,
+                                                 [(item[0], item[1], item[2], item[4]) for item in batch], durations)
+                    else:
+                        future = executor.submit(self.process_single_file, job_id, file_path, output_path, job_options)
+                    self.running[future] = (devices, [(item[0], item[2], item[4]) for item in batch])
+                    for item in batch:
+                        self.running_jobs[item[0]] = item[1]
+                        self.probe_requested.discard(item[0])
+                        self.set_job_state(item[0], RUNNING)
+                        self.eta.start_job(item[0])
+                else:
+                    index += 1
+            self.probe_ahead()
+            upcoming = [item[1] for item in itertools.islice(pending, self.staging.prefetch_count)] if self.staging else None
+        if self.staging is not None:
+            self.staging.prefetch(upcoming)
+
+    # ---- 完成 ----
+
+    def on_finished(self, future):
+        """收集一个完成的编码future：释放设备，需要校验的输出交给校验线程池，其余记录结果"""
+        processor = self.processor
+        with processor._job_lock:
+            devices, jobs = self.running.pop(future)
+        processor.io_scheduler.release(devices)
+        results = future.result() if len(jobs) > 1 else [future.result()]
+        if self.controller is not None:
+            self.controller.finish_jobs([(job[0], result[1]) for job, result in zip(jobs, results)])
+
+        for (job_id, output_path, job_options), (file_path, success, error) in zip(jobs, results):
+            with processor._job_lock:
+                self.running_jobs.pop(job_id, None)
+                processor._paused_jobs.discard(job_id)
+                cancelled = job_id in processor._cancelled_jobs
+                processor._cancelled_jobs.discard(job_id)
+
+            self.eta.finish_job(job_id, success)
+            self.job_presets.pop(job_id, None)
+            if success and self.verifier is not None and self.staging is None and not cancelled:
+                if processor.is_processing:
+                    verify_future = self.verifier.submit(file_path, output_path, self.job_settings(job_options)[0],
+                                                         processor.get_cached_info(file_path))
+                    self.verifying[verify_future] = (job_id, file_path, output_path, job_options)
+                else:
+                    self._discard_unverified(job_id, file_path, output_path)
+                continue
+
+            processor.completed_files += 1
+            self.set_job_state(job_id, DONE if success else CANCELLED if cancelled else FAILED,
+                               None if success or cancelled else error)
+
+            if success and self.staging is not None:
+                self.staged_outputs.append((job_id, file_path, output_path))
+            elif success:
+                self.record_result(file_path, True, None)
+            elif cancelled:
+                self.cancelled_files.append(file_path)
+            else:
+                self.record_result(file_path, False, error)
+
+    def on_verified(self, job_id, file_path, output_path, job_options, success, error):
+        """处理校验结果：失败时删除输出并把任务放回队首重新编码（最多 MAX_VERIFY_RETRIES 次）"""
+        processor = self.processor
+        attempts = self.verify_attempts.pop(job_id, 0)
+        if success:
+            processor.completed_files += 1
+            self.set_job_state(job_id, DONE)
+            self.record_result(file_path, True, None)
+            return
+        self.log(f"⚠️ 输出校验失败: {os.path.basename(output_path)} - {error}", level=logging.WARNING,
+                 stage="verify", file=file_path)
+        try:
+            os.remove(output_path)
+        except OSError:
+            pass
+        if attempts < MAX_VERIFY_RETRIES and processor.is_processing:
+            self.verify_attempts[job_id] = attempts + 1
+            self.log(f"🔁 重新编码: {os.path.basename(file_path)}", stage="verify", file=file_path)
+            self.set_job_state(job_id, PENDING)
+            with processor._job_lock:
+                self.pending.appendleft(
+                    (job_id, file_path, output_path, processor.io_scheduler.devices_for(file_path, output_path), job_options)
+                )
+            self.eta.add_job(job_id)
+            if self.controller is not None:
+                self.controller.add_job(job_id)
+        else:
+            processor.completed_files += 1
+            self.set_job_state(job_id, FAILED, f"输出校验失败: {error}")
+            self.record_result(file_path, False, f"输出校验失败: {error}")
+
+    def report_progress(self):
+        """更新吞吐量控制器和界面上的进度、剩余时间"""
+        processor = self.processor
+        if self.controller is not None:
+            self.controller.update(self.eta.running_progress())
+        if not processor.ui_callback:
+            return
+        estimate = self.eta.estimate()
+        progress = {'current': estimate['current_progress'] * 100}
+        if self.total_files:
+            progress['overall'] = (processor.completed_files + estimate['current_progress'] * len(self.running_jobs)) / self.total_files * 100
+            processor.ui_callback('status', f"已完成 {processor.completed_files}/{self.total_files} 个文件")
+        else:
+            processor.ui_callback('status', f"已完成 {processor.completed_files} 个文件")
+        processor.ui_callback('progress', progress)
+        if self._source_exhausted:
+            processor.ui_callback('time', processor.format_eta(estimate))
+        else:
+            processor.ui_callback('time', "剩余时间: 未知（任务仍在读取中）")
+
+    # ---- 停止与收尾 ----
+
+    def _abandon_verifying(self):
+        """停止时尚未完成校验的输出未经确认，删除后与其他未完成的任务一样计为已取消"""
+        if self.verifier is None:
+            return
+        self.verifier.close(wait=False)
+        wait(self.verifying, timeout=5)
+        for job_id, file_path, output_path, job_options in self.verifying.values():
+            self._discard_unverified(job_id, file_path, output_path)
+
+    def _discard_unverified(self, job_id, file_path, output_path):
+        try:
+            os.remove(output_path)
+        except OSError:
+            pass
+        self.log(f"⏹ 输出未完成校验，已删除: {os.path.basename(output_path)}", stage="verify", file=file_path)
+        self.set_job_state(job_id, CANCELLED)
+        self.cancelled_files.append(file_path)
+
+    def _cancel_remaining(self):
+        """停止时尚未开始的任务计为已取消，清除处理器上的批次状态"""
+        processor = self.processor
+        with processor._job_lock:
+            self.cancelled_files.extend(self.cancelled_pending)
+            self.cancelled_files.extend(item[1] for item in self.pending)
+            for item in self.pending:
+                self.set_job_state(item[0], CANCELLED)
+            self.pending = deque()
+            self.cancelled_pending = []
+            self.running_jobs.clear()
+            processor._paused_jobs.clear()
+            processor._batch = None
+        processor.eta = None
+        processor.preset_controller = None
+
+    def _commit_staged_outputs(self):
+        """等待暂存输出全部移动到最终位置，移动失败的任务计为失败"""
+        if self.staging is None:
+            return
+        try:
+            failed_moves = dict(self.staging.flush())
+            for job_id, file_path, output_path in self.staged_outputs:
+                if output_path in failed_moves:
+                    self.set_job_state(job_id, FAILED, failed_moves[output_path])
+                    self.record_result(file_path, False, failed_moves[output_path])
+                else:
+                    self.record_result(file_path, True, None)
+        finally:
+            self.staging.close()
+
+    def _report(self):
+        """结束本批：汇总日志和界面状态，返回 (成功的文件列表, [(失败的文件, 错误信息)])"""
+        processor = self.processor
+        processor.is_processing = False
+
+        cancelled_files = self.cancelled_files
+        if self.result_callback is not None:
+            for file_path in cancelled_files:
+                self.result_callback(file_path, False, "已取消")
+            cancelled_files = []
+
+        if self.successful_files:
+            self.log(f"\n🎉 处理完成! 成功: {len(self.successful_files)} 个文件")
+
+        if self.failed_files:
+            self.log(f"❌ 失败: {len(self.failed_files)} 个文件", level=logging.ERROR)
+            for file_path, error in self.failed_files:
+                self.log(f"  - {os.path.basename(file_path)}: {error}", level=logging.ERROR, file=file_path)
+
+        if cancelled_files:
+            self.log(f"⏹ 已取消: {len(cancelled_files)} 个文件")
+
+        if processor.ui_callback:
+            processor.ui_callback('status', "处理完成")
+            processor.ui_callback('time', "剩余时间: --:--:--")
+            processor.ui_callback('progress', {'overall': 100, 'current': 0})
+
+        return self.successful_files, self.failed_files + [(file_path, "已取消") for file_path in cancelled_files]
+
+    # ---- 任务控制（由 VideoProcessor 在持有 _job_lock 时调用）----
+
+    def job_state(self, job_id):
+        """运行中或排队中的任务返回 running / pending，否则返回None"""
+        if job_id in self.running_jobs:
+            return 'running'
+        if any(item[0] == job_id for item in self.pending):
+            return 'pending'
+        return None
+
+    def unfinished_jobs(self):
+        """编码尚未结束的任务ID；停止处理时只取消这些任务，已结束但还未收集的任务保留其结果"""
+        return [job[0] for future, (_, jobs) in list(self.running.items()) if not future.done() for job in jobs]
+
+    def _remove_pending(self, job_id):
+        """从待处理队列中移除任务并返回该任务，不存在时返回None"""
+        for index, item in enumerate(self.pending):
+            if item[0] == job_id:
+                del self.pending[index]
+                return item
+        return None
+
+    def cancel_pending_job(self, job_id):
+        """取消排队中的任务，任务不在队列中时返回False"""
+        item = self._remove_pending(job_id)
+        if item is None:
+            return False
+        self.cancelled_pending.append(item[1])
+        self.probe_requested.discard(job_id)
+        self.clip_durations.pop(job_id, None)
+        self.processor.completed_files += 1
+        self.set_job_state(job_id, CANCELLED)
+        self.eta.discard_jobs([job_id])
+        if self.controller is not None:
+            self.controller.discard_jobs([job_id])
+        return True
+
+    def cancel_all_pending(self):
+        """取消所有排队中的任务并停止读取后续任务，返回取消的数量"""
+        self.stop_generating = True
+        pending, self.pending = self.pending, deque()
+        self.cancelled_pending.extend(item[1] for item in pending)
+        self.probe_requested.clear()
+        self.clip_durations.clear()
+        self.processor.completed_files += len(pending)
+        for item in pending:
+            self.set_job_state(item[0], CANCELLED)
+        self.eta.discard_jobs([item[0] for item in pending])
+        if self.controller is not None:
+            self.controller.discard_jobs([item[0] for item in pending])
+        return len(pending)
+
+    def prioritize(self, job_id):
+        """把排队中的任务移到队首"""
+        item = self._remove_pending(job_id)
+        if item is None:
+            return False
+        self.pending.appendleft(item)
+        return True
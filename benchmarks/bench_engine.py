@@ -0,0 +1,94 @@
+"""对比FFmpeg子进程与进程内PyAV引擎处理短视频的耗时
+
+用法: python benchmarks/bench_engine.py [--count 50] [--seconds 3 5 10] [--concurrent 4]
+
+用FFmpeg的lavfi测试源生成指定时长的短视频，分别用两种后端以相同并发数批量旋转，
+输出每种时长下的总耗时和单个文件平均耗时，结果同时追加到 benchmarks/results.jsonl。
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import av_engine  # noqa: E402
+from video_processor import VideoProcessor  # noqa: E402
+
+
+def make_clips(ffmpeg_path, directory, count, seconds):
+    """生成count个指定时长的测试视频（720p、30fps、带音频）"""
+    template = os.path.join(directory, f"clip_{seconds}s.mp4")
+    subprocess.run(
+        [ffmpeg_path, "-v", "error", "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=30:duration={seconds}",
+         "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+         "-c:v", "libx264", "-preset", "veryfast", "-c:a", "aac", "-shortest", "-y", template],
+        check=True
+    )
+    clips = []
+    for index in range(count):
+        path = os.path.join(directory, f"clip_{seconds}s_{index:04d}.mp4")
+        shutil.copyfile(template, path)
+        clips.append(path)
+    return clips
+
+
+def run_batch(processor, clips, engine, concurrent):
+    """用指定后端并发处理所有文件，返回(总耗时, 失败数)"""
+    options = {'engine': engine}
+    processor.is_processing = True
+
+    def encode(path):
+        output = path.replace(".mp4", f"_{engine}.mp4")
+        success, _ = processor.reencode_video(path, output, "顺时针90度", "无", encode_options=options)
+        return success
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrent) as executor:
+        results = list(executor.map(encode, clips))
+    return time.perf_counter() - start, results.count(False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比FFmpeg子进程与进程内PyAV引擎")
+    parser.add_argument('--count', type=int, default=50, help='每种时长的文件数')
+    parser.add_argument('--seconds', type=int, nargs='+', default=[3, 5, 10], help='测试视频时长')
+    parser.add_argument('--concurrent', type=int, default=os.cpu_count() or 4, help='并发数')
+    parser.add_argument('--keep', action='store_true', help='保留生成的测试文件')
+    args = parser.parse_args()
+
+    engines = ['ffmpeg'] + (['pyav'] if av_engine.is_available() else [])
+    if len(engines) == 1:
+        print("未安装PyAV，只测试FFmpeg子进程路径", file=sys.stderr)
+
+    processor = VideoProcessor()
+    work_dir = tempfile.mkdtemp(prefix="bench_engine_")
+    results_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.jsonl")
+    try:
+        print(f"{'时长':>6} {'后端':>8} {'总耗时':>10} {'每文件':>10} {'失败':>6}")
+        for seconds in args.seconds:
+            clips = make_clips(processor.ffmpeg_path, work_dir, args.count, seconds)
+            for engine in engines:
+                elapsed, failures = run_batch(processor, clips, engine, args.concurrent)
+                per_file = elapsed / len(clips)
+                print(f"{seconds:>5}s {engine:>8} {elapsed:>9.2f}s {per_file * 1000:>8.0f}ms {failures:>6}")
+                record = {
+                    'benchmark': 'engine', 'host': platform.node(), 'time': time.time(),
+                    'engine': engine, 'clip_seconds': seconds, 'count': len(clips),
+                    'concurrent': args.concurrent, 'elapsed': elapsed, 'failures': failures,
+                }
+                with open(results_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record) + "\n")
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
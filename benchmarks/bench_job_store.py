@@ -0,0 +1,122 @@
+"""测量任务表（JobStore）与路径列表 + 媒体信息字典两种方式的每任务内存和操作耗时
+
+用法: python benchmarks/bench_job_store.py [--jobs 1000000] [--dirs 1000]
+
+生成 jobs 个分布在 dirs 个目录中的合成路径和探测结果（字段与 parse_probe_output 一致），
+分别用原来的方式（video_files 列表 + file_info {路径: 信息字典}）和 JobStore 保存，
+用 tracemalloc 测量每个任务占用的内存，并测量加入、按路径查找和全表遍历的耗时。
+结果同时追加到 benchmarks/results.jsonl。
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_store import JobStore  # noqa: E402
+
+
+def make_paths(jobs, dirs):
+    root = os.path.join(os.sep, "media", "archive")
+    return [os.path.join(root, f"2024-{index % 12 + 1:02d}", f"camera_{index % dirs:04d}", f"VID_{index:08d}.mp4")
+            for index in range(jobs)]
+
+
+def make_info(index):
+    """与 parse_probe_output 结构相同的探测结果"""
+    return {
+        'duration': 5.0 + index % 600, 'size': 10485760.0 + index, 'bit_rate': 8000000.0,
+        'video_bit_rate': 7800000.0, 'audio_bit_rate': 128000.0, 'video_codec': ('h264', 'hevc')[index % 2],
+        'width': 1920, 'height': 1080, 'fps': 30.0, 'nb_frames': 900 + index % 600, 'pix_fmt': 'yuv420p',
+        'color_range': 'tv', 'color_space': 'bt709', 'color_transfer': 'bt709', 'color_primaries': 'bt709',
+        'display_rotation': 0, 'stream_count': 2, 'video_count': 1, 'audio_count': 1,
+    }
+
+
+def build_list(paths):
+    video_files, file_info = [], {}
+    for index, path in enumerate(paths):
+        video_files.append(path)
+        file_info[path] = make_info(index)
+    return video_files, file_info
+
+
+def build_store(paths):
+    store = JobStore()
+    for index, path in enumerate(paths):
+        job_id, _ = store.add(path)
+        store.set_info(job_id, make_info(index))
+    return store
+
+
+def measure(build, jobs, dirs):
+    """返回 (结构, 占用内存字节, 构建耗时)
+
+    路径在测量范围内生成（相当于扫描目录得到的字符串），构建完成后只计入结构仍然引用的部分
+    """
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build(make_paths(jobs, dirs))
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, memory, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量任务表的每任务内存")
+    parser.add_argument('--jobs', type=int, default=1000000, help='任务数')
+    parser.add_argument('--dirs', type=int, default=1000, help='目录数')
+    parser.add_argument('--lookups', type=int, default=100000, help='按路径查找的次数')
+    args = parser.parse_args()
+
+    (video_files, file_info), list_memory, list_elapsed = measure(build_list, args.jobs, args.dirs)
+    sample = random.Random(0).sample(video_files, min(args.lookups, len(video_files)))
+    started = time.perf_counter()
+    for path in sample:
+        file_info.get(path)
+    list_lookup = time.perf_counter() - started
+    del video_files, file_info
+    gc.collect()
+
+    store, store_memory, store_elapsed = measure(build_store, args.jobs, args.dirs)
+    sample = [store.path(job_id) for job_id in random.Random(0).sample(range(len(store)), min(args.lookups, len(store)))]
+    started = time.perf_counter()
+    for path in sample:
+        store.info(store.id_of(path))
+    store_lookup = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in store:
+        pass
+    store_iterate = time.perf_counter() - started
+
+    rows = [
+        ('list+dict', list_memory, list_elapsed, list_lookup),
+        ('JobStore', store_memory, store_elapsed, store_lookup),
+    ]
+    print(f"{'方式':>10} {'每任务内存':>10} {'总内存':>10} {'构建耗时':>9} {'查找(微秒/次)':>14}")
+    for name, memory, elapsed, lookup in rows:
+        print(f"{name:>10} {memory / args.jobs:9.0f}B {memory / 2 ** 20:8.1f}MB {elapsed:8.2f}s "
+              f"{lookup / len(sample) * 1e6:14.2f}")
+    print(f"JobStore 遍历全部路径 {store_iterate:.2f}s，memory_usage() 估算 {store.memory_usage() / args.jobs:.0f}B/任务")
+
+    results_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.jsonl")
+    with open(results_path, 'a', encoding='utf-8') as f:
+        for name, memory, elapsed, lookup in rows:
+            record = {
+                'benchmark': 'job_store', 'host': platform.node(), 'time': time.time(), 'method': name,
+                'jobs': args.jobs, 'dirs': args.dirs, 'bytes_per_job': memory / args.jobs, 'build_elapsed': elapsed,
+                'lookup_us': lookup / len(sample) * 1e6,
+            }
+            f.write(json.dumps(record) + "\n")
+
+if __name__ == "__main__":
+    main()
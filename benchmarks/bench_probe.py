@@ -0,0 +1,100 @@
+"""对比逐个探测与并行批量探测大量文件的耗时
+
+用法: python benchmarks/bench_probe.py [--count 2000] [--workers 4 8 16] [--source 视频文件] [--fake-latency 秒]
+
+把一个源视频（默认用FFmpeg的lavfi测试源生成2秒的小视频）硬链接/复制为count个文件，
+先逐个调用 probe_video，再用不同并行数的 ProbePool 探测，每轮之前清空媒体信息缓存。
+--fake-latency 改用模拟FFprobe（tools/fake_ffmpeg.py），每次探测额外等待指定秒数，
+用于在没有FFmpeg的机器上测量探测延迟较高（网络存储、冷缓存）时的并行效果，例如:
+  python benchmarks/bench_probe.py --fake-latency 0.05 --count 200 --workers 16
+结果同时追加到 benchmarks/results.jsonl。
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+import fake_ffmpeg  # noqa: E402
+from probe_pool import ProbePool, default_workers  # noqa: E402
+from video_processor import VideoProcessor  # noqa: E402
+
+
+def make_files(processor, directory, count, source=None):
+    """生成count个待探测文件，优先使用硬链接避免占用磁盘空间"""
+    if not source:
+        source = os.path.join(directory, "source.mp4")
+        subprocess.run(
+            [processor.ffmpeg_path, "-v", "error", "-f", "lavfi", "-i", "testsrc2=size=640x360:rate=30:duration=2",
+             "-c:v", "libx264", "-preset", "ultrafast", "-y", source],
+            check=True
+        )
+    files = []
+    for index in range(count):
+        path = os.path.join(directory, f"file_{index:05d}{os.path.splitext(source)[1]}")
+        try:
+            os.link(source, path)
+        except OSError:
+            shutil.copyfile(source, path)
+        files.append(path)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比逐个探测与并行批量探测")
+    parser.add_argument('--count', type=int, default=2000, help='文件数')
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({4, 8, default_workers()}), help='并行探测数')
+    parser.add_argument('--source', help='用作样本的视频文件，默认自动生成')
+    parser.add_argument('--skip-sequential', action='store_true', help='跳过逐个探测（文件很多时较慢）')
+    parser.add_argument('--fake-latency', type=float, help='使用模拟FFprobe，每次探测额外等待的秒数')
+    args = parser.parse_args()
+
+    processor = VideoProcessor()
+    work_dir = tempfile.mkdtemp(prefix="bench_probe_")
+    results_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.jsonl")
+    try:
+        if args.fake_latency is not None:
+            os.environ['FAKE_FFPROBE_LATENCY'] = str(args.fake_latency)
+            processor.ffmpeg_path, processor.ffprobe_path = fake_ffmpeg.install(os.path.join(work_dir, "bin"))
+            source = args.source or os.path.join(work_dir, "source.mp4")
+            if not args.source:
+                open(source, 'wb').close()
+            files = make_files(processor, work_dir, args.count, source)
+        else:
+            files = make_files(processor, work_dir, args.count, args.source)
+        runs = ([('sequential', 1)] if not args.skip_sequential else []) + [('pool', n) for n in args.workers]
+        baseline = None
+        print(f"{'方式':>10} {'并行数':>6} {'耗时':>9} {'文件/秒':>9} {'加速比':>7}")
+        for mode, workers in runs:
+            processor.media_info_cache.clear()
+            start = time.perf_counter()
+            if mode == 'sequential':
+                infos = [processor.probe_video(path) for path in files]
+            else:
+                infos = ProbePool(processor, max_workers=workers).run(files)
+            elapsed = time.perf_counter() - start
+            failures = infos.count(None)
+            baseline = baseline or elapsed
+            print(f"{mode:>10} {workers:>6} {elapsed:>8.2f}s {len(files) / elapsed:>9.0f} {baseline / elapsed:>6.1f}x"
+                  + (f"  失败 {failures}" if failures else ""))
+            record = {
+                'benchmark': 'probe', 'host': platform.node(), 'time': time.time(), 'mode': mode,
+                'workers': workers, 'count': len(files), 'elapsed': elapsed, 'failures': failures,
+                'fake_latency': args.fake_latency,
+            }
+            with open(results_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""用模拟FFmpeg（tools/fake_ffmpeg.py）测试 process_files 在上万任务下的表现
+
+用法: python benchmarks/bench_scale.py [--jobs 10000] [--concurrent 8] [--speed 0] [--fail-rate 0.01]
+                                      [--hang-rate 0] [--stop-after 秒] [--manifest] [--verify]
+                                      [--batch-clip-seconds 10]
+
+测量并输出：
+  - 每个任务的调度开销：总耗时×并发数减去模拟编码时间后，平均到每个任务（含进程启动、探测和调度）
+  - 内存增长：开始、峰值和结束时的常驻内存（RSS）
+  - 界面事件频率：各类 ui_callback 的总次数、平均和最高每秒次数
+  - 剩余时间估算误差：完成10%/25%/50%/75%时的预测剩余时间与实际剩余时间之差
+  - 停止延迟：--stop-after 指定秒数后调用 stop_processing()，到 process_files 返回的时间
+结果同时追加到 benchmarks/results.jsonl，便于对比不同版本。
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+import fake_ffmpeg  # noqa: E402
+from eta_model import EncodeHistory  # noqa: E402
+from video_processor import VideoProcessor  # noqa: E402
+
+
+def current_rss():
+    """当前进程的常驻内存（字节），无法获取时返回None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+
+def make_inputs(directory, count):
+    """生成count个空输入文件（每1000个一个子目录），返回路径列表"""
+    files = []
+    for index in range(count):
+        subdir = os.path.join(directory, f"batch_{index // 1000:03d}")
+        if index % 1000 == 0:
+            os.makedirs(subdir, exist_ok=True)
+        path = os.path.join(subdir, f"clip_{index:06d}.mp4")
+        open(path, 'wb').close()
+        files.append(path)
+    return files
+
+
+def eta_errors(samples, end_time, total):
+    """完成比例达到各检查点时，预测剩余时间与实际剩余时间之差（秒）"""
+    errors = {}
+    for checkpoint in (0.1, 0.25, 0.5, 0.75):
+        for timestamp, completed, remaining in samples:
+            if total and completed >= total * checkpoint and remaining is not None:
+                actual = end_time - timestamp
+                errors[f"{int(checkpoint * 100)}%"] = {
+                    'predicted': round(remaining, 2), 'actual': round(actual, 2),
+                    'error_percent': round((remaining - actual) / actual * 100, 1) if actual > 0 else None,
+                }
+                break
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟FFmpeg下的大批量调度测试")
+    parser.add_argument('--jobs', type=int, default=10000, help='任务数')
+    parser.add_argument('--concurrent', type=int, default=8, help='并发任务数')
+    parser.add_argument('--duration', default='2-20', help='模拟媒体时长（秒），可写范围')
+    parser.add_argument('--speed', type=float, default=0, help='模拟编码速度（相对实时的倍数），0为立即完成')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='随机编码失败的概率')
+    parser.add_argument('--hw-crash-rate', type=float, default=0.0, help='硬件编码器崩溃的概率（配合 --hw-accel）')
+    parser.add_argument('--hang-rate', type=float, default=0.0, help='编码卡住的概率（需配合 --stop-after）')
+    parser.add_argument('--corrupt-rate', type=float, default=0.0, help='输出损坏的概率（配合 --verify）')
+    parser.add_argument('--hw-accel', default='software', choices=['software', 'nvenc', 'qsv', 'amf'])
+    parser.add_argument('--stop-after', type=float, help='运行指定秒数后停止，测量停止延迟')
+    parser.add_argument('--manifest', action='store_true', help='以生成器（流式清单）而不是列表提交任务')
+    parser.add_argument('--verify', action='store_true', help='启用输出校验')
+    parser.add_argument('--batch-clip-seconds', type=float, default=0,
+                        help='不超过该时长的模拟视频合并批量编码，0表示逐个编码')
+    parser.add_argument('--batch-max-seconds', type=float, default=120, help='每组合并编码的总时长上限')
+    parser.add_argument('--seed', default='0', help='模拟结果的随机种子')
+    parser.add_argument('--keep', action='store_true', help='保留临时目录')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_scale_")
+    results_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.jsonl")
+    os.environ.update({
+        'FAKE_FFMPEG_DURATION': args.duration,
+        'FAKE_FFMPEG_SPEED': str(args.speed),
+        'FAKE_FFMPEG_FAIL_RATE': str(args.fail_rate),
+        'FAKE_FFMPEG_HW_CRASH_RATE': str(args.hw_crash_rate),
+        'FAKE_FFMPEG_HANG_RATE': str(args.hang_rate),
+        'FAKE_FFMPEG_CORRUPT_RATE': str(args.corrupt_rate),
+        'FAKE_FFMPEG_SEED': args.seed,
+        'FAKE_FFMPEG_OUTPUT_BYTES': '512',
+    })
+    try:
+        ffmpeg_path, ffprobe_path = fake_ffmpeg.install(os.path.join(work_dir, "bin"))
+        print(f"生成 {args.jobs} 个输入文件...", flush=True)
+        files = make_inputs(os.path.join(work_dir, "in"), args.jobs)
+        simulated = 0.0 if not args.speed else sum(fake_ffmpeg.describe(path)['duration'] for path in files) / args.speed
+
+        events = Counter()
+        event_seconds = Counter()
+        start = None
+
+        def ui_callback(callback_type, data):
+            events[callback_type] += 1
+            if start is not None:
+                event_seconds[int(time.time() - start)] += 1
+
+        processor = VideoProcessor(ui_callback=ui_callback)
+        processor.ffmpeg_path, processor.ffprobe_path = ffmpeg_path, ffprobe_path
+        processor.encode_history = EncodeHistory(path=os.path.join(work_dir, "history.jsonl"))
+
+        samples = []  # (时间, 已完成数, 预测剩余秒数)
+        rss = {'start': current_rss(), 'peak': current_rss()}
+        finished = threading.Event()
+        stop_state = {}
+
+        def sample():
+            while not finished.wait(0.5):
+                value = current_rss()
+                if value:
+                    rss['peak'] = max(rss['peak'] or 0, value)
+                samples.append((time.time(), processor.completed_files, processor.get_metrics().get('remaining')))
+                if args.stop_after and 'requested' not in stop_state and time.time() - start >= args.stop_after:
+                    stop_state['requested'] = time.time()
+                    processor.stop_processing()
+
+        jobs = files if not args.manifest else ({'input': path} for path in files)
+        start = time.time()
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        successful, failed = processor.process_files(
+            jobs, "顺时针90度", "_rotated", "指定目录", os.path.join(work_dir, "out"), False,
+            args.hw_accel, max_concurrent=args.concurrent, max_io_per_device=0,
+            # 模拟输入无法被PyAV解码，固定使用FFmpeg后端
+            encode_options={'verify_output': args.verify, 'engine': 'ffmpeg',
+                            'batch_clip_seconds': args.batch_clip_seconds, 'batch_max_seconds': args.batch_max_seconds}
+        )
+        end = time.time()
+        finished.set()
+        sampler.join()
+        rss['end'] = current_rss()
+
+        elapsed = end - start
+        cancelled = sum(1 for _, error in failed if error == "已取消")
+        per_second = list(event_seconds.values())
+        record = {
+            'benchmark': 'scale', 'host': platform.node(), 'time': time.time(),
+            'jobs': args.jobs, 'concurrent': args.concurrent, 'speed': args.speed, 'manifest': args.manifest,
+            'verify': args.verify, 'fail_rate': args.fail_rate, 'hang_rate': args.hang_rate,
+            'batch_clip_seconds': args.batch_clip_seconds,
+            'elapsed': round(elapsed, 3),
+            'successful': len(successful), 'failed': len(failed) - cancelled, 'cancelled': cancelled,
+            # 提前停止时任务没有全部完成，无法按模拟编码时间计算开销
+            'overhead_per_job_ms': None if stop_state else round(
+                (elapsed * args.concurrent - simulated) / max(args.jobs, 1) * 1000, 2
+            ),
+            'rss_start_mb': round(rss['start'] / 2 ** 20, 1) if rss['start'] else None,
+            'rss_peak_mb': round(rss['peak'] / 2 ** 20, 1) if rss['peak'] else None,
+            'rss_end_mb': round(rss['end'] / 2 ** 20, 1) if rss['end'] else None,
+            'ui_events': dict(events),
+            'ui_events_per_second': round(sum(per_second) / max(elapsed, 1e-6), 1),
+            'ui_events_peak_per_second': max(per_second) if per_second else 0,
+            'eta_error': eta_errors(samples, end, args.jobs) if not args.stop_after else None,
+            'stop_latency': round(end - stop_state['requested'], 3) if 'requested' in stop_state else None,
+        }
+        print(json.dumps(record, ensure_ascii=False, indent=2))
+        with open(results_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if args.keep:
+            print(f"临时目录: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -131,11 +131,61 @@ def test_executable():
         print(f"❌ 可执行文件测试失败：{e}")
         return False
 
+def measure_startup(command, runs=5, label="exe"):
+    """测量启动耗时：第一次为冷启动，其余为热启动；结果追加到 startup_times.jsonl"""
+    import json
+    import tempfile
+    import time
+    from datetime import datetime
+    
+    print(f"⏱ 测量启动耗时 ({label}, {runs} 次)...")
+    timings = []
+    for run in range(runs):
+        fd, timing_file = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        started = time.perf_counter()
+        try:
+            subprocess.run(command + [f'--startup-timing={timing_file}'], timeout=60,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            wall_ms = round((time.perf_counter() - started) * 1000, 1)
+            with open(timing_file, 'r', encoding='utf-8') as f:
+                lines = f.read().strip().splitlines()
+            record = json.loads(lines[-1]) if lines else {}
+        except (subprocess.TimeoutExpired, OSError, ValueError) as e:
+            print(f"  ❌ 第 {run + 1} 次测量失败: {e}")
+            continue
+        finally:
+            os.remove(timing_file)
+        
+        record.update({'label': label, 'run': run + 1, 'cold': run == 0, 'wall_ms': wall_ms})
+        timings.append(record)
+        print(f"  {'冷启动' if run == 0 else '热启动'}: 总耗时 {wall_ms} ms，"
+              f"窗口显示 {record.get('window_shown_ms')} ms (进程内)")
+    
+    if timings:
+        with open('startup_times.jsonl', 'a', encoding='utf-8') as f:
+            for record in timings:
+                record['measured_at'] = datetime.now().isoformat(timespec='seconds')
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        warm = [t['wall_ms'] for t in timings if not t['cold']]
+        if warm:
+            print(f"📊 热启动平均: {sum(warm) / len(warm):.1f} ms")
+    return timings
+
 def main():
     """主函数"""
     print("🎯 视频旋转工具 - 构建脚本")
     print("=" * 40)
     
+    # 仅测量启动耗时：python build.py --measure-startup [exe|script]
+    if '--measure-startup' in sys.argv:
+        target = sys.argv[-1] if sys.argv[-1] in ('exe', 'script') else 'exe'
+        if target == 'script':
+            measure_startup([sys.executable, 'rotate_video.py'], label='script')
+        else:
+            measure_startup([os.path.join('dist', '视频旋转工具.exe')], label='exe')
+        return
+    
     try:
         # 1. 检查依赖
         check_dependencies()
@@ -151,6 +201,8 @@ def main():
             
             # 4. 测试可执行文件
             if test_executable():
+                print()
+                measure_startup([os.path.join('dist', '视频旋转工具.exe')], label='exe')
                 print()
                 print("🎉 构建完成！")
                 print(f"📁 可执行文件路径: {os.path.abspath(os.path.join('dist', '视频旋转工具.exe'))}")
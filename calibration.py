@@ -0,0 +1,212 @@
+import os
+import platform
+import subprocess
+import time
+
+# 校准使用的代表性分辨率
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080), "2160p": (3840, 2160)}
+DEFAULT_RESOLUTIONS = ("720p", "1080p")
+# 每次试编码的合成视频时长（秒）
+SAMPLE_SECONDS = 3
+# 默认内存上限：物理内存的一半
+MEMORY_FRACTION = 0.5
+# 增加并发后总速度提升不足该比例时，不再继续增加并发
+MIN_GAIN = 1.03
+MAX_CONCURRENCY = 16
+
+
+def host_key():
+    """校准结果按主机名保存"""
+    return platform.node() or "default"
+
+
+def normalize_accel(hw_accel):
+    return "software" if hw_accel in (None, "无", "software") else hw_accel
+
+
+def total_memory():
+    """物理内存总量（字节），无法获取时返回None"""
+    try:
+        import psutil
+        return psutil.virtual_memory().total
+    except ImportError:
+        pass
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def process_rss(pid):
+    """进程的常驻内存（字节），无法获取时返回None"""
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def concurrency_grid(cpu_count, hw_accel):
+    """候选并发数：硬件编码器受编码会话数限制，最多试到8"""
+    limit = min(MAX_CONCURRENCY, cpu_count * 2) if normalize_accel(hw_accel) == "software" else 8
+    return [value for value in (1, 2, 3, 4, 6, 8, 12, 16) if value <= max(limit, 1)]
+
+
+def thread_grid(cpu_count, hw_accel):
+    """候选的每任务线程数，0表示由编码器自动决定；硬件编码只试自动"""
+    if normalize_accel(hw_accel) != "software":
+        return [0]
+    return [0] + [value for value in (1, 2, 4, 8, 16) if value < cpu_count]
+
+
+def default_settings(hw_accel, cpu_count=None):
+    """未校准时的 (并发数, 每任务线程数)：libx264自身多线程，少量并发即可用满CPU"""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    if normalize_accel(hw_accel) == "software":
+        return max(1, min(4, cpu_count // 4)), 0
+    return 2, 0
+
+
+class Calibrator:
+    """在并发数 × 每任务线程数的网格上运行合成视频的短时编码，找出总速度（×实时）最高且不超过内存上限的组合
+
+    每个分辨率、每个线程数从低到高增加并发，总速度不再明显提升、出错或超过内存上限时停止该线程数的搜索。
+    """
+
+    def __init__(self, processor, hw_accel="software", seconds=SAMPLE_SECONDS, memory_limit=None,
+                 max_concurrency=None, log=print):
+        self.processor = processor
+        self.hw_accel = normalize_accel(hw_accel)
+        self.seconds = seconds
+        memory = total_memory()
+        self.memory_limit = memory_limit if memory_limit is not None else (memory * MEMORY_FRACTION if memory else None)
+        self.cpu_count = os.cpu_count() or 1
+        self.max_concurrency = max_concurrency
+        self.log = log
+
+    def build_args(self, width, height, threads):
+        """合成测试图像 → 旋转 → 编码 → 丢弃输出，只测编码吞吐，不涉及磁盘I/O"""
+        args = [self.processor.ffmpeg_path, "-v", "error", "-nostdin",
+                "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate=30:duration={self.seconds}"]
+        args += self.processor.get_video_codec_params(self.hw_accel)
+        if threads:
+            args += ["-threads", str(threads)]
+        args += ["-vf", self.processor.get_rotation_filter("顺时针90度"), "-f", "null", "-"]
+        return args
+
+    def run_trial(self, resolution, concurrency, threads):
+        """同时运行concurrency个编码，返回速度（×实时的总和）、峰值内存和是否成功"""
+        width, height = RESOLUTIONS[resolution]
+        args = self.build_args(width, height, threads)
+        started = time.time()
+        processes = [
+            subprocess.Popen(
+                args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+            )
+            for _ in range(concurrency)
+        ]
+        peak_memory = None
+        try:
+            while any(process.poll() is None for process in processes):
+                sizes = [process_rss(process.pid) for process in processes if process.poll() is None]
+                if sizes and None not in sizes:
+                    peak_memory = max(peak_memory or 0, sum(sizes))
+                time.sleep(0.1)
+            wall = time.time() - started
+            errors = [process.stderr.read().decode('utf-8', errors='replace').strip()
+                      for process in processes if process.returncode != 0]
+        finally:
+            for process in processes:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                process.stderr.close()
+        ok = not errors
+        return {
+            'resolution': resolution, 'concurrency': concurrency, 'threads': threads,
+            'speed': round(concurrency * self.seconds / wall, 3) if ok and wall > 0 else 0.0,
+            'peak_memory_mb': round(peak_memory / 2 ** 20, 1) if peak_memory else None,
+            'within_memory': not (self.memory_limit and peak_memory and peak_memory > self.memory_limit),
+            'ok': ok, 'error': errors[0].splitlines()[-1] if errors and errors[0] else None,
+        }
+
+    def calibrate(self, resolutions=DEFAULT_RESOLUTIONS):
+        """运行网格搜索，返回该编码器的校准结果"""
+        trials = []
+        concurrencies = concurrency_grid(self.cpu_count, self.hw_accel)
+        if self.max_concurrency:
+            concurrencies = [value for value in concurrencies if value <= self.max_concurrency]
+        for resolution in resolutions:
+            for threads in thread_grid(self.cpu_count, self.hw_accel):
+                best_speed = 0.0
+                for concurrency in concurrencies:
+                    # 线程总数远超核数时只会互相争抢
+                    if threads and threads * concurrency > self.cpu_count * 2:
+                        break
+                    trial = self.run_trial(resolution, concurrency, threads)
+                    trials.append(trial)
+                    threads_text = threads or "自动"
+                    if not trial['ok']:
+                        self.log(f"  {resolution} 并发 {concurrency} 线程 {threads_text}: 失败 - {trial['error']}")
+                        break
+                    memory_text = f"，内存 {trial['peak_memory_mb']}MB" if trial['peak_memory_mb'] else ""
+                    self.log(f"  {resolution} 并发 {concurrency} 线程 {threads_text}: {trial['speed']:.2f}x{memory_text}")
+                    if not trial['within_memory'] or trial['speed'] < best_speed * MIN_GAIN:
+                        break
+                    best_speed = trial['speed']
+        return summarize(trials, resolutions, self.seconds, self.memory_limit)
+
+
+def summarize(trials, resolutions, seconds=SAMPLE_SECONDS, memory_limit=None):
+    """从试编码结果中选出每个分辨率的最佳组合，以及兼顾所有分辨率的总体推荐"""
+    usable = [trial for trial in trials if trial['ok'] and trial['within_memory']]
+    best = {}
+    for resolution in resolutions:
+        candidates = [trial for trial in usable if trial['resolution'] == resolution]
+        if candidates:
+            # 速度相同时取并发较少的组合
+            winner = max(candidates, key=lambda trial: (trial['speed'], -trial['concurrency']))
+            best[resolution] = {key: winner[key] for key in ('concurrency', 'threads', 'speed')}
+
+    # 总体推荐：在每个分辨率上都试过的组合中，按相对各分辨率最佳速度的比例之和排序
+    scores = {}
+    for trial in usable:
+        if trial['resolution'] in best and best[trial['resolution']]['speed']:
+            key = (trial['concurrency'], trial['threads'])
+            scores.setdefault(key, {})[trial['resolution']] = trial['speed'] / best[trial['resolution']]['speed']
+    complete = {key: sum(ratios.values()) for key, ratios in scores.items() if len(ratios) == len(best)}
+    overall = None
+    if complete:
+        concurrency, threads = max(complete, key=lambda key: (complete[key], -key[0]))
+        overall = {'concurrency': concurrency, 'threads': threads}
+    return {
+        'time': time.time(), 'cpu_count': os.cpu_count(), 'seconds': seconds,
+        'memory_limit_mb': round(memory_limit / 2 ** 20) if memory_limit else None,
+        'best': best, 'overall': overall, 'trials': trials,
+    }
+
+
+def resolve_auto(config_manager, hw_accel, pixels=None):
+    """"自动"并发时使用的 (并发数, 每任务线程数, 是否来自校准)
+
+    指定 pixels（待处理文件的典型分辨率，宽×高）时使用像素数最接近的已校准分辨率的最佳组合，
+    否则使用总体推荐；本机未校准该编码器时返回默认值。
+    """
+    entry = config_manager.get_calibration(host_key()).get(normalize_accel(hw_accel))
+    if entry:
+        best = entry.get('best') or {}
+        if pixels and best:
+            resolution = min(best, key=lambda name: abs(RESOLUTIONS[name][0] * RESOLUTIONS[name][1] - pixels))
+            return best[resolution]['concurrency'], best[resolution]['threads'], True
+        if entry.get('overall'):
+            return entry['overall']['concurrency'], entry['overall']['threads'], True
+    concurrency, threads = default_settings(hw_accel)
+    return concurrency, threads, False
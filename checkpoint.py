@@ -0,0 +1,103 @@
+import csv
+import json
+import os
+import shutil
+
+# 每次运行的分段文件名和分段列表（FFmpeg segment muxer 在每个分段写完后追加一行）
+SEGMENT_PATTERN = "seg_r{run:03d}_%05d.mkv"
+SEGMENT_LIST = "list_r{run:03d}.csv"
+
+
+class CheckpointState:
+    """分段编码的断点状态
+
+    输出 out.mp4 的分段写在 out.mp4.parts/ 目录，旁边的 out.mp4.checkpoint.json 记录编码参数签名和
+    每次运行的起始时间。已完成的分段以FFmpeg写出的分段列表为准（分段关闭后才会列出），
+    因此即使进程被强制终止或系统重启，最多只丢失正在编码的那一个分段。
+    """
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.state_path = output_file + ".checkpoint.json"
+        self.parts_dir = output_file + ".parts"
+        self.signature = None
+        self.runs = []  # [{'run': 序号, 'offset': 本次运行在源视频中的起始秒数}]
+
+    def load(self, signature):
+        """读取断点；签名不一致（源文件或编码参数已变化）时清除旧分段重新开始，返回是否可以续编"""
+        self.signature = signature
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = None
+        if state and state.get('signature') == signature and os.path.isdir(self.parts_dir):
+            self.runs = state.get('runs', [])
+            return bool(self.segments())
+        self.clear()
+        self.runs = []
+        return False
+
+    def _save(self):
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'signature': self.signature, 'runs': self.runs}, f, ensure_ascii=False)
+        os.replace(temp_path, self.state_path)
+
+    def segments(self):
+        """按顺序返回已完成的分段 [(文件路径, 起始秒, 结束秒)]，时间为源视频中的绝对时间"""
+        segments = []
+        for run in self.runs:
+            list_path = os.path.join(self.parts_dir, SEGMENT_LIST.format(run=run['run']))
+            try:
+                with open(list_path, 'r', encoding='utf-8', newline='') as f:
+                    rows = list(csv.reader(f))
+            except OSError:
+                continue
+            for row in rows:
+                if len(row) < 3:
+                    continue  # 正在写入的行
+                try:
+                    start, end = float(row[1]), float(row[2])
+                except ValueError:
+                    continue
+                path = os.path.join(self.parts_dir, row[0])
+                if os.path.exists(path):
+                    segments.append((path, run['offset'] + start, run['offset'] + end))
+        return segments
+
+    def resume_time(self):
+        """下一次运行应从源视频的哪一秒开始"""
+        segments = self.segments()
+        return segments[-1][2] if segments else 0.0
+
+    def begin_run(self):
+        """开始新的一次运行：删除未完成的分段，登记本次运行，返回 (分段文件模板, 分段列表路径, 起始秒数)"""
+        os.makedirs(self.parts_dir, exist_ok=True)
+        completed = {os.path.basename(path) for path, _, _ in self.segments()}
+        for name in os.listdir(self.parts_dir):
+            if name.endswith(".mkv") and name not in completed:
+                os.remove(os.path.join(self.parts_dir, name))
+        offset = self.resume_time()
+        run = max((item['run'] for item in self.runs), default=0) + 1
+        self.runs.append({'run': run, 'offset': offset})
+        self._save()
+        return (os.path.join(self.parts_dir, SEGMENT_PATTERN.format(run=run)),
+                os.path.join(self.parts_dir, SEGMENT_LIST.format(run=run)), offset)
+
+    def write_concat_list(self):
+        """写出concat分离器使用的分段列表，返回其路径"""
+        list_path = os.path.join(self.parts_dir, "concat.txt")
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for path, _, _ in self.segments():
+                escaped = os.path.abspath(path).replace("\\", "/").replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        return list_path
+
+    def clear(self):
+        """删除分段目录和状态文件"""
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+        try:
+            os.remove(self.state_path)
+        except OSError:
+            pass
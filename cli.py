@@ -0,0 +1,373 @@
+import argparse
+import json
+import os
+import sys
+
+from config_manager import ConfigManager
+from log_sink import setup_logging_from_config
+from video_processor import VideoProcessor, is_video_file, iter_video_files
+
+
+def collect_files(paths):
+    """展开命令行传入的文件和目录为视频文件列表"""
+    files = []
+    seen = set()
+    for arg in paths:
+        path = os.path.normpath(os.path.abspath(arg))
+        if os.path.isdir(path):
+            candidates = iter_video_files(path)
+        elif os.path.isfile(path) and is_video_file(path):
+            candidates = [path]
+        else:
+            candidates = []
+        for candidate in candidates:
+            if candidate not in seen:
+                seen.add(candidate)
+                files.append(candidate)
+    return files
+
+
+def concurrency_value(value):
+    """并发任务数参数：正整数或 auto"""
+    if value == 'auto':
+        return value
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("应为正整数或 auto")
+    if number < 1:
+        raise argparse.ArgumentTypeError("应为正整数或 auto")
+    return number
+
+
+def deadline_value(value):
+    """截止时间参数：+90m、+2h、HH:MM 或 ISO 日期时间，转换为时间戳"""
+    from preset_controller import parse_deadline
+    try:
+        return parse_deadline(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def add_processing_arguments(parser, config, with_paths=True):
+    """添加处理参数，默认值取自配置文件"""
+    processing = config.get_processing_config()
+    if with_paths:
+        parser.add_argument('paths', nargs='*', help='视频文件或目录')
+    parser.add_argument('--rotation', default=processing.get('default_rotation', '顺时针90度'),
+                        choices=['顺时针90度', '逆时针90度', '180度'], help='旋转方向')
+    parser.add_argument('--suffix', default=processing.get('default_suffix', '_rotated'), help='输出文件后缀')
+    parser.add_argument('--output-option', default=processing.get('default_output_option', '源文件目录'),
+                        choices=['源文件目录', '桌面', '指定目录'], help='输出位置')
+    parser.add_argument('--output-dir', default=os.path.expanduser(processing.get('default_output_dir', '~/Desktop')),
+                        help='指定目录模式下的输出目录')
+    parser.add_argument('--create-subdir', action='store_true', default=processing.get('create_subdir', False),
+                        help='按日期创建子目录')
+    parser.add_argument('--hw-accel', default=processing.get('hardware_acceleration', '无'),
+                        choices=['无', 'nvenc', 'qsv', 'amf'], help='硬件加速')
+    parser.add_argument('--concurrent', type=concurrency_value, default=processing.get('max_concurrent_tasks', 1),
+                        help='并发任务数，auto 表示按本机校准结果（cli.py calibrate）自动选择')
+    parser.add_argument('--container-mode', default=processing.get('container_mode', 'default'),
+                        choices=['default', 'faststart', 'fragmented'], help='MP4输出封装模式')
+    parser.add_argument('--codec-policy', default=processing.get('codec_policy', 'h264'), choices=['h264', 'match_source'],
+                        help='编码策略：固定H.264，或匹配源视频的编码格式、码率、像素格式和色彩信息')
+    parser.add_argument('--max-growth', type=float, default=processing.get('max_size_growth_percent'),
+                        help='输出最多比输入大多少百分比，超出时降低码率重新编码')
+    parser.add_argument('--engine', default=processing.get('engine', 'auto'), choices=['auto', 'ffmpeg', 'pyav'],
+                        help='编码后端：auto按时长自动选择，短视频在进程内编码（需要PyAV）')
+    parser.add_argument('--no-verify', dest='verify_output', action='store_false',
+                        default=processing.get('verify_output', True),
+                        help='不校验输出（默认比较时长、流、帧数和分辨率并抽样解码，失败时重新编码）')
+    parser.add_argument('--checkpoint-min-seconds', type=float,
+                        default=processing.get('checkpoint_min_seconds', 1800),
+                        help='不短于该时长（秒）的视频分段编码，中断后再次运行从最后完成的分段继续；0表示关闭')
+    parser.add_argument('--batch-clip-seconds', type=float, default=processing.get('batch_clip_seconds', 10),
+                        help='不超过该时长（秒）的短视频按总时长分组，每组只启动一个FFmpeg进程；0表示关闭')
+    parser.add_argument('--deadline', type=deadline_value,
+                        help='截止时间（+90m、+2h、HH:MM 或 ISO 日期时间），按实测速度为未开始的任务调整编码预设以按时完成')
+    parser.add_argument('--target-speed', type=float, default=processing.get('target_speed'),
+                        help='目标总编码速度（所有并发任务合计的×实时倍数），按实测速度调整编码预设')
+
+
+def build_processing_params(args, config):
+    """把命令行参数转换为VideoProcessor.start_processing使用的参数"""
+    concurrent, threads = args.concurrent, None
+    if concurrent == 'auto':
+        from calibration import resolve_auto
+        concurrent, threads, calibrated = resolve_auto(config, args.hw_accel)
+        if not calibrated:
+            print(f"本机尚未校准，使用默认并发数 {concurrent}（运行 cli.py calibrate 进行校准）", file=sys.stderr)
+    return {
+        'rotation': args.rotation,
+        'suffix': args.suffix,
+        'output_option': args.output_option,
+        'output_dir': args.output_dir,
+        'create_subdir': args.create_subdir,
+        'hw_accel': args.hw_accel,
+        'concurrent_tasks': concurrent,
+        'io_per_device': config.get('processing.max_io_per_device', 2),
+        'encode_options': {
+            'container_mode': args.container_mode,
+            'codec_policy': args.codec_policy,
+            'max_size_growth_percent': args.max_growth,
+            'engine': args.engine,
+            'verify_output': args.verify_output,
+            'checkpoint_min_seconds': args.checkpoint_min_seconds,
+            'checkpoint_segment_seconds': config.get('processing.checkpoint_segment_seconds', 60),
+            'batch_clip_seconds': args.batch_clip_seconds,
+            'batch_max_seconds': config.get('processing.batch_max_seconds', 120),
+            'batch_max_files': config.get('processing.batch_max_files', 16),
+            'inprocess_max_seconds': config.get('processing.inprocess_max_seconds', 15),
+            'encoder_threads': threads,
+            'deadline': args.deadline,
+            'target_speed': args.target_speed if not args.deadline else None,
+        },
+    }
+
+
+def console_callback(callback_type, data):
+    """命令行模式下的回调：只输出日志和状态"""
+    if callback_type in ('log', 'status'):
+        print(data, flush=True)
+
+
+def cmd_plan(args, config):
+    """预演处理计划，不进行编码"""
+    from planner import BatchPlanner, format_plan
+
+    files = collect_files(args.paths)
+    if not files:
+        print("未找到视频文件", file=sys.stderr)
+        return 1
+    processor = VideoProcessor()
+    plan = BatchPlanner(processor).plan(files, build_processing_params(args, config))
+    if args.json:
+        print(json.dumps(plan, ensure_ascii=False, indent=2))
+    else:
+        print("\n".join(format_plan(plan, max_jobs=args.max_jobs)))
+    return 0 if plan['ok'] else 2
+
+
+def cmd_run(args, config):
+    """批量处理文件，按秒输出进度和预计剩余时间，按Ctrl+C停止"""
+    import threading
+
+    files = collect_files(args.paths)
+    if not files:
+        print("未找到视频文件", file=sys.stderr)
+        return 1
+
+    state = {}
+
+    def callback(callback_type, data):
+        if callback_type == 'log':
+            print(data, flush=True)
+        elif callback_type == 'status':
+            state['status'] = data
+        elif callback_type == 'time':
+            print(f"{state.get('status', '')} | {data}", flush=True)
+            if args.metrics_file:
+                # 先写临时文件再替换，外部读取方不会读到写了一半的内容
+                temp_path = args.metrics_file + '.tmp'
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(processor.get_metrics(), f, ensure_ascii=False)
+                os.replace(temp_path, args.metrics_file)
+
+    processor = VideoProcessor(ui_callback=callback)
+    result = {}
+    worker = threading.Thread(
+        target=lambda: result.update(outcome=processor.start_processing(files, build_processing_params(args, config))),
+        daemon=True
+    )
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(0.5)
+    except KeyboardInterrupt:
+        processor.stop_processing()
+        worker.join()
+        return 130
+    _, failed = result.get('outcome', ([], files))
+    return 0 if not failed else 1
+
+
+def cmd_manifest(args, config):
+    """按任务清单（CSV或JSON Lines，文件或标准输入）流式处理，每个任务可单独指定旋转方向、输出路径和配置"""
+    import threading
+    from manifest import iter_manifest
+
+    counts = {'success': 0, 'failed': 0}
+    results = open(args.results, 'a', encoding='utf-8') if args.results else None
+
+    def on_result(file_path, success, error):
+        counts['success' if success else 'failed'] += 1
+        if not success:
+            print(f"❌ {file_path}: {error}", file=sys.stderr, flush=True)
+        if results:
+            results.write(json.dumps({'input': file_path, 'success': success, 'error': error}, ensure_ascii=False) + "\n")
+            results.flush()
+
+    def callback(callback_type, data):
+        if callback_type == 'status' and not args.quiet:
+            print(data, file=sys.stderr, flush=True)
+
+    processor = VideoProcessor(ui_callback=callback)
+    params = build_processing_params(args, config)
+    jobs = iter_manifest(args.manifest, profiles=config.get('profiles', {}), manifest_format=args.format)
+    worker = threading.Thread(target=processor.process_files, kwargs=dict(
+        files=jobs, rotation=params['rotation'], suffix=params['suffix'], output_option=params['output_option'],
+        output_dir=params['output_dir'], create_subdir=params['create_subdir'], hw_accel=params['hw_accel'],
+        max_concurrent=params['concurrent_tasks'], max_io_per_device=params['io_per_device'],
+        encode_options=params['encode_options'], result_callback=on_result
+    ), daemon=True)
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(0.5)
+    except KeyboardInterrupt:
+        processor.stop_processing()
+        worker.join(10)
+        return 130
+    finally:
+        if results:
+            results.close()
+    print(f"成功 {counts['success']} 个，失败 {counts['failed']} 个", file=sys.stderr)
+    return 0 if not counts['failed'] else 1
+
+
+def cmd_watch(args, config):
+    """监视文件夹并持续处理新文件，按Ctrl+C停止"""
+    import time
+    from watcher import WatchService
+
+    if not os.path.isdir(args.folder):
+        print(f"目录不存在: {args.folder}", file=sys.stderr)
+        return 1
+    processor = VideoProcessor(ui_callback=console_callback)
+    try:
+        service = WatchService(
+            processor, args.folder, build_processing_params(args, config),
+            stable_seconds=args.stable_seconds,
+            poll_interval=config.get('watch.poll_interval', 1.0),
+            on_complete=args.on_complete,
+            done_dir=config.get('watch.done_dir', '_done'),
+            failed_dir=config.get('watch.failed_dir', '_failed'),
+        )
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    service.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        service.stop()
+    return 0
+
+
+def cmd_stream(args, config):
+    """从文件、URL或标准输入读取，旋转后写入文件、URL或标准输出"""
+    # 输出到标准输出时日志写到标准错误，避免混入视频数据
+    processor = VideoProcessor(ui_callback=lambda kind, data: kind == 'log' and print(data, file=sys.stderr, flush=True))
+    success, error = processor.rotate_stream(
+        args.input, args.output, args.rotation, args.hw_accel,
+        input_format=args.input_format, output_format=args.output_format
+    )
+    if not success:
+        print(error, file=sys.stderr)
+    return 0 if success else 1
+
+
+def cmd_calibrate(args, config):
+    """在本机运行合成视频的短时编码，找出总速度最高的并发数和每任务线程数，保存为"自动"并发的依据"""
+    from calibration import Calibrator, host_key, normalize_accel
+
+    processor = VideoProcessor()
+    calibrator = Calibrator(
+        processor, args.hw_accel, seconds=args.seconds, max_concurrency=args.max_concurrency,
+        memory_limit=args.memory_limit_mb * 2 ** 20 if args.memory_limit_mb else None
+    )
+    limit_text = f"{calibrator.memory_limit / 2 ** 20:.0f}MB" if calibrator.memory_limit else "不限"
+    print(f"校准 {normalize_accel(args.hw_accel)} 编码（{calibrator.cpu_count} 个CPU，内存上限 {limit_text}）...", flush=True)
+    try:
+        result = calibrator.calibrate(args.resolutions)
+    except KeyboardInterrupt:
+        return 130
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    for resolution, best in result['best'].items():
+        print(f"{resolution}: 并发 {best['concurrency']}，线程 {best['threads'] or '自动'}，总速度 {best['speed']:.2f}x")
+    if not result['overall']:
+        print("没有成功的试编码，未保存校准结果", file=sys.stderr)
+        return 1
+    overall = result['overall']
+    print(f"推荐: 并发 {overall['concurrency']}，线程 {overall['threads'] or '自动'}")
+    if not args.dry_run:
+        config.save_calibration(host_key(), normalize_accel(args.hw_accel), result)
+        config.flush()
+        print(f"已保存到 {config.config_path}（主机 {host_key()}），并发任务数设为 auto 时使用")
+    return 0
+
+
+def main(argv=None):
+    """命令行入口"""
+    config = ConfigManager()
+    setup_logging_from_config(config)
+    parser = argparse.ArgumentParser(description="视频旋转工具命令行")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    plan_parser = subparsers.add_parser('plan', help='预估处理时间、输出大小和磁盘空间，不进行编码')
+    add_processing_arguments(plan_parser, config)
+    plan_parser.add_argument('--json', action='store_true', help='以JSON格式输出')
+    plan_parser.add_argument('--max-jobs', type=int, default=50, help='最多列出的任务数')
+    plan_parser.set_defaults(handler=cmd_plan)
+
+    run_parser = subparsers.add_parser('run', help='批量处理文件并显示预计剩余时间')
+    add_processing_arguments(run_parser, config)
+    run_parser.add_argument('--metrics-file', help='每秒把处理指标（进度、剩余时间、各任务预计剩余）写入该JSON文件')
+    run_parser.set_defaults(handler=cmd_run)
+
+    manifest_parser = subparsers.add_parser('manifest', help='按任务清单（CSV/JSON Lines）流式批量处理')
+    add_processing_arguments(manifest_parser, config, with_paths=False)
+    manifest_parser.add_argument('manifest', help='清单文件路径，- 表示从标准输入读取')
+    manifest_parser.add_argument('--format', choices=['csv', 'jsonl'], help='清单格式，默认按扩展名或内容判断')
+    manifest_parser.add_argument('--results', help='把每个任务的结果以JSON Lines追加到该文件')
+    manifest_parser.add_argument('--quiet', action='store_true', help='不输出进度状态')
+    manifest_parser.set_defaults(handler=cmd_manifest)
+
+    watch_parser = subparsers.add_parser('watch', help='监视文件夹，新文件稳定后自动处理')
+    add_processing_arguments(watch_parser, config, with_paths=False)
+    watch_parser.add_argument('folder', help='监视的文件夹')
+    watch_parser.add_argument('--stable-seconds', type=float, default=config.get('watch.stable_seconds', 5.0),
+                              help='文件大小和修改时间保持不变多少秒后开始处理')
+    watch_parser.add_argument('--on-complete', choices=['move', 'mark'], default=config.get('watch.on_complete', 'move'),
+                              help='完成后移动输入文件到完成/失败子目录，或写入标记文件')
+    watch_parser.set_defaults(handler=cmd_watch)
+
+    stream_parser = subparsers.add_parser('stream', help='流式处理：输入输出可以是文件、http(s) URL或 -（标准输入/输出）')
+    add_processing_arguments(stream_parser, config, with_paths=False)
+    stream_parser.add_argument('input', help='输入：文件路径、http(s) URL 或 -')
+    stream_parser.add_argument('output', help='输出：文件路径、http(s) URL（分块PUT上传）或 -')
+    stream_parser.add_argument('--input-format', help='管道输入的封装格式（如 mpegts、matroska），默认自动识别')
+    stream_parser.add_argument('--output-format', default='mp4', choices=['mp4', 'matroska'],
+                               help='输出封装：mp4为分段MP4，matroska可直接流式写入')
+    stream_parser.set_defaults(handler=cmd_stream)
+
+    calibrate_parser = subparsers.add_parser('calibrate', help='测量本机最佳并发数和每任务线程数，供"自动"并发使用')
+    calibrate_parser.add_argument('--hw-accel', default=config.get('processing.hardware_acceleration', '无'),
+                                  choices=['无', 'nvenc', 'qsv', 'amf'], help='要校准的编码器')
+    calibrate_parser.add_argument('--resolutions', nargs='+', default=['720p', '1080p'],
+                                  choices=['720p', '1080p', '2160p'], help='试编码的分辨率')
+    calibrate_parser.add_argument('--seconds', type=float, default=3, help='每次试编码的合成视频时长')
+    calibrate_parser.add_argument('--max-concurrency', type=int, help='最多试到的并发数')
+    calibrate_parser.add_argument('--memory-limit-mb', type=float, help='内存上限，默认物理内存的一半')
+    calibrate_parser.add_argument('--json', action='store_true', help='输出全部试编码结果')
+    calibrate_parser.add_argument('--dry-run', action='store_true', help='只显示结果，不保存')
+    calibrate_parser.set_defaults(handler=cmd_calibrate)
+
+    args = parser.parse_args(argv)
+    return args.handler(args, config)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,34 @@
+import atexit
+import copy
 import json
 import os
-from typing import Dict, Any, Optional, Tuple, List
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple, List, Iterator
 
 class ConfigManager:
-    """配置管理类，负责应用程序配置的读取、保存和管理"""
+    """配置管理类，负责应用程序配置的读取、保存和管理
     
-    def __init__(self, config_file: str = "config.json"):
+    读取直接访问内存中的配置；修改只更新内存并标记为脏，由后台写入线程在
+    save_delay秒内无新修改后合并为一次原子写入（临时文件 + fsync + 重命名）。
+    """
+    
+    def __init__(self, config_file: str = "config.json", save_delay: float = 1.0):
         self.config_file = config_file
         self.config_path = os.path.join(os.path.dirname(__file__), config_file)
+        self.save_delay = save_delay
         self.default_config = self._get_default_config()
         self.config = self._load_config()
+        
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()  # 保证同一时间只有一个写入
+        self._wakeup = threading.Condition(self._lock)
+        self._dirty = False
+        self._save_deadline: Optional[float] = None
+        self._transaction_depth = 0
+        self._writer_thread: Optional[threading.Thread] = None
+        atexit.register(self.flush)
     
     def _get_default_config(self) -> Dict[str, Any]:
         """获取默认配置"""
@@ -26,19 +45,59 @@ class ConfigManager:
                 "default_output_dir": "~/Desktop",
                 "create_subdir": False,
                 "hardware_acceleration": "无",
-                "max_concurrent_tasks": 1
+                "max_concurrent_tasks": 1,  # 或 "auto"：按本机校准结果选择并发数和每任务线程数
+                "max_io_per_device": 2,  # 每个磁盘/网络共享同时读写的任务数，0表示不限制
+                "staging_enabled": False,  # 是否把输入预取到本地暂存目录
+                "staging_dir": "",  # 暂存目录，留空使用系统临时目录
+                "staging_budget_mb": 10240,  # 暂存空间上限
+                "staging_prefetch_count": 2,  # 提前预取的输入数量
+                "container_mode": "default",  # MP4封装: default / faststart / fragmented
+                "engine": "auto",  # 编码后端: auto（短视频进程内编码）/ ffmpeg / pyav
+                "inprocess_max_seconds": 15,  # auto模式下不超过该时长的视频使用进程内编码
+                "codec_policy": "h264",  # 编码策略: h264（固定H.264）/ match_source（匹配源编码格式和码率）
+                "max_size_growth_percent": None,  # 输出最多比输入大多少百分比，None表示不限制
+                "verify_output": True,  # 编码后校验输出（媒体信息比较 + 抽样解码），失败时自动重新编码
+                "checkpoint_min_seconds": 1800,  # 不短于该时长的视频分段编码，中断后可续编；0表示关闭
+                "checkpoint_segment_seconds": 60,  # 分段时长，中断时最多损失一个分段的编码
+                "batch_clip_seconds": 10,  # 不超过该时长的短视频合并到一个FFmpeg进程中批量编码；0表示关闭
+                "batch_max_seconds": 120,  # 每组短视频的总时长上限
+                "batch_max_files": 16,  # 每组最多的文件数
+                "target_speed": None  # 目标总编码速度（×实时），设置后按实测速度自动调整编码预设；None表示使用默认预设
             },
             "advanced": {
                 "ffmpeg_timeout": 300,  # 5分钟超时
-                "log_level": "info",
+                "log_level": "info",  # debug / info / warning / error，debug时记录每个文件的完整FFmpeg命令
+                "log_dir": "",  # 结构化日志（JSON Lines）目录，留空使用程序目录下的 logs
+                "log_max_mb": 10,  # 单个日志文件上限，超过后轮转
+                "log_backup_count": 5,  # 保留的轮转日志文件数
                 "auto_save_config": True,
-                "check_ffmpeg_on_startup": True
+                "check_ffmpeg_on_startup": True,
+                "profile_ui": False,  # 界面性能分析（同 --profile），退出时在程序目录的 profiles 下写出报告
+                "preview_mode": "frames",  # frames: 抽取关键帧; clip: 按正式设置编码开头几秒
+                "preview_cache_mb": 200,  # 预览缓存上限
+                "probe_workers": 0  # 添加文件时并行探测媒体信息的进程数，0表示按CPU核数自动选择
+            },
+            "profiles": {
+                # 任务清单中 profile 字段引用的编码选项
+                "match_source": {"codec_policy": "match_source", "max_size_growth_percent": 10},
+                "streaming": {"container_mode": "faststart"}
+            },
+            "watch": {
+                "stable_seconds": 5,  # 文件大小和修改时间保持不变多少秒后开始处理
+                "poll_interval": 1.0,  # 不支持inotify时的扫描间隔
+                "on_complete": "move",  # move: 移动到完成/失败子目录; mark: 写入 .done/.failed 标记文件
+                "done_dir": "_done",
+                "failed_dir": "_failed"
             },
             "recent": {
                 "files": [],
                 "output_directories": [],
                 "max_recent_items": 10
-            }
+            },
+            "cache": {
+                "binaries": {}  # 可执行文件路径 -> 检测结果（按修改时间和大小失效）
+            },
+            "calibration": {}  # 主机名 -> 编码器 -> 并发数/线程数校准结果（cli.py calibrate）
         }
     
     def _load_config(self) -> Dict[str, Any]:
@@ -50,14 +109,14 @@ class ConfigManager:
                 # 合并默认配置和加载的配置
                 return self._merge_config(self.default_config, loaded_config)
             else:
-                return self.default_config.copy()
+                return copy.deepcopy(self.default_config)
         except Exception as e:
             print(f"加载配置文件失败: {e}，使用默认配置")
-            return self.default_config.copy()
+            return copy.deepcopy(self.default_config)
     
     def _merge_config(self, default: Dict[str, Any], loaded: Dict[str, Any]) -> Dict[str, Any]:
         """合并配置，确保所有默认键都存在"""
-        result = default.copy()
+        result = copy.deepcopy(default)
         for key, value in loaded.items():
             if key in result and isinstance(result[key], dict) and isinstance(value, dict):
                 result[key] = self._merge_config(result[key], value)
@@ -66,17 +125,107 @@ class ConfigManager:
         return result
     
     def save_config(self) -> bool:
-        """保存配置到文件"""
+        """立即保存配置到文件（原子写入：先写临时文件并fsync，再重命名覆盖）"""
+        with self._write_lock:
+            return self._save_locked()
+    
+    def _save_locked(self) -> bool:
+        """写入当前配置（调用方需持有写入锁）
+        
+        快照在写入锁内生成：较早的快照不会在较新的快照之后覆盖文件
+        """
+        with self._lock:
+            content = json.dumps(self.config, indent=2, ensure_ascii=False)
+            self._dirty = False
+            self._save_deadline = None
+        
+        temp_path = None
         try:
             # 确保目录存在
-            os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
+            config_dir = os.path.dirname(self.config_path)
+            os.makedirs(config_dir, exist_ok=True)
+            
+            # 临时文件必须与目标在同一目录，保证重命名是原子的
+            import tempfile
+            fd, temp_path = tempfile.mkstemp(prefix=f".{self.config_file}.", suffix=".tmp", dir=config_dir)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.config_path)
+            temp_path = None
             
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=2, ensure_ascii=False)
+            # 同步目录项，确保重命名在掉电后依然生效（Windows不支持打开目录）
+            if os.name != 'nt':
+                dir_fd = os.open(config_dir, os.O_RDONLY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
             return True
         except Exception as e:
             print(f"保存配置文件失败: {e}")
+            with self._lock:
+                self._dirty = True
             return False
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def _schedule_save(self) -> None:
+        """安排一次延迟保存，在save_delay秒内的多次修改合并为一次写入"""
+        with self._lock:
+            self._dirty = True
+            self._save_deadline = time.monotonic() + self.save_delay
+            if self._writer_thread is None or not self._writer_thread.is_alive():
+                self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+                self._writer_thread.start()
+            self._wakeup.notify()
+    
+    def _writer_loop(self) -> None:
+        """后台写入线程：等到最后一次修改后的save_delay秒再写入"""
+        while True:
+            with self._lock:
+                while self._save_deadline is None:
+                    if not self._wakeup.wait(timeout=30):
+                        # 长时间无修改时退出，下次修改再启动
+                        if self._save_deadline is None:
+                            self._writer_thread = None
+                            return
+                remaining = self._save_deadline - time.monotonic()
+                if remaining > 0:
+                    self._wakeup.wait(timeout=remaining)
+                    continue
+            self.save_config()
+    
+    def flush(self) -> bool:
+        """立即写入尚未保存的修改（程序退出前调用）
+        
+        先取得写入锁：后台线程的写入已清除脏标记但尚未完成重命名时，等它完成后再返回
+        """
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return True
+            return self._save_locked()
+    
+    @contextmanager
+    def transaction(self) -> Iterator["ConfigManager"]:
+        """批量修改多个配置项，退出时只提交一次保存"""
+        with self._lock:
+            self._transaction_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._transaction_depth -= 1
+                if self._transaction_depth == 0 and self._dirty:
+                    self._commit()
+    
+    def _commit(self) -> None:
+        """提交修改：启用自动保存时安排延迟写入"""
+        if self.get('advanced.auto_save_config', True):
+            self._schedule_save()
     
     def get(self, key_path: str, default: Any = None) -> Any:
         """获取配置值，支持点分隔的路径，如 'ui.window_geometry'"""
@@ -90,23 +239,30 @@ class ConfigManager:
         except (KeyError, TypeError):
             return default
     
-    def set(self, key_path: str, value: Any) -> None:
-        """设置配置值，支持点分隔的路径"""
+    def set(self, key_path: str, value: Any, persist: bool = True) -> None:
+        """设置配置值，支持点分隔的路径；persist为False时只更新内存，随下次保存写入"""
         keys = key_path.split('.')
-        config = self.config
-        
-        # 导航到最后一级的父级
-        for key in keys[:-1]:
-            if key not in config:
-                config[key] = {}
-            config = config[key]
         
-        # 设置值
-        config[keys[-1]] = value
-        
-        # 如果启用了自动保存，则保存配置
-        if self.get('advanced.auto_save_config', True):
-            self.save_config()
+        with self._lock:
+            config = self.config
+            
+            # 导航到最后一级的父级
+            for key in keys[:-1]:
+                if key not in config:
+                    config[key] = {}
+                config = config[key]
+            
+            # 值未变化时不触发保存
+            if keys[-1] in config and config[keys[-1]] == value:
+                return
+            
+            # 设置值
+            config[keys[-1]] = value
+            self._dirty = True
+            
+            # 事务中的修改在事务结束时统一提交
+            if persist and self._transaction_depth == 0:
+                self._commit()
     
     def get_ui_config(self) -> Dict[str, Any]:
         """获取UI相关配置"""
@@ -121,13 +277,26 @@ class ConfigManager:
         return self.config.get('advanced', {})
     
     def update_processing_config(self, settings: Dict[str, Any]) -> None:
-        """更新处理配置"""
-        for key, value in settings.items():
-            self.set(f'processing.{key}', value)
+        """更新处理配置（多个键合并为一次保存）"""
+        with self.transaction():
+            for key, value in settings.items():
+                self.set(f'processing.{key}', value)
+    
+    def get_calibration(self, host: str) -> Dict[str, Any]:
+        """获取某台主机的校准结果（编码器 -> 结果）；主机名可能含点，不经过点分隔路径访问"""
+        return self.config.get('calibration', {}).get(host, {})
+    
+    def save_calibration(self, host: str, hw_accel: str, result: Dict[str, Any]) -> None:
+        """保存某台主机上一个编码器的校准结果"""
+        with self._lock:
+            self.config.setdefault('calibration', {}).setdefault(host, {})[hw_accel] = result
+            self._dirty = True
+            if self._transaction_depth == 0:
+                self._commit()
     
     def add_recent_file(self, file_path: str) -> None:
         """添加最近使用的文件"""
-        recent_files = self.get('recent.files', [])
+        recent_files = list(self.get('recent.files', []))
         
         # 如果文件已存在，先移除
         if file_path in recent_files:
@@ -148,15 +317,15 @@ class ConfigManager:
         # 过滤掉不存在的文件
         existing_files = [f for f in recent_files if os.path.exists(f)]
         
-        # 如果列表发生了变化，更新配置
+        # 如果列表发生了变化，只更新内存，读取操作不触发写入
         if len(existing_files) != len(recent_files):
-            self.set('recent.files', existing_files)
+            self.set('recent.files', existing_files, persist=False)
         
         return existing_files
     
     def add_recent_output_dir(self, dir_path: str) -> None:
         """添加最近使用的输出目录"""
-        recent_dirs = self.get('recent.output_directories', [])
+        recent_dirs = list(self.get('recent.output_directories', []))
         
         # 如果目录已存在，先移除
         if dir_path in recent_dirs:
@@ -177,22 +346,25 @@ class ConfigManager:
         # 过滤掉不存在的目录
         existing_dirs = [d for d in recent_dirs if os.path.exists(d)]
         
-        # 如果列表发生了变化，更新配置
+        # 如果列表发生了变化，只更新内存，读取操作不触发写入
         if len(existing_dirs) != len(recent_dirs):
-            self.set('recent.output_directories', existing_dirs)
+            self.set('recent.output_directories', existing_dirs, persist=False)
         
         return existing_dirs
     
     def reset_to_default(self) -> None:
         """重置为默认配置"""
-        self.config = self.default_config.copy()
+        with self._lock:
+            self.config = copy.deepcopy(self.default_config)
         self.save_config()
     
     def export_config(self, export_path: str) -> bool:
         """导出配置到指定路径"""
         try:
+            with self._lock:
+                content = json.dumps(self.config, indent=2, ensure_ascii=False)
             with open(export_path, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=2, ensure_ascii=False)
+                f.write(content)
             return True
         except Exception as e:
             print(f"导出配置失败: {e}")
@@ -205,7 +377,8 @@ class ConfigManager:
                 imported_config = json.load(f)
             
             # 合并导入的配置和默认配置
-            self.config = self._merge_config(self.default_config, imported_config)
+            with self._lock:
+                self.config = self._merge_config(self.default_config, imported_config)
             self.save_config()
             return True
         except Exception as e:
@@ -227,8 +400,18 @@ class ConfigManager:
         processing_config = self.get_processing_config()
         if 'max_concurrent_tasks' in processing_config:
             max_tasks = processing_config['max_concurrent_tasks']
-            if not isinstance(max_tasks, int) or max_tasks < 1 or max_tasks > 16:
+            if max_tasks != "auto" and (not isinstance(max_tasks, int) or max_tasks < 1 or max_tasks > 16):
                 errors.append("无效的最大并发任务数配置")
+        if 'max_io_per_device' in processing_config:
+            max_io = processing_config['max_io_per_device']
+            if not isinstance(max_io, int) or max_io < 0:
+                errors.append("无效的单设备I/O并发数配置")
+        growth = processing_config.get('max_size_growth_percent')
+        if growth is not None and (not isinstance(growth, (int, float)) or growth < 0):
+            errors.append("无效的输出大小上限配置")
+        target_speed = processing_config.get('target_speed')
+        if target_speed is not None and (not isinstance(target_speed, (int, float)) or target_speed <= 0):
+            errors.append("无效的目标编码速度配置")
         
         # 验证高级配置
         advanced_config = self.get_advanced_config()
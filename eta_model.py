@@ -0,0 +1,282 @@
+import json
+import os
+import platform
+import statistics
+import threading
+import time
+from collections import deque
+
+from app_paths import get_app_dir
+
+# 参与预测的历史记录条数上限，超过后按时间顺序丢弃最旧的记录
+MAX_RECORDS = 2000
+# 每次预测取最近多少条匹配记录
+RECENT_SAMPLES = 30
+# 基准分辨率，编码吞吐量按像素数折算
+REFERENCE_PIXELS = 1920 * 1080
+
+
+class EncodeHistory:
+    """本机历史编码记录（JSON Lines），按编码器、配置、分辨率和并发数预测编码速度
+
+    每条记录: time, host, encoder, profile, width, height, duration, elapsed, speed（相对实时的倍数）, concurrency
+    """
+
+    def __init__(self, path=None, max_records=MAX_RECORDS):
+        self.path = path or os.path.join(get_app_dir(), "encode_history.jsonl")
+        self.max_records = max_records
+        self.host = platform.node()
+        self._records = deque(maxlen=max_records)
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        """首次使用时才读取历史文件，不影响启动速度"""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        for line in lines[-self.max_records:]:
+            try:
+                self._records.append(json.loads(line))
+            except ValueError:
+                continue
+        # 文件明显超出上限时压缩为最近的记录
+        if len(lines) > self.max_records * 2:
+            self._rewrite()
+
+    def _rewrite(self):
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for record in self._records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+
+    def record(self, encoder, profile, width, height, duration, elapsed, concurrency):
+        """记录一次成功的编码"""
+        if not duration or elapsed <= 0:
+            return
+        record = {
+            'time': round(time.time(), 1),
+            'host': self.host,
+            'encoder': encoder,
+            'profile': profile,
+            'width': width,
+            'height': height,
+            'duration': round(duration, 3),
+            'elapsed': round(elapsed, 3),
+            'speed': round(duration / elapsed, 4),
+            'concurrency': concurrency,
+        }
+        with self._lock:
+            self._ensure_loaded()
+            self._records.append(record)
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError:
+                pass
+
+    def predict_speed(self, encoder, profile, width, height, concurrency):
+        """预测编码速度（相对实时的倍数），没有可用历史时返回None
+
+        按匹配程度从高到低逐级放宽条件：本机+编码器+配置+并发数 → 本机+编码器+并发数 → 本机+编码器 → 编码器；
+        各记录的速度先按像素数折算为吞吐量，取最近若干条的中位数后再折算回目标分辨率。
+        """
+        pixels = width * height if width and height else REFERENCE_PIXELS
+        levels = (
+            lambda r: r.get('host') == self.host and r.get('profile') == profile and r.get('concurrency') == concurrency,
+            lambda r: r.get('host') == self.host and r.get('concurrency') == concurrency,
+            lambda r: r.get('host') == self.host,
+            lambda r: True,
+        )
+        with self._lock:
+            self._ensure_loaded()
+            candidates = [r for r in self._records if r.get('encoder') == encoder]
+        for matches in levels:
+            throughputs = [
+                r['speed'] * (r['width'] * r['height'] if r.get('width') and r.get('height') else REFERENCE_PIXELS)
+                for r in candidates if matches(r)
+            ][-RECENT_SAMPLES:]
+            if throughputs:
+                return statistics.median(throughputs) / pixels
+        return None
+
+
+class EtaTracker:
+    """一批任务的剩余时间估算：开始前按历史速度预测每个任务，运行中用实时进度和本批实际耗时修正
+
+    所有汇总量增量维护，超大批量下每次估算的开销与正在运行的任务数成正比。
+    """
+
+    def __init__(self, concurrency):
+        self.concurrency = max(1, concurrency)
+        self._lock = threading.Lock()
+        self._predicted = {}  # 任务ID -> 预测耗时（秒），未知时为None
+        self._durations = {}  # 任务ID -> 媒体时长（秒）
+        self._pending_ids = set()
+        self._running = {}  # 任务ID -> [开始时间, 已编码的媒体秒数]
+        self._pending_known_sum = 0.0
+        self._pending_known_count = 0
+        self._known_sum = 0.0  # 全部已知预测的总和，用于估计未知任务
+        self._known_count = 0
+        self._actual_sum = 0.0  # 本批已完成任务的实际耗时与预测耗时，用于整体修正
+        self._actual_predicted_sum = 0.0
+        self._actual_count = 0
+
+    def add_job(self, job_id):
+        """登记尚未开始的任务（此时预测未知）"""
+        with self._lock:
+            self._predicted.setdefault(job_id, None)
+            self._pending_ids.add(job_id)
+
+    def set_prediction(self, job_id, duration, predicted_time):
+        """设置任务的媒体时长和预测耗时（可在后台探测完成后调用）"""
+        with self._lock:
+            if job_id not in self._pending_ids and job_id not in self._running:
+                return  # 任务已结束
+            previous = self._predicted.get(job_id)
+            if previous is not None:
+                self._known_sum -= previous
+                self._known_count -= 1
+                if job_id in self._pending_ids:
+                    self._pending_known_sum -= previous
+                    self._pending_known_count -= 1
+            self._predicted[job_id] = predicted_time
+            self._durations[job_id] = duration
+            if predicted_time is not None:
+                self._known_sum += predicted_time
+                self._known_count += 1
+                if job_id in self._pending_ids:
+                    self._pending_known_sum += predicted_time
+                    self._pending_known_count += 1
+
+    def _leave_pending(self, job_id):
+        if job_id in self._pending_ids:
+            self._pending_ids.discard(job_id)
+            predicted = self._predicted.get(job_id)
+            if predicted is not None:
+                self._pending_known_sum -= predicted
+                self._pending_known_count -= 1
+
+    def start_job(self, job_id):
+        with self._lock:
+            self._leave_pending(job_id)
+            self._running[job_id] = [time.time(), 0.0]
+
+    def update_progress(self, job_id, media_seconds):
+        """FFmpeg实时进度：已编码的媒体时长（秒）"""
+        with self._lock:
+            state = self._running.get(job_id)
+            if state is not None:
+                state[1] = media_seconds
+
+    def running_progress(self):
+        """运行中任务的实时进度 {任务ID: 已编码的媒体秒数}"""
+        with self._lock:
+            return {job_id: state[1] for job_id, state in self._running.items()}
+
+    def finish_job(self, job_id, success=True):
+        """任务结束（成功、失败或取消）"""
+        with self._lock:
+            self._leave_pending(job_id)
+            state = self._running.pop(job_id, None)
+            predicted = self._predicted.pop(job_id, None)
+            self._durations.pop(job_id, None)
+            if success and state is not None and predicted:
+                self._actual_sum += time.time() - state[0]
+                self._actual_predicted_sum += predicted
+                self._actual_count += 1
+
+    def discard_jobs(self, job_ids):
+        """从估算中移除已取消的排队任务"""
+        with self._lock:
+            for job_id in job_ids:
+                self._leave_pending(job_id)
+                self._predicted.pop(job_id, None)
+                self._durations.pop(job_id, None)
+
+    def get_prediction(self, job_id):
+        """任务的预测耗时（已按本批实际速度修正），未知时返回None"""
+        with self._lock:
+            predicted = self._predicted.get(job_id)
+            return predicted * self._correction() if predicted is not None else None
+
+    def _correction(self):
+        """本批实际耗时/预测耗时，样本少时向1收缩，避免个别任务造成大幅波动"""
+        if not self._actual_predicted_sum:
+            return 1.0
+        ratio = min(max(self._actual_sum / self._actual_predicted_sum, 0.25), 4.0)
+        samples = min(self._actual_count, 20)
+        return (ratio * samples + 2.0) / (samples + 2)
+
+    def _running_remaining(self, job_id, state, now, correction):
+        """运行中任务的剩余时间：进度越多越依赖实时进度推算，否则依赖预测"""
+        started, done_seconds = state
+        elapsed = now - started
+        predicted = self._predicted.get(job_id)
+        duration = self._durations.get(job_id)
+        predicted_remaining = max(predicted * correction - elapsed, 0.0) if predicted is not None else None
+        if duration and done_seconds > 0:
+            fraction = min(done_seconds / duration, 1.0)
+            live_remaining = elapsed * (1 - fraction) / max(fraction, 1e-6)
+            if predicted_remaining is None:
+                return live_remaining, fraction
+            weight = min(fraction * 2, 1.0)
+            return weight * live_remaining + (1 - weight) * predicted_remaining, fraction
+        if predicted_remaining is None:
+            return None, 0.0
+        return predicted_remaining, (min(elapsed / (predicted * correction), 0.99) if predicted else 0.0)
+
+    def estimate(self):
+        """返回估算结果字典: remaining（整批剩余秒数，无法估算时为None）、completion_time、current_progress、jobs"""
+        now = time.time()
+        with self._lock:
+            correction = self._correction()
+            average = self._known_sum / self._known_count if self._known_count else None
+
+            jobs = {}
+            running_total = 0.0
+            running_max = 0.0
+            fractions = []
+            unknown = 0
+            for job_id, state in self._running.items():
+                remaining, fraction = self._running_remaining(job_id, state, now, correction)
+                fractions.append(fraction)
+                if remaining is None:
+                    if average is None:
+                        unknown += 1
+                        jobs[job_id] = None
+                        continue
+                    remaining = max(average * correction - (now - state[0]), 0.0)
+                jobs[job_id] = remaining
+                running_total += remaining
+                running_max = max(running_max, remaining)
+
+            pending_unknown = len(self._pending_ids) - self._pending_known_count
+            pending_total = self._pending_known_sum
+            if pending_unknown:
+                if average is None:
+                    unknown += pending_unknown
+                else:
+                    pending_total += average * pending_unknown
+            pending_total *= correction
+
+        if unknown:
+            remaining = None
+        else:
+            remaining = max(running_max, (running_total + pending_total) / self.concurrency)
+        return {
+            'remaining': remaining,
+            'completion_time': now + remaining if remaining is not None else None,
+            'current_progress': sum(fractions) / len(fractions) if fractions else 0.0,
+            'correction': correction,
+            'jobs': jobs,
+        }
@@ -0,0 +1,70 @@
+import os
+import struct
+import time
+
+
+def _read_box_header(f, offset, file_size):
+    """读取offset处的box头，返回(box类型, box总大小)；头部尚未写完时返回None"""
+    if offset + 8 > file_size:
+        return None
+    f.seek(offset)
+    size, box_type = struct.unpack('>I4s', f.read(8))
+    if size == 1:
+        # 64位扩展大小
+        if offset + 16 > file_size:
+            return None
+        size = struct.unpack('>Q', f.read(8))[0]
+    elif size == 0:
+        # 大小为0表示box延伸到文件末尾，只有文件写完后才能确定
+        return box_type, None
+    return box_type, size
+
+
+def iter_fragments(path, is_finished, poll_interval=0.2, timeout=None):
+    """边编码边读取分段MP4，按顺序产出已完整写入的片段字节
+
+    第一个片段为初始化段（ftyp+moov），之后每个片段为一个 moof+mdat 媒体段，
+    最后为 mfra 等尾部box。is_finished() 返回True表示编码已结束；
+    超过timeout秒没有新数据时停止。
+    """
+    offset = 0
+    pending = b''  # 已读取但尚未组成完整片段的box（如尚未等到mdat的moof）
+    last_progress = time.monotonic()
+
+    while not os.path.exists(path):
+        if is_finished():
+            return
+        time.sleep(poll_interval)
+
+    with open(path, 'rb') as f:
+        while True:
+            finished = is_finished()
+            file_size = os.path.getsize(path)
+            header = _read_box_header(f, offset, file_size)
+
+            if header is not None:
+                box_type, size = header
+                if size is None and finished:
+                    size = file_size - offset
+                if size is not None and offset + size <= file_size:
+                    f.seek(offset)
+                    data = f.read(size)
+                    offset += size
+                    last_progress = time.monotonic()
+
+                    # moof需要与紧随的mdat一起交付，ftyp需要与moov一起交付
+                    if box_type in (b'ftyp', b'moof', b'styp', b'sidx'):
+                        pending += data
+                        continue
+                    yield pending + data
+                    pending = b''
+                    continue
+
+            # 编码已结束时文件不再增长，剩余无法组成完整box的数据视为截断
+            if finished:
+                if pending:
+                    yield pending
+                return
+            if timeout is not None and time.monotonic() - last_progress > timeout:
+                return
+            time.sleep(poll_interval)
@@ -0,0 +1,100 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+# 目录 -> 设备标识缓存的最大条目数，超出时淘汰最久未使用的目录
+DEVICE_CACHE_SIZE = 4096
+
+
+class IOScheduler:
+    """按存储设备限制并发I/O的调度器，避免同一块磁盘/网络共享被多个任务同时读写造成寻道抖动
+
+    并发上限只在占用时检查：批处理和文件夹监视可以各自按 limit 传入不同的上限，任务运行中修改
+    max_per_device 也不会影响已占用的计数——占用和释放总是成对计数，与占用时的上限无关。
+    """
+
+    def __init__(self, max_per_device=2):
+        self.max_per_device = max_per_device  # 未指定 limit 时每个设备允许的并发任务数，0表示不限制
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._active = {}  # 设备标识 -> 当前占用的任务数
+        self._device_cache = OrderedDict()  # 目录 -> 设备标识，按最近使用排序
+
+    def get_device(self, path):
+        """获取路径所在的设备标识（输出文件可能尚不存在，向上查找已存在的目录）"""
+        directory = os.path.dirname(os.path.abspath(path))
+        with self._lock:
+            cached = self._device_cache.get(directory)
+            if cached is not None:
+                self._device_cache.move_to_end(directory)
+                return cached
+
+        probe = directory
+        while True:
+            try:
+                device = os.stat(probe).st_dev
+                break
+            except OSError:
+                parent = os.path.dirname(probe)
+                if parent == probe:
+                    # 无法解析时退回到盘符/挂载根，保证同一位置的任务仍被归为一组
+                    device = os.path.splitdrive(directory)[0] or os.sep
+                    break
+                probe = parent
+
+        with self._lock:
+            self._device_cache[directory] = device
+            if len(self._device_cache) > DEVICE_CACHE_SIZE:
+                self._device_cache.popitem(last=False)
+        return device
+
+    def devices_for(self, *paths):
+        """返回一组路径涉及的设备标识（去重并排序，保证加锁顺序一致）"""
+        devices = {self.get_device(path) for path in paths if path}
+        return tuple(sorted(devices, key=str))
+
+    def _is_full(self, devices, limit):
+        """调用方需持有锁"""
+        return limit > 0 and any(self._active.get(device, 0) >= limit for device in devices)
+
+    def _hold(self, devices):
+        """调用方需持有锁"""
+        for device in devices:
+            self._active[device] = self._active.get(device, 0) + 1
+
+    def try_acquire(self, devices, limit=None):
+        """尝试占用一组设备，任一设备已达上限时不占用任何设备并返回False；limit 未指定时使用 max_per_device"""
+        limit = self.max_per_device if limit is None else limit
+        with self._lock:
+            if self._is_full(devices, limit):
+                return False
+            self._hold(devices)
+            return True
+
+    def acquire(self, devices, should_continue=None, limit=None):
+        """阻塞直到可以占用一组设备；should_continue返回False时放弃并返回False"""
+        limit = self.max_per_device if limit is None else limit
+        with self._condition:
+            while self._is_full(devices, limit):
+                if should_continue is not None and not should_continue():
+                    return False
+                self._condition.wait(timeout=0.5)
+            self._hold(devices)
+            return True
+
+    def release(self, devices):
+        """释放一组设备的占用（每次成功的 try_acquire/acquire 对应一次）"""
+        with self._condition:
+            for device in devices:
+                count = self._active.get(device, 0) - 1
+                if count > 0:
+                    self._active[device] = count
+                else:
+                    self._active.pop(device, None)
+            self._condition.notify_all()
+
+    def active_counts(self):
+        """获取各设备当前占用数的快照"""
+        with self._lock:
+            return dict(self._active)
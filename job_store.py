@@ -0,0 +1,174 @@
+import math
+import os
+import sys
+from array import array
+
+# 任务状态码（每个任务占一个字节）
+PENDING, RUNNING, PAUSED, DONE, FAILED, CANCELLED = range(6)
+STATE_NAMES = ('pending', 'running', 'paused', 'done', 'failed', 'cancelled')
+
+# 媒体信息探测状态
+NOT_PROBED, PROBED, PROBE_FAILED = range(3)
+
+
+class JobStore:
+    """按列存储的紧凑任务表，超大批量（上百万个文件）时代替路径列表 + 每文件字典
+
+    任务ID为加入顺序（从0开始），与 process_files 中的任务ID一致。路径拆分为目录和文件名，
+    目录只存一份（同一目录下的文件共享前缀）；状态、媒体信息等定长字段存在 array/bytearray 中，
+    错误信息只为失败的任务保存，输出路径不保存（按处理参数计算）。按ID和按路径查找都是O(1)。
+    遍历得到按ID顺序的路径，可以直接作为 process_files 的输入；处理过程中追加的任务也会被遍历到。
+    """
+
+    def __init__(self, paths=()):
+        self.clear()
+        self.extend(paths)
+
+    def clear(self):
+        """清空任务表"""
+        self._dirs = []  # 目录序号 -> 目录
+        self._dir_ids = {}  # 目录 -> 目录序号
+        self._names_by_dir = []  # 目录序号 -> {文件名: 任务ID}
+        self._dir_of = array('I')  # 任务ID -> 目录序号
+        self._name_of = []  # 任务ID -> 文件名
+        self._state = bytearray()
+        self._probe = bytearray()
+        self._duration = array('d')  # 未知为NaN
+        self._width = array('H')  # 未知为0
+        self._height = array('H')
+        self._codec = bytearray()  # 编码格式序号，0表示未知
+        self._codecs = [None]
+        self._codec_ids = {}
+        self._errors = {}  # 任务ID -> 错误信息
+
+    def __len__(self):
+        return len(self._name_of)
+
+    def __iter__(self):
+        job_id = 0
+        while job_id < len(self._name_of):
+            yield self.path(job_id)
+            job_id += 1
+
+    def __getitem__(self, job_id):
+        return self.path(job_id)
+
+    def __contains__(self, path):
+        return self.id_of(path) is not None
+
+    def path(self, job_id):
+        return os.path.join(self._dirs[self._dir_of[job_id]], self._name_of[job_id])
+
+    def id_of(self, path):
+        """路径对应的任务ID，不存在时返回None"""
+        directory, name = os.path.split(path)
+        dir_id = self._dir_ids.get(directory)
+        return None if dir_id is None else self._names_by_dir[dir_id].get(name)
+
+    def add(self, path):
+        """加入任务，返回 (任务ID, 是否为新任务)；已存在的路径返回原来的ID"""
+        directory, name = os.path.split(path)
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = self._dir_ids[directory] = len(self._dirs)
+            self._dirs.append(sys.intern(directory))
+            self._names_by_dir.append({})
+        names = self._names_by_dir[dir_id]
+        job_id = names.get(name)
+        if job_id is not None:
+            return job_id, False
+        job_id = names[name] = len(self._name_of)
+        self._dir_of.append(dir_id)
+        self._name_of.append(name)
+        self._state.append(PENDING)
+        self._probe.append(NOT_PROBED)
+        self._duration.append(math.nan)
+        self._width.append(0)
+        self._height.append(0)
+        self._codec.append(0)
+        return job_id, True
+
+    def extend(self, paths):
+        """批量加入任务，返回新加入任务的ID列表"""
+        added = []
+        for path in paths:
+            job_id, new = self.add(path)
+            if new:
+                added.append(job_id)
+        return added
+
+    def set_state(self, job_id, state):
+        self._state[job_id] = state
+
+    def state(self, job_id):
+        return self._state[job_id]
+
+    def state_name(self, job_id):
+        return STATE_NAMES[self._state[job_id]]
+
+    def count(self, state):
+        """处于某状态的任务数"""
+        return self._state.count(state)
+
+    def set_error(self, job_id, error):
+        if error:
+            self._errors[job_id] = error
+        else:
+            self._errors.pop(job_id, None)
+
+    def error(self, job_id):
+        return self._errors.get(job_id)
+
+    def set_info(self, job_id, info):
+        """保存探测结果中列表显示和调度用到的字段（时长、分辨率、编码格式），info为None表示探测失败"""
+        if not info:
+            self._probe[job_id] = PROBE_FAILED
+            return
+        self._probe[job_id] = PROBED
+        self._duration[job_id] = info.get('duration') or math.nan
+        self._width[job_id] = min(info.get('width') or 0, 0xFFFF)
+        self._height[job_id] = min(info.get('height') or 0, 0xFFFF)
+        codec = info.get('video_codec')
+        if codec:
+            code = self._codec_ids.get(codec)
+            if code is None and len(self._codecs) < 256:
+                code = self._codec_ids[codec] = len(self._codecs)
+                self._codecs.append(codec)
+            self._codec[job_id] = code or 0
+
+    def probed(self, job_id):
+        """是否已有探测结果（包括探测失败）"""
+        return self._probe[job_id] != NOT_PROBED
+
+    def info(self, job_id):
+        """探测到的媒体信息字典，未探测或探测失败时返回None"""
+        if self._probe[job_id] != PROBED:
+            return None
+        duration = self._duration[job_id]
+        return {
+            'duration': None if math.isnan(duration) else duration,
+            'width': self._width[job_id] or None,
+            'height': self._height[job_id] or None,
+            'video_codec': self._codecs[self._codec[job_id]],
+        }
+
+    def probed_count(self):
+        return len(self._probe) - self._probe.count(NOT_PROBED)
+
+    def pixel_counts(self):
+        """已知分辨率的任务的像素数（宽×高）"""
+        return [width * height for width, height in zip(self._width, self._height) if width and height]
+
+    def memory_usage(self):
+        """表占用的内存估算（字节），包括路径字符串和索引字典"""
+        size = sum(sys.getsizeof(column) for column in (
+            self._dirs, self._dir_ids, self._names_by_dir, self._dir_of, self._name_of, self._state,
+            self._probe, self._duration, self._width, self._height, self._codec, self._errors,
+        ))
+        size += sum(sys.getsizeof(directory) for directory in self._dirs)
+        size += sum(sys.getsizeof(names) for names in self._names_by_dir)
+        size += sum(sys.getsizeof(name) for name in self._name_of)
+        # 文件名索引中作为值的任务ID整数对象
+        size += len(self._name_of) * sys.getsizeof(1 << 20)
+        size += sum(sys.getsizeof(text) for text in self._errors.values())
+        return size
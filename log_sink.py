@@ -0,0 +1,164 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from app_paths import get_app_dir
+
+LOGGER_NAME = "video_rotator"
+# 配置 advanced.log_level 的取值 -> logging级别
+LOG_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+}
+# 结构化日志中附加的字段（通过 extra 传入）
+RECORD_FIELDS = ("job_id", "file", "stage", "duration")
+
+_listener = None
+_setup_lock = threading.Lock()
+
+# 未调用 setup_logging 时（如作为库使用）不输出到标准错误，界面日志默认显示info及以上
+logging.getLogger(LOGGER_NAME).addHandler(logging.NullHandler())
+logging.getLogger(LOGGER_NAME).setLevel(logging.INFO)
+
+
+def parse_level(level, default=logging.INFO):
+    """把配置中的级别名称（或logging级别数值）转换为logging级别"""
+    if isinstance(level, int):
+        return level
+    return LOG_LEVELS.get(str(level or "").strip().lower(), default)
+
+
+def get_logger(name=None):
+    """取得程序的logger，name为子模块名（如 processor、watcher）"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """每条日志输出为一行JSON: time, level, logger, message 以及 job_id/file/stage/duration 等附加字段"""
+
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in RECORD_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = round(value, 3) if field == 'duration' else value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """只把日志记录放入无界队列，格式化和写文件都在后台线程进行，调用线程不会被磁盘I/O阻塞"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        # 只合并消息参数，不在调用线程格式化；异常信息先转为文本，避免跨线程持有traceback
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level="info", log_dir=None, max_bytes=10 * 1024 * 1024, backup_count=5):
+    """配置日志：记录经队列交给后台线程，以JSON Lines写入按大小轮转的日志文件
+
+    重复调用时只更新日志级别。返回日志文件路径，无法创建日志目录时返回None（此时日志被丢弃）。
+    """
+    global _listener
+    logger = get_logger()
+    logger.setLevel(parse_level(level))
+    with _setup_lock:
+        if _listener is not None:
+            return _listener.log_path
+
+        logger.propagate = False
+        log_dir = log_dir or os.path.join(get_app_dir(), "logs")
+        log_path = os.path.join(log_dir, "video_rotator.jsonl")
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+            )
+        except OSError:
+            logger.addHandler(logging.NullHandler())
+            return None
+        file_handler.setFormatter(JsonLinesFormatter())
+
+        log_queue = queue.SimpleQueue()
+        logger.addHandler(_NonBlockingQueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+        _listener.log_path = log_path
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return log_path
+
+
+def setup_logging_from_config(config):
+    """按 ConfigManager 中 advanced 下的日志配置调用 setup_logging"""
+    return setup_logging(
+        level=config.get('advanced.log_level', 'info'),
+        log_dir=config.get('advanced.log_dir') or None,
+        max_bytes=int(config.get('advanced.log_max_mb', 10) * 1024 * 1024),
+        backup_count=config.get('advanced.log_backup_count', 5),
+    )
+
+
+def shutdown_logging():
+    """写完队列中剩余的日志并停止后台线程"""
+    global _listener
+    with _setup_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+class UILogBuffer:
+    """界面日志缓冲：工作线程只向有界队列追加消息，界面线程定时批量取出显示
+
+    消息产生过快时只保留最新的 max_pending 条，被挤掉的条数在下次取出时汇总为一行提示，
+    界面每次最多显示 max_lines 条，不会因日志刷屏而卡顿。
+    """
+
+    def __init__(self, max_pending=2000):
+        self._messages = deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+        self._dropped = 0
+        self._scheduled = False
+
+    def push(self, message):
+        """追加一条消息（任意线程），返回True表示调用方需要安排一次界面刷新"""
+        with self._lock:
+            if len(self._messages) == self._messages.maxlen:
+                self._dropped += 1
+            self._messages.append(message)
+            if self._scheduled:
+                return False
+            self._scheduled = True
+            return True
+
+    def drain(self, max_lines=200):
+        """取出最多max_lines条消息，返回 (消息列表, 被丢弃的条数, 是否还有剩余)；有剩余时调用方应再安排一次刷新"""
+        with self._lock:
+            count = min(max_lines, len(self._messages))
+            lines = [self._messages.popleft() for _ in range(count)]
+            dropped, self._dropped = self._dropped, 0
+            self._scheduled = bool(self._messages)
+            return lines, dropped, self._scheduled
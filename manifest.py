@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+import os
+import sys
+
+# 清单中可用的旋转写法 -> 程序内部的旋转方向
+ROTATION_ALIASES = {
+    "顺时针90度": "顺时针90度", "90": "顺时针90度", "cw": "顺时针90度", "-270": "顺时针90度",
+    "逆时针90度": "逆时针90度", "-90": "逆时针90度", "270": "逆时针90度", "ccw": "逆时针90度",
+    "180度": "180度", "180": "180度", "-180": "180度",
+}
+
+
+def _detect_format(path, first_line):
+    """按扩展名判断清单格式，无法判断时看第一行是否为JSON对象"""
+    extension = os.path.splitext(path)[1].lower() if path else ''
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    return 'jsonl' if first_line.lstrip().startswith('{') else 'csv'
+
+
+def _iter_records(handle, manifest_format):
+    """逐条产出 (行号, 记录字典或错误信息)"""
+    if manifest_format == 'csv':
+        reader = csv.DictReader(handle)
+        for record in reader:
+            yield reader.line_num, {key.strip().lower(): (value or '').strip() for key, value in record.items() if key}
+        return
+
+    for line_number, line in enumerate(handle, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"JSON格式错误: {e}"
+            continue
+        if isinstance(record, str):
+            record = {'input': record}
+        if not isinstance(record, dict):
+            yield line_number, "每行应为JSON对象"
+            continue
+        yield line_number, record
+
+
+def iter_manifest(source, profiles=None, manifest_format=None):
+    """流式读取任务清单（CSV或JSON Lines），逐个产出process_files可用的任务字典
+
+    source 为文件路径、'-'（标准输入）或文本文件对象。每条记录的字段：
+      input（必填，也可写作path）、output、rotation（90/-90/180/cw/ccw 或中文名称）、
+      profile（配置 profiles 中的名称；JSON Lines中也可直接写编码选项对象）
+    相对路径相对于清单所在目录（标准输入时相对于当前目录）。无效记录产出带 error 字段的任务，
+    由批处理计为失败，不会中断后面的任务。
+    """
+    profiles = profiles or {}
+    if hasattr(source, 'read'):
+        handle, path, should_close = source, getattr(source, 'name', None), False
+    elif source == '-':
+        handle, path, should_close = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8'), None, False
+    else:
+        handle, path, should_close = open(source, 'r', encoding='utf-8-sig', newline=''), source, True
+    base_dir = os.path.dirname(os.path.abspath(path)) if isinstance(path, str) and os.path.exists(path) else os.getcwd()
+
+    try:
+        # 读取第一行用于判断格式，再与剩余内容拼接，不需要回退文件位置（标准输入无法回退）
+        first_line = handle.readline()
+        manifest_format = manifest_format or _detect_format(path if isinstance(path, str) else None, first_line)
+        lines = _chain_first_line(first_line, handle)
+
+        for line_number, record in _iter_records(lines, manifest_format):
+            if isinstance(record, str):
+                yield {'input': f"<第{line_number}行>", 'error': record}
+                continue
+            yield _build_job(record, line_number, base_dir, profiles)
+    finally:
+        if should_close:
+            handle.close()
+
+
+def _chain_first_line(first_line, handle):
+    if first_line:
+        yield first_line
+    yield from handle
+
+
+def _build_job(record, line_number, base_dir, profiles):
+    """把一条清单记录转换为任务字典"""
+    input_path = record.get('input') or record.get('path')
+    if not input_path:
+        return {'input': f"<第{line_number}行>", 'error': "缺少input字段"}
+    job = {'input': os.path.normpath(os.path.join(base_dir, os.path.expanduser(str(input_path))))}
+
+    if record.get('output'):
+        job['output'] = os.path.normpath(os.path.join(base_dir, os.path.expanduser(str(record['output']))))
+
+    rotation = record.get('rotation')
+    if rotation not in (None, ''):
+        rotation = ROTATION_ALIASES.get(str(rotation).strip().lower())
+        if rotation is None:
+            job['error'] = f"第{line_number}行: 无效的旋转方向 {record.get('rotation')}"
+            return job
+        job['rotation'] = rotation
+
+    profile = record.get('profile')
+    if isinstance(profile, dict):
+        job['encode_options'] = profile
+    elif profile:
+        if profile not in profiles:
+            job['error'] = f"第{line_number}行: 未定义的配置 {profile}"
+            return job
+        job['encode_options'] = profiles[profile]
+    return job
@@ -0,0 +1,192 @@
+import os
+import shutil
+
+# 尚未实测时使用的保守编码速度（相对实时的倍数，按1080p估计）
+DEFAULT_ENCODER_SPEED = {
+    "无": 1.0,
+    "software": 1.0,
+    "nvenc": 6.0,
+    "qsv": 4.0,
+    "amf": 4.0,
+}
+
+# 预留的磁盘余量，避免把目标磁盘写满
+FREE_SPACE_MARGIN = 0.05
+
+
+def format_duration(seconds):
+    """把秒数格式化为 HH:MM:SS"""
+    if seconds is None:
+        return "--:--:--"
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
+
+
+def format_size(size):
+    """把字节数格式化为易读的大小"""
+    if size is None:
+        return "未知"
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class BatchPlanner:
+    """批量处理的预演规划：探测输入、解析输出路径、检测冲突并估算时间、大小和磁盘空间，不进行任何编码"""
+
+    def __init__(self, processor):
+        self.processor = processor
+
+    def estimate_job(self, input_file, info, hw_accel, encode_options=None, concurrency=1):
+        """估算单个任务的输出大小和编码耗时（耗时按本机历史编码速度预测）"""
+        if not info or not info.get('duration'):
+            try:
+                size = os.path.getsize(input_file)
+            except OSError:
+                size = None
+            return size, None
+
+        duration = info['duration']
+        if info.get('video_bit_rate'):
+            # 视频按源码率重新编码，音频直接复制
+            estimated_size = (info['video_bit_rate'] + (info.get('audio_bit_rate') or 0)) * duration / 8
+        else:
+            estimated_size = info.get('size')
+        limit = self.processor.get_size_limit(input_file, encode_options)
+        if limit and estimated_size:
+            estimated_size = min(estimated_size, limit)
+
+        return estimated_size, self.processor.predict_encode_time(info, hw_accel, encode_options, concurrency)
+
+    def plan(self, files, params):
+        """生成处理计划，params与VideoProcessor.start_processing的参数相同"""
+        hw_accel = params.get('hw_accel', '无')
+        max_concurrent = max(1, int(params.get('concurrent_tasks', 1)))
+
+        # 先并行探测全部输入，下面逐个读取时直接命中缓存
+        from probe_pool import ProbePool
+        infos = ProbePool(self.processor, max_workers=self.processor.probe_workers).run(files)
+
+        jobs = []
+        outputs = {}  # 规范化输出路径 -> (输出路径, 对应的输入文件列表)
+        input_keys = {os.path.normcase(os.path.abspath(f)) for f in files}
+        problems = []
+
+        for input_file, info in zip(files, infos):
+            output_path = self.processor.get_output_path(
+                input_file, params['suffix'], params['output_option'],
+                params['output_dir'], params['create_subdir'], create_dirs=False
+            )
+            estimated_size, estimated_time = self.estimate_job(
+                input_file, info, hw_accel, params.get('encode_options'), max_concurrent
+            )
+            output_key = os.path.normcase(os.path.abspath(output_path))
+
+            job = {
+                'input': input_file,
+                'output': output_path,
+                'duration': info.get('duration') if info else None,
+                'resolution': f"{info['width']}x{info['height']}" if info and info.get('width') else None,
+                'estimated_size': estimated_size,
+                'estimated_time': estimated_time,
+                'issues': [],
+            }
+            if info is None:
+                job['issues'].append("无法探测媒体信息")
+            if output_key in input_keys:
+                job['issues'].append("输出路径与某个输入文件相同")
+            elif os.path.exists(output_path):
+                job['issues'].append("输出文件已存在，将被覆盖")
+            outputs.setdefault(output_key, (output_path, []))[1].append(input_file)
+            jobs.append(job)
+
+        # 不同目录中的同名文件输出到同一目录时会互相覆盖
+        collisions = [
+            {'output': output_path, 'inputs': inputs}
+            for output_path, inputs in outputs.values() if len(inputs) > 1
+        ]
+        for collision in collisions:
+            problems.append(f"输出路径冲突: {collision['output']} <- {len(collision['inputs'])} 个输入")
+
+        disks = self._check_disks(jobs)
+        for disk in disks:
+            if not disk['ok']:
+                problems.append(
+                    f"磁盘空间不足: {disk['path']} 需要 {format_size(disk['required'])}，可用 {format_size(disk['free'])}"
+                )
+
+        known_times = [job['estimated_time'] for job in jobs if job['estimated_time'] is not None]
+        return {
+            'jobs': jobs,
+            'collisions': collisions,
+            'disks': disks,
+            'total_duration': sum(job['duration'] or 0 for job in jobs),
+            'total_size': sum(job['estimated_size'] or 0 for job in jobs),
+            'estimated_time': self._estimate_wall_time(known_times, max_concurrent),
+            'unknown_jobs': len(jobs) - len(known_times),
+            'problems': problems,
+            'ok': not problems,
+        }
+
+    def _estimate_wall_time(self, job_times, max_concurrent):
+        """按最长任务优先分配到并发通道，估算整批的墙钟时间"""
+        lanes = [0.0] * max_concurrent
+        for job_time in sorted(job_times, reverse=True):
+            index = lanes.index(min(lanes))
+            lanes[index] += job_time
+        return max(lanes) if job_times else None
+
+    def _check_disks(self, jobs):
+        """按目标文件系统汇总所需空间并检查剩余空间"""
+        scheduler = self.processor.io_scheduler
+        disks = {}
+        for job in jobs:
+            device = scheduler.get_device(job['output'])
+            disk = disks.setdefault(device, {'path': self._existing_dir(job['output']), 'required': 0})
+            disk['required'] += job['estimated_size'] or 0
+
+        result = []
+        for disk in disks.values():
+            try:
+                free = shutil.disk_usage(disk['path']).free
+            except OSError:
+                free = None
+            disk['free'] = free
+            disk['ok'] = free is None or disk['required'] <= free * (1 - FREE_SPACE_MARGIN)
+            result.append(disk)
+        return result
+
+    def _existing_dir(self, path):
+        """返回路径最近的已存在目录"""
+        directory = os.path.dirname(os.path.abspath(path))
+        while not os.path.isdir(directory):
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                break
+            directory = parent
+        return directory
+
+
+def format_plan(plan, max_jobs=20):
+    """把处理计划格式化为日志行"""
+    lines = [
+        f"📋 处理计划: {len(plan['jobs'])} 个文件，总时长 {format_duration(plan['total_duration'])}，"
+        f"预计输出 {format_size(plan['total_size'])}，预计耗时 {format_duration(plan['estimated_time'])}"
+    ]
+    if plan['unknown_jobs']:
+        lines.append(f"  ⚠️ {plan['unknown_jobs']} 个文件无法估算耗时")
+    for job in plan['jobs'][:max_jobs]:
+        line = (f"  - {os.path.basename(job['input'])} -> {job['output']} "
+                f"({format_size(job['estimated_size'])}, {format_duration(job['estimated_time'])})")
+        if job['issues']:
+            line += f" ⚠️ {'; '.join(job['issues'])}"
+        lines.append(line)
+    if len(plan['jobs']) > max_jobs:
+        lines.append(f"  ... 另有 {len(plan['jobs']) - max_jobs} 个文件")
+    for disk in plan['disks']:
+        lines.append(f"  💾 {disk['path']}: 需要 {format_size(disk['required'])}，可用 {format_size(disk['free'])}")
+    for problem in plan['problems']:
+        lines.append(f"  ❌ {problem}")
+    return lines
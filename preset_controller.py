@@ -0,0 +1,198 @@
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+# 各编码器的预设阶梯：从质量最好（最慢）到最快，数值为相对默认预设的大致编码速度
+PRESET_LADDERS = {
+    "x26x": [("veryslow", 0.25), ("slower", 0.4), ("slow", 0.6), ("medium", 1.0), ("fast", 1.3),
+             ("faster", 1.6), ("veryfast", 2.4), ("superfast", 3.5), ("ultrafast", 5.0)],
+    "nvenc": [("p7", 0.5), ("p6", 0.7), ("p5", 0.85), ("p4", 1.0), ("p3", 1.2), ("p2", 1.4), ("p1", 1.6)],
+    "qsv": [("veryslow", 0.5), ("slower", 0.65), ("slow", 0.8), ("medium", 1.0), ("fast", 1.2),
+            ("faster", 1.4), ("veryfast", 1.7)],
+    "amf": [("quality", 0.7), ("balanced", 1.0), ("speed", 1.4)],
+}
+# 编码器默认使用的预设，控制器从这里开始
+DEFAULT_PRESETS = {"x26x": "medium", "nvenc": "p4", "qsv": "medium", "amf": "balanced"}
+ENCODER_LADDERS = {
+    "libx264": "x26x", "libx265": "x26x",
+    "h264_nvenc": "nvenc", "hevc_nvenc": "nvenc",
+    "h264_qsv": "qsv", "hevc_qsv": "qsv",
+    "h264_amf": "amf", "hevc_amf": "amf",
+}
+ACCEL_LADDERS = {"software": "x26x", "无": "x26x", "nvenc": "nvenc", "qsv": "qsv", "amf": "amf"}
+
+# 预计吞吐量至少比需要的高出该比例才认为能按时完成；换回更慢（质量更好）的预设需要更大的余量，避免来回切换
+HEADROOM = 1.1
+SLOWDOWN_HEADROOM = 1.3
+# 两次调整之间的最短间隔（秒）
+MIN_ADJUST_INTERVAL = 10
+# 实测样本累计达到该编码时长（各任务耗时之和，秒）后才开始调整
+MIN_SAMPLE_SECONDS = 20
+
+
+def preset_params(encoder, preset):
+    """编码器的预设参数：AMF使用 -quality，其他使用 -preset；编码器不支持该预设时返回空列表"""
+    ladder = ENCODER_LADDERS.get(encoder)
+    if not preset or not ladder or preset not in dict(PRESET_LADDERS[ladder]):
+        return []
+    return ["-quality" if ladder == "amf" else "-preset", preset]
+
+
+def parse_deadline(text, now=None):
+    """解析截止时间，返回时间戳：+90m / +2h / +3600（相对现在）、HH:MM（今天，已过则为明天）或ISO日期时间"""
+    now = now or datetime.now()
+    text = text.strip()
+    match = re.fullmatch(r"\+(\d+(?:\.\d+)?)([smh]?)", text)
+    if match:
+        seconds = float(match.group(1)) * {'': 1, 's': 1, 'm': 60, 'h': 3600}[match.group(2)]
+        return (now + timedelta(seconds=seconds)).timestamp()
+    match = re.fullmatch(r"(\d{1,2}):(\d{2})", text)
+    if match:
+        target = now.replace(hour=int(match.group(1)), minute=int(match.group(2)), second=0, microsecond=0)
+        if target <= now:
+            target += timedelta(days=1)
+        return target.timestamp()
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise ValueError(f"无法识别的截止时间: {text}（支持 +90m、+2h、HH:MM 或 ISO 日期时间）")
+
+
+class ThroughputController:
+    """按吞吐量目标调整尚未开始任务的编码预设
+
+    给定截止时间（deadline，时间戳）或目标总速度（target_speed，所有并发任务合计的×实时倍数），
+    根据剩余媒体时长和实测编码速度，选择能按时完成的质量最好（最慢）的预设。
+    实测速度按各任务所用预设的相对速度折算到默认预设，因此不同预设的样本可以合并估计。
+    每次调整及其原因通过 log(消息, 级别) 记录。
+    """
+
+    def __init__(self, hw_accel, concurrency=1, deadline=None, target_speed=None, log=None):
+        self.ladder = PRESET_LADDERS[ACCEL_LADDERS.get(hw_accel, "x26x")]
+        self.factors = dict(self.ladder)
+        self.level = [name for name, _ in self.ladder].index(DEFAULT_PRESETS[ACCEL_LADDERS.get(hw_accel, "x26x")])
+        self.concurrency = max(1, concurrency)
+        self.deadline = deadline
+        self.target_speed = target_speed
+        self.log = log or (lambda message, level=logging.INFO: None)
+        self._lock = threading.Lock()
+        self._durations = {}  # 排队或运行中的任务ID -> 媒体时长（未知为None）
+        self._pending = set()
+        self._running = {}  # 任务ID -> (预设, 开始时间)
+        self._sample_media = 0.0  # 已完成任务：折算到默认预设的媒体时长与实际耗时之和
+        self._sample_time = 0.0
+        self._last_adjust = 0.0
+
+    @property
+    def preset(self):
+        return self.ladder[self.level][0]
+
+    def add_job(self, job_id, duration=None):
+        """登记任务或补充探测到的时长（探测可能在任务开始后才完成）"""
+        with self._lock:
+            if job_id not in self._running:
+                self._pending.add(job_id)
+            if duration or job_id not in self._durations:
+                self._durations[job_id] = duration
+
+    def start_job(self, job_id):
+        """任务开始，返回它使用的预设"""
+        with self._lock:
+            self._pending.discard(job_id)
+            self._durations.setdefault(job_id, None)
+            self._running[job_id] = (self.preset, time.time())
+            return self.preset
+
+    def finish_jobs(self, results):
+        """一组同时开始的任务（单个任务或合并编码的一组短视频）结束，results 为 [(任务ID, 是否成功)]
+
+        成功且时长已知的任务作为速度样本；一组任务共用一个编码进程，耗时只计一次。
+        """
+        now = time.time()
+        with self._lock:
+            media, started = 0.0, None
+            for job_id, success in results:
+                duration = self._durations.pop(job_id, None)
+                state = self._running.pop(job_id, None)
+                self._pending.discard(job_id)
+                if state is None:
+                    continue
+                started = state[1] if started is None else min(started, state[1])
+                if success and duration:
+                    media += duration / self.factors[state[0]]
+            if media and started is not None and now > started:
+                self._sample_media += media
+                self._sample_time += now - started
+
+    def discard_jobs(self, job_ids):
+        """移除已取消的排队任务"""
+        with self._lock:
+            for job_id in job_ids:
+                if job_id in self._pending:
+                    self._pending.discard(job_id)
+                    self._durations.pop(job_id, None)
+
+    def _lane_speed(self, progress, now):
+        """单个任务在默认预设下的实测编码速度（×实时），样本不足时返回None"""
+        media, spent = self._sample_media, self._sample_time
+        for job_id, done_seconds in progress.items():
+            state = self._running.get(job_id)
+            if state is not None and done_seconds > 0:
+                media += done_seconds / self.factors[state[0]]
+                spent += now - state[1]
+        return media / spent if spent >= MIN_SAMPLE_SECONDS else None
+
+    def _remaining_media(self, progress):
+        """剩余的媒体时长（秒）：排队任务的时长 + 运行中任务未编码的部分，时长未知的任务按平均值计"""
+        known = [duration for duration in self._durations.values() if duration]
+        average = sum(known) / len(known) if known else 0.0
+        remaining = 0.0
+        for job_id, duration in self._durations.items():
+            remaining += max((duration or average) - progress.get(job_id, 0.0), 0.0)
+        return remaining
+
+    def update(self, progress, now=None):
+        """按当前进度重新选择预设，只影响之后开始的任务；progress 为运行中任务的 {任务ID: 已编码媒体秒数}"""
+        now = now or time.time()
+        with self._lock:
+            # 预设只影响尚未开始的任务
+            if now - self._last_adjust < MIN_ADJUST_INTERVAL or not self._pending:
+                return None
+            lane_speed = self._lane_speed(progress, now)
+            if not lane_speed:
+                return None
+            remaining = self._remaining_media(progress)
+            if self.target_speed:
+                required = self.target_speed
+                reason = f"目标总速度 {self.target_speed:.1f}x"
+            else:
+                time_left = self.deadline - now
+                if time_left > 0:
+                    required = remaining / time_left
+                    reason = f"剩余媒体时长 {remaining / 60:.1f}分钟，距截止 {time_left / 60:.1f}分钟，需要 {required:.1f}x"
+                else:
+                    required = float('inf')
+                    reason = f"已过截止时间，剩余媒体时长 {remaining / 60:.1f}分钟"
+            lanes = min(self.concurrency, max(len(self._pending) + len(self._running), 1))
+
+            # 能满足需要的最慢预设；当前预设之前的（更慢的）需要更大的余量才换回
+            target = len(self.ladder) - 1
+            for level, (_, factor) in enumerate(self.ladder):
+                headroom = SLOWDOWN_HEADROOM if level < self.level else HEADROOM
+                if lane_speed * factor * lanes >= required * headroom:
+                    target = level
+                    break
+            if target == self.level:
+                return None
+            previous, self.level = self.preset, target
+            self._last_adjust = now
+            expected = lane_speed * self.ladder[target][1] * lanes
+        fits = expected >= required
+        self.log(
+            f"⏱ 编码预设 {previous} → {self.preset}：{reason}，预计 {expected:.1f}x"
+            + ("" if fits else "（最快预设也无法按时完成）"),
+            logging.INFO if fits else logging.WARNING
+        )
+        return self.preset
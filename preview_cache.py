@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+# 生成中的条目目录名后缀
+BUILDING_SUFFIX = ".building"
+# 超过该时间仍未提交的生成目录视为异常退出的遗留
+STALE_BUILD_SECONDS = 3600
+
+
+class PreviewCache:
+    """磁盘上的预览LRU缓存：每个条目一个目录，按最近访问时间淘汰，总大小不超过max_bytes"""
+
+    _lock = threading.Lock()  # 同一进程内的多个实例共享同一缓存目录
+
+    def __init__(self, cache_dir=None, max_bytes=200 * 1024 * 1024):
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "rotate_video_preview")
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, input_file, size, mtime, mode, settings):
+        """根据输入文件指纹和预览设置生成缓存键"""
+        payload = json.dumps([os.path.abspath(input_file), size, mtime, mode, list(settings)], ensure_ascii=False)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        """命中时返回条目中的文件列表并刷新访问时间，未命中返回None"""
+        entry_dir = self._entry_dir(key)
+        manifest = os.path.join(entry_dir, "files.json")
+        try:
+            with open(manifest, 'r', encoding='utf-8') as f:
+                names = json.load(f)
+        except (OSError, ValueError):
+            return None
+        paths = [os.path.join(entry_dir, name) for name in names]
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        now = time.time()
+        os.utime(entry_dir, (now, now))
+        return paths
+
+    def create_entry(self, key):
+        """为一次生成创建独立的临时目录，返回目录路径
+
+        同一键的多次生成各用各的目录，互不删除；提交前目录名带 BUILDING_SUFFIX，不会被命中或淘汰
+        """
+        return tempfile.mkdtemp(prefix=f"{key}.", suffix=BUILDING_SUFFIX, dir=self.cache_dir)
+
+    def commit(self, key, build_dir):
+        """写入清单并把临时目录移到条目位置使其可被命中，然后按LRU淘汰其他条目，返回条目中的文件列表
+
+        同一键已由另一次生成提交时保留已有条目（其文件可能正在被预览），丢弃本次结果
+        """
+        names = sorted(os.listdir(build_dir))
+        with open(os.path.join(build_dir, "files.json"), 'w', encoding='utf-8') as f:
+            json.dump(names, f)
+        entry_dir = self._entry_dir(key)
+        with self._lock:
+            existing = self.get(key)
+            if existing:
+                shutil.rmtree(build_dir, ignore_errors=True)
+            else:
+                shutil.rmtree(entry_dir, ignore_errors=True)  # 文件不完整的旧条目
+                os.replace(build_dir, entry_dir)
+        self.evict(keep=key)
+        return existing or [os.path.join(entry_dir, name) for name in names]
+
+    def discard(self, build_dir):
+        """删除生成失败的临时目录"""
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+    def evict(self, keep=None):
+        """按最近访问时间从旧到新删除条目，直到总大小不超过上限
+
+        keep 指定的条目（刚提交、即将被预览）和生成中的目录不删除；
+        超过 STALE_BUILD_SECONDS 的生成目录是异常退出遗留的，直接删除
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            now = time.time()
+            for name in os.listdir(self.cache_dir):
+                entry_dir = os.path.join(self.cache_dir, name)
+                try:
+                    if not os.path.isdir(entry_dir):
+                        continue
+                    mtime = os.path.getmtime(entry_dir)
+                    if name.endswith(BUILDING_SUFFIX):
+                        if now - mtime > STALE_BUILD_SECONDS:
+                            shutil.rmtree(entry_dir, ignore_errors=True)
+                        continue
+                    size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+                except OSError:
+                    continue  # 其他进程同时删除了该条目
+                total += size
+                if name != keep:
+                    entries.append((mtime, size, entry_dir))
+
+            for _, size, entry_dir in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
@@ -0,0 +1,95 @@
+import os
+import threading
+from collections import deque
+
+
+def default_workers():
+    """默认并行探测数：探测主要耗时在进程启动和读取文件头，可以多于CPU核数"""
+    return min(16, (os.cpu_count() or 4) * 2)
+
+
+class ProbePool:
+    """有界并行探测池：最多max_workers个ffprobe同时运行，结果写入VideoProcessor.media_info_cache
+
+    添加的文件按顺序排队，每个结果通过 on_result(key, path, info) 回调（在工作线程中调用，
+    info为None表示探测失败），submit时也可为这一批单独指定回调。cancel() 清空队列并丢弃正在进行的探测结果。
+    """
+
+    def __init__(self, processor, max_workers=None, on_result=None):
+        self.processor = processor
+        self.max_workers = max_workers or default_workers()
+        self.on_result = on_result
+        self._queue = deque()  # (代数, 键, 路径, 回调)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._workers = 0
+        self._active = 0
+        self._generation = 0
+
+    def submit(self, items, on_result=None):
+        """添加待探测的文件；items为路径或 (键, 路径) 的可迭代对象"""
+        callback = on_result or self.on_result
+        with self._lock:
+            generation = self._generation
+            for item in items:
+                key, path = (item, item) if isinstance(item, str) else item
+                self._queue.append((generation, key, path, callback))
+            # 按需启动工作线程，队列清空后线程自动退出
+            while self._workers < min(self.max_workers, len(self._queue) + self._active):
+                self._workers += 1
+                threading.Thread(target=self._work, daemon=True).start()
+
+    def cancel(self):
+        """取消所有排队和进行中的探测，返回被丢弃的排队数量"""
+        with self._lock:
+            dropped = len(self._queue)
+            self._queue.clear()
+            self._generation += 1
+            self._idle.notify_all()
+        return dropped
+
+    def pending(self):
+        """尚未完成的探测数量"""
+        with self._lock:
+            return len(self._queue) + self._active
+
+    def wait(self, timeout=None):
+        """等待队列中的探测全部完成，超时返回False"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._queue and not self._active, timeout)
+
+    def run(self, paths):
+        """阻塞式探测一组文件，返回与paths顺序对应的媒体信息列表"""
+        results = [None] * len(paths)
+
+        def collect(index, path, info):
+            results[index] = info
+
+        self.submit(enumerate(paths), on_result=collect)
+        self.wait()
+        return results
+
+    def _work(self):
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._workers -= 1
+                    self._idle.notify_all()
+                    return
+                generation, key, path, callback = self._queue.popleft()
+                self._active += 1
+            try:
+                info = self.processor.probe_video(path)
+            except Exception:
+                info = None
+            # 回调完成后才算该项结束，wait() 返回时所有结果都已交付
+            try:
+                if callback and generation == self._generation:
+                    callback(key, path, info)
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    if not self._queue and not self._active:
+                        self._idle.notify_all()
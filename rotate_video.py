@@ -1,15 +1,14 @@
+import time
+
+# 启动计时起点（尽量早记录，用于 --startup-timing 模式）
+STARTUP_T0 = time.perf_counter()
+
 import os
-import re
-import subprocess
 import threading
-import time
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from datetime import datetime, timedelta
-import json
+from datetime import datetime
 import sys
-from pathlib import Path
-import shutil
 
 # 尝试导入拖拽支持库
 try:
@@ -21,73 +20,188 @@ except ImportError:
 
 # 导入新的模块
 from ui_components import VideoRotatorUI
-from video_processor import VideoProcessor
+from video_processor import VideoProcessor, is_video_file, iter_video_files
 from config_manager import ConfigManager
+from probe_pool import ProbePool
+from job_store import JobStore
+from log_sink import UILogBuffer, setup_logging_from_config
+from app_paths import get_app_dir
+
+IMPORTS_DONE = time.perf_counter()
+
+
+def get_startup_timing_path():
+    """解析 --startup-timing[=路径] 参数，未指定时返回None"""
+    for arg in sys.argv[1:]:
+        if arg == '--startup-timing' or arg.startswith('--startup-timing='):
+            path = arg.partition('=')[2]
+            if not path:
+                path = os.path.join(get_app_dir(), 'startup_timing.jsonl')
+            return path
+    return None
+
+
+def get_profile_dir(config_manager):
+    """性能分析报告目录：--profile[=目录] 参数或配置 advanced.profile_ui，未启用时返回None"""
+    for arg in sys.argv[1:]:
+        if arg == '--profile' or arg.startswith('--profile='):
+            return arg.partition('=')[2] or os.path.join(get_app_dir(), 'profiles')
+    if config_manager.get('advanced.profile_ui', False):
+        return os.path.join(get_app_dir(), 'profiles')
+    return None
+
 
 class VideoRotator:
     def __init__(self, root):
         self.root = root
         
         # 初始化变量
-        self.video_files = []
+        self.video_files = JobStore()  # 任务表：路径、状态、媒体信息，任务ID即列表中的序号
+        self.processing_files = None  # 正在处理的任务表（处理中清空列表时批处理继续使用原来的表）
         self.processing = False
         self.stop_requested = False
         self.active_processes = []  # 存储活跃的进程列表
+        self.watch_service = None  # 监视文件夹模式的服务
+        self.exit_code = 0
+        self.startup_marks = {'imports': IMPORTS_DONE - STARTUP_T0}
+        self.startup_timing_path = get_startup_timing_path()
         
         # 初始化配置管理器
         self.config_manager = ConfigManager()
+        setup_logging_from_config(self.config_manager)
+        
+        # 性能分析：统计界面热点路径的调用频率和耗时、主循环延迟，退出时写出报告
+        # （方法需要在被界面和处理器绑定之前替换为计数包装）
+        self.profiler = None
+        profile_dir = get_profile_dir(self.config_manager)
+        if profile_dir:
+            from ui_profiler import UIProfiler
+            self.profiler = UIProfiler(root, profile_dir).start()
+            self.profiler.instrument(
+                self, 'ui_callback', '_flush_log', '_smooth_progress_update', '_flush_probe_results',
+                'refresh_file_list', 'add_videos_from_directory', 'add_files', 'add_folder', 'on_drop'
+            )
+        
+        # 工作线程的日志先进入缓冲，由主线程定时批量显示
+        self.log_buffer = UILogBuffer()
         
         # 初始化视频处理器
         self.video_processor = VideoProcessor(ui_callback=self.ui_callback)
+        self.video_processor.probe_workers = self.config_manager.get('advanced.probe_workers', 0) or None
+        
+        # 添加文件时在后台并行探测媒体信息，结果分批刷新到文件列表
+        self._probe_next = 0  # 小于该ID的任务已提交探测
+        self._probe_generation = 0  # 清空列表时递增，丢弃旧列表的探测结果
+        self._probe_results = []
+        self._probe_flush_scheduled = False
+        self._probe_lock = threading.Lock()
+        self.probe_pool = ProbePool(
+            self.video_processor, max_workers=self.video_processor.probe_workers, on_result=self._on_probe_result
+        )
         
         # 处理命令行参数（拖拽到exe的文件）
         self.process_command_line_args()
         
         # 创建界面
         self.ui = VideoRotatorUI(self.root, self)
-        
-        # 检查FFmpeg是否可用
-        if not self.video_processor.check_ffmpeg():
-            messagebox.showerror("错误", "未找到FFmpeg，请确保已安装FFmpeg并添加到系统PATH中，或将ffmpeg.exe放在程序目录下")
-            sys.exit(1)
+        self.startup_marks['ui_built'] = time.perf_counter() - STARTUP_T0
+        if self.profiler:
+            self.profiler.instrument(self.ui, 'update_file_list', 'update_file_entry', 'refresh_visible_entries', 'log_messages')
             
         # 加载配置
         self.load_config()
+        
+        # 窗口显示后再在后台检测FFmpeg，检测完成前禁用开始按钮
+        self.ffmpeg_ready = False
+        self.ui.start_btn.config(state=tk.DISABLED)
+        self.root.after_idle(self._on_window_shown)
     
-
+    def _on_window_shown(self):
+        """窗口首次空闲时记录启动时间并启动后台检测"""
+        self.startup_marks['window_shown'] = time.perf_counter() - STARTUP_T0
+        
+        if not self.config_manager.get('advanced.check_ffmpeg_on_startup', True):
+            self._on_ffmpeg_checked(True)
+            return
+        
+        self.ui.status_var.set("正在检测FFmpeg...")
+        cache = dict(self.config_manager.get('cache.binaries', {}))
+        
+        def check():
+            available = self.video_processor.check_ffmpeg(cache=cache)
+            self.root.after(0, lambda: self._on_ffmpeg_checked(available, cache))
+        
+        threading.Thread(target=check, daemon=True).start()
+    
+    def _on_ffmpeg_checked(self, available, cache=None):
+        """FFmpeg检测完成后的处理（在主线程中执行）"""
+        self.startup_marks['ffmpeg_checked'] = time.perf_counter() - STARTUP_T0
+        if cache is not None:
+            self.config_manager.set('cache.binaries', cache)
+        
+        if self.startup_timing_path:
+            self._write_startup_timing(available)
+            self.on_close()
+            return
+        
+        if not available:
+            messagebox.showerror("错误", "未找到FFmpeg，请确保已安装FFmpeg并添加到系统PATH中，或将ffmpeg.exe放在程序目录下")
+            self.exit_code = 1
+            self.on_close()
+            return
+        
+        self.ffmpeg_ready = True
+        self.ui.status_var.set("就绪")
+        if not self.processing:
+            self.ui.start_btn.config(state=tk.NORMAL)
+    
+    def _write_startup_timing(self, ffmpeg_available):
+        """启动计时模式：把各阶段耗时追加到JSON-lines文件"""
+        import json
+        
+        record = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'frozen': bool(getattr(sys, 'frozen', False)),
+            'ffmpeg_available': ffmpeg_available,
+        }
+        record.update({f'{name}_ms': round(value * 1000, 1) for name, value in self.startup_marks.items()})
+        try:
+            with open(self.startup_timing_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"写入启动计时失败: {e}")
     
     def process_command_line_args(self):
         """处理命令行参数（拖拽到exe的文件）"""
         if len(sys.argv) > 1:
             for arg in sys.argv[1:]:
+                if arg.startswith('--'):
+                    continue
                 # 规范化路径
                 path = os.path.normpath(os.path.abspath(arg))
                 if os.path.isfile(path):
                     # 检查是否为视频文件
                     if self.is_video_file(path):
-                        self.video_files.append(path)
+                        self.video_files.add(path)
                 elif os.path.isdir(path):
                     # 添加目录中的所有视频文件
                     self.add_videos_from_directory(path)
     
     def is_video_file(self, filepath):
         """检查文件是否为视频文件"""
-        extensions = ('.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm', '.m4v')
-        return filepath.lower().endswith(extensions)
+        return is_video_file(filepath)
     
     def add_videos_from_directory(self, directory):
         """从目录中添加所有视频文件"""
-        for root_dir, _, files in os.walk(directory):
-            for file in files:
-                if self.is_video_file(file):
-                    full_path = os.path.normpath(os.path.join(root_dir, file))
-                    if full_path not in self.video_files:
-                        self.video_files.append(full_path)
+        self.video_files.extend(iter_video_files(directory))
     
     def ui_callback(self, callback_type, data):
         """UI回调函数，用于视频处理器更新界面"""
+        if self.profiler:
+            self.profiler.count(f"ui_callback:{callback_type}")
         if callback_type == 'log':
-            self.ui.log_message(data)
+            if self.log_buffer.push(data):
+                self.root.after(100, self._flush_log)
         elif callback_type == 'status':
             self.ui.status_var.set(data)
         elif callback_type == 'time':
@@ -100,6 +214,16 @@ class VideoRotator:
                 self._smooth_progress_update(self.ui.current_progress_bar, data['current'])
             self.root.update_idletasks()
     
+    def _flush_log(self):
+        """把缓冲的日志一次性显示到日志区（主线程），每次最多200条，其余留到下次"""
+        lines, dropped, more = self.log_buffer.drain(200)
+        if dropped:
+            lines.insert(0, f"…… 日志过多，已省略 {dropped} 条（完整内容见日志文件）")
+        if lines:
+            self.ui.log_messages(lines)
+        if more:
+            self.root.after(100, self._flush_log)
+    
     def _smooth_progress_update(self, progress_bar, target_value):
         """平滑更新进度条"""
         current_value = progress_bar['value']
@@ -131,12 +255,12 @@ class VideoRotator:
             # 规范化路径
             path = os.path.normpath(os.path.abspath(file_path))
             if os.path.isfile(path):
-                if self.is_video_file(path) and path not in self.video_files:
-                    self.video_files.append(path)
+                if self.is_video_file(path):
+                    self.video_files.add(path)
             elif os.path.isdir(path):
                 self.add_videos_from_directory(path)
         
-        self.ui.update_file_list(self.video_files)
+        self.refresh_file_list()
         return 'break'
     
 
@@ -152,21 +276,69 @@ class VideoRotator:
             filetypes=[("视频文件", "*.mp4 *.avi *.mov *.mkv *.flv *.wmv *.webm *.m4v"), ("所有文件", "*.*")]
         )
         if files:
-            self.video_files.extend(files)
-            self.ui.update_file_list(self.video_files)
+            self.video_files.extend(os.path.normpath(f) for f in files)
+            self.refresh_file_list()
     
     def add_folder(self):
         """添加文件夹中的所有视频文件到列表"""
         folder = filedialog.askdirectory(title="选择包含视频文件的文件夹")
         if folder:
             self.add_videos_from_directory(folder)
-            self.ui.update_file_list(self.video_files)
+            self.refresh_file_list()
     
     def clear_list(self):
-        """清空文件列表"""
-        self.video_files = []
+        """清空文件列表，并取消尚未完成的媒体信息探测
+        
+        换用新的任务表而不是原地清空：处理中的批次仍持有原来的表，任务ID不会指向新列表中的文件
+        """
+        self.probe_pool.cancel()
+        self.video_files = JobStore()
+        self._probe_next = 0
+        with self._probe_lock:
+            self._probe_generation += 1
+            self._probe_results = []
         self.ui.update_file_list(self.video_files)
     
+    def refresh_file_list(self):
+        """刷新文件列表显示，并为新加入的文件提交后台探测"""
+        self.ui.update_file_list(self.video_files)
+        if self._probe_next < len(self.video_files):
+            generation, start = self._probe_generation, self._probe_next
+            self._probe_next = len(self.video_files)
+            self.probe_pool.submit([((generation, job_id), self.video_files.path(job_id))
+                                    for job_id in range(start, self._probe_next)])
+    
+    def _on_probe_result(self, key, path, info):
+        """探测结果回调（工作线程），攒批后由主线程统一刷新"""
+        with self._probe_lock:
+            if key[0] != self._probe_generation:
+                return  # 列表已被清空
+            self._probe_results.append((key[1], info))
+            if self._probe_flush_scheduled:
+                return
+            self._probe_flush_scheduled = True
+        self.root.after(100, self._flush_probe_results)
+    
+    def _flush_probe_results(self):
+        """把已到达的探测结果刷新到文件列表（主线程）"""
+        with self._probe_lock:
+            self._probe_flush_scheduled = False
+            results, self._probe_results = self._probe_results, []
+        if not results:
+            return
+        
+        for job_id, info in results:
+            self.video_files.set_info(job_id, info)
+            self.ui.update_file_entry(job_id, self.video_files.path(job_id), self.video_files.info(job_id),
+                                      self.video_files.state_name(job_id))
+        
+        remaining = self.probe_pool.pending()
+        if not self.processing:
+            if remaining:
+                self.ui.status_var.set(f"正在读取媒体信息: 已完成 {self.video_files.probed_count()} 个，剩余 {remaining} 个")
+            elif self.ffmpeg_ready:
+                self.ui.status_var.set("就绪")
+    
 
     
     def get_hw_accel_params(self):
@@ -184,25 +356,127 @@ class VideoRotator:
     
 
     
-    def start_processing(self):
-        """开始处理视频"""
+    def preview_selected(self):
+        """预览选中文件（未选中时为第一个文件）的旋转效果，在后台生成，不占用批处理线程池"""
         if not self.video_files:
             messagebox.showwarning("警告", "请先添加视频文件")
             return
         
-        # 保存当前设置
-        self.save_current_settings()
+        from preview_cache import PreviewCache
         
-        # 准备处理参数
-        processing_params = {
+        index = self.ui.get_selected_index() or 0
+        file_path = self.video_files[index]
+        rotation = self.ui.rotation_var.get()
+        hw_accel = self.ui.hw_accel_var.get()
+        mode = self.config_manager.get('advanced.preview_mode', 'frames')
+        cache = PreviewCache(max_bytes=self.config_manager.get('advanced.preview_cache_mb', 200) * 1024 * 1024)
+        self.ui.status_var.set(f"正在生成预览: {os.path.basename(file_path)}")
+        
+        def run_preview():
+            outputs, error = self.video_processor.generate_preview(file_path, rotation, hw_accel, mode=mode, cache=cache)
+            self.root.after(0, lambda: self._show_preview(file_path, mode, outputs, error))
+        
+        threading.Thread(target=run_preview, daemon=True).start()
+    
+    def _show_preview(self, file_path, mode, outputs, error):
+        """显示预览结果（在主线程中执行）"""
+        self.ui.status_var.set("就绪" if not self.processing else self.ui.status_var.get())
+        if error:
+            self.ui.log_message(f"❌ 预览失败: {os.path.basename(file_path)} - {error}")
+            return
+        if mode == "clip":
+            # 预览片段交给系统默认播放器打开
+            self.ui.log_message(f"👁 预览片段: {outputs[0]}")
+            if os.name == 'nt':
+                os.startfile(outputs[0])
+            else:
+                import subprocess
+                subprocess.Popen(['open' if sys.platform == 'darwin' else 'xdg-open', outputs[0]])
+        else:
+            self.ui.show_preview(f"预览 - {os.path.basename(file_path)}", outputs)
+    
+    def get_processing_params(self):
+        """根据界面设置准备处理参数"""
+        # 自动模式下 get_concurrency 会读取校准结果并统计已探测文件的分辨率，只调用一次
+        concurrency, threads = self.get_concurrency()
+        return {
             'rotation': self.ui.rotation_var.get(),
             'suffix': self.ui.suffix_var.get(),
             'output_option': self.ui.output_option_var.get(),
             'output_dir': self.ui.output_dir_var.get(),
             'create_subdir': self.ui.create_subdir_var.get(),
             'hw_accel': self.ui.hw_accel_var.get(),
-            'concurrent_tasks': self.ui.concurrent_tasks_var.get()
+            'concurrent_tasks': concurrency,
+            'io_per_device': self.config_manager.get('processing.max_io_per_device', 2),
+            'staging': self.get_staging_options(),
+            'encode_options': self.get_encode_options(threads)
         }
+    
+    def get_concurrency(self):
+        """(并发任务数, 每任务线程数)；自动模式下按本机校准结果和已探测文件的典型分辨率选择"""
+        if not self.ui.concurrent_auto_var.get():
+            return self.ui.concurrent_tasks_var.get(), None
+        from calibration import resolve_auto
+        sizes = sorted(self.video_files.pixel_counts())
+        concurrency, threads, _ = resolve_auto(
+            self.config_manager, self.ui.hw_accel_var.get(), sizes[len(sizes) // 2] if sizes else None
+        )
+        return concurrency, threads
+    
+    def get_encode_options(self, encoder_threads=None):
+        """获取编码相关选项，encoder_threads 为 get_concurrency 得到的每任务线程数"""
+        return {
+            'container_mode': self.ui.container_mode_var.get(),
+            'codec_policy': self.ui.codec_policy_var.get(),
+            'max_size_growth_percent': self.config_manager.get('processing.max_size_growth_percent'),
+            'engine': self.config_manager.get('processing.engine', 'auto'),
+            'inprocess_max_seconds': self.config_manager.get('processing.inprocess_max_seconds', 15),
+            'verify_output': self.config_manager.get('processing.verify_output', True),
+            'encoder_threads': encoder_threads,
+            'checkpoint_min_seconds': self.config_manager.get('processing.checkpoint_min_seconds', 1800),
+            'checkpoint_segment_seconds': self.config_manager.get('processing.checkpoint_segment_seconds', 60),
+            'batch_clip_seconds': self.config_manager.get('processing.batch_clip_seconds', 10),
+            'batch_max_seconds': self.config_manager.get('processing.batch_max_seconds', 120),
+            'batch_max_files': self.config_manager.get('processing.batch_max_files', 16),
+            'target_speed': self.config_manager.get('processing.target_speed')
+        }
+    
+    def plan_processing(self):
+        """预估处理计划（后台探测，不进行编码）"""
+        if not self.video_files:
+            messagebox.showwarning("警告", "请先添加视频文件")
+            return
+        
+        from planner import BatchPlanner, format_plan
+        
+        # 直接遍历任务表，不复制出路径列表；清空列表会换用新表，不影响正在预估的这一份
+        files = self.video_files
+        params = self.get_processing_params()
+        self.ui.log_message(f"📋 正在预估 {len(files)} 个文件的处理计划...")
+        
+        def run_plan():
+            plan = BatchPlanner(self.video_processor).plan(files, params)
+            
+            def show_plan():
+                for line in format_plan(plan):
+                    self.ui.log_message(line)
+                if not plan['ok']:
+                    messagebox.showwarning("处理计划", "\n".join(plan['problems'][:10]))
+            self.root.after(0, show_plan)
+        
+        threading.Thread(target=run_plan, daemon=True).start()
+    
+    def start_processing(self):
+        """开始处理视频"""
+        if not self.video_files:
+            messagebox.showwarning("警告", "请先添加视频文件")
+            return
+        
+        # 保存当前设置
+        self.save_current_settings()
+        
+        # 准备处理参数
+        processing_params = self.get_processing_params()
         
         # 检查输出目录（除了源文件目录选项）
         option = self.ui.output_option_var.get()
@@ -231,29 +505,51 @@ class VideoRotator:
         
         # 更新界面状态
         self.processing = True
+        self.processing_files = self.video_files
         self.stop_requested = False
         self.ui.start_btn.config(state=tk.DISABLED)
         self.ui.stop_btn.config(state=tk.NORMAL)
         self.ui.overall_progress_bar.config(value=0)
         self.ui.current_progress_bar.config(value=0)
         
-        # 在新线程中开始处理
-        processing_thread = threading.Thread(target=self._process_videos_thread, args=(processing_params,))
+        # 在新线程中开始处理（处理中添加的文件留到下一批）
+        processing_thread = threading.Thread(target=self._process_videos_thread, args=(self.processing_files, processing_params))
         processing_thread.daemon = True
         processing_thread.start()
+        self.root.after(500, self._refresh_job_states)
+    
+    def _refresh_job_states(self):
+        """处理中定时把任务表中的状态刷新到文件列表的可见行（主线程）"""
+        if self.processing_files is not None and self.processing_files is self.video_files:
+            self.ui.refresh_visible_entries(self.video_files)
+        if self.processing:
+            self.root.after(500, self._refresh_job_states)
+    
+    def get_staging_options(self):
+        """获取本地暂存选项，未启用时返回None"""
+        if not self.config_manager.get('processing.staging_enabled', False):
+            return None
+        return {
+            'scratch_dir': self.config_manager.get('processing.staging_dir', ''),
+            'budget_mb': self.config_manager.get('processing.staging_budget_mb', 10240),
+            'prefetch_count': self.config_manager.get('processing.staging_prefetch_count', 2)
+        }
     
-    def _process_videos_thread(self, processing_params):
+    def _process_videos_thread(self, files, processing_params):
         """处理视频的线程函数"""
         try:
-            self.video_processor.start_processing(self.video_files, processing_params)
+            self.video_processor.start_processing(files, processing_params)
         finally:
             # 恢复UI状态
             self.root.after(0, self._restore_ui_state)
     
     def _restore_ui_state(self):
         """恢复UI状态"""
+        if self.processing_files is not None and self.processing_files is self.video_files:
+            self.ui.refresh_visible_entries(self.video_files)
         self.processing = False
-        self.ui.start_btn.config(state=tk.NORMAL)
+        self.processing_files = None
+        self.ui.start_btn.config(state=tk.NORMAL if self.ffmpeg_ready else tk.DISABLED)
         self.ui.stop_btn.config(state=tk.DISABLED)
     
     def save_current_settings(self):
@@ -265,17 +561,82 @@ class VideoRotator:
             'default_output_dir': self.ui.output_dir_var.get(),
             'create_subdir': self.ui.create_subdir_var.get(),
             'hardware_acceleration': self.ui.hw_accel_var.get(),
-            'max_concurrent_tasks': self.ui.concurrent_tasks_var.get()
+            'max_concurrent_tasks': 'auto' if self.ui.concurrent_auto_var.get() else self.ui.concurrent_tasks_var.get(),
+            'container_mode': self.ui.container_mode_var.get(),
+            'codec_policy': self.ui.codec_policy_var.get()
         }
         
         self.config_manager.update_processing_config(settings)
     
+    def toggle_watch(self):
+        """开始或停止监视文件夹模式"""
+        if self.watch_service:
+            service, self.watch_service = self.watch_service, None
+            self.ui.watch_btn.config(text="👀 监视文件夹")
+            # 停止时需要等待正在处理的任务结束，放到后台避免阻塞界面
+            threading.Thread(target=service.stop, daemon=True).start()
+            self._restore_ui_state()
+            return
+        
+        if self.processing:
+            messagebox.showwarning("警告", "请先停止当前的批量处理")
+            return
+        folder = filedialog.askdirectory(title="选择要监视的文件夹")
+        if not folder:
+            return
+        
+        from watcher import WatchService
+        
+        self.save_current_settings()
+        try:
+            self.watch_service = WatchService(
+                self.video_processor, folder, self.get_processing_params(),
+                stable_seconds=self.config_manager.get('watch.stable_seconds', 5),
+                poll_interval=self.config_manager.get('watch.poll_interval', 1.0),
+                on_complete=self.config_manager.get('watch.on_complete', 'move'),
+                done_dir=self.config_manager.get('watch.done_dir', '_done'),
+                failed_dir=self.config_manager.get('watch.failed_dir', '_failed'),
+            )
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        self.watch_service.start()
+        self.processing = True
+        self.ui.watch_btn.config(text="⏹ 停止监视")
+        self.ui.start_btn.config(state=tk.DISABLED)
+    
+    def control_selected_jobs(self, action):
+        """对选中的任务执行控制操作（任务ID即文件在列表中的索引）"""
+        # 处理开始后清空过列表时，列表中的序号不再对应正在处理的任务
+        if not self.processing or self.video_files is not self.processing_files:
+            return
+        handlers = {
+            'prioritize': (self.video_processor.prioritize_job, "优先处理"),
+            'pause': (self.video_processor.pause_job, "暂停"),
+            'resume': (self.video_processor.resume_job, "继续"),
+            'cancel': (self.video_processor.cancel_job, "取消"),
+        }
+        handler, label = handlers[action]
+        # 优先处理时倒序移动到队首，保持选中项之间的相对顺序
+        indices = self.ui.get_selected_indices()
+        for job_id in (reversed(indices) if action == 'prioritize' else indices):
+            if handler(job_id):
+                self.ui.log_message(f"{label}: {os.path.basename(self.video_files[job_id])}")
+    
+    def cancel_pending_jobs(self):
+        """取消所有尚未开始的任务"""
+        if self.processing:
+            count = self.video_processor.cancel_pending()
+            self.ui.log_message(f"⏹ 已取消 {count} 个排队中的任务")
+    
     def stop_processing(self):
         """停止处理"""
         self.stop_requested = True
-        self.video_processor.stop_processing()
+        # 终止FFmpeg最多等待数秒，在后台线程中进行，界面保持响应
+        threading.Thread(target=self.video_processor.stop_processing, daemon=True).start()
         self.ui.log_message("用户请求停止处理...")
-        self._restore_ui_state()
+        # 批次真正结束后由处理线程恢复界面（_restore_ui_state），此前不能开始新的批次
+        self.ui.stop_btn.config(state=tk.DISABLED)
     
 
     
@@ -302,15 +663,34 @@ class VideoRotator:
         self.ui.output_dir_var.set(processing_config.get('default_output_dir', os.path.expanduser('~/Desktop')))
         self.ui.create_subdir_var.set(processing_config.get('create_subdir', False))
         self.ui.hw_accel_var.set(processing_config.get('hardware_acceleration', '无'))
-        self.ui.concurrent_tasks_var.set(processing_config.get('max_concurrent_tasks', 1))
+        max_tasks = processing_config.get('max_concurrent_tasks', 1)
+        self.ui.concurrent_auto_var.set(max_tasks == 'auto')
+        if max_tasks != 'auto':
+            self.ui.concurrent_tasks_var.set(max_tasks)
+        self.ui.on_concurrent_changed()
+        self.ui.container_mode_var.set(processing_config.get('container_mode', 'default'))
+        self.ui.codec_policy_var.set(processing_config.get('codec_policy', 'h264'))
         
         # 更新界面状态
         self.ui.on_output_option_changed()
-        self.ui.on_concurrent_changed()
     
     def save_config(self):
         """保存配置"""
         self.save_current_settings()
+    
+    def on_close(self):
+        """关闭窗口：停止处理并把尚未写入的配置落盘"""
+        if self.watch_service:
+            self.watch_service.watcher.stop()
+        if self.processing:
+            self.video_processor.stop_processing()
+        self.save_current_settings()
+        self.config_manager.flush()
+        if self.profiler:
+            report = self.profiler.stop()
+            if report:
+                print(f"性能分析报告: {report}")
+        self.root.destroy()
 
 def main():
     """主函数"""
@@ -320,12 +700,14 @@ def main():
         root = tk.Tk()
     
     app = VideoRotator(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
     
     # 如果有命令行参数传入的文件，更新文件列表显示
     if app.video_files:
-        app.update_file_list()
+        app.refresh_file_list()
     
     root.mainloop()
+    sys.exit(app.exit_code)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
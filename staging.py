@@ -0,0 +1,295 @@
+import atexit
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from log_sink import get_logger
+
+# 复制文件时的分块大小，分块复制便于在停止时及时中断
+COPY_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def _pid_alive(pid):
+    """判断进程是否仍在运行（用于识别崩溃后遗留的暂存目录）"""
+    if pid <= 0:
+        return False
+    if os.name == 'nt':
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        handle = ctypes.windll.kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class StagingManager:
+    """本地暂存管线：后台预取即将处理的输入到本地暂存目录，输出先写入暂存目录再异步移动到目标位置"""
+
+    def __init__(self, scratch_root=None, budget_bytes=10 * 1024 ** 3, prefetch_count=2, ui_callback=None):
+        self.scratch_root = scratch_root or os.path.join(tempfile.gettempdir(), "rotate_video_staging")
+        self.budget_bytes = budget_bytes
+        self.prefetch_count = prefetch_count
+        self.ui_callback = ui_callback
+        self.session_dir = None
+
+        self._lock = threading.Condition()
+        self._entries = OrderedDict()  # 源路径 -> 暂存条目，按预取顺序排列（用于淘汰）
+        self._wanted = []  # 当前需要预取的源路径
+        self._used_bytes = 0  # 已占用（含预留）的暂存空间
+        self._output_reservations = {}  # 暂存输出路径 -> 预留的空间
+        self._counter = 0
+        self._copy_event = threading.Event()
+        self._move_queue = queue.Queue()
+        self._move_failures = []
+        self._prefetch_stopped = False  # 停止处理时置位：中断复制，等待中的 get_input 立即返回
+        self._closed = False
+        self._threads = []
+
+    def start(self):
+        """创建本次会话的暂存目录并启动后台复制/移动线程"""
+        self._cleanup_stale_sessions()
+        self.session_dir = os.path.join(self.scratch_root, f"session_{os.getpid()}_{int(time.time())}")
+        os.makedirs(os.path.join(self.session_dir, "in"), exist_ok=True)
+        os.makedirs(os.path.join(self.session_dir, "out"), exist_ok=True)
+        with open(os.path.join(self.session_dir, "owner.pid"), 'w') as f:
+            f.write(str(os.getpid()))
+
+        for target in (self._copy_worker, self._move_worker):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        # 正常退出时清理；崩溃遗留的目录在下次启动时清理
+        atexit.register(self.close)
+        return self
+
+    def _cleanup_stale_sessions(self):
+        """清理所属进程已不存在的遗留暂存目录"""
+        if not os.path.isdir(self.scratch_root):
+            return
+        for name in os.listdir(self.scratch_root):
+            session = os.path.join(self.scratch_root, name)
+            if not name.startswith("session_") or not os.path.isdir(session):
+                continue
+            try:
+                with open(os.path.join(session, "owner.pid"), 'r') as f:
+                    pid = int(f.read().strip() or 0)
+            except (OSError, ValueError):
+                pid = 0
+            if not _pid_alive(pid):
+                shutil.rmtree(session, ignore_errors=True)
+
+    def _log(self, message, level=logging.WARNING):
+        get_logger("staging").log(level, message, extra={'stage': "staging"})
+        if self.ui_callback:
+            self.ui_callback('log', message)
+
+    def prefetch(self, paths):
+        """设置接下来需要预取的输入（只取前prefetch_count个），不在列表中的空闲暂存条目可被淘汰"""
+        with self._lock:
+            self._wanted = list(paths)[:self.prefetch_count]
+        self._copy_event.set()
+
+    def _reserve(self, size):
+        """在预算内预留空间，不足时按最早预取的顺序淘汰不再需要的空闲条目"""
+        if size > self.budget_bytes:
+            return False
+        if self._used_bytes + size > self.budget_bytes:
+            for source, entry in list(self._entries.items()):
+                if self._used_bytes + size <= self.budget_bytes:
+                    break
+                if entry['state'] == 'ready' and not entry['in_use'] and source not in self._wanted:
+                    self._drop_entry(source)
+        if self._used_bytes + size > self.budget_bytes:
+            return False
+        self._used_bytes += size
+        return True
+
+    def _drop_entry(self, source):
+        """删除暂存条目并归还空间（调用方需持有锁）"""
+        entry = self._entries.pop(source, None)
+        if entry is None:
+            return
+        self._used_bytes -= entry['size']
+        try:
+            os.remove(entry['path'])
+        except OSError:
+            pass
+
+    def _copy_worker(self):
+        """后台复制线程：依次把需要的输入复制到暂存目录"""
+        while not self._prefetch_stopped:
+            self._copy_event.wait(timeout=1)
+            self._copy_event.clear()
+
+            while not self._prefetch_stopped:
+                with self._lock:
+                    source = next((p for p in self._wanted if p not in self._entries), None)
+                    if source is None:
+                        break
+                    try:
+                        size = os.path.getsize(source)
+                    except OSError:
+                        self._wanted.remove(source)
+                        continue
+                    if not self._reserve(size):
+                        # 空间不足时该文件直接从原位置读取
+                        self._wanted.remove(source)
+                        continue
+                    self._counter += 1
+                    staged_dir = os.path.join(self.session_dir, "in", str(self._counter))
+                    entry = {
+                        'path': os.path.join(staged_dir, os.path.basename(source)),
+                        'size': size,
+                        'state': 'copying',
+                        'in_use': False,
+                    }
+                    self._entries[source] = entry
+
+                try:
+                    os.makedirs(staged_dir, exist_ok=True)
+                    self._copy_file(source, entry['path'])
+                    state = 'ready'
+                except Exception as e:
+                    self._log(f"⚠️ 预取失败，将直接读取源文件: {os.path.basename(source)} - {e}")
+                    state = 'failed'
+
+                with self._lock:
+                    if state == 'failed' or self._prefetch_stopped:
+                        self._drop_entry(source)
+                        if source in self._wanted:
+                            self._wanted.remove(source)
+                    else:
+                        entry['state'] = state
+                    self._lock.notify_all()
+
+    def _copy_file(self, source, destination):
+        """分块复制文件，关闭时中断"""
+        with open(source, 'rb') as src, open(destination, 'wb') as dst:
+            while True:
+                if self._prefetch_stopped:
+                    raise RuntimeError("暂存已关闭")
+                chunk = src.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                dst.write(chunk)
+        shutil.copystat(source, destination)
+
+    def get_input(self, source):
+        """获取用于编码的输入路径：已预取则返回暂存路径，正在复制则等待完成，否则返回原路径"""
+        with self._lock:
+            entry = self._entries.get(source)
+            while entry is not None and entry['state'] == 'copying' and not self._prefetch_stopped:
+                self._lock.wait(timeout=0.5)
+                entry = self._entries.get(source)
+            if entry is None or entry['state'] != 'ready':
+                if source in self._wanted:
+                    self._wanted.remove(source)
+                return source
+            entry['in_use'] = True
+            return entry['path']
+
+    def release_input(self, source):
+        """输入使用完毕，立即删除暂存副本"""
+        with self._lock:
+            self._drop_entry(source)
+            if source in self._wanted:
+                self._wanted.remove(source)
+        self._copy_event.set()
+
+    def get_output_path(self, final_path, estimated_size=0):
+        """为最终输出路径分配暂存输出路径，预算不足时直接返回最终路径"""
+        with self._lock:
+            if not self._reserve(estimated_size):
+                return final_path
+            self._counter += 1
+            staged_dir = os.path.join(self.session_dir, "out", str(self._counter))
+            staged_path = os.path.join(staged_dir, os.path.basename(final_path))
+            self._output_reservations[staged_path] = estimated_size
+        os.makedirs(staged_dir, exist_ok=True)
+        return staged_path
+
+    def _release_output(self, staged_path):
+        """归还暂存输出预留的空间"""
+        with self._lock:
+            self._used_bytes -= self._output_reservations.pop(staged_path, 0)
+        self._copy_event.set()
+
+    def commit_output(self, staged_path, final_path):
+        """异步把暂存输出移动到最终位置"""
+        if staged_path == final_path:
+            return
+        self._move_queue.put((staged_path, final_path))
+
+    def discard_output(self, staged_path):
+        """丢弃失败任务的暂存输出"""
+        if staged_path not in self._output_reservations:
+            return
+        try:
+            os.remove(staged_path)
+        except OSError:
+            pass
+        self._release_output(staged_path)
+
+    def _move_worker(self):
+        """后台移动线程：把完成的输出移动到最终位置"""
+        while True:
+            item = self._move_queue.get()
+            if item is None:
+                self._move_queue.task_done()
+                break
+            staged_path, final_path = item
+            try:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                shutil.move(staged_path, final_path)
+            except Exception as e:
+                self._move_failures.append((final_path, f"移动输出文件失败: {e}"))
+                self._log(f"❌ 移动输出文件失败: {os.path.basename(final_path)} - {e}", level=logging.ERROR)
+            finally:
+                self._release_output(staged_path)
+                self._move_queue.task_done()
+
+    def flush(self):
+        """等待所有输出移动完成，返回移动失败的(最终路径, 错误)列表"""
+        self._move_queue.join()
+        failures, self._move_failures = self._move_failures, []
+        return failures
+
+    def stop_prefetch(self):
+        """停止预取：中断正在进行的复制，等待复制完成的 get_input 立即返回源路径；
+        已提交的输出照常移动，停止处理时先调用它释放工作线程，再由 flush()/close() 收尾
+        """
+        with self._lock:
+            self._prefetch_stopped = True
+            self._wanted = []
+            self._lock.notify_all()
+        self._copy_event.set()
+
+    def close(self):
+        """停止后台线程并删除本次会话的暂存目录"""
+        if self._closed:
+            return
+        self._closed = True
+        self.stop_prefetch()
+        self._move_queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        if self.session_dir:
+            shutil.rmtree(self.session_dir, ignore_errors=True)
+        try:
+            atexit.unregister(self.close)
+        except Exception:
+            pass
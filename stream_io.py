@@ -0,0 +1,179 @@
+import os
+import sys
+from urllib.parse import urlsplit
+
+# 每次在流之间搬运的数据块大小；管道两端各只缓冲一个块，内存占用与文件大小无关
+CHUNK_SIZE = 256 * 1024
+
+
+class ByteSource:
+    """输入字节流适配器基类"""
+
+    # 可直接交给FFmpeg读取的本地路径（可随机访问），None表示需要通过管道输入
+    path = None
+
+    def read(self, size):
+        """读取最多size字节，流结束时返回空字节串"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ByteSink:
+    """输出字节流适配器基类"""
+
+    def write(self, data):
+        raise NotImplementedError
+
+    def close(self):
+        """正常结束，提交全部数据"""
+        pass
+
+    def abort(self):
+        """处理失败时调用，丢弃已写入的数据"""
+        self.close()
+
+
+class FileSource(ByteSource):
+    """本地文件输入，FFmpeg直接按路径读取（保留随机访问能力，支持moov在末尾的MP4）"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def read(self, size):
+        if self._file is None:
+            self._file = open(self.path, 'rb')
+        return self._file.read(size)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+
+class FileSink(ByteSink):
+    """本地文件输出：先写临时文件，成功后再重命名，失败时不留下残缺文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self._temp_path = f"{path}.part"
+        self._file = open(self._temp_path, 'wb')
+
+    def write(self, data):
+        self._file.write(data)
+
+    def close(self):
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+
+class FileObjSource(ByteSource):
+    """任意可读的Python文件对象（如 sys.stdin.buffer、io.BytesIO、网络响应）"""
+
+    def __init__(self, fileobj, close_after=False):
+        self.fileobj = fileobj
+        self.close_after = close_after
+
+    def read(self, size):
+        return self.fileobj.read(size) or b''
+
+    def close(self):
+        if self.close_after:
+            self.fileobj.close()
+
+
+class FileObjSink(ByteSink):
+    """任意可写的Python文件对象"""
+
+    def __init__(self, fileobj, close_after=False):
+        self.fileobj = fileobj
+        self.close_after = close_after
+
+    def write(self, data):
+        self.fileobj.write(data)
+
+    def close(self):
+        if hasattr(self.fileobj, 'flush'):
+            self.fileobj.flush()
+        if self.close_after:
+            self.fileobj.close()
+
+
+class HTTPSource(FileObjSource):
+    """HTTP(S) GET流式读取，适用于对象存储的预签名URL或任何HTTP文件服务"""
+
+    def __init__(self, url, headers=None, timeout=60):
+        from urllib.request import Request, urlopen
+
+        self.url = url
+        response = urlopen(Request(url, headers=headers or {}), timeout=timeout)
+        super().__init__(response, close_after=True)
+
+
+class HTTPSink(ByteSink):
+    """HTTP(S) 分块传输上传（默认PUT），边编码边上传，无需知道总大小"""
+
+    def __init__(self, url, method='PUT', headers=None, content_type='video/mp4', timeout=60):
+        import http.client
+
+        parts = urlsplit(url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.url = url
+        self._connection = connection_class(parts.netloc, timeout=timeout)
+        target = parts.path or '/'
+        if parts.query:
+            target += f"?{parts.query}"
+        self._connection.putrequest(method, target)
+        self._connection.putheader('Content-Type', content_type)
+        self._connection.putheader('Transfer-Encoding', 'chunked')
+        for name, value in (headers or {}).items():
+            self._connection.putheader(name, value)
+        self._connection.endheaders()
+
+    def write(self, data):
+        if data:
+            self._connection.send(b"%X\r\n%s\r\n" % (len(data), data))
+
+    def close(self):
+        self._connection.send(b"0\r\n\r\n")
+        response = self._connection.getresponse()
+        body = response.read()
+        self._connection.close()
+        if response.status >= 300:
+            raise IOError(f"上传失败: HTTP {response.status} {body[:200]!r}")
+
+    def abort(self):
+        # 不发送结束块直接断开，服务端会丢弃不完整的上传
+        self._connection.close()
+
+
+def open_source(spec):
+    """根据描述创建输入适配器：'-' 为标准输入，http(s):// 为HTTP，其他字符串为本地路径，也可直接传入文件对象"""
+    if isinstance(spec, ByteSource):
+        return spec
+    if hasattr(spec, 'read'):
+        return FileObjSource(spec)
+    if spec == '-':
+        return FileObjSource(sys.stdin.buffer)
+    if urlsplit(spec).scheme in ('http', 'https'):
+        return HTTPSource(spec)
+    return FileSource(spec)
+
+
+def open_sink(spec, content_type='video/mp4'):
+    """根据描述创建输出适配器：'-' 为标准输出，http(s):// 为HTTP上传，其他字符串为本地路径，也可直接传入文件对象"""
+    if isinstance(spec, ByteSink):
+        return spec
+    if hasattr(spec, 'write'):
+        return FileObjSink(spec)
+    if spec == '-':
+        return FileObjSink(sys.stdout.buffer)
+    if urlsplit(spec).scheme in ('http', 'https'):
+        return HTTPSink(spec, content_type=content_type)
+    return FileSink(spec)
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+import fake_ffmpeg  # noqa: E402
+from eta_model import EncodeHistory  # noqa: E402
+from video_processor import VideoProcessor  # noqa: E402
+
+
+@pytest.fixture
+def fake_env(tmp_path, monkeypatch):
+    """安装模拟FFmpeg/FFprobe（tools/fake_ffmpeg.py），默认立即完成、不出错，返回 (ffmpeg路径, ffprobe路径)"""
+    for name in list(os.environ):
+        if name.startswith(('FAKE_FFMPEG_', 'FAKE_FFPROBE_')):
+            monkeypatch.delenv(name)
+    monkeypatch.setenv('FAKE_FFMPEG_SPEED', '0')
+    monkeypatch.setenv('FAKE_FFMPEG_DURATION', '4')
+    monkeypatch.setenv('FAKE_FFMPEG_OUTPUT_BYTES', '512')
+    return fake_ffmpeg.install(str(tmp_path / "bin"))
+
+
+@pytest.fixture
+def processor(fake_env, tmp_path):
+    """使用模拟FFmpeg的 VideoProcessor，编码历史写到临时目录；记录全部界面回调到 processor.events"""
+    events = []
+    processor = VideoProcessor(ui_callback=lambda kind, data: events.append((kind, data)))
+    processor.ffmpeg_path, processor.ffprobe_path = fake_env
+    processor.encode_history = EncodeHistory(path=str(tmp_path / "history.jsonl"))
+    processor.events = events
+    return processor
+
+
+@pytest.fixture
+def make_inputs(tmp_path):
+    """在临时目录生成指定个数的空输入文件（模拟FFprobe按默认参数报告媒体信息），返回路径列表"""
+    def make(count, prefix="clip"):
+        directory = tmp_path / "in"
+        directory.mkdir(exist_ok=True)
+        paths = []
+        for index in range(count):
+            path = directory / f"{prefix}_{index:03d}.mp4"
+            path.write_bytes(b"")
+            paths.append(str(path))
+        return paths
+    return make
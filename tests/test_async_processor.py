@@ -0,0 +1,91 @@
+import asyncio
+import os
+
+from async_processor import AsyncVideoProcessor, LogEvent, ProgressEvent, StateEvent
+
+
+def run_async(coroutine, timeout=30):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout))
+
+
+def states_of(events, job_id):
+    return [event.state for event in events if isinstance(event, StateEvent) and event.job_id == job_id]
+
+
+def test_jobs_report_progress_and_finish(processor, make_inputs, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_FFMPEG_SPEED', '20')
+    monkeypatch.setenv('FAKE_FFMPEG_PROGRESS', '0.05')
+    paths = make_inputs(2)
+
+    async def main():
+        service = AsyncVideoProcessor(processor, max_concurrent=2)
+        events = []
+
+        async def collect():
+            async for event in service.events():
+                events.append(event)
+
+        collector = asyncio.ensure_future(collect())
+        await asyncio.sleep(0)
+        jobs = [service.submit(path, str(tmp_path / "out" / os.path.basename(path)), "顺时针90度") for path in paths]
+        job_events = [event async for event in jobs[0].events()]
+        results = [await job for job in jobs]
+        await service.close()
+        await collector
+        return jobs, results, events, job_events
+
+    jobs, results, events, job_events = run_async(main())
+    assert results == [(True, None), (True, None)]
+    for job in jobs:
+        assert os.path.exists(job.output_file)
+        assert states_of(events, job.job_id) == ['queued', 'running', 'done']
+        progress = [event.media_seconds for event in events
+                    if isinstance(event, ProgressEvent) and event.job_id == job.job_id]
+        assert progress and progress == sorted(progress) and progress[-1] == 4
+    # 单个任务的事件流以当前状态开头，任务结束后迭代结束
+    assert job_events[0] == StateEvent(0, 'queued', None)
+    assert states_of(job_events, 0)[-1] == 'done'
+
+
+def test_cancel_running_and_queued_jobs(processor, make_inputs, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_FFMPEG_HANG_RATE', '1')
+    paths = make_inputs(3)
+
+    async def main():
+        service = AsyncVideoProcessor(processor, max_concurrent=1)
+        jobs = [service.submit(path, str(tmp_path / "out" / os.path.basename(path))) for path in paths]
+        while jobs[0]._process is None:
+            await asyncio.sleep(0.01)
+        process = jobs[0]._process
+        assert jobs[1].cancel()
+        assert jobs[0].cancel()
+        results = [await jobs[0], await jobs[1]]
+        # 第三个任务在前一个取消后开始运行，由 close() 取消
+        while jobs[2].state != 'running':
+            await asyncio.sleep(0.01)
+        await service.close()
+        return jobs, results, process, await jobs[2]
+
+    jobs, results, process, last = run_async(main())
+    assert results == [(False, "已取消"), (False, "已取消")]
+    assert last == (False, "已取消")
+    assert process.returncode is not None
+    assert [job.state for job in jobs] == ['cancelled', 'cancelled', 'cancelled']
+    assert not jobs[0].cancel()
+
+
+def test_output_over_size_cap_is_reencoded_at_lower_bitrate(processor, tmp_path):
+    source = tmp_path / "in.mp4"
+    source.write_bytes(b"\0" * 100)
+
+    async def main():
+        service = AsyncVideoProcessor(processor)
+        job = service.submit(str(source), str(tmp_path / "out.mp4"), encode_options={'max_size_growth_percent': 0})
+        events = [event async for event in job.events()]
+        return await job, events
+
+    result, events = run_async(main())
+    assert result == (True, None)
+    messages = [event.message for event in events if isinstance(event, LogEvent)]
+    assert sum("开始处理" in message for message in messages) == 3
+    assert sum("降低码率" in message for message in messages) == 2
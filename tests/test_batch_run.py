@@ -0,0 +1,41 @@
+from batch_run import BatchRun
+from preset_controller import ThroughputController
+
+
+def make_batch(processor, paths, tmp_path, **encode_options):
+    batch = BatchRun(processor, paths, "顺时针90度", "_rotated", "指定目录", str(tmp_path / "out"), False, "software",
+                     encode_options=dict(encode_options, engine='ffmpeg'))
+    batch.controller = ThroughputController("software", target_speed=2)
+    return batch
+
+
+def test_probe_result_for_queued_job_is_recorded(processor, make_inputs, tmp_path):
+    paths = make_inputs(1)
+    batch = make_batch(processor, paths, tmp_path, batch_clip_seconds=10)
+    batch.eta.add_job(0)
+    batch.probe_requested.add(0)
+    batch.on_probed((0, None), paths[0], {'duration': 4})
+    assert batch.clip_durations == {0: 4}
+    assert batch.eta.get_prediction(0) is not None
+    assert batch.controller._durations == {0: 4}
+
+
+def test_late_probe_result_for_finished_job_is_ignored(processor, make_inputs, tmp_path):
+    paths = make_inputs(1)
+    batch = make_batch(processor, paths, tmp_path, batch_clip_seconds=10)
+    # 任务已开始并结束（不在队列中也不在运行中）后才收到探测结果
+    batch.on_probed((0, None), paths[0], {'duration': 4})
+    assert not batch.clip_durations
+    assert not batch.controller._pending and not batch.controller._durations
+
+
+def test_probe_result_for_running_job_updates_prediction_only(processor, make_inputs, tmp_path):
+    paths = make_inputs(1)
+    batch = make_batch(processor, paths, tmp_path, batch_clip_seconds=10)
+    batch.running_jobs[0] = paths[0]
+    batch.eta.add_job(0)
+    batch.eta.start_job(0)
+    batch.controller.start_job(0)
+    batch.on_probed((0, None), paths[0], {'duration': 4})
+    assert not batch.clip_durations
+    assert batch.controller._durations == {0: 4} and not batch.controller._pending
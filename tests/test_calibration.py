@@ -0,0 +1,57 @@
+import calibration
+from calibration import default_settings, host_key, resolve_auto, summarize
+
+
+def trial(resolution, concurrency, threads, speed, ok=True, within_memory=True):
+    return {'resolution': resolution, 'concurrency': concurrency, 'threads': threads, 'speed': speed,
+            'ok': ok, 'within_memory': within_memory, 'peak_memory_mb': None}
+
+
+class FakeConfig:
+    """只提供 resolve_auto 用到的 get_calibration"""
+
+    def __init__(self, calibration=None):
+        self.calibration = calibration or {}
+
+    def get_calibration(self, host):
+        return self.calibration.get(host, {})
+
+
+def test_summarize_picks_fastest_usable_trial_per_resolution():
+    trials = [
+        trial("720p", 1, 0, 2.0), trial("720p", 2, 0, 3.0), trial("720p", 4, 0, 3.0),
+        trial("720p", 8, 0, 9.0, within_memory=False), trial("720p", 6, 0, 8.0, ok=False),
+        trial("1080p", 1, 0, 1.0), trial("1080p", 2, 0, 1.5), trial("1080p", 4, 0, 2.0),
+    ]
+    result = summarize(trials, ("720p", "1080p", "2160p"), seconds=2, memory_limit=2 * 2 ** 30)
+    # 速度相同时取并发较少的组合，超出内存或出错的结果不参与
+    assert result['best'] == {'720p': {'concurrency': 2, 'threads': 0, 'speed': 3.0},
+                              '1080p': {'concurrency': 4, 'threads': 0, 'speed': 2.0}}
+    # 总体推荐按相对各分辨率最佳速度的比例之和：并发2为 1 + 0.75，并发4为 1 + 1
+    assert result['overall'] == {'concurrency': 4, 'threads': 0}
+    assert result['memory_limit_mb'] == 2048 and result['seconds'] == 2
+    assert result['trials'] is trials
+
+
+def test_summarize_overall_requires_every_resolution():
+    trials = [trial("720p", 2, 0, 3.0), trial("1080p", 4, 0, 2.0)]
+    assert summarize(trials, ("720p", "1080p"))['overall'] is None
+    assert summarize([], ("720p",))['best'] == {}
+
+
+def test_resolve_auto_uses_closest_calibrated_resolution():
+    entry = {'best': {'720p': {'concurrency': 6, 'threads': 2, 'speed': 5.0},
+                      '2160p': {'concurrency': 2, 'threads': 8, 'speed': 1.0}},
+             'overall': {'concurrency': 4, 'threads': 4}}
+    config = FakeConfig({host_key(): {'software': entry}})
+    assert resolve_auto(config, "无", 1920 * 1080) == (6, 2, True)
+    assert resolve_auto(config, "software", 3840 * 2160) == (2, 8, True)
+    assert resolve_auto(config, "software") == (4, 4, True)
+
+
+def test_resolve_auto_defaults_when_not_calibrated(monkeypatch):
+    monkeypatch.setattr(calibration.os, 'cpu_count', lambda: 16)
+    config = FakeConfig({host_key(): {'software': {'best': {}}}})
+    assert resolve_auto(config, "nvenc", 1920 * 1080) == (2, 0, False)
+    assert resolve_auto(config, "software") == (4, 0, False)
+    assert default_settings("software", cpu_count=2) == (1, 0)
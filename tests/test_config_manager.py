@@ -0,0 +1,62 @@
+import json
+import threading
+
+import pytest
+
+from config_manager import ConfigManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = ConfigManager("config.json", save_delay=60)
+    manager.config_path = str(tmp_path / "config.json")
+    yield manager
+    manager._dirty = False  # 不在退出时写入
+
+
+def test_transaction_commits_once(manager, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(manager, '_schedule_save', lambda: scheduled.append(True))
+    with manager.transaction():
+        manager.set('processing.default_suffix', "_r")
+        with manager.transaction():
+            manager.set('processing.create_subdir', True)
+        assert not scheduled  # 嵌套事务结束时不提交
+        manager.set('processing.max_io_per_device', 3)
+    assert scheduled == [True]
+    assert manager.get('processing.default_suffix') == "_r"
+
+
+def test_transaction_without_changes_does_not_save(manager, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(manager, '_schedule_save', lambda: scheduled.append(True))
+    with manager.transaction():
+        manager.set('processing.default_suffix', manager.get('processing.default_suffix'))
+    assert not scheduled
+
+
+def test_transaction_commits_on_exception(manager, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(manager, '_schedule_save', lambda: scheduled.append(True))
+    with pytest.raises(RuntimeError):
+        with manager.transaction():
+            manager.set('processing.default_suffix', "_x")
+            raise RuntimeError
+    assert scheduled == [True]
+
+
+def test_flush_writes_latest_values(manager, tmp_path):
+    def writer(index):
+        for value in range(50):
+            manager.set(f'test.key{index}', value)
+            manager.save_config()
+
+    threads = [threading.Thread(target=writer, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    manager.set('test.final', True)
+    assert manager.flush()
+    saved = json.loads((tmp_path / "config.json").read_text(encoding='utf-8'))
+    assert saved['test'] == {'key0': 49, 'key1': 49, 'key2': 49, 'key3': 49, 'final': True}
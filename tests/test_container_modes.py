@@ -0,0 +1,42 @@
+import pytest
+
+
+def test_default_mode_and_non_mp4_outputs_add_nothing(processor, make_inputs):
+    source = make_inputs(1)[0]
+    assert processor.get_container_params("default", source, "out.mp4") == []
+    assert processor.get_container_params(None, source, "out.mp4") == []
+    assert processor.get_container_params("fragmented", source, "out.mkv") == []
+
+
+def test_fragmented_output_flags(processor, make_inputs):
+    params = processor.get_container_params("fragmented", make_inputs(1)[0], "out.MOV")
+    assert params == ["-movflags", "+frag_keyframe+empty_moov+default_base_moof", "-frag_duration", "2000000"]
+
+
+def test_faststart_reserves_moov_from_probe(processor, make_inputs):
+    # 模拟FFprobe报告4秒、30fps、一条音频流：4 × (30 + 47) 个样本，每个约16字节，加25%和64KB余量
+    params = processor.get_container_params("faststart", make_inputs(1)[0], "out.mp4")
+    assert params == ["-moov_size", str(int(4 * (30 + 47) * 16 * 1.25) + 64 * 1024)]
+
+
+@pytest.mark.parametrize("mode", ["faststart", "faststart_rewrite"])
+def test_faststart_without_probe_moves_moov_after_encoding(processor, tmp_path, mode):
+    params = processor.get_container_params(mode, str(tmp_path / "missing.mp4"), "out.mp4")
+    assert params == ["-movflags", "+faststart"]
+
+
+def test_container_params_precede_output_file(processor, make_inputs, tmp_path):
+    output = str(tmp_path / "out.mp4")
+    args = processor.build_encode_args(make_inputs(1)[0], output, "顺时针90度", "software",
+                                       output_options=["-progress", "pipe:1"],
+                                       encode_options={'container_mode': "fragmented"})
+    assert args[-2:] == ["-y", output]
+    assert args.index("-movflags") > args.index("-vf")
+    assert args.index("-movflags") < args.index("-progress")
+
+
+def test_insufficient_reserved_moov_falls_back_to_rewrite_once(processor):
+    error = "[mp4 @ 0x1] reserved_moov_size is too small"
+    reason, hw_accel, options = processor.get_encode_fallback(error, "nvenc", {'container_mode': "faststart"})
+    assert hw_accel == "nvenc" and options == {'container_mode': "faststart_rewrite"}
+    assert processor.get_encode_fallback(error, "software", options) is None
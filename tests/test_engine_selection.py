@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+import av_engine
+
+
+class FakeEngine:
+    """代替 av_engine.AVEngine：probe 返回预设的 (时长, 显示旋转角度)，记录 rotate 调用"""
+
+    def __init__(self, duration=5.0, rotation=0, result=(True, None)):
+        self.duration, self.rotation, self.result = duration, rotation, result
+        self.probed, self.rotated = [], []
+
+    def probe(self, input_file):
+        self.probed.append(input_file)
+        return self.duration, self.rotation
+
+    def rotate(self, input_file, output_file, rotation, should_continue=None):
+        self.rotated.append(input_file)
+        return self.result
+
+
+@pytest.fixture
+def engine(processor, monkeypatch):
+    monkeypatch.setattr(av_engine, 'is_available', lambda: True)
+    processor._av_engine = FakeEngine()
+    return processor._av_engine
+
+
+def test_short_clip_uses_in_process_engine(processor, make_inputs, engine):
+    assert processor.select_engine(make_inputs(1)[0], "software") == 'pyav'
+    engine.duration = 30.0
+    assert processor.select_engine(make_inputs(1)[0], "software") == 'ffmpeg'
+    assert processor.select_engine(make_inputs(1)[0], "software", {'inprocess_max_seconds': 60}) == 'pyav'
+
+
+def test_cached_probe_is_used_instead_of_in_process_probe(processor, make_inputs, engine):
+    path = make_inputs(1)[0]
+    processor.probe_video(path)  # 模拟FFprobe报告4秒
+    engine.duration = 30.0
+    assert processor.select_engine(path, "software") == 'pyav'
+    assert engine.probed == []
+
+
+def test_rotation_metadata_goes_to_ffmpeg(processor, make_inputs, engine):
+    engine.rotation = 90
+    assert processor.select_engine(make_inputs(1)[0], "software") == 'ffmpeg'
+
+
+@pytest.mark.parametrize("hw_accel, options", [
+    ("nvenc", {}),
+    ("software", {'engine': 'ffmpeg'}),
+    ("software", {'container_mode': 'faststart'}),
+    ("software", {'codec_policy': 'match_source'}),
+    ("software", {'target_video_bitrate': 1000000}),
+])
+def test_unsupported_settings_use_ffmpeg(processor, make_inputs, engine, hw_accel, options):
+    assert processor.select_engine(make_inputs(1)[0], hw_accel, dict(options, engine=options.get('engine', 'pyav'))) == 'ffmpeg'
+
+
+def test_missing_input_or_pyav_uses_ffmpeg(processor, tmp_path, make_inputs, engine, monkeypatch):
+    assert processor.select_engine(str(tmp_path / "missing.mp4"), "software") == 'ffmpeg'
+    monkeypatch.setattr(av_engine, 'is_available', lambda: False)
+    assert processor.select_engine(make_inputs(1)[0], "software", {'engine': 'pyav'}) == 'ffmpeg'
+
+
+def test_in_process_failure_falls_back_to_ffmpeg(processor, make_inputs, engine, tmp_path):
+    engine.result = (False, av_engine.ROTATED_SOURCE_ERROR)
+    output = str(tmp_path / "out.mp4")
+    assert processor.reencode_video(make_inputs(1)[0], output, "顺时针90度", "software") == (True, None)
+    assert len(engine.rotated) == 1
+    assert os.path.exists(output)
+
+
+def test_cancelled_in_process_encode_is_not_retried(processor, make_inputs, engine, tmp_path):
+    engine.result = (False, "已取消")
+    output = str(tmp_path / "out.mp4")
+    assert processor.reencode_video(make_inputs(1)[0], output, "顺时针90度", "software") == (False, "已取消")
+    assert not os.path.exists(output)
@@ -0,0 +1,77 @@
+import types
+
+import pytest
+
+import eta_model
+from eta_model import EtaTracker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手动推进的时钟，替换 eta_model 使用的 time.time()"""
+    now = [1000.0]
+    monkeypatch.setattr(eta_model, 'time', types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_pending_jobs_use_predictions(clock):
+    tracker = EtaTracker(concurrency=2)
+    for job_id, predicted in enumerate((10.0, 20.0, 30.0)):
+        tracker.add_job(job_id)
+        tracker.set_prediction(job_id, predicted, predicted)
+    estimate = tracker.estimate()
+    assert estimate['remaining'] == pytest.approx(30.0)
+    assert estimate['completion_time'] == pytest.approx(1030.0)
+
+
+def test_unknown_prediction_makes_estimate_unknown(clock):
+    tracker = EtaTracker(concurrency=1)
+    tracker.add_job(0)
+    assert tracker.estimate()['remaining'] is None
+    # 有已知预测后，未知任务按平均值估计
+    tracker.add_job(1)
+    tracker.set_prediction(1, 8.0, 8.0)
+    assert tracker.estimate()['remaining'] == pytest.approx(16.0)
+
+
+def test_running_job_blends_live_progress(clock):
+    tracker = EtaTracker(concurrency=1)
+    tracker.add_job(0)
+    tracker.set_prediction(0, 100.0, 100.0)
+    tracker.start_job(0)
+    clock[0] += 10
+    tracker.update_progress(0, 50.0)
+    estimate = tracker.estimate()
+    # 已完成一半：完全按实时进度推算，剩余 10 秒
+    assert estimate['remaining'] == pytest.approx(10.0)
+    assert estimate['current_progress'] == pytest.approx(0.5)
+    assert tracker.running_progress() == {0: 50.0}
+
+
+def test_slower_batch_corrects_later_predictions(clock):
+    tracker = EtaTracker(concurrency=1)
+    for job_id in range(3):
+        tracker.add_job(job_id)
+        tracker.set_prediction(job_id, 10.0, 10.0)
+    for job_id in range(2):
+        tracker.start_job(job_id)
+        clock[0] += 20  # 实际耗时是预测的两倍
+        tracker.finish_job(job_id)
+    estimate = tracker.estimate()
+    assert 1.0 < estimate['correction'] < 2.0
+    assert tracker.get_prediction(2) == pytest.approx(10.0 * estimate['correction'])
+    assert estimate['remaining'] == pytest.approx(10.0 * estimate['correction'])
+
+
+def test_finished_and_discarded_jobs_leave_estimate(clock):
+    tracker = EtaTracker(concurrency=1)
+    for job_id in range(3):
+        tracker.add_job(job_id)
+        tracker.set_prediction(job_id, 5.0, 5.0)
+    tracker.discard_jobs([1])
+    tracker.start_job(0)
+    tracker.finish_job(0, success=False)
+    # 任务结束后才完成的探测不再计入
+    tracker.set_prediction(0, 5.0, 5.0)
+    assert tracker.estimate()['remaining'] == pytest.approx(5.0)
+    assert tracker.get_prediction(0) is None
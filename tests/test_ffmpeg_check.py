@@ -0,0 +1,42 @@
+import os
+
+import video_processor
+
+
+def fail_if_run(*args, **kwargs):
+    raise AssertionError("缓存命中时不应启动FFmpeg")
+
+
+def test_check_result_is_cached_by_binary_signature(processor, monkeypatch):
+    cache = {}
+    assert processor.check_ffmpeg(cache=cache)
+    signature = processor.get_binary_signature(processor.ffmpeg_path)
+    assert cache == {signature['path']: {'mtime': signature['mtime'], 'size': signature['size'], 'ok': True,
+                                         'version': "ffmpeg version 0.0-fake Copyright (c) fake_ffmpeg.py"}}
+
+    monkeypatch.setattr(video_processor.subprocess, 'run', fail_if_run)
+    assert processor.check_ffmpeg(cache=cache)
+
+
+def test_changed_binary_is_checked_again(processor, monkeypatch):
+    signature = processor.get_binary_signature(processor.ffmpeg_path)
+    # 缓存中记录的是旧版本（修改时间不同）的失败结果
+    cache = {signature['path']: {'mtime': signature['mtime'] - 10, 'size': signature['size'], 'ok': False}}
+    assert processor.check_ffmpeg(cache=cache)
+    assert cache[signature['path']]['ok'] is True
+    assert cache[signature['path']]['mtime'] == signature['mtime']
+
+
+def test_missing_binary_is_unavailable(processor, tmp_path):
+    processor.ffmpeg_path = str(tmp_path / "missing" / "ffmpeg")
+    cache = {}
+    assert processor.get_binary_signature(processor.ffmpeg_path) is None
+    assert not processor.check_ffmpeg(cache=cache)
+    assert cache == {}
+
+
+def test_binary_on_path_is_resolved(processor, monkeypatch):
+    directory, name = os.path.split(processor.ffmpeg_path)
+    monkeypatch.setenv('PATH', directory + os.pathsep + os.environ.get('PATH', ''))
+    signature = processor.get_binary_signature(name)
+    assert signature['path'] == os.path.normcase(os.path.abspath(processor.ffmpeg_path))
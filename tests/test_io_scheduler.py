@@ -0,0 +1,68 @@
+import threading
+
+import io_scheduler
+from io_scheduler import IOScheduler
+
+
+def test_limit_change_while_held_keeps_counts_balanced():
+    scheduler = IOScheduler(max_per_device=0)
+    assert scheduler.try_acquire(("disk",))
+    # 占用期间改为有上限（如文件夹监视启动），释放仍与占用成对计数
+    scheduler.max_per_device = 1
+    assert not scheduler.try_acquire(("disk",))
+    scheduler.release(("disk",))
+    assert scheduler.active_counts() == {}
+    assert scheduler.try_acquire(("disk",))
+
+
+def test_per_call_limit_overrides_default():
+    scheduler = IOScheduler(max_per_device=1)
+    assert scheduler.try_acquire(("disk",), limit=2)
+    assert scheduler.try_acquire(("disk",), limit=2)
+    assert not scheduler.try_acquire(("disk",), limit=2)
+    assert scheduler.try_acquire(("disk",), limit=0)
+    assert scheduler.active_counts() == {"disk": 3}
+
+
+def test_device_cache_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(io_scheduler, 'DEVICE_CACHE_SIZE', 3)
+    scheduler = IOScheduler()
+    for index in range(5):
+        scheduler.get_device(str(tmp_path / f"dir{index}" / "a.mp4"))
+    assert len(scheduler._device_cache) == 3
+    assert str(tmp_path / "dir4") in scheduler._device_cache
+
+
+def test_missing_output_directory_resolves_to_existing_parent(tmp_path):
+    scheduler = IOScheduler()
+    existing = scheduler.get_device(str(tmp_path / "a.mp4"))
+    assert scheduler.get_device(str(tmp_path / "not" / "yet" / "created" / "a.mp4")) == existing
+    # 输入和输出在同一设备上时只占用一次
+    assert scheduler.devices_for(str(tmp_path / "a.mp4"), str(tmp_path / "out" / "b.mp4"), None) == (existing,)
+
+
+def test_try_acquire_is_all_or_nothing():
+    scheduler = IOScheduler(max_per_device=1)
+    assert scheduler.try_acquire(("a",))
+    assert not scheduler.try_acquire(("a", "b"))
+    assert scheduler.active_counts() == {"a": 1}
+
+
+def test_acquire_waits_for_release():
+    scheduler = IOScheduler(max_per_device=1)
+    scheduler.try_acquire(("disk",))
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: scheduler.acquire(("disk",)) and acquired.set())
+    thread.start()
+    assert not acquired.wait(0.2)
+    scheduler.release(("disk",))
+    assert acquired.wait(5)
+    thread.join()
+    assert scheduler.active_counts() == {"disk": 1}
+
+
+def test_acquire_gives_up_when_stopped():
+    scheduler = IOScheduler(max_per_device=1)
+    scheduler.try_acquire(("disk",))
+    assert not scheduler.acquire(("disk",), should_continue=lambda: False)
+    assert scheduler.active_counts() == {"disk": 1}
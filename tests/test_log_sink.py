@@ -0,0 +1,72 @@
+import json
+import logging
+
+import pytest
+
+import log_sink
+from log_sink import JsonLinesFormatter, UILogBuffer, get_logger, parse_level, setup_logging, shutdown_logging
+
+
+@pytest.fixture
+def clean_logger():
+    """setup_logging 修改全局logger，测试结束后恢复原来的处理器、级别和传播设置"""
+    logger = get_logger()
+    handlers, level, propagate = list(logger.handlers), logger.level, logger.propagate
+    yield logger
+    shutdown_logging()
+    logger.handlers[:] = handlers
+    logger.setLevel(level)
+    logger.propagate = propagate
+
+
+def test_parse_level():
+    assert parse_level("Warning") == logging.WARNING
+    assert parse_level(logging.DEBUG) == logging.DEBUG
+    assert parse_level("verbose") == logging.INFO
+    assert parse_level(None, default=logging.ERROR) == logging.ERROR
+
+
+def test_formatter_writes_extra_fields():
+    record = logging.LogRecord("video_rotator.test", logging.WARNING, __file__, 1, "编码 %s", ("a.mp4",), None)
+    record.job_id, record.stage, record.duration = 3, "encode", 1.23456
+    entry = json.loads(JsonLinesFormatter().format(record))
+    assert entry['level'] == "warning" and entry['logger'] == "video_rotator.test"
+    assert entry['message'] == "编码 a.mp4"
+    assert (entry['job_id'], entry['stage'], entry['duration']) == (3, "encode", 1.235)
+    assert 'file' not in entry
+
+
+def test_records_are_written_as_json_lines(clean_logger, tmp_path):
+    log_path = setup_logging("info", log_dir=str(tmp_path / "logs"))
+    get_logger("processor").info("完成 %s", "a.mp4", extra={'job_id': 1, 'file': "a.mp4", 'stage': "encode"})
+    get_logger("processor").debug("低于级别的日志不写入")
+    # 重复调用只更新级别，不重复添加处理器
+    assert setup_logging("debug", log_dir=str(tmp_path / "other")) == log_path
+    assert clean_logger.level == logging.DEBUG
+    shutdown_logging()
+
+    with open(log_path, encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f]
+    assert [entry['message'] for entry in entries] == ["完成 a.mp4"]
+    assert entries[0]['job_id'] == 1 and entries[0]['file'] == "a.mp4"
+
+
+def test_unwritable_log_dir_discards_logs(clean_logger, tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    assert setup_logging(log_dir=str(blocker / "logs")) is None
+    assert log_sink._listener is None
+    get_logger().error("不会抛出异常")
+
+
+def test_ui_buffer_schedules_once_and_reports_dropped():
+    buffer = UILogBuffer(max_pending=3)
+    assert buffer.push("1")
+    assert not buffer.push("2")
+    for message in ("3", "4", "5"):
+        buffer.push(message)
+    lines, dropped, more = buffer.drain(max_lines=2)
+    assert (lines, dropped, more) == (["3", "4"], 2, True)
+    assert buffer.drain() == (["5"], 0, False)
+    # 取空后下一条消息需要重新安排刷新
+    assert buffer.push("6")
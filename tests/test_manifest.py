@@ -0,0 +1,71 @@
+import io
+import os
+
+from manifest import iter_manifest
+
+
+def test_jsonl_records(tmp_path):
+    manifest = tmp_path / "jobs.jsonl"
+    manifest.write_text(
+        '# 注释行\n'
+        '{"input": "a.mp4", "rotation": "90"}\n'
+        '"b.mp4"\n'
+        '\n'
+        '{"path": "sub/c.mp4", "output": "out/c.mp4", "rotation": "ccw", "profile": {"crf": 20}}\n',
+        encoding='utf-8'
+    )
+    jobs = list(iter_manifest(str(manifest)))
+    assert jobs == [
+        {'input': str(tmp_path / "a.mp4"), 'rotation': "顺时针90度"},
+        {'input': str(tmp_path / "b.mp4")},
+        {'input': str(tmp_path / "sub" / "c.mp4"), 'output': str(tmp_path / "out" / "c.mp4"),
+         'rotation': "逆时针90度", 'encode_options': {'crf': 20}},
+    ]
+
+
+def test_csv_records_with_profiles(tmp_path):
+    manifest = tmp_path / "jobs.csv"
+    manifest.write_text("Input,Rotation,Profile\na.mp4,180,fast\nb.mp4,,\n", encoding='utf-8')
+    profiles = {'fast': {'encoder_preset': 'veryfast'}}
+    jobs = list(iter_manifest(str(manifest), profiles=profiles))
+    assert jobs == [
+        {'input': str(tmp_path / "a.mp4"), 'rotation': "180度", 'encode_options': profiles['fast']},
+        {'input': str(tmp_path / "b.mp4")},
+    ]
+
+
+def test_invalid_records_become_error_jobs(tmp_path):
+    manifest = tmp_path / "jobs.jsonl"
+    manifest.write_text(
+        '{"input": "a.mp4", "rotation": "45"}\n'
+        '{broken\n'
+        '[1, 2]\n'
+        '{"output": "x.mp4"}\n'
+        '{"input": "b.mp4", "profile": "missing"}\n'
+        '{"input": "c.mp4"}\n',
+        encoding='utf-8'
+    )
+    jobs = list(iter_manifest(str(manifest)))
+    assert [bool(job.get('error')) for job in jobs] == [True, True, True, True, True, False]
+    assert "无效的旋转方向" in jobs[0]['error']
+    assert jobs[1]['input'] == "<第2行>" and "JSON格式错误" in jobs[1]['error']
+    assert jobs[3]['error'] == "缺少input字段"
+    assert "未定义的配置" in jobs[4]['error']
+
+
+def test_file_object_is_read_lazily():
+    lines = ['{"input": "a.mp4"}\n', '{"input": "b.mp4"}\n']
+    consumed = []
+
+    class Reader(io.StringIO):
+        def __iter__(self):
+            for line in lines:
+                consumed.append(line)
+                yield line
+
+        def readline(self):
+            return ""
+
+    jobs = iter_manifest(Reader(), manifest_format='jsonl')
+    assert next(jobs) == {'input': os.path.join(os.getcwd(), "a.mp4")}
+    assert len(consumed) == 1
@@ -0,0 +1,96 @@
+import os
+from collections import namedtuple
+
+import planner
+from planner import BatchPlanner, format_plan
+
+DiskUsage = namedtuple('DiskUsage', 'total used free')
+
+
+def params(output_option="指定目录", output_dir="", suffix="_rotated", **encode_options):
+    return {
+        'rotation': "顺时针90度", 'suffix': suffix, 'output_option': output_option, 'output_dir': output_dir,
+        'create_subdir': False, 'hw_accel': "software", 'concurrent_tasks': 2, 'encode_options': encode_options,
+    }
+
+
+def fake_probes(processor, monkeypatch, infos):
+    """按文件名返回预设的媒体信息，不在表中的文件探测失败"""
+    probed = []
+
+    def probe(path):
+        probed.append(path)
+        return infos.get(os.path.basename(path))
+    monkeypatch.setattr(processor, 'probe_video', probe)
+    return probed
+
+
+def make_file(directory, name, size=1000):
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_plan_estimates_size_and_time_from_probes(processor, tmp_path, monkeypatch):
+    info = {'duration': 10.0, 'width': 1920, 'height': 1080, 'video_bit_rate': 800000, 'audio_bit_rate': 0, 'size': 1000}
+    probed = fake_probes(processor, monkeypatch, {'a.mp4': info, 'b.mp4': dict(info, duration=20.0)})
+    files = [make_file(tmp_path / "in", name) for name in ("a.mp4", "b.mp4")]
+    plan = BatchPlanner(processor).plan(files, params(output_dir=str(tmp_path / "out")))
+    assert sorted(probed) == sorted(files)
+    assert plan['ok']
+    assert [job['output'] for job in plan['jobs']] == [str(tmp_path / "out" / "a_rotated.mp4"),
+                                                       str(tmp_path / "out" / "b_rotated.mp4")]
+    assert [job['estimated_size'] for job in plan['jobs']] == [1000000, 2000000]
+    assert plan['total_duration'] == 30.0
+    # 没有历史时按默认速度（软件编码1倍实时）估算，两个任务分到两个并发通道
+    assert plan['estimated_time'] == 20.0
+
+
+def test_size_limit_caps_estimate(processor, tmp_path, monkeypatch):
+    info = {'duration': 10.0, 'video_bit_rate': 800000}
+    fake_probes(processor, monkeypatch, {'a.mp4': info})
+    files = [make_file(tmp_path / "in", "a.mp4", size=1000)]
+    plan = BatchPlanner(processor).plan(files, params(output_dir=str(tmp_path / "out"), max_size_growth_percent=10))
+    assert plan['jobs'][0]['estimated_size'] == 1100
+
+
+def test_unprobeable_and_colliding_inputs_are_reported(processor, tmp_path, monkeypatch):
+    fake_probes(processor, monkeypatch, {})
+    files = [make_file(tmp_path / "in1", "a.mp4", size=300), make_file(tmp_path / "in2", "a.mp4", size=300)]
+    plan = BatchPlanner(processor).plan(files, params(output_dir=str(tmp_path / "out")))
+    assert not plan['ok']
+    assert plan['unknown_jobs'] == 2
+    assert all("无法探测媒体信息" in job['issues'] for job in plan['jobs'])
+    # 探测失败时按输入大小估算输出
+    assert plan['total_size'] == 600
+    assert plan['collisions'] == [{'output': str(tmp_path / "out" / "a_rotated.mp4"), 'inputs': files}]
+    assert any("输出路径冲突" in problem for problem in plan['problems'])
+
+
+def test_output_that_is_an_input_or_exists_is_flagged(processor, tmp_path, monkeypatch):
+    fake_probes(processor, monkeypatch, {'a.mp4': {'duration': 1.0}, 'a_rotated.mp4': {'duration': 1.0}})
+    files = [make_file(tmp_path, "a.mp4"), make_file(tmp_path, "a_rotated.mp4")]
+    plan = BatchPlanner(processor).plan(files, params(output_option="源文件目录"))
+    assert plan['jobs'][0]['issues'] == ["输出路径与某个输入文件相同"]
+
+    make_file(tmp_path / "out", "a_rotated.mp4")
+    plan = BatchPlanner(processor).plan(files[:1], params(output_dir=str(tmp_path / "out")))
+    assert plan['jobs'][0]['issues'] == ["输出文件已存在，将被覆盖"]
+
+
+def test_insufficient_disk_space_is_a_problem(processor, tmp_path, monkeypatch):
+    fake_probes(processor, monkeypatch, {'a.mp4': {'duration': 10.0, 'size': 5000}})
+    monkeypatch.setattr(planner.shutil, 'disk_usage', lambda path: DiskUsage(10000, 9000, 1000))
+    files = [make_file(tmp_path / "in", "a.mp4")]
+    plan = BatchPlanner(processor).plan(files, params(output_dir=str(tmp_path / "out" / "new")))
+    assert plan['disks'] == [{'path': str(tmp_path), 'required': 5000, 'free': 1000, 'ok': False}]
+    assert any("磁盘空间不足" in problem for problem in plan['problems'])
+    lines = format_plan(plan)
+    assert lines[0].startswith("📋 处理计划: 1 个文件")
+    assert any(line.startswith("  ❌ 磁盘空间不足") for line in lines)
+
+
+def test_wall_time_assigns_longest_jobs_first():
+    assert BatchPlanner(None)._estimate_wall_time([3, 5, 3, 4], 2) == 8
+    assert BatchPlanner(None)._estimate_wall_time([], 2) is None
@@ -0,0 +1,50 @@
+from preset_controller import MIN_ADJUST_INTERVAL, ThroughputController
+
+
+def controller_with_sample(lane_speed, pending_media, **kwargs):
+    """登记排队任务并放入一个已完成的速度样本：默认预设下单任务编码速度为 lane_speed ×实时"""
+    controller = ThroughputController("software", **kwargs)
+    for job_id in range(4):
+        controller.add_job(job_id, pending_media / 4)
+    controller._sample_media, controller._sample_time = lane_speed * 100, 100.0
+    return controller
+
+
+def test_no_adjustment_without_samples():
+    controller = ThroughputController("software", target_speed=10.0)
+    controller.add_job(0, 60.0)
+    assert controller.update({}, now=1000.0) is None
+    assert controller.preset == "medium"
+
+
+def test_tight_deadline_picks_faster_preset():
+    # 需要 3600秒/600秒 = 6x（含余量6.6x），默认预设只有 2x，superfast 约 7x
+    controller = controller_with_sample(2.0, 3600.0, concurrency=1, deadline=1600.0)
+    assert controller.update({}, now=1000.0) == "superfast"
+    # 调整后的间隔内不再调整
+    controller.deadline = 1e9
+    assert controller.update({}, now=1000.0 + MIN_ADJUST_INTERVAL / 2) is None
+
+
+def test_loose_deadline_picks_slower_preset():
+    controller = controller_with_sample(2.0, 600.0, concurrency=2, deadline=1000.0 + 36000)
+    assert controller.update({}, now=1000.0) == "veryslow"
+
+
+def test_target_speed_uses_all_lanes():
+    # 4路并发、默认预设每路 1x：目标 5x 需要每路至少 1.25x×余量
+    controller = controller_with_sample(1.0, 600.0, concurrency=4, target_speed=5.0)
+    assert controller.update({}, now=1000.0) == "faster"
+    logs = []
+    controller.log = lambda message, level=None: logs.append(message)
+    controller.target_speed = 50.0
+    assert controller.update({}, now=1000.0 + MIN_ADJUST_INTERVAL) == "ultrafast"
+    assert "最快预设也无法按时完成" in logs[0]
+
+
+def test_only_pending_jobs_are_affected():
+    controller = ThroughputController("software", target_speed=100.0)
+    controller.add_job(0, 60.0)
+    assert controller.start_job(0) == "medium"
+    controller._sample_media, controller._sample_time = 100.0, 100.0
+    assert controller.update({0: 30.0}, now=1000.0) is None
@@ -0,0 +1,65 @@
+import os
+import time
+
+from preview_cache import BUILDING_SUFFIX, STALE_BUILD_SECONDS, PreviewCache
+
+
+def build(cache, key, size, name="frame_0.png"):
+    build_dir = cache.create_entry(key)
+    with open(os.path.join(build_dir, name), 'wb') as f:
+        f.write(b"\0" * size)
+    return build_dir
+
+
+def test_commit_keeps_entry_larger_than_limit(tmp_path):
+    cache = PreviewCache(cache_dir=str(tmp_path), max_bytes=100)
+    paths = cache.commit("a", build(cache, "a", 500))
+    assert all(os.path.exists(path) for path in paths)
+    assert cache.get("a") == paths
+
+
+def test_evict_removes_oldest_but_not_current(tmp_path):
+    cache = PreviewCache(cache_dir=str(tmp_path), max_bytes=250)
+    cache.commit("old", build(cache, "old", 100))
+    os.utime(os.path.join(str(tmp_path), "old"), (time.time() - 60, time.time() - 60))
+    cache.commit("mid", build(cache, "mid", 100))
+    cache.commit("new", build(cache, "new", 100))
+    assert cache.get("old") is None
+    assert cache.get("mid") and cache.get("new")
+
+
+def test_evict_skips_entries_being_built(tmp_path):
+    cache = PreviewCache(cache_dir=str(tmp_path), max_bytes=10)
+    in_progress = build(cache, "pending", 100)
+    cache.commit("done", build(cache, "done", 100))
+    assert os.path.exists(os.path.join(in_progress, "frame_0.png"))
+    assert cache.get("pending") is None
+
+
+def test_stale_build_directory_is_removed(tmp_path):
+    cache = PreviewCache(cache_dir=str(tmp_path), max_bytes=10)
+    leftover = build(cache, "crashed", 100)
+    past = time.time() - STALE_BUILD_SECONDS - 1
+    os.utime(leftover, (past, past))
+    cache.evict()
+    assert not os.path.exists(leftover)
+
+
+def test_concurrent_builds_of_same_key_do_not_delete_each_other(tmp_path):
+    cache = PreviewCache(cache_dir=str(tmp_path))
+    first, second = build(cache, "k", 10), build(cache, "k", 10)
+    assert first != second and first.endswith(BUILDING_SUFFIX)
+    paths = cache.commit("k", first)
+    # 后完成的一次生成不替换已提交的条目，返回同一组文件
+    assert cache.commit("k", second) == paths
+    assert all(os.path.exists(path) for path in paths)
+    assert not os.path.exists(second)
+
+
+def test_discard_removes_only_the_failed_build(tmp_path):
+    cache = PreviewCache(cache_dir=str(tmp_path))
+    paths = cache.commit("k", build(cache, "k", 10))
+    failed = build(cache, "k", 10)
+    cache.discard(failed)
+    assert not os.path.exists(failed)
+    assert cache.get("k") == paths
@@ -0,0 +1,75 @@
+import threading
+import time
+
+from probe_pool import ProbePool
+
+
+class FakeProcessor:
+    """probe_video 可阻塞（gate未打开时等待），记录并发峰值"""
+
+    def __init__(self, blocked=False):
+        self.gate = threading.Event()
+        if not blocked:
+            self.gate.set()
+        self.started = []
+        self.active = self.peak = 0
+        self._lock = threading.Lock()
+
+    def probe_video(self, path):
+        with self._lock:
+            self.started.append(path)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            self.gate.wait(5)
+            if path.startswith("bad"):
+                raise RuntimeError("探测异常")
+            return {'duration': float(len(path))}
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        time.sleep(0.01)
+    raise AssertionError("等待超时")
+
+
+def test_run_returns_results_in_order_within_worker_limit():
+    processor = FakeProcessor()
+    paths = [f"{'x' * index}.mp4" for index in range(1, 21)]
+    infos = ProbePool(processor, max_workers=3).run(paths + ["bad.mp4"])
+    assert [info['duration'] for info in infos[:-1]] == [float(len(path)) for path in paths]
+    assert infos[-1] is None
+    assert processor.peak <= 3
+
+
+def test_cancel_drops_queued_and_in_flight_results():
+    processor = FakeProcessor(blocked=True)
+    results = []
+    pool = ProbePool(processor, max_workers=2, on_result=lambda key, path, info: results.append(key))
+    pool.submit((index, f"{index}.mp4") for index in range(10))
+    wait_for(lambda: len(processor.started) == 2)
+    assert pool.pending() == 10
+    assert pool.cancel() == 8
+    processor.gate.set()
+    assert pool.wait(5)
+    assert pool.pending() == 0
+    assert results == []
+    assert len(processor.started) == 2
+
+
+def test_submit_after_cancel_delivers_new_results():
+    processor = FakeProcessor(blocked=True)
+    results = []
+    pool = ProbePool(processor, max_workers=1, on_result=lambda key, path, info: results.append(key))
+    pool.submit(["old.mp4"])
+    wait_for(lambda: processor.started)
+    pool.cancel()
+    pool.submit(["new.mp4"])
+    processor.gate.set()
+    assert pool.wait(5)
+    assert results == ["new.mp4"]
@@ -0,0 +1,347 @@
+import json
+import os
+import threading
+import time
+
+import batch_run
+import fake_ffmpeg
+from job_store import CANCELLED, DONE, FAILED, JobStore
+from manifest import iter_manifest
+
+
+def run(processor, files, tmp_path, encode_options=None, **kwargs):
+    """以默认参数运行 process_files；固定使用FFmpeg后端（空的模拟输入无法由PyAV打开）"""
+    kwargs.setdefault('max_concurrent', 2)
+    return processor.process_files(
+        files, "顺时针90度", "_rotated", "指定目录", str(tmp_path / "out"), False, "software",
+        encode_options=dict(encode_options or {}, engine='ffmpeg'), **kwargs
+    )
+
+
+def output_of(tmp_path, path):
+    return str(tmp_path / "out" / (os.path.splitext(os.path.basename(path))[0] + "_rotated.mp4"))
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("等待超时")
+        time.sleep(0.02)
+
+
+def encode_starts(processor, path):
+    """某个输入开始编码的次数（按日志计）"""
+    name = os.path.basename(path)
+    return sum(1 for kind, data in processor.events if kind == 'log' and str(data).startswith(f"开始处理: {name} "))
+
+
+def test_outputs_are_rotated(processor, make_inputs, tmp_path):
+    paths = make_inputs(3)
+    successful, failed = run(processor, paths, tmp_path)
+    assert sorted(successful) == paths and not failed
+    for path in paths:
+        info = fake_ffmpeg.describe(output_of(tmp_path, path))
+        assert (info['width'], info['height']) == (1080, 1920)
+
+
+def test_slow_manifest_does_not_block_dispatch(processor, make_inputs, tmp_path):
+    paths = make_inputs(3)
+    release = threading.Event()
+
+    def slow_manifest():
+        yield paths[0]
+        yield paths[1]
+        # 读取阻塞（如等待标准输入）期间，已读到的任务照常完成
+        release.wait(10)
+        yield paths[2]
+
+    finished = []
+    result_callback = lambda path, success, error: finished.append((path, success))
+    thread = threading.Thread(target=run, args=(processor, slow_manifest(), tmp_path),
+                              kwargs={'result_callback': result_callback})
+    thread.start()
+    deadline = time.time() + 10
+    while len(finished) < 2 and time.time() < deadline:
+        time.sleep(0.05)
+    assert sorted(finished) == [(paths[0], True), (paths[1], True)]
+    release.set()
+    thread.join(10)
+    assert not thread.is_alive()
+    assert sorted(finished) == [(path, True) for path in paths]
+
+
+def test_stop_while_manifest_blocks(processor, make_inputs, tmp_path):
+    paths = make_inputs(1)
+    blocked = threading.Event()
+
+    def stuck_manifest():
+        yield paths[0]
+        blocked.set()
+        threading.Event().wait(30)
+        yield from ()
+
+    thread = threading.Thread(target=run, args=(processor, stuck_manifest(), tmp_path))
+    thread.start()
+    assert blocked.wait(10)
+    time.sleep(0.3)
+    processor.stop_processing()
+    thread.join(10)
+    assert not thread.is_alive()
+
+
+def test_manifest_read_error_is_logged(processor, make_inputs, tmp_path):
+    paths = make_inputs(1)
+
+    def broken_manifest():
+        yield paths[0]
+        raise ValueError("第2行不是有效的JSON")
+
+    successful, failed = run(processor, broken_manifest(), tmp_path)
+    assert successful == paths and not failed
+    assert any(kind == 'log' and "读取任务失败" in str(data) for kind, data in processor.events)
+
+
+def test_checkpointed_encode_logs_final_output(processor, make_inputs, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_FFMPEG_DURATION', '30')
+    paths = make_inputs(1)
+    options = {'checkpoint_min_seconds': 10, 'checkpoint_segment_seconds': 10}
+    successful, failed = run(processor, paths, tmp_path, encode_options=options)
+    assert successful == paths and not failed
+    logs = [str(data) for kind, data in processor.events if kind == 'log' and "完成" in str(data)]
+    assert any("clip_000_rotated.mp4" in line for line in logs)
+    assert not any("%05d" in line for line in logs)
+
+
+def test_staging_disables_checkpointing(processor, make_inputs, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_FFMPEG_DURATION', '30')
+    paths = make_inputs(1)
+    used = []
+    original = processor._encode_checkpointed
+    monkeypatch.setattr(processor, '_encode_checkpointed', lambda *args, **kwargs: used.append(args) or original(*args, **kwargs))
+    options = {'checkpoint_min_seconds': 10, 'checkpoint_segment_seconds': 10}
+    staging = {'scratch_dir': str(tmp_path / "scratch"), 'budget_mb': 64, 'prefetch_count': 1}
+    successful, failed = run(processor, paths, tmp_path, encode_options=options, staging_options=staging)
+    assert successful == paths and not failed
+    assert not used
+    assert (tmp_path / "out" / "clip_000_rotated.mp4").exists()
+    assert not list((tmp_path / "out").glob("*.checkpoint.json"))
+
+
+def test_cancel_and_stop(processor, make_inputs, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_FFMPEG_HANG_RATE', '1')
+    paths = make_inputs(4)
+    store = JobStore(paths)
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(value=run(processor, store, tmp_path)))
+    thread.start()
+    wait_until(lambda: len(processor._job_processes) == 2)
+    # 排队中的任务直接移出队列，运行中的任务终止其FFmpeg进程
+    assert processor.cancel_job(3)
+    assert processor.cancel_job(0)
+    wait_until(lambda: 2 in processor._job_processes)
+    processor.stop_processing()
+    thread.join(10)
+    assert not thread.is_alive()
+
+    successful, failed = result['value']
+    assert not successful
+    assert sorted(failed) == [(path, "已取消") for path in paths]
+    assert [store.state(job_id) for job_id in range(4)] == [CANCELLED] * 4
+    assert not os.listdir(tmp_path / "out")
+    assert not processor.active_processes
+
+
+def test_job_finished_before_stop_keeps_its_result(processor, make_inputs, tmp_path, monkeypatch):
+    paths = make_inputs(1)
+    store = JobStore(paths)
+    real_wait = batch_run.wait
+
+    def stop_after_finish(futures, **kwargs):
+        # 等待超时返回的同时编码结束，调度线程尚未收集结果时停止
+        real_wait(list(futures))
+        processor.stop_processing()
+        return set(), set()
+
+    monkeypatch.setattr(batch_run, 'wait', stop_after_finish)
+    successful, failed = run(processor, store, tmp_path)
+    assert successful == paths and not failed
+    assert store.state(0) == DONE
+    assert os.path.exists(output_of(tmp_path, paths[0]))
+
+
+def test_stop_releases_worker_waiting_for_prefetch(processor, make_inputs, tmp_path, monkeypatch):
+    from staging import StagingManager
+
+    def stuck_copy(self, source, destination):
+        while not self._prefetch_stopped:
+            time.sleep(0.02)
+        raise RuntimeError("暂存已关闭")
+
+    monkeypatch.setattr(StagingManager, '_copy_file', stuck_copy)
+    paths = make_inputs(3)
+    staging = {'scratch_dir': str(tmp_path / "scratch"), 'budget_mb': 64, 'prefetch_count': 1}
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(
+        value=run(processor, paths, tmp_path, staging_options=staging, max_concurrent=1)
+    ))
+    thread.start()
+    # 第一个任务直接读取源文件，第二个任务开始后在 get_input 中等待卡住的预取
+    wait_until(lambda: processor._batch is not None and 1 in processor._batch.running_jobs)
+    time.sleep(0.3)
+    processor.stop_processing()
+    thread.join(10)
+    assert not thread.is_alive()
+    successful, failed = result['value']
+    assert successful == paths[:1]
+    assert sorted(failed) == [(path, "已取消") for path in paths[1:]]
+
+
+def test_probes_only_the_scan_window_with_fewer_workers_than_encodes(processor, make_inputs, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_FFMPEG_HANG_RATE', '1')
+    paths = make_inputs(80)
+    probed, active, peak = [], [0], [0]
+    lock = threading.Lock()
+    real_probe = processor.probe_video
+
+    def counting_probe(path):
+        with lock:
+            probed.append(path)
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            return real_probe(path)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    monkeypatch.setattr(processor, 'probe_video', counting_probe)
+    thread = threading.Thread(target=run, args=(processor, paths, tmp_path), kwargs={'max_concurrent': 4, 'max_io_per_device': 0})
+    thread.start()
+    wait_until(lambda: len(processor._job_processes) == 4)
+    wait_until(lambda: processor._batch.probe_pool.pending() == 0)
+    processor.stop_processing()
+    thread.join(10)
+    # 调度窗口为32个任务，探测并发为编码并发的一半
+    assert len(set(probed)) <= 32 + 4
+    assert peak[0] <= 2
+
+
+def test_corrupt_output_is_reencoded_once_then_failed(processor, make_inputs, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_FFMPEG_CORRUPT_RATE', '1')
+    paths = make_inputs(2)
+    successful, failed = run(processor, paths, tmp_path, encode_options={'verify_output': True})
+    assert not successful
+    assert sorted(path for path, _ in failed) == paths
+    assert all(error.startswith("输出校验失败") for _, error in failed)
+    assert [encode_starts(processor, path) for path in paths] == [2, 2]
+    assert not os.listdir(tmp_path / "out")
+
+
+def test_staged_corrupt_output_is_reencoded_once_then_failed(processor, make_inputs, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_FFMPEG_CORRUPT_RATE', '1')
+    paths = make_inputs(2)
+    staging = {'scratch_dir': str(tmp_path / "scratch"), 'budget_mb': 64, 'prefetch_count': 1}
+    successful, failed = run(processor, paths, tmp_path, encode_options={'verify_output': True}, staging_options=staging)
+    assert not successful
+    assert sorted(path for path, _ in failed) == paths
+    assert all(error.startswith("输出校验失败") for _, error in failed)
+    assert [encode_starts(processor, path) for path in paths] == [2, 2]
+    assert not os.listdir(tmp_path / "out")
+
+
+def test_staged_verified_output_passes(processor, make_inputs, tmp_path):
+    paths = make_inputs(2)
+    staging = {'scratch_dir': str(tmp_path / "scratch"), 'budget_mb': 64, 'prefetch_count': 1}
+    successful, failed = run(processor, paths, tmp_path, encode_options={'verify_output': True}, staging_options=staging)
+    assert sorted(successful) == paths and not failed
+    assert [encode_starts(processor, path) for path in paths] == [1, 1]
+    assert sorted(os.listdir(tmp_path / "out")) == ["clip_000_rotated.mp4", "clip_001_rotated.mp4"]
+
+
+def test_verified_output_passes(processor, make_inputs, tmp_path):
+    paths = make_inputs(2)
+    successful, failed = run(processor, paths, tmp_path, encode_options={'verify_output': True})
+    assert sorted(successful) == paths and not failed
+    assert [encode_starts(processor, path) for path in paths] == [1, 1]
+
+
+def test_checkpointed_encode_resumes_after_stop(processor, make_inputs, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_FFMPEG_DURATION', '30')
+    monkeypatch.setenv('FAKE_FFMPEG_SPEED', '10')
+    monkeypatch.setenv('FAKE_FFMPEG_PROGRESS', '0.05')
+    paths = make_inputs(1)
+    output = output_of(tmp_path, paths[0])
+    options = {'checkpoint_min_seconds': 10, 'checkpoint_segment_seconds': 10}
+    list_path = os.path.join(output + ".parts", "list_r001.csv")
+
+    thread = threading.Thread(target=run, args=(processor, paths, tmp_path), kwargs={'encode_options': options})
+    thread.start()
+    wait_until(lambda: os.path.exists(list_path) and open(list_path).read().count("\n") >= 1)
+    processor.stop_processing()
+    thread.join(10)
+    assert not os.path.exists(output)
+    assert os.path.exists(output + ".checkpoint.json")
+
+    monkeypatch.setenv('FAKE_FFMPEG_SPEED', '0')
+    processor.events.clear()
+    successful, failed = run(processor, paths, tmp_path, encode_options=options)
+    assert successful == paths and not failed
+    assert any(kind == 'log' and "处继续编码" in str(data) for kind, data in processor.events)
+    # 第一次运行完成的分段与续编的分段拼接为完整时长
+    assert fake_ffmpeg.describe(output)['duration'] == 30
+    assert not os.path.exists(output + ".parts") and not os.path.exists(output + ".checkpoint.json")
+
+
+def test_batch_failure_is_attributed_to_failing_input(processor, make_inputs, tmp_path, monkeypatch):
+    paths = make_inputs(6)
+    monkeypatch.setenv('FAKE_FFMPEG_FAIL_RATE', '0.3')
+    # 选一个让部分（不含第一个）输入失败的种子，结果只由种子和文件名决定
+    for seed in range(100):
+        monkeypatch.setenv('FAKE_FFMPEG_SEED', str(seed))
+        failing = [path for path in paths if fake_ffmpeg._chance(path, 'fail', 'FAKE_FFMPEG_FAIL_RATE')]
+        if failing and paths[0] not in failing and len(failing) < len(paths) - 1:
+            break
+    for path in paths:
+        processor.probe_video(path)
+
+    options = {'batch_clip_seconds': 10, 'batch_max_seconds': 60}
+    successful, failed = run(processor, paths, tmp_path, encode_options=options, max_concurrent=1)
+    assert any(kind == 'log' and "逐个重新处理" in str(data) for kind, data in processor.events)
+    assert sorted(path for path, _ in failed) == failing
+    assert sorted(successful) == sorted(set(paths) - set(failing))
+    for path in paths:
+        assert os.path.exists(output_of(tmp_path, path)) == (path not in failing)
+
+
+def test_manifest_jobs(processor, make_inputs, tmp_path):
+    paths = make_inputs(3)
+    manifest = tmp_path / "in" / "jobs.jsonl"
+    manifest.write_text("\n".join([
+        json.dumps({'input': "clip_000.mp4", 'rotation': "180"}),
+        json.dumps({'input': "clip_001.mp4", 'output': "custom/one.mp4", 'rotation': "ccw"}),
+        "{不是JSON",
+        json.dumps({'input': "clip_002.mp4", 'profile': "missing"}),
+    ]) + "\n", encoding='utf-8')
+
+    successful, failed = run(processor, iter_manifest(str(manifest)), tmp_path)
+    assert sorted(successful) == paths[:2]
+    errors = dict(failed)
+    assert "JSON格式错误" in errors["<第3行>"]
+    assert "未定义的配置" in errors[paths[2]]
+    info = fake_ffmpeg.describe(output_of(tmp_path, paths[0]))
+    assert (info['width'], info['height']) == (1920, 1080)
+    info = fake_ffmpeg.describe(str(tmp_path / "in" / "custom" / "one.mp4"))
+    assert (info['width'], info['height']) == (1080, 1920)
+
+
+def test_job_store_states_are_written_back(processor, make_inputs, tmp_path):
+    paths = make_inputs(2)
+    store = JobStore(paths + [str(tmp_path / "in" / "missing.mp4")])
+    successful, failed = run(processor, store, tmp_path)
+    assert sorted(successful) == paths
+    assert [store.state(job_id) for job_id in range(3)] == [DONE, DONE, FAILED]
+    assert store.error(0) is None and store.error(2) == failed[0][1]
+    # 处理过程中追加的任务不属于本批
+    store.add(str(tmp_path / "in" / "later.mp4"))
+    assert store.state_name(3) == 'pending'
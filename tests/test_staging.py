@@ -0,0 +1,92 @@
+import os
+import time
+
+import pytest
+
+from staging import StagingManager
+
+
+@pytest.fixture
+def staging(tmp_path):
+    manager = StagingManager(scratch_root=str(tmp_path / "scratch"), budget_bytes=100, prefetch_count=2).start()
+    yield manager
+    manager.close()
+
+
+def make_source(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def wait_ready(staging, *sources):
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        with staging._lock:
+            if all(staging._entries.get(source, {}).get('state') == 'ready' for source in sources):
+                return
+        time.sleep(0.01)
+    raise AssertionError("预取未完成")
+
+
+def add_entry(staging, source, size, in_use=False):
+    staging._entries[source] = {'path': source + ".staged", 'size': size, 'state': 'ready', 'in_use': in_use}
+    staging._used_bytes += size
+
+
+def test_reserve_evicts_oldest_idle_unwanted_entries(staging):
+    add_entry(staging, "a", 40)
+    add_entry(staging, "b", 40)
+    with staging._lock:
+        assert staging._reserve(50)
+    # 只淘汰到足够为止，按预取顺序先淘汰最早的
+    assert list(staging._entries) == ["b"]
+    assert staging._used_bytes == 90
+
+
+def test_reserve_keeps_wanted_and_in_use_entries(staging):
+    add_entry(staging, "a", 40, in_use=True)
+    add_entry(staging, "b", 40)
+    staging._wanted = ["b"]
+    with staging._lock:
+        assert not staging._reserve(30)
+    assert list(staging._entries) == ["a", "b"]
+    assert staging._used_bytes == 80
+
+
+def test_reserve_rejects_file_larger_than_budget(staging):
+    add_entry(staging, "a", 10)
+    with staging._lock:
+        assert not staging._reserve(101)
+    assert list(staging._entries) == ["a"]
+
+
+def test_prefetched_input_is_used_and_released(staging, tmp_path):
+    source = make_source(tmp_path, "a.mp4", 30)
+    staging.prefetch([source])
+    wait_ready(staging, source)
+    staged = staging.get_input(source)
+    assert staged != source and os.path.getsize(staged) == 30
+    staging.release_input(source)
+    assert not os.path.exists(staged)
+    assert staging._used_bytes == 0
+
+
+def test_new_prefetch_evicts_inputs_no_longer_wanted(staging, tmp_path):
+    first = [make_source(tmp_path, f"a{index}.mp4", 40) for index in range(2)]
+    staging.prefetch(first)
+    wait_ready(staging, *first)
+    later = make_source(tmp_path, "b.mp4", 40)
+    staging.prefetch([first[1], later])
+    wait_ready(staging, first[1], later)
+    assert list(staging._entries) == [first[1], later]
+    assert staging._used_bytes == 80
+
+
+def test_output_falls_back_to_final_path_over_budget(staging, tmp_path):
+    final = str(tmp_path / "out" / "a.mp4")
+    staged = staging.get_output_path(final, estimated_size=60)
+    assert staged != final
+    assert staging.get_output_path(str(tmp_path / "out" / "b.mp4"), estimated_size=60) == str(tmp_path / "out" / "b.mp4")
+    staging.discard_output(staged)
+    assert staging._used_bytes == 0
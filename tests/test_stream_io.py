@@ -0,0 +1,122 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import fake_ffmpeg
+from stream_io import ByteSink, ByteSource
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    """GET 返回 server.source 的内容，PUT 按分块传输接收上传，完整结束时存入 server.uploads"""
+
+    def do_GET(self):
+        body = self.server.source
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        chunks = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return  # 客户端未发送结束块就断开，丢弃
+            size = int(line.strip(), 16)
+            data = self.rfile.read(size)
+            self.rfile.readline()
+            if size == 0:
+                break
+            chunks.append(data)
+        self.server.uploads[self.path] = b"".join(chunks)
+        status = self.server.put_status
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), MediaHandler)
+    # 模拟FFmpeg的输出格式：1920x1080、6秒的视频
+    httpd.source = fake_ffmpeg.MARKER + json.dumps(
+        {'duration': 6.0, 'width': 1920, 'height': 1080, 'fps': 30, 'corrupt': False}
+    ).encode('utf-8') + b"\n" + b"\0" * 2048
+    httpd.uploads = {}
+    httpd.put_status = 201
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class RecordingSource(ByteSource):
+    def __init__(self, data=b""):
+        self.data, self.closed = data, False
+
+    def read(self, size):
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+    def close(self):
+        self.closed = True
+
+
+class RecordingSink(ByteSink):
+    def __init__(self):
+        self.data, self.closed, self.aborted = b"", False, False
+
+    def write(self, data):
+        self.data += data
+
+    def close(self):
+        self.closed = True
+
+    def abort(self):
+        self.aborted = True
+
+
+def test_http_source_to_http_sink(processor, server):
+    success, error = processor.rotate_stream(
+        f"{server.base_url}/in.mp4", f"{server.base_url}/out.mp4", "顺时针90度", "software"
+    )
+    assert (success, error) == (True, None)
+    upload = server.uploads['/out.mp4']
+    info = fake_ffmpeg._parse_fake(upload)
+    assert (info['width'], info['height'], info['duration']) == (1080, 1920, 6.0)
+
+
+def test_http_sink_error_status_fails(processor, server):
+    server.put_status = 500
+    success, error = processor.rotate_stream(
+        f"{server.base_url}/in.mp4", f"{server.base_url}/out.mp4", "180度", "software"
+    )
+    assert not success
+    assert "HTTP 500" in error
+
+
+def test_ffmpeg_start_failure_releases_both_ends(processor, tmp_path):
+    processor.ffmpeg_path = str(tmp_path / "missing" / "ffmpeg")
+    source, sink = RecordingSource(b"data"), RecordingSink()
+    with pytest.raises(OSError):
+        processor.rotate_stream(source, sink, "顺时针90度", "software")
+    assert source.closed
+    assert sink.aborted and not sink.closed
+    assert not processor.active_processes
+
+
+def test_ffmpeg_start_failure_abandons_http_upload(processor, server, tmp_path):
+    processor.ffmpeg_path = str(tmp_path / "missing" / "ffmpeg")
+    with pytest.raises(OSError):
+        processor.rotate_stream(
+            f"{server.base_url}/in.mp4", f"{server.base_url}/out.mp4", "顺时针90度", "software"
+        )
+    assert '/out.mp4' not in server.uploads
@@ -0,0 +1,79 @@
+import os
+import time
+
+import pytest
+
+import ui_profiler
+from ui_profiler import UIProfiler
+
+
+class FakeRoot:
+    """代替Tk根窗口：after() 只记录预约的回调，由测试手动执行"""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, callback):
+        self.scheduled.append((ms, callback))
+
+
+class Target:
+    def work(self, value):
+        return value * 2
+
+    def fail(self):
+        raise ValueError("失败")
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    profiler = UIProfiler(FakeRoot(), str(tmp_path / "profile"), trace_memory=False)
+    yield profiler
+    profiler.stop()
+
+
+def test_count_tracks_totals_per_second_peaks_and_slow_calls(profiler, monkeypatch):
+    clock = [100.2]
+    monkeypatch.setattr(ui_profiler.time, 'perf_counter', lambda: clock[0])
+    for _ in range(3):
+        profiler.count("ui_callback:log")
+    clock[0] = 101.5
+    profiler.count("ui_callback:log")
+    profiler.count("Target.work", elapsed=0.5)
+    profiler.count("Target.work", elapsed=0.001)
+    assert profiler._events["ui_callback:log"][:3] == [4, 1, 3]
+    assert profiler._events["Target.work"] == [2, 2, 2, 0.501, 0.5]
+    assert list(profiler._slow_calls) == [(101.5, "Target.work", 0.5)]
+
+
+def test_instrument_counts_calls_including_failures(profiler):
+    target = Target()
+    profiler.instrument(target, 'work', 'fail')
+    assert target.work(3) == 6
+    with pytest.raises(ValueError):
+        target.fail()
+    assert profiler._events["Target.work"][0] == 1
+    assert profiler._events["Target.fail"][0] == 1
+
+
+def test_stall_is_attributed_to_slow_calls_and_reported(profiler):
+    profiler.start()
+    assert profiler.root.scheduled[-1][0] == ui_profiler.LAG_INTERVAL_MS
+    profiler.count("Target.work", elapsed=0.25)
+    # 预约的采样晚了300ms才执行
+    profiler._expected = time.perf_counter() - 0.3
+    profiler._sample_lag()
+    assert len(profiler._lags) == 1 and profiler._lags[0] >= 0.3
+    assert profiler._stalls[0][2] == [("Target.work", 0.25)]
+    assert len(profiler.root.scheduled) == 2
+
+    report = profiler.stop()
+    assert report and os.path.exists(report) and os.path.exists(report[:-4] + ".prof")
+    with open(report, encoding='utf-8') as f:
+        text = f.read()
+    assert "卡顿 1 次" in text
+    assert "期间: Target.work 250ms" in text
+    # 停止后预约的采样不再记录
+    profiler.root.scheduled[-1][1]()
+    assert len(profiler._lags) == 1
+    assert profiler.stop() is None
@@ -0,0 +1,59 @@
+import pytest
+
+from verifier import build_decode_args, check_metadata, decode_error, sample_positions
+
+SOURCE = {
+    'video_count': 1, 'audio_count': 1, 'duration': 60.0, 'fps': 30.0, 'nb_frames': 1800,
+    'width': 1920, 'height': 1080, 'display_rotation': 0,
+}
+
+
+def output(**changes):
+    info = dict(SOURCE, width=1080, height=1920)
+    info.update(changes)
+    return info
+
+
+def test_matching_output_passes():
+    assert check_metadata(SOURCE, output(), "顺时针90度") is None
+    assert check_metadata(SOURCE, output(width=1920, height=1080), "180度") is None
+
+
+@pytest.mark.parametrize("changes,message", [
+    ({'video_count': 0}, "没有视频流"),
+    ({'audio_count': 0}, "音频流数量"),
+    ({'audio_count': 2}, "音频流数量"),
+    ({'duration': 55.0}, "时长不一致"),
+    ({'duration': None}, "无法读取输出时长"),
+    ({'nb_frames': 1700}, "帧数不一致"),
+    ({'width': 1920, 'height': 1080}, "分辨率"),
+])
+def test_mismatches_are_reported(changes, message):
+    assert message in check_metadata(SOURCE, output(**changes), "顺时针90度")
+
+
+def test_tolerances():
+    # 时长允许 max(0.5秒, 2%)，帧数允许 max(2帧, 2%)
+    assert check_metadata(SOURCE, output(duration=61.1, nb_frames=1830), "顺时针90度") is None
+
+
+def test_display_rotation_of_source_is_applied():
+    source = dict(SOURCE, width=1080, height=1920, display_rotation=90)
+    assert check_metadata(source, output(), "顺时针90度") is None
+
+
+def test_sample_positions():
+    assert sample_positions(60.0) == [(0.0, 1.0), (29.5, 1.0), (59.0, 1.0)]
+    # 太短或时长未知时完整解码一次，避免抽样重叠
+    assert sample_positions(2.5) == [(0.0, None)]
+    assert sample_positions(None) == [(0.0, None)]
+
+
+def test_decode_args_and_errors():
+    samples = sample_positions(60.0)
+    args = build_decode_args("ffmpeg", "out.mp4", samples)
+    assert args.count("-i") == 3 and args.count("null") == 3
+    assert args[args.index("-ss") + 1] == "29.5"
+    assert decode_error(samples, 0, "") is None
+    assert "29.5" in decode_error(samples, 1, "Invalid NAL unit size\n")
+    assert "完整解码" in decode_error([(0.0, None)], 1, "")
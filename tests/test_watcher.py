@@ -0,0 +1,72 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from watcher import FolderWatcher, WatchService
+
+
+def params(suffix, output_option="源文件目录", output_dir=""):
+    return {
+        'rotation': "顺时针90度", 'suffix': suffix, 'output_option': output_option, 'output_dir': output_dir,
+        'create_subdir': False, 'hw_accel': "software", 'concurrent_tasks': 1, 'encode_options': {},
+    }
+
+
+def test_seen_entry_is_forgotten_after_processing(tmp_path):
+    stable = []
+    watcher = FolderWatcher(str(tmp_path), stable.append, stable_seconds=0)
+    path = tmp_path / "a.mp4"
+    path.write_bytes(b"x" * 10)
+    watcher._scan()
+    watcher._check_stable()
+    assert stable == [str(path)]
+    # 回调后、处理完之前，同一状态的文件不会再次回调
+    watcher._scan()
+    watcher._check_stable()
+    assert stable == [str(path)]
+    watcher.forget(str(path))
+    assert not watcher._seen
+
+
+def test_moved_input_is_forgotten(processor, tmp_path):
+    folder = tmp_path / "watch"
+    folder.mkdir()
+    service = WatchService(processor, str(folder), params("_rotated"), stable_seconds=0)
+    path = folder / "a.mp4"
+    path.write_bytes(b"x" * 10)
+    service.watcher._scan()
+    service.watcher._seen[str(path)] = (10, os.path.getmtime(path))
+    service._finish(str(path), True, None)
+    assert (folder / "_done" / "a.mp4").exists()
+    assert not service.watcher._seen
+
+
+@pytest.mark.parametrize("output_option,output_dir", [("源文件目录", ""), ("指定目录", "out")])
+def test_empty_suffix_with_output_inside_folder_is_rejected(processor, tmp_path, output_option, output_dir):
+    folder = tmp_path / "watch"
+    folder.mkdir()
+    output_dir = str(folder / output_dir) if output_dir else ""
+    with pytest.raises(ValueError):
+        WatchService(processor, str(folder), params("", output_option, output_dir))
+
+
+def test_empty_suffix_with_output_elsewhere_is_allowed(processor, tmp_path):
+    folder = tmp_path / "watch"
+    folder.mkdir()
+    WatchService(processor, str(folder), params("", "指定目录", str(tmp_path / "out")))
+
+
+def test_concurrent_finishes_are_all_counted(processor, tmp_path):
+    folder = tmp_path / "watch"
+    folder.mkdir()
+    service = WatchService(processor, str(folder), params("_rotated"), stable_seconds=0, on_complete='mark')
+    paths = []
+    for index in range(40):
+        path = folder / f"clip_{index:03d}.mp4"
+        path.write_bytes(b"x")
+        paths.append(str(path))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda item: service._finish(item[1], item[0] % 4 != 0, "错误"), enumerate(paths)))
+    assert (service.completed, service.failed) == (30, 10)
+    assert ("status", "监视中: 已完成 30 个，失败 10 个") in processor.events
@@ -0,0 +1,315 @@
+"""模拟FFmpeg/FFprobe的可执行程序，用于在不真正编码的情况下测试批处理引擎
+
+用法:
+  python tools/fake_ffmpeg.py --install 目录      在目录中生成 ffmpeg/ffprobe 启动脚本（Windows为.cmd），输出两者路径
+  python tools/fake_ffmpeg.py ffmpeg 参数...      按FFmpeg方式运行
+  python tools/fake_ffmpeg.py ffprobe 参数...     按FFprobe方式运行
+
+让程序使用它：设置环境变量 VIDEO_ROTATOR_FFMPEG / VIDEO_ROTATOR_FFPROBE 为启动脚本路径，
+或直接修改 VideoProcessor 的 ffmpeg_path / ffprobe_path。
+
+行为通过环境变量配置（子进程继承，均可省略）：
+  FAKE_FFMPEG_DURATION        媒体时长（秒），可写范围如 "2-30"，此时按文件名确定性取值，默认10
+  FAKE_FFMPEG_SIZE            视频分辨率，默认 1920x1080
+  FAKE_FFMPEG_FPS             帧率，默认30
+  FAKE_FFMPEG_SPEED           编码速度（相对实时的倍数），默认100；0表示立即完成。-preset 按 PRESET_SPEED 调整速度
+  FAKE_FFMPEG_PROGRESS        -progress 输出间隔（秒），默认0.5
+  FAKE_FFMPEG_FAIL_RATE       编码失败（返回码1）的概率
+  FAKE_FFMPEG_HW_CRASH_RATE   使用硬件编码器时异常退出的概率（返回与FFmpeg相同的 -22/AVERROR(EINVAL) 退出码）
+  FAKE_FFMPEG_HANG_RATE       编码卡住不退出（直到被终止）的概率
+  FAKE_FFMPEG_CORRUPT_RATE    输出损坏（抽样解码报错）的概率
+  FAKE_FFMPEG_SEED            随机种子；同一文件的结果只由种子和文件名决定，便于复现
+  FAKE_FFMPEG_OUTPUT_BYTES    输出文件大小，默认4096
+  FAKE_FFPROBE_LATENCY        每次FFprobe调用额外等待的秒数（模拟网络存储或冷缓存上的探测延迟），默认0
+
+输出文件写入一段JSON描述（时长、旋转后的分辨率、是否损坏），FFprobe读取到该描述时原样报告，
+因此输出校验会得到与真实编码一致的结果。支持 -ss 输入定位、segment 分段输出（含分段列表）、concat 拼接，
+多输入多输出的批量编码（每个输出用 -map 序号:v:0 指定输入），-f lavfi 合成输入，
+以及 pipe:0 输入和 pipe:1 输出（流处理）。
+"""
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+MARKER = b"FAKEFFMPEG"
+# -preset 对速度的影响（相对 medium），用于测试按截止时间调整预设
+PRESET_SPEED = {'veryslow': 0.25, 'slower': 0.4, 'slow': 0.6, 'medium': 1.0, 'fast': 1.3,
+                'faster': 1.6, 'veryfast': 2.4, 'superfast': 3.5, 'ultrafast': 5.0}
+HW_ENCODERS = ("_nvenc", "_qsv", "_amf")
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return float(default)
+
+
+def _rng(path, purpose):
+    """按种子、文件名和用途确定的随机数，同一文件重复运行结果相同"""
+    seed = os.environ.get('FAKE_FFMPEG_SEED', '0')
+    digest = hashlib.sha1(f"{seed}|{os.path.basename(path)}|{purpose}".encode('utf-8')).hexdigest()
+    return random.Random(int(digest[:16], 16))
+
+
+def _chance(path, purpose, rate_name):
+    rate = _env_float(rate_name, 0)
+    return rate > 0 and _rng(path, purpose).random() < rate
+
+
+def _read_fake(path):
+    """读取本程序写出的输出描述，不是假输出时返回None"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(4096)
+    except OSError:
+        return None
+    return _parse_fake(head)
+
+
+def _parse_fake(head):
+    if not head.startswith(MARKER):
+        return None
+    try:
+        return json.loads(head[len(MARKER):].split(b"\n", 1)[0])
+    except ValueError:
+        return None
+
+
+def describe(path):
+    """文件的模拟媒体信息: duration, width, height, fps, corrupt"""
+    fake = _read_fake(path)
+    if fake:
+        return fake
+    spec = os.environ.get('FAKE_FFMPEG_DURATION', '10')
+    low, _, high = spec.partition('-')
+    duration = float(low) if not high else _rng(path, 'duration').uniform(float(low), float(high))
+    width, _, height = os.environ.get('FAKE_FFMPEG_SIZE', '1920x1080').partition('x')
+    return {
+        'duration': round(duration, 3), 'width': int(width), 'height': int(height),
+        'fps': _env_float('FAKE_FFMPEG_FPS', 30), 'corrupt': False,
+    }
+
+
+def run_ffprobe(args):
+    path = args[-1]
+    latency = _env_float('FAKE_FFPROBE_LATENCY', 0)
+    if latency > 0:
+        time.sleep(latency)
+    if not os.path.exists(path):
+        print(f"{path}: No such file or directory", file=sys.stderr)
+        return 1
+    info = describe(path)
+    frames = int(info['duration'] * info['fps'])
+    print(json.dumps({
+        'format': {'duration': str(info['duration']), 'size': str(os.path.getsize(path)), 'bit_rate': "8000000"},
+        'streams': [
+            {'codec_type': 'video', 'codec_name': 'h264', 'width': info['width'], 'height': info['height'],
+             'avg_frame_rate': f"{int(info['fps'])}/1", 'nb_frames': str(frames), 'pix_fmt': 'yuv420p'},
+            {'codec_type': 'audio', 'codec_name': 'aac', 'bit_rate': "128000"},
+        ],
+    }))
+    return 0
+
+
+def _option(args, name, default=None):
+    return args[args.index(name) + 1] if name in args[:-1] else default
+
+
+def _write_output(path, description):
+    header = MARKER + json.dumps(description).encode('utf-8') + b"\n"
+    size = max(int(_env_float('FAKE_FFMPEG_OUTPUT_BYTES', 4096)), len(header))
+    if path == 'pipe:1':
+        sys.stdout.buffer.write(header + b"\0" * (size - len(header)))
+        sys.stdout.buffer.flush()
+        return
+    with open(path, 'wb') as f:
+        f.write(header + b"\0" * (size - len(header)))
+
+
+def _simulate(start, end, progress, offset=0.0, preset=None):
+    """按速度模拟编码 [start, end) 这段媒体时间，并按 -progress 格式输出进度（相对于本次输出的开头）"""
+    speed = _env_float('FAKE_FFMPEG_SPEED', 100) * PRESET_SPEED.get(preset, 1.0)
+    interval = max(_env_float('FAKE_FFMPEG_PROGRESS', 0.5), 0.01)
+    position = start
+    while speed > 0 and position < end:
+        step = min(interval, (end - position) / speed)
+        time.sleep(step)
+        position = min(end, position + step * speed)
+        if progress:
+            print(f"out_time_us={int((position - offset) * 1000000)}\nprogress=continue", flush=True)
+
+
+def run_concat(args):
+    """concat分离器 + -c copy：输出时长为各分段时长之和"""
+    list_file = _option(args, '-i')
+    parts = []
+    with open(list_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("file "):
+                parts.append(line[5:].strip("'").replace("'\\''", "'"))
+    if not parts:
+        print(f"{list_file}: no files to concatenate", file=sys.stderr)
+        return 1
+    infos = [describe(part) for part in parts]
+    _write_output(args[-1], dict(infos[0], duration=round(sum(info['duration'] for info in infos), 3),
+                                 corrupt=any(info.get('corrupt') for info in infos)))
+    return 0
+
+
+def run_decode(args):
+    """抽样解码（每处抽样一个输入，各自输出到 -f null -）：任一输入是损坏的输出时报告解码错误"""
+    inputs = [args[index + 1] for index, arg in enumerate(args[:-1]) if arg == '-i']
+    for path in inputs:
+        if not os.path.exists(path):
+            print(f"{path}: No such file or directory", file=sys.stderr)
+            return 1
+    if any(describe(path).get('corrupt') for path in inputs):
+        print("[h264 @ 0x0] Invalid NAL unit size (fake corrupt output)", file=sys.stderr)
+        return 1
+    return 0
+
+
+def run_multi(args):
+    """多输入多输出：任一输入失败（或硬件编码器崩溃）时整个进程失败，与真实FFmpeg一致"""
+    inputs = [args[index + 1] for index, arg in enumerate(args[:-1]) if arg == '-i']
+    last_input = max(index for index, arg in enumerate(args) if arg == '-i') + 2
+    # 输出参数：以非选项参数（输出文件）结束一个输出，其前面的选项都带一个值
+    outputs, current, index = [], {}, last_input
+    while index < len(args):
+        if args[index].startswith('-') and index + 1 < len(args):
+            current[args[index]] = args[index + 1]
+            index += 2
+        else:
+            outputs.append((args[index], current))
+            current, index = {}, index + 1
+    for path in inputs:
+        if not os.path.exists(path):
+            print(f"{path}: No such file or directory", file=sys.stderr)
+            return 1
+    infos = [describe(path) for path in inputs]
+    for path, options in outputs:
+        encoder = options.get('-c:v', '')
+        source = inputs[int(options.get('-map', '0:v:0').split(':')[0])]
+        if encoder.endswith(HW_ENCODERS) and _chance(source, 'hw_crash', 'FAKE_FFMPEG_HW_CRASH_RATE'):
+            print(f"[{encoder} @ 0x0] Cannot load hardware encoder (fake crash)", file=sys.stderr)
+            return -22 & 0xFFFFFFFF if os.name == 'nt' else -22 & 0xFF
+    _simulate(0, sum(info['duration'] for info in infos), False, preset=outputs[0][1].get('-preset') if outputs else None)
+    for path, options in outputs:
+        source_index = int(options.get('-map', '0:v:0').split(':')[0])
+        source, info = inputs[source_index], infos[source_index]
+        if _chance(source, 'fail', 'FAKE_FFMPEG_FAIL_RATE'):
+            print(f"{source}: Invalid data found when processing input (fake failure)", file=sys.stderr)
+            return 1
+        width, height = info['width'], info['height']
+        if options.get('-vf', '').count('transpose') == 1:
+            width, height = height, width
+        _write_output(path, dict(info, width=width, height=height,
+                                 corrupt=_chance(source, 'corrupt', 'FAKE_FFMPEG_CORRUPT_RATE')))
+    return 0
+
+
+def run_ffmpeg(args):
+    if '-version' in args:
+        print("ffmpeg version 0.0-fake Copyright (c) fake_ffmpeg.py")
+        return 0
+    if _option(args, '-f') == 'concat':
+        return run_concat(args)
+    if args[-1] == '-' and _option(args, '-f') == 'null':
+        return run_decode(args)
+    if args.count('-i') > 1:
+        return run_multi(args)
+    if _option(args, '-f') == 'lavfi':
+        # 合成输入（如校准使用的 testsrc2=size=WxH:rate=30:duration=S），按速度模拟编码
+        spec = dict(item.split('=', 1) for item in _option(args, '-i', '').partition('=')[2].split(':') if '=' in item)
+        _simulate(0, float(spec.get('duration', _option(args, '-t', '10'))), '-progress' in args)
+        return 0
+    input_file = _option(args, '-i')
+    if input_file == 'pipe:0':
+        # 标准输入：读完整个输入，是假输出时沿用其描述，否则按默认参数
+        info = _parse_fake(sys.stdin.buffer.read()) or describe(input_file)
+    elif not input_file or not os.path.exists(input_file):
+        print(f"{input_file}: No such file or directory", file=sys.stderr)
+        return 1
+    else:
+        info = describe(input_file)
+
+    output_file = args[-1]
+    encoder = _option(args, '-c:v', '')
+    if encoder.endswith(HW_ENCODERS) and _chance(input_file, 'hw_crash', 'FAKE_FFMPEG_HW_CRASH_RATE'):
+        print(f"[{encoder} @ 0x0] Cannot load hardware encoder (fake crash)", file=sys.stderr)
+        return -22 & 0xFFFFFFFF if os.name == 'nt' else -22 & 0xFF
+    if _chance(input_file, 'hang', 'FAKE_FFMPEG_HANG_RATE'):
+        while True:
+            time.sleep(3600)
+
+    # 旋转90度时交换宽高（transpose=1/transpose=2，180度为两次transpose=1）
+    width, height = info['width'], info['height']
+    if _option(args, '-vf', '').count('transpose') == 1:
+        width, height = height, width
+    description = dict(info, width=width, height=height,
+                       corrupt=_chance(input_file, 'corrupt', 'FAKE_FFMPEG_CORRUPT_RATE'))
+    progress = '-progress' in args
+    start = float(args[args.index('-ss') + 1]) if '-ss' in args[:args.index('-i')] else 0.0
+
+    if _option(args, '-f') == 'segment':
+        # 分段输出：每段写完后追加到分段列表（filename,start,end，时间相对于本次输出的开头）
+        segment_time = float(_option(args, '-segment_time', '2'))
+        list_path = _option(args, '-segment_list')
+        position, index = start, 0
+        while position < info['duration'] - 1e-6:
+            end = min(info['duration'], position + segment_time)
+            _simulate(position, end, progress, offset=start, preset=_option(args, '-preset'))
+            segment_path = output_file % index
+            _write_output(segment_path, dict(description, duration=round(end - position, 3)))
+            if list_path:
+                with open(list_path, 'a', encoding='utf-8') as f:
+                    f.write(f"{os.path.basename(segment_path)},{position - start:.6f},{end - start:.6f}\n")
+            position, index = end, index + 1
+    else:
+        _simulate(start, info['duration'], progress, offset=start, preset=_option(args, '-preset'))
+        if _chance(input_file, 'fail', 'FAKE_FFMPEG_FAIL_RATE'):
+            print(f"{input_file}: Invalid data found when processing input (fake failure)", file=sys.stderr)
+            return 1
+        _write_output(output_file, dict(description, duration=round(info['duration'] - start, 3)))
+    if progress:
+        print(f"out_time_us={int((info['duration'] - start) * 1000000)}\nprogress=end", flush=True)
+    return 0
+
+
+def install(directory):
+    """生成启动脚本，返回 (ffmpeg路径, ffprobe路径)"""
+    os.makedirs(directory, exist_ok=True)
+    script = os.path.abspath(__file__)
+    paths = []
+    for role in ('ffmpeg', 'ffprobe'):
+        if os.name == 'nt':
+            path = os.path.join(directory, f"{role}.cmd")
+            content = f'@"{sys.executable}" "{script}" {role} %*\r\n'
+        else:
+            path = os.path.join(directory, role)
+            content = f'#!/bin/sh\nexec "{sys.executable}" "{script}" {role} "$@"\n'
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.chmod(path, 0o755)
+        paths.append(path)
+    return tuple(paths)
+
+
+def main(argv):
+    if len(argv) >= 2 and argv[0] == '--install':
+        print("\n".join(install(argv[1])))
+        return 0
+    role = argv[0] if argv and argv[0] in ('ffmpeg', 'ffprobe') else (
+        'ffprobe' if 'ffprobe' in os.path.basename(sys.argv[0]) else 'ffmpeg'
+    )
+    args = argv[1:] if argv and argv[0] == role else argv
+    return run_ffprobe(args) if role == 'ffprobe' else run_ffmpeg(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -10,6 +10,12 @@ except ImportError:
     DRAG_DROP_AVAILABLE = False
     print("警告: 未安装tkinterdnd2库，拖拽功能将不可用。可通过 pip install tkinterdnd2 安装。")
 
+# 日志区最多保留的行数，更早的内容只保存在日志文件中
+MAX_LOG_LINES = 5000
+# 文件列表中显示的任务状态（JobStore.state_name）
+JOB_STATE_LABELS = {'pending': '等待', 'running': '处理中', 'paused': '已暂停',
+                    'done': '完成', 'failed': '失败', 'cancelled': '已取消'}
+
 class VideoRotatorUI:
     """视频旋转工具的用户界面类"""
     
@@ -42,6 +48,9 @@ class VideoRotatorUI:
         self.create_subdir_var = tk.BooleanVar(value=False)
         self.hw_accel_var = tk.StringVar(value="无")
         self.concurrent_tasks_var = tk.IntVar(value=1)
+        self.concurrent_auto_var = tk.BooleanVar(value=False)
+        self.container_mode_var = tk.StringVar(value="default")
+        self.codec_policy_var = tk.StringVar(value="h264")
         self.status_var = tk.StringVar(value="就绪")
         self.time_var = tk.StringVar(value="剩余时间: --:--:--")
     
@@ -142,6 +151,7 @@ class VideoRotatorUI:
         ttk.Button(file_btn_frame, text="📁 添加文件", command=self.controller.add_files, width=12).pack(side=tk.LEFT, padx=5)
         ttk.Button(file_btn_frame, text="📂 添加文件夹", command=self.controller.add_folder, width=12).pack(side=tk.LEFT, padx=5)
         ttk.Button(file_btn_frame, text="🗑 清空列表", command=self.controller.clear_list, width=12).pack(side=tk.LEFT, padx=5)
+        ttk.Button(file_btn_frame, text="👁 预览", command=self.controller.preview_selected, width=12).pack(side=tk.LEFT, padx=5)
         
         # 文件列表
         list_frame = ttk.Frame(file_frame)
@@ -156,6 +166,16 @@ class VideoRotatorUI:
         
         self.file_listbox.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         file_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        
+        # 右键菜单：处理过程中对选中的任务进行控制
+        self.job_menu = tk.Menu(self.file_listbox, tearoff=0)
+        self.job_menu.add_command(label="⏭ 优先处理", command=lambda: self.controller.control_selected_jobs('prioritize'))
+        self.job_menu.add_command(label="⏸ 暂停", command=lambda: self.controller.control_selected_jobs('pause'))
+        self.job_menu.add_command(label="▶ 继续", command=lambda: self.controller.control_selected_jobs('resume'))
+        self.job_menu.add_command(label="✖ 取消", command=lambda: self.controller.control_selected_jobs('cancel'))
+        self.job_menu.add_separator()
+        self.job_menu.add_command(label="✖ 取消所有排队任务", command=self.controller.cancel_pending_jobs)
+        self.file_listbox.bind("<Button-3>", self.show_job_menu)
     
     def create_settings_section(self, parent):
         """创建旋转设置区域"""
@@ -256,13 +276,34 @@ class VideoRotatorUI:
         concurrent_frame = ttk.Frame(advanced_frame)
         concurrent_frame.grid(row=1, column=1, sticky=tk.W, padx=5, pady=5)
         
-        ttk.Scale(concurrent_frame, from_=1, to=8, variable=self.concurrent_tasks_var, 
-                 orient=tk.HORIZONTAL, length=180).pack(side=tk.LEFT)
+        self.concurrent_scale = ttk.Scale(concurrent_frame, from_=1, to=8, variable=self.concurrent_tasks_var,
+                                          orient=tk.HORIZONTAL, length=180)
+        self.concurrent_scale.pack(side=tk.LEFT)
         self.concurrent_label = ttk.Label(concurrent_frame, text="1", width=3)
         self.concurrent_label.pack(side=tk.LEFT, padx=(10, 0))
+        # 自动：按本机校准结果（cli.py calibrate）选择并发数和每任务线程数
+        ttk.Checkbutton(concurrent_frame, text="自动", variable=self.concurrent_auto_var).pack(side=tk.LEFT, padx=(8, 0))
         
-        # 绑定滑块变化事件
+        # 绑定滑块和自动选项的变化事件（包括加载配置时以代码设置的值）
         self.concurrent_tasks_var.trace('w', self.on_concurrent_changed)
+        self.concurrent_auto_var.trace('w', self.on_concurrent_changed)
+        
+        # MP4输出封装模式
+        ttk.Label(advanced_frame, text="输出封装:", font=('', 9, 'bold')).grid(row=2, column=0, sticky=tk.W, padx=5, pady=5)
+        container_frame = ttk.Frame(advanced_frame)
+        container_frame.grid(row=2, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        ttk.Radiobutton(container_frame, text="默认", variable=self.container_mode_var, value="default").pack(side=tk.LEFT, padx=(0, 8))
+        ttk.Radiobutton(container_frame, text="快速启动", variable=self.container_mode_var, value="faststart").pack(side=tk.LEFT, padx=(0, 8))
+        ttk.Radiobutton(container_frame, text="分段MP4(边编码边读取)", variable=self.container_mode_var, value="fragmented").pack(side=tk.LEFT)
+        
+        # 编码策略
+        ttk.Label(advanced_frame, text="编码策略:", font=('', 9, 'bold')).grid(row=3, column=0, sticky=tk.W, padx=5, pady=5)
+        codec_frame = ttk.Frame(advanced_frame)
+        codec_frame.grid(row=3, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        ttk.Radiobutton(codec_frame, text="H.264", variable=self.codec_policy_var, value="h264").pack(side=tk.LEFT, padx=(0, 8))
+        ttk.Radiobutton(codec_frame, text="匹配源(编码格式/码率/色彩)", variable=self.codec_policy_var, value="match_source").pack(side=tk.LEFT)
     
     def create_button_section(self, parent):
         """创建按钮区域"""
@@ -273,6 +314,12 @@ class VideoRotatorUI:
         self.start_btn = ttk.Button(button_frame, text="🚀 开始处理", command=self.controller.start_processing, width=14)
         self.start_btn.pack(side=tk.LEFT, padx=8)
         
+        self.plan_btn = ttk.Button(button_frame, text="📋 预估", command=self.controller.plan_processing, width=14)
+        self.plan_btn.pack(side=tk.LEFT, padx=8)
+        
+        self.watch_btn = ttk.Button(button_frame, text="👀 监视文件夹", command=self.controller.toggle_watch, width=14)
+        self.watch_btn.pack(side=tk.LEFT, padx=8)
+        
         self.stop_btn = ttk.Button(button_frame, text="⏹ 停止", command=self.controller.stop_processing, state=tk.DISABLED, width=14)
         self.stop_btn.pack(side=tk.LEFT, padx=8)
     
@@ -328,16 +375,83 @@ class VideoRotatorUI:
             self.output_dir_var.set(os.path.normpath(directory))
     
     def on_concurrent_changed(self, *args):
-        """并发任务数变化时的处理"""
-        self.concurrent_label.config(text=str(self.concurrent_tasks_var.get()))
+        """并发任务数变化时的处理；自动模式下禁用滑块"""
+        auto = self.concurrent_auto_var.get()
+        self.concurrent_scale.state(['disabled'] if auto else ['!disabled'])
+        self.concurrent_label.config(text="自动" if auto else str(self.concurrent_tasks_var.get()), width=4 if auto else 3)
     
-    def update_file_list(self, files):
-        """更新文件列表显示"""
+    def format_file_entry(self, file, info=None, state=None):
+        """文件列表中一行的显示文字：任务状态、文件名，有媒体信息时附加时长、分辨率和编码格式"""
+        filename = os.path.basename(file)
+        if state:
+            filename = f"[{JOB_STATE_LABELS.get(state, state)}] {filename}"
+        if not info:
+            return f"{filename} ({file})"
+        details = []
+        if info.get('duration'):
+            seconds = int(info['duration'])
+            details.append(f"{seconds // 3600:02d}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}")
+        if info.get('width') and info.get('height'):
+            details.append(f"{info['width']}x{info['height']}")
+        if info.get('video_codec'):
+            details.append(info['video_codec'])
+        return f"{filename} [{' '.join(details)}] ({file})"
+    
+    def update_file_list(self, jobs):
+        """按任务表（JobStore）更新文件列表显示，列表中的序号即任务ID"""
         self.file_listbox.delete(0, tk.END)
-        for file in files:
-            filename = os.path.basename(file)
-            display_text = f"{filename} ({file})"
-            self.file_listbox.insert(tk.END, display_text)
+        entries = [self.format_file_entry(jobs.path(job_id), jobs.info(job_id), jobs.state_name(job_id))
+                   for job_id in range(len(jobs))]
+        if entries:
+            self.file_listbox.insert(tk.END, *entries)
+    
+    def update_file_entry(self, index, file, info, state=None):
+        """更新单个文件的显示（探测结果到达、任务状态变化时），保持选中状态"""
+        entry = self.format_file_entry(file, info, state)
+        if self.file_listbox.get(index) == entry:
+            return
+        selected = self.file_listbox.selection_includes(index)
+        self.file_listbox.delete(index)
+        self.file_listbox.insert(index, entry)
+        if selected:
+            self.file_listbox.selection_set(index)
+    
+    def refresh_visible_entries(self, jobs):
+        """按任务表刷新当前可见的行（处理中定时调用），不可见的行滚动到时再刷新，开销与列表长度无关"""
+        first = self.file_listbox.nearest(0)
+        last = self.file_listbox.nearest(self.file_listbox.winfo_height())
+        for job_id in range(max(first, 0), min(last + 1, len(jobs))):
+            self.update_file_entry(job_id, jobs.path(job_id), jobs.info(job_id), jobs.state_name(job_id))
+    
+    def show_job_menu(self, event):
+        """在鼠标位置弹出任务控制菜单，右键点击的项未选中时改为选中该项"""
+        index = self.file_listbox.nearest(event.y)
+        if index >= 0 and index not in self.file_listbox.curselection():
+            self.file_listbox.selection_clear(0, tk.END)
+            self.file_listbox.selection_set(index)
+        self.job_menu.tk_popup(event.x_root, event.y_root)
+    
+    def get_selected_indices(self):
+        """获取文件列表中所有选中项的索引"""
+        return list(self.file_listbox.curselection())
+    
+    def get_selected_index(self):
+        """获取文件列表中第一个选中项的索引，未选中时返回None"""
+        selection = self.file_listbox.curselection()
+        return selection[0] if selection else None
+    
+    def show_preview(self, title, image_paths):
+        """在新窗口中并排显示预览帧"""
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        window.images = []  # 保持引用，防止图片被回收
+        for column, path in enumerate(image_paths):
+            try:
+                image = tk.PhotoImage(file=path)
+            except tk.TclError:
+                continue
+            window.images.append(image)
+            ttk.Label(window, image=image).grid(row=0, column=column, padx=4, pady=4)
     
     def create_copyright_section(self, parent):
         """创建版权信息区域"""
@@ -355,6 +469,16 @@ class VideoRotatorUI:
                                    font=('', 8), foreground='gray', anchor='center')
         copyright_label.grid(row=1, column=0, sticky=(tk.W, tk.E))
     
+    def log_messages(self, messages):
+        """批量添加日志消息，日志区只保留最近的 MAX_LOG_LINES 行"""
+        self.log_text.config(state=tk.NORMAL)
+        self.log_text.insert(tk.END, "\n".join(messages) + "\n")
+        line_count = int(self.log_text.index('end-1c').split('.')[0])
+        if line_count > MAX_LOG_LINES:
+            self.log_text.delete('1.0', f"{line_count - MAX_LOG_LINES + 1}.0")
+        self.log_text.see(tk.END)
+        self.log_text.config(state=tk.DISABLED)
+    
     def log_message(self, message):
         """添加日志消息"""
         self.log_text.config(state=tk.NORMAL)
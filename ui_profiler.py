@@ -0,0 +1,212 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+
+# 主循环延迟的采样间隔（毫秒）：每次用 after() 预约下一次采样，实际执行时间与预约时间之差即为延迟
+LAG_INTERVAL_MS = 100
+# 超过该延迟（秒）记为卡顿，报告中列出最严重的几次及期间运行过的耗时调用
+STALL_SECONDS = 0.1
+# tracemalloc 快照间隔（秒）和回溯深度
+SNAPSHOT_INTERVAL = 60
+TRACE_FRAMES = 10
+# 超过该耗时（秒）的被测调用会被记下，用于解释卡顿
+SLOW_CALL_SECONDS = 0.02
+MAX_LAG_SAMPLES = 1000000
+TOP_COUNT = 25
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class UIProfiler:
+    """界面卡顿分析：cProfile、tracemalloc快照、Tk主循环延迟采样和每秒界面事件计数
+
+    cProfile只统计调用 start() 的线程，即Tk主线程（界面刷新、日志显示、列表更新都在这里执行），
+    工作线程的编码和探测不计入。事件计数可以在任意线程调用。stop() 时在报告目录写出
+    ui_profile_时间.txt（文字报告）和 ui_profile_时间.prof（可用 pstats/snakeviz 查看）。
+    """
+
+    def __init__(self, root, report_dir, lag_interval_ms=LAG_INTERVAL_MS, trace_memory=True):
+        self.root = root
+        self.report_dir = report_dir
+        self.lag_interval_ms = lag_interval_ms
+        self.trace_memory = trace_memory
+        self.profile = cProfile.Profile()
+        self._lock = threading.Lock()
+        self._events = {}  # 事件类型 -> [总数, 当前秒的计数, 每秒峰值, 总耗时, 最长耗时]
+        self._second = 0
+        self._lags = []
+        self._stalls = []  # (延迟秒数, 发生时间, [期间的耗时调用])
+        self._slow_calls = deque(maxlen=200)  # (结束时间, 名称, 耗时)
+        self._snapshots = []  # (相对时间, 当前内存, 峰值内存)
+        self._first_snapshot = None
+        self._last_snapshot = None
+        self._expected = None
+        self.started = None
+        self.running = False
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._second = int(self.started)
+        self.running = True
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        self._take_snapshot()
+        self.profile.enable()
+        self._schedule_lag_sample()
+        return self
+
+    def _schedule_lag_sample(self):
+        self._expected = time.perf_counter() + self.lag_interval_ms / 1000
+        self.root.after(self.lag_interval_ms, self._sample_lag)
+
+    def _sample_lag(self):
+        if not self.running:
+            return
+        now = time.perf_counter()
+        lag = max(now - self._expected, 0.0)
+        if len(self._lags) < MAX_LAG_SAMPLES:
+            self._lags.append(lag)
+        if lag >= STALL_SECONDS:
+            # 卡顿期间结束的耗时调用（被测方法）很可能就是原因
+            window_start = self._expected - self.lag_interval_ms / 1000
+            with self._lock:
+                culprits = [(name, elapsed) for end, name, elapsed in self._slow_calls if end >= window_start]
+            self._stalls.append((lag, now - self.started, culprits))
+            self._stalls.sort(key=lambda item: -item[0])
+            del self._stalls[TOP_COUNT:]
+        if self._snapshots and now - self.started - self._snapshots[-1][0] >= SNAPSHOT_INTERVAL:
+            # 快照本身的耗时不计入热点；下一次延迟采样在快照之后重新预约，也不计入延迟
+            self.profile.disable()
+            self._take_snapshot()
+            self.profile.enable()
+        self._schedule_lag_sample()
+
+    def _take_snapshot(self):
+        if not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        self._snapshots.append((time.perf_counter() - self.started, current, peak))
+        # 过滤（纯Python实现，较慢）留到写报告时进行
+        snapshot = tracemalloc.take_snapshot()
+        if self._first_snapshot is None:
+            self._first_snapshot = snapshot
+        self._last_snapshot = snapshot
+
+    def count(self, kind, elapsed=None):
+        """记录一次界面事件（回调类型、被测方法调用等），elapsed 为其耗时（秒）"""
+        now = time.perf_counter()
+        second = int(now)
+        with self._lock:
+            if second != self._second:
+                for entry in self._events.values():
+                    entry[1] = 0
+                self._second = second
+            entry = self._events.get(kind)
+            if entry is None:
+                entry = self._events[kind] = [0, 0, 0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += 1
+            entry[2] = max(entry[2], entry[1])
+            if elapsed is not None:
+                entry[3] += elapsed
+                entry[4] = max(entry[4], elapsed)
+                if elapsed >= SLOW_CALL_SECONDS:
+                    self._slow_calls.append((now, kind, elapsed))
+
+    def instrument(self, obj, *names):
+        """把对象的方法替换为计数计时的包装（需要在回调绑定之前调用，例如创建界面之前）"""
+        for name in names:
+            method = getattr(obj, name)
+            label = f"{type(obj).__name__}.{name}"
+
+            @functools.wraps(method)
+            def wrapper(*args, _method=method, _label=label, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return _method(*args, **kwargs)
+                finally:
+                    self.count(_label, time.perf_counter() - started)
+
+            setattr(obj, name, wrapper)
+
+    def stop(self):
+        """停止采样并写出报告，返回报告路径（写入失败时返回None）"""
+        if not self.running:
+            return None
+        self.running = False
+        self.profile.disable()
+        self._take_snapshot()
+        if self.trace_memory:
+            tracemalloc.stop()
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        base = os.path.join(self.report_dir, f"ui_profile_{stamp}")
+        try:
+            os.makedirs(self.report_dir, exist_ok=True)
+            self.profile.dump_stats(base + ".prof")
+            with open(base + ".txt", 'w', encoding='utf-8') as f:
+                f.write(self.format_report())
+        except OSError as e:
+            print(f"写入性能分析报告失败: {e}")
+            return None
+        return base + ".txt"
+
+    def format_report(self):
+        """文字报告：主循环延迟、界面事件频率、主线程热点函数和内存分配"""
+        duration = max(time.perf_counter() - self.started, 1e-9)
+        lines = [f"界面性能分析报告（{datetime.now().isoformat(timespec='seconds')}，时长 {duration:.1f} 秒）", ""]
+
+        lags = sorted(self._lags)
+        lines.append(f"== Tk主循环延迟（after({self.lag_interval_ms}) 的实际执行时间 - 预约时间）==")
+        if lags:
+            stall_count = sum(1 for lag in lags if lag >= STALL_SECONDS)
+            lines.append(
+                f"采样 {len(lags)} 次  平均 {sum(lags) / len(lags) * 1000:.1f}ms  "
+                f"p50 {_percentile(lags, 0.5) * 1000:.1f}ms  p95 {_percentile(lags, 0.95) * 1000:.1f}ms  "
+                f"p99 {_percentile(lags, 0.99) * 1000:.1f}ms  最大 {lags[-1] * 1000:.1f}ms  "
+                f"≥{STALL_SECONDS * 1000:.0f}ms 的卡顿 {stall_count} 次"
+            )
+        for lag, at, culprits in self._stalls:
+            detail = "，".join(f"{name} {elapsed * 1000:.0f}ms" for name, elapsed in culprits) or "无被测调用"
+            lines.append(f"  {at:8.1f}s  卡顿 {lag * 1000:.0f}ms  期间: {detail}")
+        lines.append("")
+
+        lines.append("== 界面事件（次数 / 平均每秒 / 峰值每秒 / 总耗时 / 最长耗时）==")
+        with self._lock:
+            events = sorted(self._events.items(), key=lambda item: (-item[1][3], -item[1][0]))
+        for kind, (total, _, peak, elapsed, longest) in events:
+            timing = f"{elapsed * 1000:10.0f}ms {longest * 1000:8.1f}ms" if elapsed else ""
+            lines.append(f"  {kind:<40} {total:8d} {total / duration:8.1f}/s {peak:6d}/s {timing}")
+        lines.append("")
+
+        lines.append(f"== 主线程热点（按累计耗时，前{TOP_COUNT}项）==")
+        stream = io.StringIO()
+        pstats.Stats(self.profile, stream=stream).sort_stats("cumulative").print_stats(TOP_COUNT)
+        lines.extend(line for line in stream.getvalue().splitlines() if line.strip())
+        lines.append("")
+
+        if self._last_snapshot is not None:
+            filters = (tracemalloc.Filter(False, tracemalloc.__file__),
+                       tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"))
+            first, last = self._first_snapshot.filter_traces(filters), self._last_snapshot.filter_traces(filters)
+            lines.append("== 内存（tracemalloc）==")
+            for at, current, peak in self._snapshots:
+                lines.append(f"  {at:8.1f}s  当前 {current / 2 ** 20:8.1f}MB  峰值 {peak / 2 ** 20:8.1f}MB")
+            lines.append(f"-- 当前分配最多的位置（前{TOP_COUNT}项）--")
+            for stat in last.statistics("lineno")[:TOP_COUNT]:
+                lines.append(f"  {stat}")
+            if self._first_snapshot is not self._last_snapshot:
+                lines.append(f"-- 开始以来增长最多的位置（前{TOP_COUNT}项）--")
+                for stat in last.compare_to(first, "lineno")[:TOP_COUNT]:
+                    lines.append(f"  {stat}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,189 @@
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 抽样解码的位置数（开头、中间、结尾）和每处解码的媒体时长
+SAMPLE_COUNT = 3
+SAMPLE_SECONDS = 1.0
+# 输出时长与源视频允许的偏差：取绝对值和相对值中较大者
+DURATION_TOLERANCE = 0.5
+DURATION_TOLERANCE_RATIO = 0.02
+# 帧数估计允许的偏差
+FRAME_TOLERANCE = 2
+FRAME_TOLERANCE_RATIO = 0.02
+# 抽样解码的超时时间（秒）
+DECODE_TIMEOUT = 120
+
+
+def expected_dimensions(info, rotation):
+    """按源视频的显示尺寸（已考虑旋转元数据）和旋转方向计算输出分辨率"""
+    width, height = info.get('width'), info.get('height')
+    if not width or not height:
+        return None
+    if (info.get('display_rotation') or 0) % 180:
+        width, height = height, width
+    if rotation in ("顺时针90度", "逆时针90度"):
+        width, height = height, width
+    return width, height
+
+
+def estimate_frames(info):
+    """视频帧数：优先使用容器记录的帧数，否则按时长×帧率估算"""
+    if info.get('nb_frames'):
+        return info['nb_frames']
+    if info.get('duration') and info.get('fps'):
+        return info['duration'] * info['fps']
+    return None
+
+
+def check_metadata(source_info, output_info, rotation):
+    """比较源视频和输出的媒体信息，返回不一致项的说明，全部一致时返回None"""
+    if not output_info.get('video_count'):
+        return "输出中没有视频流"
+
+    # 默认流选择只保留一路音频，进程内编码会复制全部音频
+    source_audio = source_info.get('audio_count') or 0
+    output_audio = output_info.get('audio_count') or 0
+    if output_audio < min(source_audio, 1) or output_audio > source_audio:
+        return f"音频流数量不一致（源 {source_audio}，输出 {output_audio}）"
+
+    source_duration, output_duration = source_info.get('duration'), output_info.get('duration')
+    if source_duration:
+        if not output_duration:
+            return "无法读取输出时长"
+        tolerance = max(DURATION_TOLERANCE, source_duration * DURATION_TOLERANCE_RATIO)
+        if abs(output_duration - source_duration) > tolerance:
+            return f"时长不一致（源 {source_duration:.2f}秒，输出 {output_duration:.2f}秒）"
+
+    source_frames, output_frames = estimate_frames(source_info), estimate_frames(output_info)
+    if source_frames and output_frames:
+        tolerance = max(FRAME_TOLERANCE, source_frames * FRAME_TOLERANCE_RATIO)
+        if abs(output_frames - source_frames) > tolerance:
+            return f"帧数不一致（源约 {source_frames:.0f} 帧，输出约 {output_frames:.0f} 帧）"
+
+    expected = expected_dimensions(source_info, rotation)
+    actual = (output_info.get('width'), output_info.get('height'))
+    if expected and actual != expected:
+        return f"分辨率不符合旋转结果（应为 {expected[0]}x{expected[1]}，实际 {actual[0]}x{actual[1]}）"
+    return None
+
+
+def check_output(output_file, source_info, output_info, rotation):
+    """解码之前的检查：输出存在且非空、能读取媒体信息、与源视频的媒体信息一致，返回问题说明，全部通过时返回None"""
+    if not os.path.exists(output_file) or os.path.getsize(output_file) == 0:
+        return "输出文件不存在或为空"
+    if not output_info:
+        return "无法读取输出文件的媒体信息"
+    return check_metadata(source_info, output_info, rotation) if source_info else None
+
+
+def sample_positions(duration, count=SAMPLE_COUNT, sample_seconds=SAMPLE_SECONDS):
+    """抽样解码的 [(起始时间, 解码时长)]：均匀分布在开头到结尾之间，最后一处覆盖文件末尾
+
+    时长不足以容纳互不重叠的各处抽样（或未知）时，改为完整解码一次，解码时长为None
+    """
+    if not duration or count <= 1 or duration < count * sample_seconds:
+        return [(0.0, None)]
+    last = duration - sample_seconds
+    return [(round(last * index / (count - 1), 3), sample_seconds) for index in range(count)]
+
+
+def build_decode_args(ffmpeg_path, output_file, samples):
+    """一个FFmpeg进程解码全部抽样：每处抽样作为一个定位到起始时间的输入，各自输出到null"""
+    args = [ffmpeg_path, "-v", "error", "-nostdin"]
+    for position, seconds in samples:
+        if position:
+            args += ["-ss", str(position)]
+        if seconds:
+            args += ["-t", str(seconds)]
+        args += ["-i", output_file]
+    for index in range(len(samples)):
+        args += ["-map", f"{index}:v:0", "-f", "null", "-"]
+    return args
+
+
+def decode_error(samples, returncode, stderr):
+    """抽样解码的结果：有错误输出或返回码非0时返回说明，否则返回None"""
+    if returncode == 0 and not stderr.strip():
+        return None
+    detail = stderr.strip().splitlines()[-1] if stderr.strip() else f"返回码 {returncode}"
+    where = "完整解码" if samples[0][1] is None else "、".join(f"{position:.1f}" for position, _ in samples) + "秒处"
+    return f"抽样解码失败（{where}）: {detail}"
+
+
+class OutputVerifier:
+    """编码完成后的输出校验：比较媒体信息并抽样解码少量GOP，在独立的线程池中运行，不占用编码并发
+
+    verify() 返回 (是否通过, 错误信息)；submit() 返回Future，供批处理在编码下一个文件的同时等待结果。
+    close(wait=False) 取消排队中的校验并终止正在运行的解码进程。
+    """
+
+    def __init__(self, processor, max_workers=1):
+        self.processor = processor
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="verify")
+        self._lock = threading.Lock()
+        self._processes = set()
+        self._closed = False
+
+    def submit(self, input_file, output_file, rotation, source_info=None):
+        return self.executor.submit(self.verify, input_file, output_file, rotation, source_info)
+
+    def close(self, wait=True):
+        """关闭线程池；wait为False时取消尚未开始的校验，并终止正在运行的解码"""
+        with self._lock:
+            self._closed = True
+            processes = list(self._processes) if not wait else []
+        self.executor.shutdown(wait=False, cancel_futures=not wait)
+        for process in processes:
+            try:
+                process.kill()
+            except OSError:
+                pass
+        if wait:
+            self.executor.shutdown(wait=True)
+
+    def verify(self, input_file, output_file, rotation, source_info=None):
+        """校验输出文件，任何一项失败即返回 (False, 原因)；source_info 为已探测的源视频信息，省略时探测"""
+        try:
+            source_info = source_info or self.processor.probe_video(input_file)
+            output_info = self.processor.probe_video(output_file)
+            problem = check_output(output_file, source_info, output_info, rotation)
+            if problem:
+                return False, problem
+            return self.decode_samples(output_file, output_info.get('duration'))
+        except Exception as e:
+            return False, f"校验异常: {e}"
+
+    def decode_samples(self, output_file, duration):
+        """在开头、中间和结尾各解码一小段（从所在GOP的关键帧开始），只要有错误输出即视为损坏"""
+        samples = sample_positions(duration)
+        process = subprocess.Popen(
+            build_decode_args(self.processor.ffmpeg_path, output_file, samples),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        )
+        with self._lock:
+            self._processes.add(process)
+            closed = self._closed
+        if closed:
+            process.kill()
+        try:
+            _, stderr = process.communicate(timeout=DECODE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            return False, "抽样解码超时"
+        finally:
+            with self._lock:
+                self._processes.discard(process)
+                closed = self._closed
+        if closed and process.returncode != 0:
+            return False, "校验已取消"
+        error = decode_error(samples, process.returncode, stderr)
+        return (False, error) if error else (True, None)
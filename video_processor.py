@@ -1,3 +1,4 @@
+import logging
 import os
 import subprocess
 import threading
@@ -5,6 +6,67 @@ import time
 from datetime import datetime
 import sys
 
+from eta_model import EncodeHistory
+from io_scheduler import IOScheduler
+from job_store import RUNNING, PAUSED
+from log_sink import get_logger
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm', '.m4v')
+# 硬件编码器异常退出的返回码：Windows上的 -22(AVERROR(EINVAL)) 与访问冲突，其他系统上 -22 截断为234
+HW_CRASH_RETURN_CODES = (4294967274, -1073741818, 234)
+# 输出校验失败后自动重新编码的次数
+MAX_VERIFY_RETRIES = 1
+# 输出超出大小上限时降低码率重新编码的最多次数
+MAX_SIZE_CAP_RETRIES = 2
+
+
+def is_video_file(filepath):
+    """检查文件是否为视频文件"""
+    return filepath.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def iter_video_files(directory):
+    """递归遍历目录中的所有视频文件"""
+    for root_dir, _, files in os.walk(directory):
+        for file in files:
+            if is_video_file(file):
+                yield os.path.normpath(os.path.join(root_dir, file))
+
+
+# 编码器族 -> 各硬件加速选项使用的编码器（匹配源编码策略）
+CODEC_FAMILY_ENCODERS = {
+    "h264": {"software": "libx264", "nvenc": "h264_nvenc", "qsv": "h264_qsv", "amf": "h264_amf"},
+    "hevc": {"software": "libx265", "nvenc": "hevc_nvenc", "qsv": "hevc_qsv", "amf": "hevc_amf"},
+    "av1": {"software": "libsvtav1", "nvenc": "av1_nvenc", "qsv": "av1_qsv", "amf": "av1_amf"},
+    "vp9": {"software": "libvpx-vp9"},
+}
+
+# 各编码器可以直接输出的像素格式；硬件编码器的10位输出使用p010le
+ENCODER_PIX_FMTS = {
+    "libx264": {"yuv420p", "yuvj420p", "yuv422p", "yuv444p", "yuv420p10le", "yuv422p10le", "yuv444p10le"},
+    "libx265": {"yuv420p", "yuvj420p", "yuv422p", "yuv444p", "yuv420p10le", "yuv422p10le", "yuv444p10le"},
+    "libsvtav1": {"yuv420p", "yuv420p10le"},
+    "libvpx-vp9": {"yuv420p", "yuv422p", "yuv444p", "yuv420p10le", "yuv422p10le", "yuv444p10le"},
+}
+HW_PIX_FMTS = {"yuv420p": "yuv420p", "yuvj420p": "yuv420p", "nv12": "nv12", "yuv420p10le": "p010le", "p010le": "p010le"}
+
+
+def _parse_rate(rate):
+    """解析FFprobe的帧率字符串（如 30000/1001）"""
+    try:
+        num, _, den = str(rate).partition('/')
+        value = float(num) / float(den or 1)
+        return value if value > 0 else None
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
 class VideoProcessor:
     """视频处理类，负责FFmpeg相关的视频旋转操作"""
     
@@ -17,6 +79,37 @@ class VideoProcessor:
         self.start_time = None
         self.ffmpeg_path = self.find_ffmpeg()  # 查找FFmpeg路径
         self.ffprobe_path = self.find_ffprobe()  # 查找FFprobe路径
+        self.io_scheduler = IOScheduler()  # 按设备限制并发I/O
+        self.media_info_cache = {}  # (路径, 大小, 修改时间) -> 媒体信息
+        self._probing = {}  # 正在探测的缓存键 -> 探测完成事件
+        self._probe_lock = threading.Lock()
+        self.measured_speed = {}  # 硬件加速选项 -> 实测编码速度（相对实时的倍数）
+        self._av_engine = None  # 进程内编码引擎（PyAV），首次使用时创建
+        self.encode_history = EncodeHistory()  # 历史编码速度，用于预测耗时
+        self.eta = None  # 当前批次的剩余时间估算（EtaTracker）
+        self.preset_controller = None  # 当前批次的吞吐量控制器（设置了截止时间或目标速度时）
+        self.batch_concurrency = 1
+        self.probe_workers = None  # 并行探测数，None表示按CPU核数自动选择
+        self.logger = get_logger("processor")
+        self.ui_log_level = None  # 界面显示的最低日志级别，None表示与日志级别（advanced.log_level）一致
+        
+        # 任务控制状态，任务ID为文件在本批列表中的索引；待调度队列和运行中的任务由当前批次（BatchRun）持有
+        self._job_lock = threading.RLock()
+        self._batch = None  # 当前批次的调度器（batch_run.BatchRun）
+        self._job_processes = {}  # 任务ID -> FFmpeg进程
+        self._paused_jobs = set()
+        self._cancelled_jobs = set()
+        self._job_context = threading.local()  # 当前工作线程正在处理的任务ID
+    
+    def log(self, message, level=logging.INFO, stage=None, file=None, duration=None, ui=True):
+        """记录一条日志：写入结构化日志文件（后台线程写入，不阻塞调用线程），
+        级别不低于 ui_log_level 且 ui 为True时同时交给界面显示
+        """
+        job_id = getattr(self._job_context, 'job_id', None)
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, message.strip(), extra={'job_id': job_id, 'file': file, 'stage': stage, 'duration': duration})
+        if ui and self.ui_callback and level >= (self.ui_log_level or self.logger.getEffectiveLevel()):
+            self.ui_callback('log', message)
     
     def get_rotation_filter(self, rotation):
         """根据旋转方向返回FFmpeg滤镜参数"""
@@ -49,8 +142,82 @@ class VideoProcessor:
         else:
             return ["-c:v", "libx264"]
     
-    def get_output_path(self, input_file, suffix, output_option, output_dir, create_subdir):
-        """生成输出文件路径"""
+    def get_output_codec_params(self, input_file, output_file, hw_accel, encode_options=None):
+        """按编码策略返回视频编码参数
+        
+        h264（默认）: 固定使用H.264，码率由编码器默认码控决定
+        match_source: 按探测结果选择同一编码族的编码器，目标码率接近源视频，保留像素格式和色彩信息
+        encode_options['target_video_bitrate'] 指定时（如超出大小上限后的重试）使用该码率
+        """
+        encode_options = encode_options or {}
+        target_bitrate = encode_options.get('target_video_bitrate')
+        info = None
+        if encode_options.get('codec_policy') == 'match_source' and input_file and os.path.exists(input_file):
+            info = self.probe_video(input_file)
+        if not info:
+            params = self.get_video_codec_params(hw_accel)
+            if target_bitrate:
+                params += self.get_bitrate_params(target_bitrate)
+            return params
+        
+        family = info.get('video_codec') if info.get('video_codec') in CODEC_FAMILY_ENCODERS else "h264"
+        accel = hw_accel if hw_accel in ("nvenc", "qsv", "amf") else "software"
+        encoders = CODEC_FAMILY_ENCODERS[family]
+        if accel not in encoders:
+            accel = "software"
+        encoder = encoders[accel]
+        params = ["-c:v", encoder]
+        
+        # hvc1标签让苹果设备和浏览器能识别MP4中的HEVC
+        if family == "hevc" and os.path.splitext(output_file)[1].lower() in ('.mp4', '.mov', '.m4v'):
+            params += ["-tag:v", "hvc1"]
+        if encoder == "libvpx-vp9":
+            params += ["-row-mt", "1"]
+        
+        bitrate = target_bitrate or info.get('video_bit_rate')
+        limit = self.get_size_limit(input_file, encode_options)
+        if bitrate and limit and info.get('duration'):
+            # 目标码率不超过大小上限允许的视频码率（留5%给封装开销）
+            allowed = (limit * 8 / info['duration'] - (info.get('audio_bit_rate') or 0)) * 0.95
+            bitrate = min(bitrate, max(allowed, 1))
+        if bitrate:
+            params += self.get_bitrate_params(bitrate)
+        
+        pix_fmt = info.get('pix_fmt')
+        if accel == "software":
+            pix_fmt = pix_fmt if pix_fmt in ENCODER_PIX_FMTS.get(encoder, ()) else None
+        else:
+            pix_fmt = HW_PIX_FMTS.get(pix_fmt)
+        if pix_fmt:
+            params += ["-pix_fmt", pix_fmt]
+        
+        for option, key in (("-color_primaries", 'color_primaries'), ("-color_trc", 'color_transfer'),
+                            ("-colorspace", 'color_space'), ("-color_range", 'color_range')):
+            value = info.get(key)
+            if value and value != "unknown":
+                params += [option, value]
+        return params
+    
+    def get_thread_params(self, encode_options=None):
+        """每个编码任务的线程数（encode_options['encoder_threads']，来自校准结果），未设置时由编码器自动决定"""
+        threads = (encode_options or {}).get('encoder_threads')
+        return ["-threads", str(threads)] if threads else []
+    
+    def get_preset_params(self, codec_params, encode_options=None):
+        """编码预设（encode_options['encoder_preset']，由吞吐量控制器按截止时间分配），编码器不支持该预设时不添加"""
+        preset = (encode_options or {}).get('encoder_preset')
+        if not preset or "-c:v" not in codec_params[:-1]:
+            return []
+        from preset_controller import preset_params
+        return preset_params(codec_params[codec_params.index("-c:v") + 1], preset)
+    
+    def get_bitrate_params(self, bitrate):
+        """目标平均码率，峰值不超过1.5倍"""
+        bitrate = int(bitrate)
+        return ["-b:v", str(bitrate), "-maxrate", str(int(bitrate * 1.5)), "-bufsize", str(bitrate * 2)]
+    
+    def get_output_path(self, input_file, suffix, output_option, output_dir, create_subdir, create_dirs=True):
+        """生成输出文件路径（create_dirs为False时只计算路径，不创建子目录）"""
         base_name = os.path.splitext(os.path.basename(input_file))[0]
         ext = os.path.splitext(input_file)[1]
         output_filename = f"{base_name}{suffix}{ext}"
@@ -62,7 +229,8 @@ class VideoProcessor:
             if create_subdir:
                 date_str = datetime.now().strftime("%Y%m%d")
                 output_dir = os.path.join(desktop_path, f"rotated_videos_{date_str}")
-                os.makedirs(output_dir, exist_ok=True)
+                if create_dirs:
+                    os.makedirs(output_dir, exist_ok=True)
                 output_path = os.path.join(output_dir, output_filename)
             else:
                 output_path = os.path.join(desktop_path, output_filename)
@@ -70,204 +238,836 @@ class VideoProcessor:
             if create_subdir:
                 date_str = datetime.now().strftime("%Y%m%d")
                 output_dir = os.path.join(output_dir, f"rotated_videos_{date_str}")
-                os.makedirs(output_dir, exist_ok=True)
+                if create_dirs:
+                    os.makedirs(output_dir, exist_ok=True)
             output_path = os.path.join(output_dir, output_filename)
         
         return output_path
     
-    def reencode_video(self, input_file, output_file, rotation, hw_accel, progress_callback=None):
-        """重新编码视频文件"""
-        # 首先尝试使用指定的硬件加速
-        success, error = self._try_encode(input_file, output_file, rotation, hw_accel)
+    def probe_video(self, file_path):
+        """使用FFprobe获取视频信息，结果按文件大小和修改时间缓存，失败返回None"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        cache_key = (file_path, stat.st_size, stat.st_mtime)
+        # 同一文件正在被其他线程探测时（如后台探测与输出校验同时需要源视频信息）等待其结果，不重复启动FFprobe
+        with self._probe_lock:
+            if cache_key in self.media_info_cache:
+                return self.media_info_cache[cache_key]
+            in_flight = self._probing.get(cache_key)
+            if in_flight is None:
+                self._probing[cache_key] = threading.Event()
+        if in_flight is not None:
+            in_flight.wait()
+            return self.media_info_cache.get(cache_key)
+        
+        info = None
+        try:
+            result = subprocess.run(
+                [self.ffprobe_path, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", file_path],
+                capture_output=True,
+                text=True,
+                encoding='utf-8',
+                errors='replace',
+                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+            )
+            if result.returncode == 0:
+                info = self.parse_probe_output(result.stdout, stat.st_size)
+                self.media_info_cache[cache_key] = info
+        except Exception:
+            pass
+        finally:
+            with self._probe_lock:
+                self._probing.pop(cache_key).set()
+        return info
+    
+    def parse_probe_output(self, output, file_size=0):
+        """把FFprobe的JSON输出整理为媒体信息字典"""
+        import json
+        data = json.loads(output or '{}')
+        streams = data.get('streams', [])
+        fmt = data.get('format', {})
+        video = next((st for st in streams if st.get('codec_type') == 'video'), {})
+        audio_streams = [st for st in streams if st.get('codec_type') == 'audio']
+        
+        duration = _to_float(fmt.get('duration')) or _to_float(video.get('duration'))
+        bit_rate = _to_float(fmt.get('bit_rate'))
+        if not bit_rate and duration and file_size:
+            bit_rate = file_size * 8 / duration
+        audio_bit_rate = sum(_to_float(st.get('bit_rate')) or 0 for st in audio_streams)
+        video_bit_rate = _to_float(video.get('bit_rate'))
+        if not video_bit_rate and bit_rate:
+            video_bit_rate = max(bit_rate - audio_bit_rate, 0) or None
+        # 手机拍摄的视频常带旋转元数据（显示矩阵或rotate标签），FFmpeg解码时会先按它自动旋转
+        display_rotation = next(
+            (_to_float(item.get('rotation')) for item in video.get('side_data_list', []) if 'rotation' in item),
+            _to_float(video.get('tags', {}).get('rotate'))
+        )
+        
+        return {
+            'duration': duration,
+            'size': _to_float(fmt.get('size')) or file_size,
+            'bit_rate': bit_rate,
+            'video_bit_rate': video_bit_rate,
+            'audio_bit_rate': audio_bit_rate,
+            'video_codec': video.get('codec_name'),
+            'width': video.get('width'),
+            'height': video.get('height'),
+            'fps': _parse_rate(video.get('avg_frame_rate')) or _parse_rate(video.get('r_frame_rate')),
+            'nb_frames': int(video['nb_frames']) if str(video.get('nb_frames', '')).isdigit() else None,
+            'pix_fmt': video.get('pix_fmt'),
+            'color_range': video.get('color_range'),
+            'color_space': video.get('color_space'),
+            'color_transfer': video.get('color_transfer'),
+            'color_primaries': video.get('color_primaries'),
+            'display_rotation': int(display_rotation) if display_rotation else 0,
+            'stream_count': len(streams),
+            'video_count': sum(1 for st in streams if st.get('codec_type') == 'video'),
+            'audio_count': len(audio_streams),
+        }
+    
+    def record_encode_speed(self, hw_accel, media_duration, elapsed):
+        """记录实测编码速度（指数平滑），供批量预估使用"""
+        if not media_duration or elapsed <= 0:
+            return
+        speed = media_duration / elapsed
+        previous = self.measured_speed.get(hw_accel)
+        self.measured_speed[hw_accel] = speed if previous is None else previous * 0.7 + speed * 0.3
+    
+    def get_history_key(self, hw_accel, encode_options=None):
+        """历史记录中区分编码速度的 (编码器, 配置)"""
+        encode_options = encode_options or {}
+        encoder = self.get_video_codec_params(hw_accel)[1]
+        profile = f"{encode_options.get('codec_policy') or 'h264'}/{encode_options.get('container_mode') or 'default'}"
+        if encode_options.get('encoder_preset'):
+            profile += f"/{encode_options['encoder_preset']}"
+        return encoder, profile
+    
+    def predict_encode_time(self, info, hw_accel, encode_options=None, concurrency=None):
+        """按历史速度预测单个文件的编码耗时（秒），没有历史时使用本次运行的实测值或默认估计"""
+        if not info or not info.get('duration'):
+            return None
+        encoder, profile = self.get_history_key(hw_accel, encode_options)
+        width, height = info.get('width'), info.get('height')
+        speed = self.encode_history.predict_speed(encoder, profile, width, height, concurrency or self.batch_concurrency)
+        if not speed:
+            from planner import DEFAULT_ENCODER_SPEED
+            speed = self.measured_speed.get(hw_accel) or DEFAULT_ENCODER_SPEED.get(hw_accel, 1.0)
+            # 默认速度按1080p估计，按像素数折算到实际分辨率
+            if width and height:
+                speed *= (1920 * 1080) / max(width * height, 1)
+        return info['duration'] / speed
+    
+    def select_engine(self, input_file, hw_accel, encode_options=None):
+        """选择编码后端：短视频使用进程内PyAV引擎（pyav），其余使用FFmpeg子进程（ffmpeg）
+        
+        encode_options['engine']: auto（默认，按时长自动选择）/ ffmpeg / pyav；
+        进程内引擎只支持软件H.264编码和默认封装，PyAV未安装时始终使用FFmpeg；带旋转元数据的视频
+        需要FFmpeg按显示矩阵自动旋转（否则方向和分辨率与FFmpeg路径不同），也使用FFmpeg。
+        """
+        import av_engine
+        
+        encode_options = encode_options or {}
+        engine = encode_options.get('engine', 'auto')
+        if engine == 'ffmpeg' or not av_engine.is_available():
+            return 'ffmpeg'
+        if hw_accel not in ('无', 'software') or encode_options.get('container_mode', 'default') != 'default':
+            return 'ffmpeg'
+        if encode_options.get('codec_policy', 'h264') != 'h264' or encode_options.get('target_video_bitrate'):
+            return 'ffmpeg'
+        if engine == 'pyav':
+            return 'pyav'
+        
+        if self._av_engine is None:
+            self._av_engine = av_engine.AVEngine()
+        # 优先使用已缓存的探测结果，否则在进程内读取，避免为了选择后端再启动ffprobe
+        if not os.path.exists(input_file):
+            return 'ffmpeg'
+        info = self.get_cached_info(input_file)
+        if info:
+            duration, display_rotation = info.get('duration'), info.get('display_rotation')
+        else:
+            duration, display_rotation = self._av_engine.probe(input_file)
+        if display_rotation:
+            return 'ffmpeg'
+        max_seconds = encode_options.get('inprocess_max_seconds', 15)
+        return 'pyav' if duration and duration <= max_seconds else 'ffmpeg'
+    
+    def _encode_in_process(self, input_file, output_file, rotation):
+        """使用进程内引擎编码，可被任务取消和停止处理中断"""
+        import av_engine
         
-        # 如果硬件加速失败且不是软件编码，则回退到软件编码
-        if not success and hw_accel != "software":
-            if "进程被异常终止" in str(error) or "4294967274" in str(error):
-                if self.ui_callback:
-                    self.ui_callback('log', f"⚠️ 硬件加速失败，回退到软件编码: {os.path.basename(input_file)}")
-                success, error = self._try_encode(input_file, output_file, rotation, "software")
+        if self._av_engine is None:
+            self._av_engine = av_engine.AVEngine()
+        job_id = getattr(self._job_context, 'job_id', None)
+        was_processing = self.is_processing  # 单独调用（不在批处理中）时不受停止标志影响
+        
+        def should_continue():
+            if was_processing and not self.is_processing:
+                return False
+            return job_id is None or job_id not in self._cancelled_jobs
+        
+        self.log(f"开始处理: {os.path.basename(input_file)} (进程内编码)", stage="encode", file=input_file)
+        started = time.time()
+        success, error = self._av_engine.rotate(input_file, output_file, rotation, should_continue)
+        if success:
+            self.log(f"✅ 完成: {os.path.basename(output_file)}", stage="encode", file=input_file, duration=time.time() - started)
+        return success, error
+    
+    def get_size_limit(self, input_file, encode_options=None):
+        """输出文件大小上限（字节）：输入大小 ×（1 + max_size_growth_percent%），未设置时返回None"""
+        growth = (encode_options or {}).get('max_size_growth_percent')
+        if growth is None or not input_file or not os.path.exists(input_file):
+            return None
+        return os.path.getsize(input_file) * (1 + growth / 100)
+    
+    def get_size_cap_retry(self, input_file, output_file, encode_options=None):
+        """输出超出大小上限时的重试，返回 (原因, 降低码率后的编码选项)，未超出上限或无法估算码率时返回None"""
+        limit = self.get_size_limit(input_file, encode_options)
+        if not limit:
+            return None
+        output_size = os.path.getsize(output_file)
+        info = self.probe_video(input_file)
+        if output_size <= limit or not info or not info.get('duration'):
+            return None
+        # 由实际输出大小反推视频码率，按超出比例降低并留10%余量
+        current = (encode_options or {}).get('target_video_bitrate') or max(
+            output_size * 8 / info['duration'] - (info.get('audio_bit_rate') or 0), 1
+        )
+        target = int(current * limit / output_size * 0.9)
+        reason = (f"输出比输入大 {(output_size / os.path.getsize(input_file) - 1) * 100:.0f}%，"
+                  f"降低码率到 {target // 1000} kb/s 重新编码")
+        return reason, dict(encode_options or {}, target_video_bitrate=target)
+    
+    def reencode_video(self, input_file, output_file, rotation, hw_accel, progress_callback=None, encode_options=None):
+        """重新编码视频文件；设置了大小上限时，输出超出上限会按比例降低码率重试（最多 MAX_SIZE_CAP_RETRIES 次）"""
+        success, error = self._reencode(input_file, output_file, rotation, hw_accel, progress_callback, encode_options)
+        if not success or not self.get_size_limit(input_file, encode_options):
+            return success, error
         
+        for _ in range(MAX_SIZE_CAP_RETRIES):
+            retry = self.get_size_cap_retry(input_file, output_file, encode_options)
+            if retry is None:
+                break
+            reason, encode_options = retry
+            self.log(f"⚠️ {reason}: {os.path.basename(input_file)}", level=logging.WARNING, stage="size_cap", file=input_file)
+            success, error = self._reencode(input_file, output_file, rotation, hw_accel, progress_callback, encode_options)
+            if not success:
+                return success, error
+        else:
+            if self.get_size_cap_retry(input_file, output_file, encode_options) is not None:
+                self.log(f"⚠️ 多次降低码率后输出仍超过大小上限: {os.path.basename(input_file)}",
+                         level=logging.WARNING, stage="size_cap", file=input_file)
         return success, error
     
-    def _try_encode(self, input_file, output_file, rotation, hw_accel):
-        """尝试编码视频文件"""
+    def _reencode(self, input_file, output_file, rotation, hw_accel, progress_callback=None, encode_options=None):
+        """选择后端编码一次，处理各类可恢复的失败"""
+        # 短视频优先在进程内编码，失败时回退到FFmpeg子进程
+        if self.select_engine(input_file, hw_accel, encode_options) == 'pyav':
+            success, error = self._encode_in_process(input_file, output_file, rotation)
+            if success or error == "已取消":
+                return success, error
+            self.log(f"⚠️ {error}，改用FFmpeg: {os.path.basename(input_file)}", level=logging.WARNING, stage="encode", file=input_file)
+        
+        # 长视频使用可续编的分段编码
+        encode = self._encode_checkpointed if self.use_checkpoint(input_file, encode_options) else self._try_encode
+        
+        # 首先尝试使用指定的硬件加速，失败时按 get_encode_fallback 依次回退
+        success, error = encode(input_file, output_file, rotation, hw_accel, encode_options, progress_callback)
+        while not success:
+            fallback = self.get_encode_fallback(error, hw_accel, encode_options)
+            if fallback is None:
+                break
+            reason, hw_accel, encode_options = fallback
+            self.log(f"⚠️ {reason}: {os.path.basename(input_file)}", level=logging.WARNING, stage="encode", file=input_file)
+            success, error = encode(input_file, output_file, rotation, hw_accel, encode_options, progress_callback)
+        
+        return success, error
+    
+    def get_encode_fallback(self, error, hw_accel, encode_options=None):
+        """编码失败后的回退，返回 (原因, 硬件加速, 编码选项)，没有可用的回退时返回None
+        
+        预留的moov空间不足时改用写完后再移动moov的快速启动；硬件编码器异常退出时改用软件编码；
+        当前FFmpeg不包含匹配源策略选择的编码器（如libsvtav1）时改用H.264。每种回退改变了触发它的条件，不会重复
+        """
+        error = str(error)
+        encode_options = encode_options or {}
+        if "reserved_moov_size" in error and encode_options.get('container_mode') != "faststart_rewrite":
+            return "预留的索引空间不足，改用二次写入的快速启动", hw_accel, dict(encode_options, container_mode="faststart_rewrite")
+        if hw_accel not in ("software", "无") and ("进程被异常终止" in error or "4294967274" in error):
+            return "硬件加速失败，回退到软件编码", "software", encode_options
+        if encode_options.get('codec_policy') == 'match_source' and ("Unknown encoder" in error or "Encoder not found" in error):
+            return "FFmpeg不支持源编码格式的编码器，改用H.264", hw_accel, dict(encode_options, codec_policy="h264")
+        return None
+    
+    def describe_encode_failure(self, returncode, stderr):
+        """FFmpeg编码失败的错误信息（包含完整错误输出，供 get_encode_fallback 识别）"""
+        error_details = []
+        if stderr and stderr.strip():
+            error_details.append(f"错误输出: {stderr.strip()}")
+        
+        # 根据返回码提供更具体的错误信息
+        if returncode in HW_CRASH_RETURN_CODES:
+            error_details.append("进程被异常终止，可能原因: 1)硬件加速不支持 2)文件路径包含特殊字符 3)磁盘空间不足")
+        elif returncode == 1:
+            error_details.append("FFmpeg参数错误或文件格式不支持")
+        
+        return f"FFmpeg错误 (返回码: {returncode})" + (f" - {'; '.join(error_details)}" if error_details else "")
+    
+    def use_checkpoint(self, input_file, encode_options=None):
+        """时长不短于 checkpoint_min_seconds（0或未设置表示关闭）的视频使用分段编码"""
+        min_seconds = (encode_options or {}).get('checkpoint_min_seconds')
+        if not min_seconds or not input_file or not os.path.exists(input_file):
+            return False
+        info = self.probe_video(input_file)
+        return bool(info and info.get('duration') and info['duration'] >= min_seconds)
+    
+    def _encode_checkpointed(self, input_file, output_file, rotation, hw_accel, encode_options=None, progress_callback=None):
+        """分段编码：输出按关键帧对齐的分段写入断点目录，中断后再次运行只编码剩余部分，最后无损拼接
+        
+        分段时长由 checkpoint_segment_seconds 指定（默认60秒），每段开头强制关键帧，
+        源文件或编码参数变化时旧分段作废。拼接完成后删除分段和状态文件。
+        """
+        from checkpoint import CheckpointState
+        
+        encode_options = encode_options or {}
+        segment_seconds = encode_options.get('checkpoint_segment_seconds') or 60
+        stat = os.stat(input_file)
+        info = self.probe_video(input_file) or {}
+        duration = info.get('duration') or 0
+        # 封装模式只影响最后的拼接，不计入签名，改用其他封装时已完成的分段仍可复用
+        signature = {
+            'input': os.path.abspath(input_file), 'size': stat.st_size, 'mtime': stat.st_mtime,
+            'rotation': rotation, 'hw_accel': hw_accel, 'segment_seconds': segment_seconds,
+            'codec': self.get_output_codec_params(input_file, output_file, hw_accel, encode_options),
+        }
+        state = CheckpointState(output_file)
+        if state.load(signature):
+            from planner import format_duration
+            self.log(f"⏩ 从 {format_duration(state.resume_time())} 处继续编码: {os.path.basename(input_file)}",
+                     stage="checkpoint", file=input_file)
+        
+        # 剩余部分不足半帧时视为已全部完成
+        if not duration or state.resume_time() < duration - 0.05:
+            pattern, list_path, offset = state.begin_run()
+            success, error = self._try_encode(
+                input_file, pattern, rotation, hw_accel, encode_options, progress_callback,
+                input_options=["-ss", f"{offset:.6f}"] if offset else None,
+                output_options=[
+                    "-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})",
+                    "-f", "segment", "-segment_time", str(segment_seconds), "-segment_format", "matroska",
+                    "-reset_timestamps", "1", "-segment_list", list_path, "-segment_list_type", "csv",
+                ],
+                progress_offset=offset, display_file=output_file
+            )
+            if not success:
+                # 已完成的分段保留在断点目录中，下次从最后一个完成的分段之后继续
+                return success, error
+        
+        return self._join_segments(state, input_file, output_file, hw_accel, encode_options)
+    
+    def _join_segments(self, state, input_file, output_file, hw_accel, encode_options):
+        """用concat分离器把已完成的分段无损拼接为最终输出"""
+        args = [self.ffmpeg_path, "-v", "error", "-f", "concat", "-safe", "0", "-i", state.write_concat_list(),
+                "-map", "0", "-c", "copy"]
+        if "hvc1" in self.get_output_codec_params(input_file, output_file, hw_accel, encode_options):
+            args += ["-tag:v", "hvc1"]
+        args += self.get_container_params(encode_options.get('container_mode'), input_file, output_file)
+        args += ["-y", output_file]
         try:
-            # 构建FFmpeg命令字符串，正确的参数顺序：输入选项 → 输入文件 → 输出选项 → 输出文件
-            cmd_parts = [f'"{self.ffmpeg_path}"']
-            
-            # 添加输入选项（硬件加速必须在-i之前）
-            hw_params = self.get_hw_accel_params(hw_accel)
-            cmd_parts.extend(hw_params)
-            
-            # 添加输入文件
-            cmd_parts.extend(["-i", f'"{input_file}"'])
-            
-            # 添加输出选项：视频编码器、旋转滤镜、音频复制
-            video_codec_params = self.get_video_codec_params(hw_accel)
-            cmd_parts.extend(video_codec_params)
-            
-            rotation_filter = self.get_rotation_filter(rotation)
-            cmd_parts.extend(["-vf", rotation_filter, "-c:a", "copy", "-y", f'"{output_file}"'])
-            
-            # 将命令列表转换为字符串
-            cmd_str = ' '.join(cmd_parts)
-            
-            if self.ui_callback:
-                accel_type = "软件编码" if hw_accel == "software" else f"{hw_accel.upper()}硬件加速"
-                self.ui_callback('log', f"开始处理: {os.path.basename(input_file)} ({accel_type})")
-                self.ui_callback('log', f"命令: {cmd_str}")
-            
-            # 启动进程，使用shell=True以正确处理路径中的特殊字符
-            process = subprocess.Popen(
-                cmd_str,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
+            result = subprocess.run(
+                args,
+                capture_output=True,
+                text=True,
+                encoding='utf-8',
+                errors='replace',
                 creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
             )
+        except Exception as e:
+            return False, f"拼接分段失败: {e}"
+        if result.returncode != 0:
+            return False, f"拼接分段失败 (返回码: {result.returncode}) - {result.stderr.strip()}"
+        state.clear()
+        return True, None
+    
+    def get_container_params(self, container_mode, input_file, output_file):
+        """根据输出封装模式返回MP4封装参数（仅对mp4/mov/m4v输出生效）
+        
+        faststart: 按时长和帧率估算索引(moov)大小并预留在文件开头，编码结束时直接写入，
+                   无需像 +faststart 那样再完整复制一遍文件；无法估算时退回 +faststart
+        faststart_rewrite: 使用 +faststart，写完后把moov移到文件开头（需要一次额外的文件复制）
+        fragmented: 分段MP4，每个完成的分段可以在编码继续进行时被下游读取
+        """
+        if not container_mode or container_mode == "default":
+            return []
+        if os.path.splitext(output_file)[1].lower() not in ('.mp4', '.mov', '.m4v'):
+            return []
+        
+        if container_mode == "fragmented":
+            # 每个关键帧开始新分段，且分段不超过2秒，保证下游能及时读到完成的分段
+            return ["-movflags", "+frag_keyframe+empty_moov+default_base_moof", "-frag_duration", "2000000"]
+        
+        if container_mode == "faststart":
+            info = self.probe_video(input_file) if input_file and os.path.exists(input_file) else None
+            if info and info.get('duration') and info.get('fps'):
+                # 每个视频/音频样本在索引中约占16字节（stsz/stts/ctts/stco），AAC约每秒47个音频包
+                samples = info['duration'] * (info['fps'] + 47 * max(info.get('audio_count') or 0, 1))
+                moov_size = int(samples * 16 * 1.25) + 64 * 1024
+                return ["-moov_size", str(moov_size)]
+        
+        return ["-movflags", "+faststart"]
+    
+    def build_encode_args(self, input_file, output_file, rotation, hw_accel, output_options=None, encode_options=None, input_options=None):
+        """构建FFmpeg编码参数列表，正确的参数顺序：输入选项 → 输入文件 → 输出选项 → 输出文件"""
+        encode_options = encode_options or {}
+        # 添加输入选项（硬件加速必须在-i之前）
+        args = [self.ffmpeg_path]
+        args.extend(self.get_hw_accel_params(hw_accel))
+        if input_options:
+            args.extend(input_options)
+        
+        # 添加输入文件
+        args.extend(["-i", input_file])
+        
+        # 添加输出选项：视频编码器、旋转滤镜、音频复制
+        codec_params = self.get_output_codec_params(input_file, output_file, hw_accel, encode_options)
+        args.extend(codec_params)
+        args.extend(self.get_preset_params(codec_params, encode_options))
+        args.extend(self.get_thread_params(encode_options))
+        args.extend(["-vf", self.get_rotation_filter(rotation), "-c:a", "copy"])
+        args.extend(self.get_container_params(encode_options.get('container_mode'), input_file, output_file))
+        if output_options:
+            args.extend(output_options)
+        
+        args.extend(["-y", output_file])
+        return args
+    
+    def _try_encode(self, input_file, output_file, rotation, hw_accel, encode_options=None, progress_callback=None,
+                    input_options=None, output_options=None, progress_offset=0.0, display_file=None):
+        """尝试编码视频文件
+        
+        input_options/output_options 为附加的FFmpeg参数（如分段编码的 -ss 和 segment 输出），
+        progress_offset 为本次编码在源视频中的起始秒数，用于换算实时进度；
+        display_file 为日志中显示的输出文件（分段编码时为最终输出而不是分段文件模板），默认为 output_file
+        """
+        try:
+            # 构建FFmpeg命令字符串，路径加引号
+            # -progress 把实时进度以 key=value 行写到标准输出，用于修正剩余时间
+            args = self.build_encode_args(
+                input_file, output_file, rotation, hw_accel,
+                output_options=["-progress", "pipe:1", "-nostats"] + list(output_options or []),
+                encode_options=encode_options, input_options=input_options
+            )
+            paths = (self.ffmpeg_path, input_file, output_file)
+            cmd_str = ' '.join(f'"{arg}"' if arg in paths else arg for arg in args)
+            
+            job_id = getattr(self._job_context, 'job_id', None)
             
-            # 将进程添加到活跃进程列表
-            self.active_processes.append(process)
+            accel_type = "软件编码" if hw_accel == "software" else f"{hw_accel.upper()}硬件加速"
+            predicted = self.eta.get_prediction(job_id) if self.eta and job_id is not None else None
+            if predicted is not None:
+                from planner import format_duration
+                accel_type += f"，预计 {format_duration(predicted)}"
+            self.log(f"开始处理: {os.path.basename(input_file)} ({accel_type})", stage="encode", file=input_file)
+            # 完整命令行只在调试级别记录
+            self.log(f"命令: {cmd_str}", level=logging.DEBUG, stage="encode", file=input_file)
+            started = time.time()
+            
+            with self._job_lock:
+                if job_id is not None and job_id in self._cancelled_jobs:
+                    return False, "已取消"
+                
+                # 以参数列表直接启动FFmpeg（不经过shell），路径中的特殊字符无需转义，
+                # 暂停/终止信号也直接作用于FFmpeg进程本身
+                process = subprocess.Popen(
+                    args,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    universal_newlines=True,
+                    encoding='utf-8',
+                    errors='replace',
+                    creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+                )
+                
+                # 将进程添加到活跃进程列表
+                self.active_processes.append(process)
+                if job_id is not None:
+                    self._job_processes[job_id] = process
             
             try:
-                # 等待进程完成
-                stdout, stderr = process.communicate()
+                # 标准错误在后台线程收集，当前线程逐行读取进度直到进程结束
+                stderr_lines = []
+                stderr_reader = threading.Thread(target=lambda: stderr_lines.extend(process.stderr), daemon=True)
+                stderr_reader.start()
+                for line in process.stdout:
+                    if line.startswith("out_time_us="):
+                        try:
+                            media_seconds = progress_offset + int(line.split("=", 1)[1]) / 1000000
+                        except ValueError:
+                            continue  # 尚无输出时为 N/A
+                        if progress_callback:
+                            progress_callback(media_seconds)
+                        if self.eta and job_id is not None:
+                            self.eta.update_progress(job_id, media_seconds)
+                process.wait()
+                stderr_reader.join()
+                stderr = "".join(stderr_lines)
+                
+                if job_id is not None and job_id in self._cancelled_jobs:
+                    return False, "已取消"
                 
                 if process.returncode == 0:
-                    if self.ui_callback:
-                        self.ui_callback('log', f"✅ 完成: {os.path.basename(output_file)}")
+                    self.log(f"✅ 完成: {os.path.basename(display_file or output_file)}", stage="encode", file=input_file,
+                             duration=time.time() - started)
                     return True, None
                 else:
-                    # 处理错误信息
-                    error_details = []
-                    if stderr and stderr.strip():
-                        error_details.append(f"错误输出: {stderr.strip()}")
-                    if stdout and stdout.strip():
-                        error_details.append(f"标准输出: {stdout.strip()}")
-                    
-                    # 根据返回码提供更具体的错误信息
-                    if process.returncode == 4294967274 or process.returncode == -1073741818:
-                        error_details.append("进程被异常终止，可能原因: 1)硬件加速不支持 2)文件路径包含特殊字符 3)磁盘空间不足")
-                    elif process.returncode == 1:
-                        error_details.append("FFmpeg参数错误或文件格式不支持")
+                    error_msg = self.describe_encode_failure(process.returncode, stderr)
                     
-                    error_msg = f"FFmpeg错误 (返回码: {process.returncode})" + (f" - {'; '.join(error_details)}" if error_details else "")
-                    
-                    if self.ui_callback:
-                        self.ui_callback('log', f"❌ 失败: {os.path.basename(input_file)} - {error_msg}")
+                    self.log(f"❌ 失败: {os.path.basename(input_file)} - {error_msg}", level=logging.ERROR, stage="encode",
+                             file=input_file, duration=time.time() - started)
                     return False, error_msg
             
             except Exception as e:
                 error_msg = f"处理异常: {str(e)}"
-                if self.ui_callback:
-                    self.ui_callback('log', f"❌ 异常: {os.path.basename(input_file)} - {error_msg}")
+                self.log(f"❌ 异常: {os.path.basename(input_file)} - {error_msg}", level=logging.ERROR, stage="encode", file=input_file)
                 return False, error_msg
             
             finally:
                 # 从活跃进程列表中移除
-                if process in self.active_processes:
-                    self.active_processes.remove(process)
+                with self._job_lock:
+                    if process in self.active_processes:
+                        self.active_processes.remove(process)
+                    if job_id is not None and self._job_processes.get(job_id) is process:
+                        del self._job_processes[job_id]
         
         except Exception as e:
             error_msg = f"启动处理失败: {str(e)}"
-            if self.ui_callback:
-                self.ui_callback('log', f"❌ 启动失败: {os.path.basename(input_file)} - {error_msg}")
+            self.log(f"❌ 启动失败: {os.path.basename(input_file)} - {error_msg}", level=logging.ERROR, stage="encode", file=input_file)
             return False, error_msg
     
-    def process_files(self, files, rotation, suffix, output_option, output_dir, create_subdir, hw_accel, max_concurrent=1):
-        """批量处理视频文件"""
-        self.is_processing = True
-        self.total_files = len(files)
-        self.completed_files = 0
-        self.start_time = time.time()
+    def build_batch_args(self, jobs, hw_accel, encode_options=None):
+        """构建一次编码多个短视频的FFmpeg参数：每个输入对应一个独立输出，显式映射各自的流并使用各自的旋转滤镜
         
-        if self.ui_callback:
-            self.ui_callback('status', f"开始处理 {self.total_files} 个文件...")
-            self.ui_callback('progress', {'overall': 0, 'current': 0})
-        
-        # 使用线程池进行并发处理
-        from concurrent.futures import ThreadPoolExecutor, as_completed
+        jobs 为 [(输入文件, 输出文件, 旋转方向)]
+        """
+        encode_options = encode_options or {}
+        args = [self.ffmpeg_path, "-nostdin", "-y"]
+        for input_file, _, _ in jobs:
+            args.extend(self.get_hw_accel_params(hw_accel))
+            args.extend(["-i", input_file])
+        for index, (input_file, output_file, rotation) in enumerate(jobs):
+            # 与单文件编码的默认流选择一致：一路视频，最多一路音频
+            args.extend(["-map", f"{index}:v:0", "-map", f"{index}:a:0?"])
+            codec_params = self.get_output_codec_params(input_file, output_file, hw_accel, encode_options)
+            args.extend(codec_params)
+            args.extend(self.get_preset_params(codec_params, encode_options))
+            args.extend(self.get_thread_params(encode_options))
+            args.extend(["-vf", self.get_rotation_filter(rotation), "-c:a", "copy"])
+            args.extend(self.get_container_params(encode_options.get('container_mode'), input_file, output_file))
+            args.append(output_file)
+        return args
+    
+    def encode_batch(self, jobs, hw_accel, encode_options=None, job_ids=()):
+        """用一个FFmpeg进程编码一组短视频，省去每个文件的进程启动和初始化开销，返回 (是否成功, 错误信息)
         
-        def process_single_file(file_path):
-            """处理单个文件的内部函数"""
-            if not self.is_processing:
-                return file_path, False, "处理已停止"
+        任一输入出错时整组失败并删除全部输出，由调用方逐个重新编码以确定是哪个文件出错。
+        job_ids 中的任何一个任务被取消都会终止整组。
+        """
+        try:
+            args = self.build_batch_args(jobs, hw_accel, encode_options)
+            paths = {self.ffmpeg_path}.union(*((input_file, output_file) for input_file, output_file, _ in jobs))
+            cmd_str = ' '.join(f'"{arg}"' if arg in paths else arg for arg in args)
             
-            try:
-                output_path = self.get_output_path(file_path, suffix, output_option, output_dir, create_subdir)
-                
-                # 确保输出目录存在
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                
-                success, error = self.reencode_video(file_path, output_path, rotation, hw_accel)
-                return file_path, success, error
+            accel_type = "软件编码" if hw_accel == "software" else f"{hw_accel.upper()}硬件加速"
+            self.log(f"开始批量处理: {len(jobs)} 个短视频 ({accel_type})", stage="batch_encode")
+            self.log(f"命令: {cmd_str}", level=logging.DEBUG, stage="batch_encode")
+            started = time.time()
+            
+            with self._job_lock:
+                if any(job_id in self._cancelled_jobs for job_id in job_ids):
+                    return False, "已取消"
+                process = subprocess.Popen(
+                    args,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE,
+                    universal_newlines=True,
+                    encoding='utf-8',
+                    errors='replace',
+                    creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+                )
+                self.active_processes.append(process)
+                for job_id in job_ids:
+                    self._job_processes[job_id] = process
             
+            try:
+                _, stderr = process.communicate()
+            finally:
+                with self._job_lock:
+                    if process in self.active_processes:
+                        self.active_processes.remove(process)
+                    for job_id in job_ids:
+                        if self._job_processes.get(job_id) is process:
+                            del self._job_processes[job_id]
+        
+        except Exception as e:
+            return False, f"批量处理失败: {e}"
+        
+        if process.returncode == 0:
+            self.log(f"✅ 批量完成: {len(jobs)} 个文件", stage="batch_encode", duration=time.time() - started)
+            return True, None
+        
+        for _, output_file, _ in jobs:
+            try:
+                os.remove(output_file)
+            except OSError:
+                pass
+        lines = stderr.strip().splitlines() if stderr else []
+        return False, f"FFmpeg错误 (返回码: {process.returncode})" + (f" - {lines[-1]}" if lines else "")
+    
+    def rotate_stream(self, source, sink, rotation, hw_accel, input_format=None, output_format="mp4", encode_options=None):
+        """从字节流读取、旋转后写入字节流，输入输出都不需要本地文件
+        
+        source/sink 可以是 stream_io 中的适配器，也可以是路径、URL、'-'（标准输入/输出）或文件对象。
+        本地文件输入直接交给FFmpeg按路径读取；其他输入经 pipe:0 喂入，此时MP4源文件的moov
+        必须位于文件开头（或使用 input_format 指定 mpegts/matroska 等可流式读取的格式）。
+        输出经 pipe:1 写出：mp4 使用分段MP4（无需回写文件头），matroska 本身即可流式写入。
+        两端各由一个线程按固定大小的块搬运数据，内存占用与文件大小无关。
+        """
+        from collections import deque
+        from stream_io import CHUNK_SIZE, open_sink, open_source
+        
+        content_type = "video/mp4" if output_format == "mp4" else "video/x-matroska"
+        source = open_source(source)
+        try:
+            sink = open_sink(sink, content_type=content_type)
+        except Exception:
+            source.close()
+            raise
+        
+        input_options = ["-f", input_format] if input_format else []
+        output_options = ["-f", output_format]
+        if output_format == "mp4":
+            output_options = ["-movflags", "+frag_keyframe+empty_moov+default_base_moof"] + output_options
+        try:
+            args = self.build_encode_args(
+                source.path or "pipe:0", "pipe:1", rotation, hw_accel,
+                output_options=output_options, encode_options=encode_options, input_options=input_options
+            )
+            with self._job_lock:
+                process = subprocess.Popen(
+                    args,
+                    stdin=subprocess.DEVNULL if source.path else subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+                )
+                self.active_processes.append(process)
+        except Exception:
+            # FFmpeg未能启动（如找不到程序）：释放两端，HTTP上传不发送结束块，服务端丢弃
+            source.close()
+            sink.abort()
+            raise
+        
+        errors = []
+        stderr_tail = deque(maxlen=20)  # 只保留最后几行错误输出
+        
+        def feed():
+            try:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    process.stdin.write(chunk)
+            except BrokenPipeError:
+                pass  # FFmpeg已提前退出，错误由返回码反映
             except Exception as e:
-                return file_path, False, str(e)
+                errors.append(f"读取输入失败: {e}")
+                process.kill()
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
         
-        successful_files = []
-        failed_files = []
+        def drain():
+            try:
+                while True:
+                    chunk = process.stdout.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    sink.write(chunk)
+            except Exception as e:
+                errors.append(f"写入输出失败: {e}")
+                process.kill()
         
-        with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
-            # 提交所有任务
-            future_to_file = {executor.submit(process_single_file, file_path): file_path for file_path in files}
-            
-            # 处理完成的任务
-            for future in as_completed(future_to_file):
-                if not self.is_processing:
-                    break
-                
-                file_path, success, error = future.result()
-                self.completed_files += 1
-                
-                if success:
-                    successful_files.append(file_path)
-                else:
-                    failed_files.append((file_path, error))
-                
-                # 更新进度
-                overall_progress = (self.completed_files / self.total_files) * 100
-                if self.ui_callback:
-                    self.ui_callback('progress', {'overall': overall_progress, 'current': 100})
-                    
-                    # 计算剩余时间
-                    if self.completed_files > 0:
-                        elapsed_time = time.time() - self.start_time
-                        avg_time_per_file = elapsed_time / self.completed_files
-                        remaining_files = self.total_files - self.completed_files
-                        remaining_time = avg_time_per_file * remaining_files
-                        
-                        hours = int(remaining_time // 3600)
-                        minutes = int((remaining_time % 3600) // 60)
-                        seconds = int(remaining_time % 60)
-                        time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                        
-                        self.ui_callback('time', f"剩余时间: {time_str}")
-                        self.ui_callback('status', f"已完成 {self.completed_files}/{self.total_files} 个文件")
-        
-        # 处理完成
-        self.is_processing = False
+        def read_errors():
+            for line in process.stderr:
+                stderr_tail.append(line.decode('utf-8', errors='replace').rstrip())
         
-        if self.ui_callback:
-            if successful_files:
-                self.ui_callback('log', f"\n🎉 处理完成! 成功: {len(successful_files)} 个文件")
+        threads = [threading.Thread(target=drain, daemon=True), threading.Thread(target=read_errors, daemon=True)]
+        if not source.path:
+            threads.append(threading.Thread(target=feed, daemon=True))
+        for thread in threads:
+            thread.start()
+        
+        try:
+            process.wait()
+            for thread in threads:
+                thread.join()
+        finally:
+            source.close()
+            with self._job_lock:
+                if process in self.active_processes:
+                    self.active_processes.remove(process)
+        
+        if process.returncode == 0 and not errors:
+            try:
+                sink.close()
+            except Exception as e:
+                return False, f"写入输出失败: {e}"
+            return True, None
+        
+        sink.abort()
+        error_msg = errors[0] if errors else f"FFmpeg错误 (返回码: {process.returncode}) - {' / '.join(stderr_tail)}"
+        self.log(f"❌ 流处理失败: {error_msg}", level=logging.ERROR, stage="stream")
+        return False, error_msg
+    
+    def process_files(self, files, rotation, suffix, output_option, output_dir, create_subdir, hw_accel, max_concurrent=1, max_io_per_device=2, staging_options=None, encode_options=None, result_callback=None):
+        """批量处理视频文件，调度由 batch_run.BatchRun 完成
+        
+        files 为路径列表，或任意可迭代对象（如 manifest.iter_manifest() 的生成器）。元素可以是路径，
+        也可以是任务字典 {'input', 'output', 'rotation', 'encode_options', 'error'}，缺省项使用批量参数。
+        不支持len()的输入按需读取，队列中只保留有限个待调度任务，清单再大内存占用也保持不变。
+        指定 result_callback(文件路径, 是否成功, 错误信息) 时逐个回调结果，不在内存中累积结果列表。
+        files 为 JobStore 时任务ID即表中的ID，只处理开始时表中已有的任务，任务状态和错误信息随处理进度写回表中。
+        """
+        from batch_run import BatchRun
+        
+        return BatchRun(
+            self, files, rotation, suffix, output_option, output_dir, create_subdir, hw_accel, max_concurrent, max_io_per_device,
+            staging_options=staging_options, encode_options=encode_options, result_callback=result_callback
+        ).run()
+    
+    def process_single(self, file_path, output_path, rotation, hw_accel, staging=None, encode_options=None, verifier=None):
+        """处理单个文件，返回(文件路径, 是否成功, 错误信息)
+        
+        启用暂存时输出先写入暂存目录，指定 verifier 则在移动到目标位置前校验，校验失败时重新编码
+        （最多 MAX_VERIFY_RETRIES 次，与不暂存时批处理的重试次数相同）；暂存时不使用分段编码（断点续编）
+        """
+        if not self.is_processing:
+            return file_path, False, "处理已停止"
+        
+        try:
+            # 确保输出目录存在
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
             
-            if failed_files:
-                self.ui_callback('log', f"❌ 失败: {len(failed_files)} 个文件")
-                for file_path, error in failed_files:
-                    self.ui_callback('log', f"  - {os.path.basename(file_path)}: {error}")
+            started = time.time()
+            if staging is None:
+                success, error = self.reencode_video(file_path, output_path, rotation, hw_accel, encode_options=encode_options)
+                if success:
+                    self._record_file_speed(file_path, hw_accel, time.time() - started, encode_options)
+                return file_path, success, error
             
-            self.ui_callback('status', "处理完成")
-            self.ui_callback('time', "剩余时间: --:--:--")
-            self.ui_callback('progress', {'overall': 100, 'current': 0})
+            input_path = staging.get_input(file_path)
+            if not self.is_processing:
+                staging.release_input(file_path)
+                return file_path, False, "处理已停止"
+            # 暂存的输入和输出是临时文件，每次运行路径不同且结束后即被清理，断点无法续用，因此不使用分段编码
+            staged_options = dict(encode_options or {}, checkpoint_min_seconds=0)
+            try:
+                for attempt in range(MAX_VERIFY_RETRIES + 1):
+                    staged_output = staging.get_output_path(output_path, os.path.getsize(file_path))
+                    started = time.time()
+                    success, error = self.reencode_video(input_path, staged_output, rotation, hw_accel, encode_options=staged_options)
+                    elapsed = time.time() - started
+                    if not success or verifier is None:
+                        break
+                    # 在移动到目标位置前校验，失败时删除输出，趁暂存的输入仍在时重新编码
+                    success, error = verifier.verify(file_path, staged_output, rotation)
+                    if success:
+                        break
+                    self.log(f"⚠️ 输出校验失败: {os.path.basename(output_path)} - {error}", level=logging.WARNING,
+                             stage="verify", file=file_path)
+                    error = f"输出校验失败: {error}"
+                    self._discard_staged_output(staging, staged_output, output_path)
+                    if attempt == MAX_VERIFY_RETRIES or not self.is_processing:
+                        return file_path, False, error
+                    self.log(f"🔁 重新编码: {os.path.basename(file_path)}", stage="verify", file=file_path)
+            finally:
+                staging.release_input(file_path)
+            if success:
+                self._record_file_speed(file_path, hw_accel, elapsed, encode_options)
+                staging.commit_output(staged_output, output_path)
+            else:
+                staging.discard_output(staged_output)
+            return file_path, success, error
+        
+        except Exception as e:
+            return file_path, False, str(e)
+    
+    def _discard_staged_output(self, staging, staged_output, output_path):
+        """删除未通过校验的输出：暂存空间不足时输出直接写在目标位置，也一并删除"""
+        if staged_output == output_path:
+            try:
+                os.remove(output_path)
+            except OSError:
+                pass
+        else:
+            staging.discard_output(staged_output)
+    
+    def get_cached_info(self, file_path):
+        """已缓存的媒体信息，未探测过（或文件已变化）时返回None，不为此额外探测"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return self.media_info_cache.get((file_path, stat.st_size, stat.st_mtime))
+    
+    def _record_file_speed(self, file_path, hw_accel, elapsed, encode_options=None):
+        """根据已缓存的媒体信息记录该文件的编码速度并写入历史（不为此额外探测）"""
+        info = self.get_cached_info(file_path)
+        if info:
+            self.record_encode_speed(hw_accel, info.get('duration'), elapsed)
+            encoder, profile = self.get_history_key(hw_accel, encode_options)
+            self.encode_history.record(
+                encoder, profile, info.get('width'), info.get('height'), info.get('duration'), elapsed, self.batch_concurrency
+            )
+    
+    def format_eta(self, estimate):
+        """把剩余时间估算格式化为界面显示的文字"""
+        from planner import format_duration
         
-        return successful_files, failed_files
+        if estimate['remaining'] is None:
+            return "剩余时间: 估算中..."
+        finish = datetime.fromtimestamp(estimate['completion_time']).strftime('%H:%M')
+        return f"剩余时间: {format_duration(estimate['remaining'])}（预计 {finish} 完成）"
+    
+    def get_metrics(self):
+        """当前批次的处理指标，供命令行和外部监控输出"""
+        metrics = {
+            'processing': self.is_processing,
+            'total': self.total_files,
+            'completed': self.completed_files,
+            'elapsed': time.time() - self.start_time if self.start_time else None,
+            'remaining': None,
+            'completion_time': None,
+            'jobs': {},
+        }
+        eta = self.eta
+        if eta is not None:
+            estimate = eta.estimate()
+            metrics.update(
+                remaining=estimate['remaining'],
+                completion_time=estimate['completion_time'],
+                correction=estimate['correction'],
+                jobs={str(job_id): remaining for job_id, remaining in estimate['jobs'].items()},
+            )
+        return metrics
     
     def start_processing(self, files, processing_params):
         """开始处理视频文件"""
-        if self.ui_callback:
-            self.ui_callback('log', f"🚀 开始处理 {len(files)} 个视频文件...")
+        self.log(f"🚀 开始处理 {len(files)} 个视频文件...", stage="batch")
         
         # 调用process_files方法
         return self.process_files(
@@ -278,38 +1078,143 @@ class VideoProcessor:
             processing_params['output_dir'],
             processing_params['create_subdir'],
             processing_params['hw_accel'],
-            processing_params['concurrent_tasks']
+            processing_params['concurrent_tasks'],
+            processing_params.get('io_per_device', 2),
+            processing_params.get('staging'),
+            processing_params.get('encode_options')
         )
     
-    def stop_processing(self):
-        """停止所有正在进行的处理"""
-        self.is_processing = False
+    def get_job_state(self, job_id):
+        """获取任务状态：pending / running / paused / cancelled，未知任务返回None"""
+        with self._job_lock:
+            if job_id in self._cancelled_jobs:
+                return 'cancelled'
+            if job_id in self._paused_jobs:
+                return 'paused'
+            if self._batch is not None:
+                return self._batch.job_state(job_id)
+        return None
+    
+    def _store_job_state(self, job_id, state):
+        """把任务控制操作后的状态写回当前批次的任务表"""
+        if self._batch is not None:
+            self._batch.set_job_state(job_id, state)
+    
+    def cancel_job(self, job_id):
+        """取消单个任务：排队中的直接移出队列，运行中的终止其FFmpeg进程"""
+        with self._job_lock:
+            batch = self._batch
+            if batch is None:
+                return False
+            if batch.cancel_pending_job(job_id):
+                return True
+            if job_id not in batch.running_jobs:
+                return False
+            self._cancelled_jobs.add(job_id)
+            process = self._job_processes.get(job_id)
         
-        # 终止所有活跃的进程
-        for process in self.active_processes[:]:
+        if process is not None:
+            self._terminate_processes([process])
+        return True
+    
+    def cancel_pending(self):
+        """一次性取消所有尚未开始的任务（流式输入时同时停止读取后续任务），返回取消的数量"""
+        with self._job_lock:
+            return self._batch.cancel_all_pending() if self._batch is not None else 0
+    
+    def prioritize_job(self, job_id):
+        """把排队中的任务移到队首，下一个空闲槽位优先处理"""
+        with self._job_lock:
+            return self._batch is not None and self._batch.prioritize(job_id)
+    
+    def _signal_process(self, process, pause):
+        """暂停或恢复进程：POSIX使用SIGSTOP/SIGCONT，Windows使用NtSuspendProcess/NtResumeProcess"""
+        if os.name == 'nt':
+            import ctypes
+            ntdll = ctypes.windll.ntdll
+            handle = int(process._handle)
+            status = ntdll.NtSuspendProcess(handle) if pause else ntdll.NtResumeProcess(handle)
+            return status == 0
+        import signal
+        process.send_signal(signal.SIGSTOP if pause else signal.SIGCONT)
+        return True
+    
+    def pause_job(self, job_id):
+        """暂停运行中的任务以临时释放CPU"""
+        with self._job_lock:
+            process = self._job_processes.get(job_id)
+            if process is None or job_id in self._paused_jobs or process.poll() is not None:
+                return False
+            if self._signal_process(process, pause=True):
+                self._paused_jobs.add(job_id)
+                self._store_job_state(job_id, PAUSED)
+                return True
+        return False
+    
+    def resume_job(self, job_id):
+        """恢复已暂停的任务"""
+        with self._job_lock:
+            process = self._job_processes.get(job_id)
+            if process is None or job_id not in self._paused_jobs:
+                return False
+            self._paused_jobs.discard(job_id)
+            self._store_job_state(job_id, RUNNING)
+            return self._signal_process(process, pause=False)
+    
+    def _terminate_processes(self, processes, timeout=5):
+        """并行终止一组进程：先全部发送终止信号，统一等待，超时后强制杀死"""
+        for process in processes:
             try:
-                if process and process.poll() is None:
+                if process.poll() is None:
                     process.terminate()
-                    # 等待进程终止，如果超时则强制杀死
-                    try:
-                        process.wait(timeout=5)
-                    except subprocess.TimeoutExpired:
-                        process.kill()
-                        process.wait()
+                    # 已暂停的进程需要恢复后才能处理终止信号
+                    self._signal_process(process, pause=False)
             except Exception as e:
-                if self.ui_callback:
-                    self.ui_callback('log', f"停止进程时出错: {str(e)}")
+                self.log(f"停止进程时出错: {str(e)}", level=logging.WARNING)
+        
+        deadline = time.time() + timeout
+        for process in processes:
+            try:
+                process.wait(timeout=max(0, deadline - time.time()))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            except Exception:
+                pass
+    
+    def stop_processing(self):
+        """停止所有正在进行的处理：立即清空待处理队列并终止所有活跃进程"""
+        self.is_processing = False
+        cancelled = self.cancel_pending()
+        
+        staging = None
+        with self._job_lock:
+            processes = [process for process in self.active_processes if process]
+            if self._batch is not None:
+                self._cancelled_jobs.update(self._batch.unfinished_jobs())
+                staging = self._batch.staging
+            self._paused_jobs.clear()
+        # 先停止预取，等待输入复制完成的工作线程立即返回，线程池才能随之退出
+        if staging is not None:
+            staging.stop_prefetch()
+        self._terminate_processes(processes)
         
         # 清空活跃进程列表
-        self.active_processes.clear()
+        with self._job_lock:
+            self.active_processes.clear()
         
+        if cancelled:
+            self.log(f"⏹ 已取消 {cancelled} 个排队中的任务", stage="batch")
+        self.log("⏹ 处理已停止", stage="batch")
         if self.ui_callback:
-            self.ui_callback('log', "⏹ 处理已停止")
             self.ui_callback('status', "已停止")
     
     def find_ffmpeg(self):
         """查找FFmpeg可执行文件路径"""
-        # 优先级：1. 打包的资源 2. 程序同目录 3. 系统环境变量
+        # 优先级：0. VIDEO_ROTATOR_FFMPEG 环境变量（测试用，如 tools/fake_ffmpeg.py） 1. 打包的资源 2. 程序同目录 3. 系统环境变量
+        override = os.environ.get('VIDEO_ROTATOR_FFMPEG')
+        if override:
+            return override
         
         # 1. 检查打包的资源（PyInstaller）
         if getattr(sys, 'frozen', False):
@@ -336,7 +1241,10 @@ class VideoProcessor:
     
     def find_ffprobe(self):
         """查找FFprobe可执行文件路径"""
-        # 优先级：1. 打包的资源 2. 程序同目录 3. 系统环境变量
+        # 优先级：0. VIDEO_ROTATOR_FFPROBE 环境变量（测试用，如 tools/fake_ffmpeg.py） 1. 打包的资源 2. 程序同目录 3. 系统环境变量
+        override = os.environ.get('VIDEO_ROTATOR_FFPROBE')
+        if override:
+            return override
         
         # 1. 检查打包的资源（PyInstaller）
         if getattr(sys, 'frozen', False):
@@ -361,15 +1269,116 @@ class VideoProcessor:
         # 3. 使用系统环境变量中的ffprobe
         return 'ffprobe'
     
-    def check_ffmpeg(self):
-        """检查FFmpeg是否可用"""
+    def generate_preview(self, input_file, rotation, hw_accel, mode="frames", frame_count=3, clip_seconds=3, cache=None):
+        """生成旋转预览，返回(文件路径列表, 错误信息)
+        
+        mode为"frames"时抽取若干关键帧并按相同旋转滤镜输出PNG；
+        mode为"clip"时用与正式处理完全相同的滤镜和编码参数只编码开头clip_seconds秒。
+        结果缓存在磁盘上的LRU缓存中，按输入文件指纹和设置区分。
+        """
+        from preview_cache import PreviewCache
+        
+        cache = cache or PreviewCache()
+        try:
+            stat = os.stat(input_file)
+        except OSError as e:
+            return [], f"无法读取文件: {e}"
+        
+        ext = os.path.splitext(input_file)[1]
+        if mode == "clip":
+            # 用占位路径生成参数，使缓存键包含完整的编码设置
+            settings = self.build_encode_args("<input>", "<output>", rotation, hw_accel, ["-t", str(clip_seconds)])
+        else:
+            settings = [self.get_rotation_filter(rotation), str(frame_count)]
+        key = cache.make_key(input_file, stat.st_size, stat.st_mtime, mode, settings)
+        
+        cached = cache.get(key)
+        if cached:
+            return cached, None
+        
+        build_dir = cache.create_entry(key)
+        creationflags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        try:
+            if mode == "clip":
+                output_file = os.path.join(build_dir, f"preview{ext}")
+                args = self.build_encode_args(input_file, output_file, rotation, hw_accel, ["-t", str(clip_seconds)])
+                result = subprocess.run(args, capture_output=True, text=True, encoding='utf-8', errors='replace',
+                                        creationflags=creationflags)
+                if result.returncode != 0:
+                    raise RuntimeError(result.stderr.strip()[-500:] or f"返回码 {result.returncode}")
+            else:
+                self._extract_preview_frames(input_file, rotation, frame_count, build_dir, creationflags)
+            return cache.commit(key, build_dir), None
+        except Exception as e:
+            cache.discard(build_dir)
+            return [], f"生成预览失败: {e}"
+    
+    def _extract_preview_frames(self, input_file, rotation, frame_count, entry_dir, creationflags):
+        """在视频中均匀取若干时间点，并行抽取关键帧并应用旋转滤镜"""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        info = self.probe_video(input_file)
+        duration = info.get('duration') if info else None
+        if duration:
+            timestamps = [duration * (i + 1) / (frame_count + 1) for i in range(frame_count)]
+        else:
+            timestamps = [0]
+        
+        def extract(index, timestamp):
+            output_file = os.path.join(entry_dir, f"frame_{index}.png")
+            # -ss放在-i之前进行快速定位，只解码到最近的关键帧
+            args = [self.ffmpeg_path, "-v", "error", "-ss", f"{timestamp:.3f}", "-i", input_file,
+                    "-frames:v", "1", "-vf", f"{self.get_rotation_filter(rotation)},scale=480:-2",
+                    "-y", output_file]
+            result = subprocess.run(args, capture_output=True, text=True, encoding='utf-8', errors='replace',
+                                    creationflags=creationflags)
+            if result.returncode != 0 or not os.path.exists(output_file):
+                raise RuntimeError(result.stderr.strip()[-500:] or f"返回码 {result.returncode}")
+            return output_file
+        
+        with ThreadPoolExecutor(max_workers=len(timestamps)) as executor:
+            return list(executor.map(lambda item: extract(*item), enumerate(timestamps)))
+    
+    def get_binary_signature(self, binary_path):
+        """获取可执行文件的签名（解析后的路径、修改时间、大小），找不到时返回None"""
+        import shutil
+        resolved = binary_path if os.path.isabs(binary_path) else shutil.which(binary_path)
+        if not resolved:
+            return None
+        try:
+            stat = os.stat(resolved)
+        except OSError:
+            return None
+        return {'path': os.path.normcase(os.path.abspath(resolved)), 'mtime': stat.st_mtime, 'size': stat.st_size}
+    
+    def check_ffmpeg(self, cache=None):
+        """检查FFmpeg是否可用；传入cache字典时按路径和修改时间复用之前的检测结果并更新缓存"""
+        signature = self.get_binary_signature(self.ffmpeg_path)
+        if signature is None:
+            return False
+        
+        if cache is not None:
+            entry = cache.get(signature['path'])
+            if entry and entry.get('mtime') == signature['mtime'] and entry.get('size') == signature['size']:
+                return entry.get('ok', False)
+        
         try:
             result = subprocess.run([self.ffmpeg_path, "-version"], 
                                   capture_output=True, 
                                   text=True, 
                                   creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
-            return result.returncode == 0
+            available = result.returncode == 0
+            version = result.stdout.splitlines()[0] if available and result.stdout else ''
         except FileNotFoundError:
             return False
         except Exception:
-            return False
\ No newline at end of file
+            return False
+        
+        if cache is not None:
+            cache[signature['path']] = {
+                'mtime': signature['mtime'],
+                'size': signature['size'],
+                'ok': available,
+                'version': version,
+            }
+        return available
\ No newline at end of file
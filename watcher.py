@@ -0,0 +1,341 @@
+import logging
+import os
+import select
+import shutil
+import struct
+import sys
+import threading
+import time
+
+from verifier import OutputVerifier
+from video_processor import MAX_VERIFY_RETRIES, is_video_file
+
+# inotify事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class _Inotify:
+    """基于ctypes的最小inotify封装（仅Linux）"""
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.watches = {}  # wd -> 目录
+
+    def add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self.watches[wd] = directory
+
+    def read_events(self, timeout):
+        """等待最多timeout秒，返回[(完整路径, 是否为目录)]"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            directory = self.watches.get(wd)
+            if directory and name:
+                events.append((os.path.join(directory, os.fsdecode(name)), bool(mask & IN_ISDIR)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """监视文件夹中的新视频文件，文件大小和修改时间在stable_seconds内保持不变后回调on_stable
+
+    Linux上使用inotify获取变化通知，其他平台或inotify不可用时退回到定时扫描。
+    """
+
+    def __init__(self, folder, on_stable, stable_seconds=5.0, poll_interval=1.0, recursive=True, ignore=None):
+        self.folder = os.path.abspath(folder)
+        self.on_stable = on_stable
+        self.stable_seconds = stable_seconds
+        self.poll_interval = poll_interval
+        self.recursive = recursive
+        self.ignore = ignore  # 可选的过滤函数，返回True的路径被忽略
+        self.backend = None
+
+        self._candidates = {}  # 路径 -> (大小, 修改时间, 最近一次变化的时间)
+        self._seen = {}  # 已回调、尚未处理完的路径 -> (大小, 修改时间)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动监视线程"""
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止监视"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def forget(self, path):
+        """文件已处理完（已移走或已标记），不再需要记录其回调时的状态"""
+        self._seen.pop(path, None)
+
+    def _accept(self, path):
+        return is_video_file(path) and not (self.ignore and self.ignore(path))
+
+    def _scan(self):
+        """扫描目录，把尚未处理的视频文件加入候选"""
+        stack = [self.folder]
+        directories = []
+        while stack:
+            directory = stack.pop()
+            directories.append(directory)
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if self.recursive and not (self.ignore and self.ignore(entry.path)):
+                        stack.append(entry.path)
+                elif entry.is_file() and entry.path not in self._candidates and self._accept(entry.path):
+                    self._touch(entry.path)
+        return directories
+
+    def _touch(self, path):
+        """记录文件当前状态；状态变化时重新开始计时"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._candidates.pop(path, None)
+            return
+        state = (stat.st_size, stat.st_mtime)
+        if self._seen.get(path) == state:
+            return
+        previous = self._candidates.get(path)
+        if previous is None or previous[:2] != state:
+            self._candidates[path] = state + (time.monotonic(),)
+
+    def _check_stable(self):
+        """回调已稳定的候选文件"""
+        now = time.monotonic()
+        for path in list(self._candidates):
+            self._touch(path)
+            entry = self._candidates.get(path)
+            if entry is None:
+                continue
+            size, mtime, changed_at = entry
+            if size > 0 and now - changed_at >= self.stable_seconds:
+                del self._candidates[path]
+                self._seen[path] = (size, mtime)
+                self.on_stable(path)
+
+    def _run(self):
+        inotify = None
+        if sys.platform.startswith('linux'):
+            try:
+                inotify = _Inotify()
+            except Exception:
+                inotify = None
+        self.backend = 'inotify' if inotify else 'polling'
+
+        try:
+            for directory in self._scan():
+                if inotify:
+                    inotify.add_watch(directory)
+
+            # 稳定性检查的间隔不超过1秒，保证落盘后几秒内开始处理
+            check_interval = min(1.0, max(self.stable_seconds / 2, 0.1))
+            last_scan = time.monotonic()
+            while not self._stop_event.is_set():
+                if inotify:
+                    for path, is_dir in inotify.read_events(check_interval):
+                        if is_dir:
+                            if self.recursive and not (self.ignore and self.ignore(path)):
+                                inotify.add_watch(path)
+                                self._scan_new_directory(path, inotify)
+                        elif self._accept(path):
+                            self._touch(path)
+                else:
+                    self._stop_event.wait(check_interval)
+                    if time.monotonic() - last_scan >= self.poll_interval:
+                        self._scan()
+                        last_scan = time.monotonic()
+                self._check_stable()
+        finally:
+            if inotify:
+                inotify.close()
+
+    def _scan_new_directory(self, directory, inotify):
+        """新建（或移入）的子目录：添加监视并收录其中已有的文件"""
+        for root_dir, dirs, files in os.walk(directory):
+            dirs[:] = [d for d in dirs if not (self.ignore and self.ignore(os.path.join(root_dir, d)))]
+            for name in dirs:
+                inotify.add_watch(os.path.join(root_dir, name))
+            for name in files:
+                path = os.path.join(root_dir, name)
+                if self._accept(path):
+                    self._touch(path)
+
+
+class WatchService:
+    """监视文件夹模式：稳定的新文件立即按配置的并发数持续处理，完成后移动或标记输入文件"""
+
+    def __init__(self, processor, folder, processing_params, stable_seconds=5.0, poll_interval=1.0,
+                 on_complete='move', done_dir='_done', failed_dir='_failed'):
+        self.processor = processor
+        self.folder = os.path.abspath(folder)
+        self.params = processing_params
+        self.on_complete = on_complete  # move: 移动到完成/失败子目录; mark: 写入 .done/.failed 标记文件
+        self.done_dir = os.path.join(self.folder, done_dir)
+        self.failed_dir = os.path.join(self.folder, failed_dir)
+        self._check_output_location()
+        self.watcher = FolderWatcher(folder, self._enqueue, stable_seconds, poll_interval, ignore=self._ignore)
+        self.executor = None
+        self.completed = 0
+        self.failed = 0
+        self._count_lock = threading.Lock()  # 多个工作线程同时完成任务时保护计数
+
+    def _log(self, message):
+        self.processor.log(message, stage="watch")
+
+    def _check_output_location(self):
+        """输出写入被监视的文件夹且没有后缀时，输出无法与输入区分，会被当作新文件再次处理，拒绝这种配置"""
+        params = self.params
+        if params.get('suffix'):
+            return
+        sample = self.processor.get_output_path(
+            os.path.join(self.folder, "sample.mp4"), '', params['output_option'], params['output_dir'],
+            params['create_subdir'], create_dirs=False
+        )
+        try:
+            inside = os.path.commonpath([os.path.abspath(sample), self.folder]) == self.folder
+        except ValueError:
+            inside = False  # Windows上位于不同驱动器
+        if inside:
+            raise ValueError("监视文件夹模式下，输出位于被监视的文件夹内时必须设置文件名后缀，否则输出会被再次处理")
+
+    def _ignore(self, path):
+        """忽略完成/失败目录、已标记的输入和本工具生成的输出文件"""
+        if path in (self.done_dir, self.failed_dir):
+            return True
+        if os.path.exists(path + '.done') or os.path.exists(path + '.failed'):
+            return True
+        base_name = os.path.splitext(os.path.basename(path))[0]
+        suffix = self.params.get('suffix')
+        return bool(suffix) and base_name.endswith(suffix)
+
+    def start(self):
+        """开始监视并处理"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.processor.is_processing = True
+        self.executor = ThreadPoolExecutor(max_workers=max(1, int(self.params.get('concurrent_tasks', 1))))
+        self.watcher.start()
+        self._log(f"👀 开始监视文件夹: {self.folder}")
+        return self
+
+    def stop(self):
+        """停止监视，终止正在处理的任务并丢弃排队的任务"""
+        self.watcher.stop()
+        self.processor.stop_processing()
+        if self.executor:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+        with self._count_lock:
+            completed, failed = self.completed, self.failed
+        self._log(f"👀 已停止监视: 成功 {completed} 个，失败 {failed} 个")
+
+    def _enqueue(self, path):
+        """文件已稳定，提交处理"""
+        self._log(f"📥 检测到新文件: {os.path.basename(path)}")
+        self.executor.submit(self._process, path)
+
+    def _process(self, path):
+        params = self.params
+        scheduler = self.processor.io_scheduler
+        try:
+            output_path = self.processor.get_output_path(
+                path, params['suffix'], params['output_option'], params['output_dir'], params['create_subdir']
+            )
+        except Exception as e:
+            self._finish(path, False, str(e))
+            return
+
+        devices = scheduler.devices_for(path, output_path)
+        verify = (params.get('encode_options') or {}).get('verify_output')
+        for attempt in range(MAX_VERIFY_RETRIES + 1):
+            if not scheduler.acquire(devices, should_continue=lambda: self.processor.is_processing,
+                                     limit=self.params.get('io_per_device', 2)):
+                return
+            try:
+                _, success, error = self.processor.process_single(
+                    path, output_path, params['rotation'], params['hw_accel'], encode_options=params.get('encode_options')
+                )
+            finally:
+                scheduler.release(devices)
+            # 校验在释放设备后进行，不妨碍其他任务读写
+            if not success or not verify or not self.processor.is_processing:
+                break
+            success, error = OutputVerifier(self.processor).verify(path, output_path, params['rotation'])
+            if success:
+                break
+            error = f"输出校验失败: {error}"
+            self.processor.log(f"⚠️ {error}: {os.path.basename(output_path)}", level=logging.WARNING,
+                               stage="verify", file=path)
+            try:
+                os.remove(output_path)
+            except OSError:
+                pass
+        if self.processor.is_processing:
+            self._finish(path, success, error)
+
+    def _finish(self, path, success, error):
+        """处理完成后移动或标记输入文件"""
+        with self._count_lock:
+            if success:
+                self.completed += 1
+            else:
+                self.failed += 1
+            completed, failed = self.completed, self.failed
+        if not success:
+            self._log(f"❌ 失败: {os.path.basename(path)} - {error}")
+
+        try:
+            if self.on_complete == 'mark':
+                with open(path + ('.done' if success else '.failed'), 'w', encoding='utf-8') as f:
+                    f.write(error or '')
+            else:
+                target_dir = self.done_dir if success else self.failed_dir
+                relative = os.path.relpath(os.path.dirname(path), self.folder)
+                target_dir = os.path.normpath(os.path.join(target_dir, relative))
+                os.makedirs(target_dir, exist_ok=True)
+                shutil.move(path, os.path.join(target_dir, os.path.basename(path)))
+            self.watcher.forget(path)
+        except OSError as e:
+            self._log(f"⚠️ 无法移动/标记输入文件: {os.path.basename(path)} - {e}")
+
+        if self.processor.ui_callback:
+            self.processor.ui_callback('status', f"监视中: 已完成 {completed} 个，失败 {failed} 个")